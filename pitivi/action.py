@@ -30,6 +30,7 @@ states = (STATE_NOT_ACTIVE,
 
 from pitivi.signalinterface import Signallable
 from pitivi.factories.base import SourceFactory, SinkFactory
+from pitivi.factories.timeline import TimelineSourceFactory
 from pitivi.encode import RenderSinkFactory, RenderFactory
 from pitivi.log.loggable import Loggable
 
@@ -741,13 +742,31 @@ class RenderAction(Action):
     """
     An Action to render sources.
 
-    Handles a L{RenderSinkFactory}.
+    Handles a L{RenderSinkFactory}. The sources are always rendered from the
+    original files, their proxies and the render cache are only used again
+    once the action is deactivated.
     """
 
     compatible_consumers = [RenderSinkFactory]
     # Use a queue of 5s to allow for big interleave
     queue_size = 5
 
+    def activate(self):
+        if self.pipeline is not None and self.state != STATE_ACTIVE:
+            self._setPreview(False)
+        Action.activate(self)
+
+    def deactivate(self):
+        Action.deactivate(self)
+        self._setPreview(True)
+
+    def _setPreview(self, preview):
+        for producer in self.producers:
+            if isinstance(producer, TimelineSourceFactory):
+                producer.timeline.setPreview(preview)
+            else:
+                producer.use_proxy = preview
+
 def render_action_for_uri(uri, settings, *factories):
     """Creates a L{RenderAction}.
 
@@ -27,6 +27,7 @@ import gobject
 gobject.threads_init()
 import gtk
 from optparse import OptionParser
+import gc
 import os
 import sys
 import urllib
@@ -43,11 +44,13 @@ from pitivi.device import get_probe
 from pitivi.effects import EffectsHandler
 from pitivi.configure import APPNAME
 from pitivi.settings import GlobalSettings
-from pitivi.threads import ThreadMaster
+from pitivi.threads import WorkerPool
 from pitivi.pluginmanager import PluginManager
-from pitivi.signalinterface import Signallable
+from pitivi.signalinterface import Signallable, signal_handler_report
 from pitivi.log.loggable import Loggable
 from pitivi.log import log
+from pitivi.log.ringbuffer import RingBufferLogHandler
+from pitivi.log import tracing
 from pitivi.ui.mainwindow import PitiviMainWindow
 from pitivi.projectmanager import ProjectManager, ProjectLogObserver
 from pitivi.undo import UndoableActionLog, DebugActionLogObserver
@@ -113,6 +116,8 @@ class Pitivi(Loggable, Signallable):
         # init logging as early as possible so we can log startup code
         enable_color = os.environ.get('PITIVI_DEBUG_NO_COLOR', '0') in ('', '0')
         log.init('PITIVI_DEBUG', enable_color)
+        self._initLogSink()
+        self._initTracing()
 
         self.info('starting up')
 
@@ -128,7 +133,7 @@ class Pitivi(Loggable, Signallable):
 
         # get settings
         self.settings = GlobalSettings()
-        self.threads = ThreadMaster()
+        self.threads = WorkerPool()
         #self.screencast = False
 
         self.plugin_manager = PluginManager(
@@ -170,10 +175,61 @@ class Pitivi(Loggable, Signallable):
         self.current = None
         instance.PiTiVi = None
         self.emit("shutdown")
+        if self.trace_filename:
+            self.exportTrace()
+        if self.log_sink is not None:
+            self.log_sink.uninstall()
         return True
 
     #}
 
+    def _initLogSink(self):
+        # PITIVI_DEBUG_ASYNC moves log output to a writer thread.
+        # PITIVI_DEBUG_DUMP=N keeps log records in memory and dumps the last
+        # N seconds of them on an uncaught exception.
+        self.log_sink = None
+        self.log_dump_seconds = None
+
+        dump = os.environ.get('PITIVI_DEBUG_DUMP')
+        if dump:
+            try:
+                self.log_dump_seconds = float(dump)
+            except ValueError:
+                self.warning("invalid PITIVI_DEBUG_DUMP value %r", dump)
+        threaded = os.environ.get('PITIVI_DEBUG_ASYNC', '0') not in ('', '0')
+
+        if threaded or self.log_dump_seconds is not None:
+            self.log_sink = RingBufferLogHandler(dump_only=not threaded)
+            self.log_sink.install()
+
+    def _initTracing(self):
+        # PITIVI_TRACE=FILE records spans and writes them to FILE as a Chrome
+        # trace on shutdown, or whenever we get SIGUSR2.
+        self.trace_filename = os.environ.get('PITIVI_TRACE')
+        if not self.trace_filename:
+            return
+
+        tracing.enable()
+        import signal
+        signal.signal(signal.SIGUSR2, self._exportTraceSignalCb)
+
+    def exportTrace(self, filename=None):
+        """
+        Write the spans recorded so far as a Chrome trace.
+
+        @param filename: Where to write, defaults to C{$PITIVI_TRACE}.
+        """
+        if filename is None:
+            filename = self.trace_filename
+        self.info("exporting trace to %s", filename)
+        try:
+            tracing.exportChromeTrace(filename)
+        except IOError, e:
+            self.warning("couldn't export trace: %s", e)
+
+    def _exportTraceSignalCb(self, signum, frame):
+        self.exportTrace()
+
     def _connectToProjectManager(self, projectManager):
         projectManager.connect("new-project-loading",
                 self._projectManagerNewProjectLoading)
@@ -214,6 +270,20 @@ class Pitivi(Loggable, Signallable):
         self.projectLogObserver.stopObserving(project)
         self.current = None
         self.emit("project-closed", project)
+        self._logSignalHandlerReport()
+
+    def _logSignalHandlerReport(self):
+        # handlers still connected once a project is closed usually keep
+        # parts of it alive
+        if log.getEffectiveLevel(self.logCategory) < log.INFO:
+            return
+
+        gc.collect()
+        report = signal_handler_report()
+        self.info("%d signal handlers still connected after closing the "
+                "project", sum([count for count, cls, signame in report]))
+        for count, cls, signame in report:
+            self.debug("%6d %s::%s", count, cls, signame)
 
 class InteractivePitivi(Pitivi):
     usage = _("""
@@ -246,7 +316,8 @@ the end of the project timeline.""")
         parser = self._createOptionParser()
         options, args = parser.parse_args(argv)
 
-        if options.debug:
+        self._post_mortem = options.debug
+        if options.debug or self.log_dump_seconds is not None:
             sys.excepthook = self._excepthook
 
         # validate options
@@ -348,6 +419,12 @@ the end of the project timeline.""")
         return True
 
     def _excepthook(self, exc_type, value, tback):
+        if self.log_dump_seconds is not None:
+            self.log_sink.dumpHistory(self.log_dump_seconds, sys.stderr)
+        if not self._post_mortem:
+            sys.__excepthook__(exc_type, value, tback)
+            return
+
         import traceback
         import pdb
         traceback.print_tb(tback)
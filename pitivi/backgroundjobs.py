@@ -0,0 +1,262 @@
+# PiTiVi , Non-linear video editor
+#
+#       backgroundjobs.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+"""
+Files made from sources in the background, like thumbnails and proxies.
+"""
+
+import os
+import time
+
+import gobject
+import gst
+
+from pitivi.log.loggable import Loggable
+from pitivi.signalinterface import Signallable
+
+
+class BackgroundJobQueue(Signallable, Loggable):
+    """
+    Makes a file from each queued source, one source at a time, with a
+    pipeline of its own.
+
+    Sources are taken from the queue in batches of L{batch_size}. The next
+    batch is started from an idle callback, so that other events are
+    dispatched in between. L{pause} stops starting new jobs, it's meant to
+    be called while files are being discovered.
+
+    The files are written to a C{.part} file which is renamed once the job
+    succeeded, so that interrupted jobs don't leave half made files behind.
+    Sources whose file already exists aren't made again.
+
+    The "ready" signal is emitted when the queue is empty.
+
+    Subclasses implement L{_getFilename}, L{_start} and L{_setFile}. The
+    pipeline made by L{_start} is watched with L{_watchPipeline} and calls
+    L{_finish} when it's done.
+
+    @ivar queue: The factories waiting for their file.
+    @type queue: C{list} of L{SourceFactory}
+    @ivar batch_size: How many factories are handled in a row.
+    @type batch_size: C{int}
+    @cvar job_name: What is made, used in the logs and the traces.
+    @type job_name: C{str}
+    """
+
+    __signals__ = {
+        "ready": None,
+        }
+
+    job_name = "file"
+
+    def __init__(self, batch_size=1):
+        Loggable.__init__(self)
+        self.batch_size = batch_size
+        self.queue = []
+        self.paused = False
+        self._batch = []
+        self._current = None
+        self._pipeline = None
+        self._bus = None
+        self._scheduled = False
+        self._started = None
+
+    def add(self, factory):
+        """
+        Queue C{factory}.
+
+        @return: Whether the factory was queued.
+        @rtype: C{bool}
+        """
+        self.queue.append(factory)
+        self._schedule()
+        return True
+
+    def remove(self, factory):
+        """
+        Forget about C{factory} if its file isn't done yet.
+        """
+        for factories in (self.queue, self._batch):
+            if factory in factories:
+                factories.remove(factory)
+        if self._current is not None and self._current[0] is factory:
+            self.info("cancelling the %s of %s", self.job_name, factory.uri)
+            self._finish(False)
+
+    def pause(self):
+        """
+        Don't start new jobs until L{resume} is called.
+        """
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+        self._schedule()
+
+    def _canRun(self):
+        return not self.paused
+
+    def _schedule(self):
+        if not self._canRun() or self._scheduled or \
+                self._current is not None or self._batch or not self.queue:
+            return
+
+        self._scheduled = True
+        gobject.idle_add(self._startBatchCb, priority=gobject.PRIORITY_LOW)
+
+    def _startBatchCb(self):
+        self._scheduled = False
+        if not self._canRun() or self._current is not None:
+            return False
+
+        self._batch = self.queue[:self.batch_size]
+        del self.queue[:self.batch_size]
+        self.debug("starting a batch of %d %ss", len(self._batch),
+                self.job_name)
+        self._next()
+
+        return False
+
+    def _next(self):
+        while self._batch and self._canRun():
+            factory = self._batch.pop(0)
+            filename = self._getFilename(factory)
+            if os.path.exists(filename):
+                self._setFile(factory, filename)
+                continue
+
+            self.debug("making %s %s for %s", self.job_name, filename,
+                    factory.uri)
+            self.beginSpan(self.job_name, factory.uri, uri=factory.uri)
+            self._current = (factory, filename)
+            self._started = time.time()
+            self._start(factory, filename)
+            return
+
+        # the batch is over, or was interrupted by pause()
+        self.queue[0:0] = self._batch
+        self._batch = []
+        self._batchDone()
+
+        if self.queue:
+            self._schedule()
+        else:
+            self.info("%s queue is now ready", self.job_name)
+            self.emit("ready")
+
+    def _getPartFilename(self):
+        """
+        Return the file the current job writes to.
+        """
+        return self._current[1] + ".part"
+
+    def _watchPipeline(self, pipeline, handlers):
+        """
+        Keep C{pipeline} until the current job is finished. Errors finish the
+        job.
+
+        @param handlers: The callbacks of the bus messages, by message type.
+        @type handlers: C{dict}
+        """
+        self._pipeline = pipeline
+        self._bus = pipeline.get_bus()
+        self._bus.add_signal_watch()
+        for message_type, callback in handlers.iteritems():
+            self._bus.connect("message::" + message_type, callback)
+        self._bus.connect("message::error", self._busErrorCb)
+
+    def _busErrorCb(self, unused_bus, message):
+        gerror, detail = message.parse_error()
+        self.warning("error making the %s of %s: %s", self.job_name,
+                self._current[0].uri, gerror.message)
+        self._finish(False)
+
+    def _finish(self, success):
+        """
+        Tear down the pipeline of the current job and go on with the next
+        one.
+
+        @param success: Whether the C{.part} file is complete.
+        """
+        factory, filename = self._current
+        part = self._getPartFilename()
+        self._current = None
+        self._stop()
+
+        if self._bus is not None:
+            self._bus.remove_signal_watch()
+            self._bus = None
+
+        if self._pipeline is not None:
+            self._pipeline.set_state(gst.STATE_NULL)
+            self._pipeline = None
+
+        try:
+            if success:
+                os.rename(part, filename)
+            elif os.path.exists(part):
+                os.unlink(part)
+        except OSError, e:
+            self.warning("couldn't write the %s of %s: %s", self.job_name,
+                    factory.uri, e)
+            success = False
+
+        self.endSpan(self.job_name, factory.uri, success=success)
+        self._jobDone(factory, success, time.time() - self._started)
+        if success:
+            self._setFile(factory, filename)
+        self._next()
+
+    def _getFilename(self, factory):
+        """
+        Return the file made for C{factory}.
+        """
+        raise NotImplementedError()
+
+    def _start(self, factory, filename):
+        """
+        Start making the file of C{factory}, to L{_getPartFilename}.
+        """
+        raise NotImplementedError()
+
+    def _setFile(self, factory, filename):
+        """
+        Give C{factory} the file that was made for it.
+        """
+        raise NotImplementedError()
+
+    def _stop(self):
+        """
+        Called when the current job is finished, before the pipeline is torn
+        down.
+        """
+        pass
+
+    def _jobDone(self, factory, success, duration):
+        """
+        Called when a job is finished, C{duration} is how long it took in
+        seconds.
+        """
+        pass
+
+    def _batchDone(self):
+        """
+        Called at the end of each batch.
+        """
+        pass
@@ -27,6 +27,8 @@ Discover file multimedia information.
 
 from gettext import gettext as _
 import os.path
+import math
+import time
 import gobject
 gobject.threads_init()
 import gst
@@ -34,15 +36,16 @@ import gst.pbutils
 from gst.pbutils import INSTALL_PLUGINS_SUCCESS, \
         INSTALL_PLUGINS_PARTIAL_SUCCESS, INSTALL_PLUGINS_USER_ABORT, \
         INSTALL_PLUGINS_STARTED_OK
-import tempfile
-import hashlib
 
 from pitivi.log.loggable import Loggable
 from pitivi.factories.file import FileSourceFactory, PictureFileSourceFactory
 from pitivi.stream import get_stream_for_pad
 from pitivi.signalinterface import Signallable
 from pitivi.stream import VideoStream, TextStream
-from pitivi.settings import xdg_cache_home
+from pitivi.discoverycache import get_default_cache
+from pitivi.imageprobe import probe_image
+from pitivi.threads import cpu_count
+from pitivi.utils import CachedFactoryList
 
 # FIXME: We need to store more information regarding streams
 # i.e. remember the path took to get to a raw stream, and figure out
@@ -83,11 +86,116 @@ class EOSSir(gst.Element):
         return ret
 gobject.type_register(EOSSir)
 
+def decoderFilter(factory):
+    klass = factory.get_klass()
+    return factory.get_rank() >= 64 and "Decoder" in klass and \
+            "Demuxer" not in klass
+
+_decoderFactories = CachedFactoryList(decoderFilter)
+
+# the decoders used for still images
+_image_decoders = {"png": "pngdec", "jpeg": "jpegdec"}
+
+def _signed(mask):
+    # masks are signed in caps
+    if mask >= 2 ** 31:
+        mask -= 2 ** 32
+    return mask
+
+def get_image_caps(info):
+    """
+    Return the caps the decoder of an image outputs, the same caps the
+    pipeline would find.
+
+    pngdec expands every color type to big endian RGB, or RGBA when there's
+    transparency, jpegdec outputs I420.
+
+    @type info: L{ImageInfo}
+    @rtype: C{gst.Caps}
+    """
+    if info.format == "jpeg":
+        return gst.Caps("video/x-raw-yuv, format=(fourcc)I420, "
+                "width=(int)%d, height=(int)%d, framerate=(fraction)0/1, "
+                "pixel-aspect-ratio=(fraction)1/1" % (info.width, info.height))
+
+    if info.has_alpha:
+        bpp = 32
+        masks = "red_mask=(int)%d, green_mask=(int)%d, blue_mask=(int)%d, " \
+                "alpha_mask=(int)%d" % (_signed(0xff000000), 0xff0000,
+                0xff00, 0xff)
+    else:
+        bpp = 24
+        masks = "red_mask=(int)%d, green_mask=(int)%d, blue_mask=(int)%d" \
+                % (0xff0000, 0xff00, 0xff)
+    return gst.Caps("video/x-raw-rgb, bpp=(int)%d, depth=(int)%d, "
+            "endianness=(int)4321, %s, width=(int)%d, height=(int)%d, "
+            "framerate=(fraction)0/1, pixel-aspect-ratio=(fraction)1/1" %
+            (bpp, bpp, masks, info.width, info.height))
+
+# analysis timeouts, in seconds
+DEFAULT_TIMEOUT = 10
+MIN_TIMEOUT = 5
+MAX_TIMEOUT = 120
+
+# initial guesses for the adaptive timeouts, refined as files are analyzed
+DEFAULT_THROUGHPUT = 2 * 1024 * 1024
+DEFAULT_BYTES_READ = 4 * 1024 * 1024
+
+# weight of the latest analysis in the throughput and bytes read averages
+ESTIMATE_WEIGHT = 0.3
+
+class Analysis(object):
+    """
+    The state of the analysis of one URI.
+
+    @ivar uri: The URI being analyzed.
+    @ivar streams: The streams found so far.
+    @type streams: C{list} of L{MultimediaStream}
+    @ivar duration: The duration of the file, if it could be queried.
+    @ivar pipeline: The analysis pipeline.
+    @ivar error: The error message, if the analysis failed.
+    @ivar error_detail: More details about the error.
+    @ivar mime: The type found by typefind.
+    @ivar timings: How long after the start of the analysis each phase ended,
+    in seconds. Phases are C{typefind}, C{preroll} and C{total}, C{duration}
+    is the time spent querying the duration.
+    @type timings: C{dict}
+    """
+
+    def __init__(self, uri):
+        self.uri = uri
+        self.tags = []
+        self.streams = []
+        self.duration = gst.CLOCK_TIME_NONE
+        self.pipeline = None
+        self.bus = None
+        self.timeout_id = 0
+        self.error = None
+        self.error_detail = None
+        self.unfixed_pads = 0
+        self.unknown_pads = 0
+        self.missing_plugin_messages = []
+        self.dynamic_elements = []
+        self.missing_plugin_details = []
+        self.missing_plugin_descriptions = []
+        self.source = None
+        self.last_position = 0
+        self.mime = None
+        self.started = time.time()
+        self.timings = {}
+
+    def mark(self, phase):
+        self.timings[phase] = time.time() - self.started
+
+    def __repr__(self):
+        return "<Analysis %s>" % self.uri
+
 class Discoverer(Signallable, Loggable):
     """
     Queues requests to discover information about given files.
     The discovery is done in a very fragmented way, so that it appears to be
-    running in a separate thread.
+    running in a separate thread. Up to L{max_pipelines} files are analyzed
+    at the same time, each with its own pipeline and L{Analysis} state.
 
     The "starting" signal is emitted when the discoverer starts analyzing some
     files.
@@ -98,6 +206,28 @@ class Discoverer(Signallable, Loggable):
     The "discovery-done" signal is emitted an uri is finished being analyzed.
     The "discovery-error" signal is emitted if an error is encountered while
     analyzing an uri.
+
+    The "progress" signal is emitted each time an uri is finished, with the
+    number of uris finished and the total number of uris added since the
+    discoverer was last ready.
+
+    The "timing" signal is emitted each time an uri has been analyzed, with
+    its type and L{Analysis.timings}.
+
+    Files get more time to be analyzed the bigger they are and the slower
+    the previous files were read, see L{_getTimeout}.
+
+    @ivar queue: The uris waiting to be analyzed.
+    @type queue: C{list}
+    @ivar analyses: The analyses in progress.
+    @type analyses: C{list} of L{Analysis}
+    @ivar max_pipelines: How many files can be analyzed at the same time.
+    @type max_pipelines: C{int}
+    @ivar header_only: Whether streams are left encoded, see L{__init__}.
+    @type header_only: C{bool}
+    @ivar throughput: The average speed files are read at, in bytes per
+    second.
+    @ivar bytes_read: The average number of bytes read to analyze a file.
     """
 
     __signals__ = {
@@ -105,46 +235,43 @@ class Discoverer(Signallable, Loggable):
         "discovery-done" : ["uri", "factory"],
         "ready" : None,
         "starting" : None,
-        "missing-plugins": ["uri", "detail", "description"]
+        "missing-plugins": ["uri", "detail", "description"],
+        "progress": ["done", "total"],
+        "timing": ["uri", "mime", "timings"],
         }
 
-    def __init__(self):
+    def __init__(self, cache=None, max_pipelines=None, header_only=False):
+        """
+        @param cache: Where discovery results are looked up before analyzing
+        files and stored after, defaults to the shared L{DiscoveryCache}.
+        @type cache: L{DiscoveryCache}
+        @param max_pipelines: How many files can be analyzed at the same time.
+        Defaults to the C{PITIVI_DISCOVERER_PIPELINES} environment variable,
+        or to the number of processors, up to 4.
+        @type max_pipelines: C{int}
+        @param header_only: Stop plugging elements as soon as a stream can be
+        decoded, so that the duration and stream caps come from the container
+        headers without prerolling any decoder. The resulting streams have
+        encoded caps, so the factories are meant for indexing and can't be
+        used in a timeline. They're not cached either.
+        @type header_only: C{bool}
+        """
         Loggable.__init__(self)
+        if cache is None:
+            cache = get_default_cache()
+        self.cache = cache
+        if max_pipelines is None:
+            max_pipelines = int(os.getenv("PITIVI_DISCOVERER_PIPELINES", 0)) \
+                    or min(4, cpu_count())
+        self.max_pipelines = max_pipelines
+        self.header_only = header_only
+        self.throughput = DEFAULT_THROUGHPUT
+        self.bytes_read = DEFAULT_BYTES_READ
         self.queue = []
+        self.analyses = []
         self.working = False
-        self.timeout_id = 0
-        self._resetState()
-
-    def _resetState(self):
-        self.current_uri = None
-        self.current_tags = []
-        self.current_streams = []
-        self.current_duration = gst.CLOCK_TIME_NONE
-        self.pipeline = None
-        self.bus = None
-        self.error = None
-        self.error_detail = None
-        self.unfixed_pads = 0
-        self.unknown_pads = 0
-        self.missing_plugin_messages = []
-        self.dynamic_elements = []
-        self.thumbnails = {}
-        self.missing_plugin_details = []
-        self.missing_plugin_descriptions = []
-
-    def _resetPipeline(self):
-        # finish current, cleanup
-        if self.bus is not None:
-            self.bus.remove_signal_watch()
-            self.bus = None
-
-        if self.pipeline is not None:
-            self.debug("before setting to NULL")
-            res = self.pipeline.set_state(gst.STATE_NULL)
-            self.debug("after setting to NULL : %s", res)
-
-        for element in self.dynamic_elements:
-            self.pipeline.remove(element)
+        self.done = 0
+        self._analysis_scheduled = False
 
     def addUri(self, uri):
         """ queue a filename to be discovered """
@@ -152,13 +279,19 @@ class Discoverer(Signallable, Loggable):
         self.queue.append(uri)
         if not self.working:
             self._startAnalysis()
+        else:
+            self._scheduleAnalysis()
 
     def addUris(self, uris):
         """ queue a list of filenames to be discovered """
         self.info("filenames : %s", uris)
         self.queue.extend(uris)
-        if self.queue and not self.working:
+        if not self.queue:
+            return
+        if not self.working:
             self._startAnalysis()
+        else:
+            self._scheduleAnalysis()
 
     def _startAnalysis(self):
         """
@@ -170,41 +303,70 @@ class Discoverer(Signallable, Loggable):
         self._scheduleAnalysis()
 
     def _scheduleAnalysis(self):
-        gobject.idle_add(self._analyze)
+        if self._analysis_scheduled or not self.queue or \
+                len(self.analyses) >= self.max_pipelines:
+            return
 
-    def _removeTimeout(self):
-        gobject.source_remove(self.timeout_id)
-        self.timeout_id = 0
+        self._analysis_scheduled = True
+        gobject.idle_add(self._analyzeNextCb)
+
+    def _analyzeNextCb(self):
+        self._analysis_scheduled = False
+        # start one pipeline per main loop iteration so that the UI doesn't
+        # freeze while we fill the free slots
+        if self.queue and len(self.analyses) < self.max_pipelines:
+            self._analyze(self.queue.pop(0))
+        self._scheduleAnalysis()
+
+        return False
+
+    def _removeTimeout(self, analysis):
+        gobject.source_remove(analysis.timeout_id)
+        analysis.timeout_id = 0
 
-    def _checkMissingPlugins(self):
-        if self.bus is not None:
+    def _resetPipeline(self, analysis):
+        # finish current, cleanup
+        if analysis.bus is not None:
+            analysis.bus.remove_signal_watch()
+            analysis.bus = None
+
+        if analysis.pipeline is not None:
+            self.debug("before setting to NULL")
+            res = analysis.pipeline.set_state(gst.STATE_NULL)
+            self.debug("after setting to NULL : %s", res)
+
+        for element in analysis.dynamic_elements:
+            analysis.pipeline.remove(element)
+
+    def _checkMissingPlugins(self, analysis):
+        if analysis.bus is not None:
             # This method is usually called when decodebin(2) reaches PAUSED and
             # we stop analyzing the current source.
             # decodebin2 commits its state change to PAUSED _before_ posting
             # missing-plugin messages, so we manually pop ELEMENT messages
             # looking for queued missing-plugin messages.
             while True:
-                message = self.bus.pop_filtered(gst.MESSAGE_ELEMENT)
+                message = analysis.bus.pop_filtered(gst.MESSAGE_ELEMENT)
                 if message is None:
                     break
 
-                self._busMessageElementCb(self.bus, message)
+                self._busMessageElementCb(analysis.bus, message, analysis)
 
-        if not self.missing_plugin_messages:
+        if not analysis.missing_plugin_messages:
             return False
 
-        for message in self.missing_plugin_messages:
+        for message in analysis.missing_plugin_messages:
             detail = \
                     gst.pbutils.missing_plugin_message_get_installer_detail(message)
             description = \
                     gst.pbutils.missing_plugin_message_get_description(message)
 
-            self.missing_plugin_details.append(detail)
-            self.missing_plugin_descriptions.append(description)
+            analysis.missing_plugin_details.append(detail)
+            analysis.missing_plugin_descriptions.append(description)
 
         return True
 
-    def _installMissingPluginsCallback(self, result, factory):
+    def _installMissingPluginsCallback(self, result, analysis, factory):
         rescan = False
 
         if result in (INSTALL_PLUGINS_SUCCESS,
@@ -213,81 +375,84 @@ class Discoverer(Signallable, Loggable):
             rescan = True
         elif result == INSTALL_PLUGINS_USER_ABORT \
                 and factory.getOutputStreams():
-            self._emitDone(factory)
+            self._emitDone(analysis, factory)
         else:
-            self._emitErrorMissingPlugins()
+            self._emitErrorMissingPlugins(analysis)
 
-        self._finishAnalysisAfterResult(rescan=rescan)
+        self._finishAnalysisAfterResult(analysis, rescan=rescan)
 
-    def _emitError(self):
+    def _emitError(self, analysis):
         self.debug("emitting error %s, %s, %s",
-                self.current_uri, self.error, self.error_detail)
-        self.emit("discovery-error", self.current_uri, self.error, self.error_detail)
+                analysis.uri, analysis.error, analysis.error_detail)
+        self.emit("discovery-error", analysis.uri, analysis.error,
+                analysis.error_detail)
 
-    def _emitErrorMissingPlugins(self):
-        self.error = _("Missing plugins:\n%s") % \
-                "\n".join(self.missing_plugin_descriptions)
-        self.error_detail = ""
-        self._emitError()
+    def _emitErrorMissingPlugins(self, analysis):
+        analysis.error = _("Missing plugins:\n%s") % \
+                "\n".join(analysis.missing_plugin_descriptions)
+        analysis.error_detail = ""
+        self._emitError(analysis)
 
-    def _emitDone(self, factory):
-        self.emit("discovery-done", self.current_uri, factory)
+    def _emitDone(self, analysis, factory):
+        self.emit("discovery-done", analysis.uri, factory)
 
-    def _emitResult(self):
-        missing_plugins = bool(self.missing_plugin_details)
+    def _emitResult(self, analysis):
+        missing_plugins = bool(analysis.missing_plugin_details)
         # we got a gst error, error out ASAP
-        if not missing_plugins and self.error:
-            self._emitError()
+        if not missing_plugins and analysis.error:
+            self._emitError(analysis)
             return True
 
-        have_video, have_audio, have_image = self._getCurrentStreamTypes()
-        missing_plugins = bool(self.missing_plugin_details)
+        have_video, have_audio, have_image = self._getStreamTypes(analysis)
+        missing_plugins = bool(analysis.missing_plugin_details)
 
-        if not self.current_streams and not missing_plugins:
+        if not analysis.streams and not missing_plugins:
             # woot, nothing decodable
-            self.error = _('Can not decode file.')
-            self.error_detail = _("The given file does not contain audio, "
+            analysis.error = _('Can not decode file.')
+            analysis.error_detail = _("The given file does not contain audio, "
                     "video or picture streams.")
-            self._emitError()
+            self._emitError(analysis)
             return True
 
         # construct the factory with the streams we found
-        if have_image and self.current_duration == gst.CLOCK_TIME_NONE:
-            factory = PictureFileSourceFactory(self.current_uri)
+        if have_image and analysis.duration == gst.CLOCK_TIME_NONE:
+            factory = PictureFileSourceFactory(analysis.uri)
         else:
-            factory = FileSourceFactory(self.current_uri)
+            factory = FileSourceFactory(analysis.uri)
 
-        factory.duration = self.current_duration
-        for stream in self.current_streams:
+        factory.duration = analysis.duration
+        for stream in analysis.streams:
             factory.addOutputStream(stream)
 
         if not missing_plugins:
             # make sure that we could query the duration (if it's an image, we
             # assume it's got infinite duration)
-            is_image = have_image and len(self.current_streams) == 1
-            if self.current_duration == gst.CLOCK_TIME_NONE and not is_image:
-                self.error =_("Could not establish the duration of the file.")
-                self.error_detail = _("This clip seems to be in a format "
+            is_image = have_image and len(analysis.streams) == 1
+            if analysis.duration == gst.CLOCK_TIME_NONE and not is_image:
+                analysis.error =_("Could not establish the duration of the file.")
+                analysis.error_detail = _("This clip seems to be in a format "
                         "which cannot be accessed in a random fashion.")
-                self._emitError()
+                self._emitError(analysis)
                 return True
 
-            self._emitDone(factory)
+            if not self.header_only:
+                self.cache.store(factory)
+            self._emitDone(analysis, factory)
             return True
 
         def callback(result):
-            self._installMissingPluginsCallback(result, factory)
+            self._installMissingPluginsCallback(result, analysis, factory)
 
-        res = self.emit("missing-plugins", self.current_uri, factory,
-                self.missing_plugin_details,
-                self.missing_plugin_descriptions,
+        res = self.emit("missing-plugins", analysis.uri, factory,
+                analysis.missing_plugin_details,
+                analysis.missing_plugin_descriptions,
                 callback)
         if res is None or res != INSTALL_PLUGINS_STARTED_OK:
             # no missing-plugins handlers
             if factory.getOutputStreams():
-                self._emitDone(factory)
+                self._emitDone(analysis, factory)
             else:
-                self._emitErrorMissingPlugins()
+                self._emitErrorMissingPlugins(analysis)
 
             return True
 
@@ -296,54 +461,78 @@ class Discoverer(Signallable, Loggable):
         # self._installMissingPluginsCallback is called by the application
         return False
 
-    def _finishAnalysis(self, reason):
+    def _finishAnalysis(self, analysis, reason):
         """
-        Call this method when the current file is analyzed
+        Call this method when the given analysis is finished.
         This method will wrap-up the analyzis and call the next analysis if needed
         """
-        if self.timeout_id:
-            self._removeTimeout()
+        if analysis.timeout_id:
+            self._removeTimeout(analysis)
 
-        self.info("analysys finished, reason %s", reason)
+        self.info("analysys of %s finished, reason %s", analysis.uri, reason)
+        self.endSpan("discover", analysis.uri, reason=reason)
+        analysis.mark("total")
+        if analysis.error is None:
+            self._updateEstimates(analysis)
 
         # check if there are missing plugins before calling _resetPipeline as we
         # are going to pop messagess off the bus
-        self._checkMissingPlugins()
-        self._resetPipeline()
+        self._checkMissingPlugins(analysis)
+        self._resetPipeline(analysis)
 
         # emit discovery-done, discovery-error or missing-plugins
-        if self._emitResult():
-            self._finishAnalysisAfterResult()
+        if self._emitResult(analysis):
+            self._finishAnalysisAfterResult(analysis)
 
-    def _finishAnalysisAfterResult(self, rescan=False):
-        self.info("Cleaning up after finished analyzing %s", self.current_uri)
-        self._resetState()
+    def _finishAnalysisAfterResult(self, analysis, rescan=False):
+        self.info("Cleaning up after finished analyzing %s", analysis.uri)
+        self.analyses.remove(analysis)
+
+        if rescan:
+            self.queue.insert(0, analysis.uri)
+        else:
+            if analysis.timings:
+                self.emit("timing", analysis.uri, analysis.mime,
+                        analysis.timings)
+            self.done += 1
+            self.emit("progress", self.done,
+                    self.done + len(self.queue) + len(self.analyses))
 
-        if not rescan:
-            self.queue.pop(0)
         # restart an analysis if there's more...
         if self.queue:
             self._scheduleAnalysis()
-        else:
+        elif not self.analyses:
             self.working = False
+            self.done = 0
+            self.cache.save()
             self.info("discoverer is now ready again")
             self.emit("ready")
 
-    def _timeoutCb(self):
-        self.debug("timeout")
-        self.timeout_id = 0
-        if not self.error:
-            self.error = _('Timeout while analyzing file.')
-            self.error_detail = _('Analyzing the file took too long.')
-        self._finishAnalysis("timeout")
+    def _timeoutCb(self, analysis):
+        analysis.timeout_id = 0
+        position = self._queryBytesRead(analysis)
+        if position > analysis.last_position and \
+                time.time() - analysis.started < MAX_TIMEOUT:
+            # slow, but still reading
+            self.debug("extending timeout of %s, read %d bytes",
+                    analysis.uri, position)
+            analysis.last_position = position
+            self._scheduleTimeout(analysis)
+            return False
+
+        self.debug("timeout analyzing %s", analysis.uri)
+        if not analysis.error:
+            analysis.error = _('Timeout while analyzing file.')
+            analysis.error_detail = _('Analyzing the file took too long.')
+        self._finishAnalysis(analysis, "timeout")
 
         return False
 
-    def _getCurrentStreamTypes(self):
+    def _getStreamTypes(self, analysis):
         have_video = False
         have_image = False
         have_audio = False
-        for stream in self.current_streams:
+        for stream in analysis.streams:
             caps_str = str(stream.caps)
             if caps_str.startswith('video'):
                 if stream.is_image:
@@ -355,16 +544,72 @@ class Discoverer(Signallable, Loggable):
 
         return have_video, have_audio, have_image
 
-    def _scheduleTimeout(self):
-        self.timeout_id = gobject.timeout_add_seconds(10, self._timeoutCb)
+    def _getFileSize(self, uri):
+        if not gst.uri_is_valid(uri) or gst.uri_get_protocol(uri) != "file":
+            return None
+
+        try:
+            return os.stat(gst.uri_get_location(uri)).st_size
+        except OSError:
+            return None
+
+    def _getTimeout(self, analysis):
+        """
+        Return how long the analysis can take, in seconds.
+
+        That's the time it should take to read as much of the file as the
+        previous files needed at the speed they were read, with some margin.
+        Extended timeouts don't go past L{MAX_TIMEOUT} after the analysis
+        started.
+        """
+        size = self._getFileSize(analysis.uri)
+        if size is None:
+            timeout = DEFAULT_TIMEOUT
+        else:
+            expected = min(size, self.bytes_read) / float(self.throughput)
+            timeout = min(MAX_TIMEOUT, MIN_TIMEOUT + 4 * expected)
+
+        remaining = MAX_TIMEOUT - (time.time() - analysis.started)
+        return int(max(1, min(timeout, math.ceil(remaining))))
+
+    def _queryBytesRead(self, analysis):
+        if analysis.source is None:
+            return 0
+
+        try:
+            position, format = \
+                    analysis.source.query_position(gst.FORMAT_BYTES)
+        except gst.QueryError:
+            return 0
+
+        if format != gst.FORMAT_BYTES:
+            return 0
+        return position
+
+    def _updateEstimates(self, analysis):
+        bytes_read = self._queryBytesRead(analysis)
+        elapsed = analysis.timings.get("preroll")
+        if not bytes_read or not elapsed:
+            return
+
+        self.bytes_read = (1 - ESTIMATE_WEIGHT) * self.bytes_read + \
+                ESTIMATE_WEIGHT * bytes_read
+        self.throughput = (1 - ESTIMATE_WEIGHT) * self.throughput + \
+                ESTIMATE_WEIGHT * bytes_read / elapsed
+        self.log("throughput %d bytes/s, %d bytes read per file",
+                self.throughput, self.bytes_read)
 
-    def _createSource(self):
+    def _scheduleTimeout(self, analysis):
+        analysis.timeout_id = gobject.timeout_add_seconds(
+                self._getTimeout(analysis), self._timeoutCb, analysis)
+
+    def _createSource(self, analysis):
         source = gst.element_make_from_uri(gst.URI_SRC,
-                self.current_uri, "src-%s" % self.current_uri)
+                analysis.uri, "src-%s" % analysis.uri)
         if not source:
-            self.warning("This is not a media file: %s", self.current_uri)
-            self.error = _("No available source handler.")
-            self.error_detail = _("You do not have a GStreamer source element to handle protocol '%s'") % gst.uri_get_protocol(self.current_uri)
+            self.warning("This is not a media file: %s", analysis.uri)
+            analysis.error = _("No available source handler.")
+            analysis.error_detail = _("You do not have a GStreamer source element to handle protocol '%s'") % gst.uri_get_protocol(analysis.uri)
 
             return None
 
@@ -378,104 +623,174 @@ class Discoverer(Signallable, Loggable):
         ret = os.getenv('USE_DECODEBIN2', '1') == '1'
         return ret
 
-    def _createDecodeBin(self):
+    def _createDecodeBin(self, analysis):
         if self._useDecodeBinTwo():
             dbin = gst.element_factory_make("decodebin2", "dbin")
         else:
             dbin = gst.element_factory_make("decodebin", "dbin")
 
-        dbin.connect("new-decoded-pad", self._newDecodedPadCb)
-        dbin.connect("unknown-type", self._unknownType)
+        dbin.connect("new-decoded-pad", self._newDecodedPadCb, analysis)
+        dbin.connect("unknown-type", self._unknownType, analysis)
+        typefind = dbin.get_by_name("typefind")
+        if typefind is not None:
+            typefind.connect("have-type", self._typefindHaveTypeCb, analysis)
+        if self.header_only and self._useDecodeBinTwo():
+            dbin.connect("autoplug-continue", self._autoplugContinueCb)
 
         return dbin
 
-    def _connectToBus(self):
-        self.bus = self.pipeline.get_bus()
-        self.bus.add_signal_watch()
-        self.bus.connect("message::eos", self._busMessageEosCb)
-        self.bus.connect("message::error", self._busMessageErrorCb)
-        self.bus.connect("message::element", self._busMessageElementCb)
-        self.bus.connect("message::state-changed",
-                         self._busMessageStateChangedCb)
+    def _typefindHaveTypeCb(self, unused_typefind, unused_probability, caps,
+            analysis):
+        analysis.mime = caps[0].get_name()
+        analysis.mark("typefind")
+
+    def _autoplugContinueCb(self, unused_dbin, unused_pad, caps):
+        # in header only mode, expose streams that a decoder could handle
+        # instead of plugging the decoder
+        for factory in _decoderFactories.get():
+            for template in factory.get_static_pad_templates():
+                if template.direction == gst.PAD_SINK and \
+                        not caps.intersect(
+                                template.static_caps.get()).is_empty():
+                    return False
+
+        return True
+
+    def _connectToBus(self, analysis):
+        bus = analysis.bus = analysis.pipeline.get_bus()
+        bus.add_signal_watch()
+        bus.connect("message::eos", self._busMessageEosCb, analysis)
+        bus.connect("message::error", self._busMessageErrorCb, analysis)
+        bus.connect("message::element", self._busMessageElementCb, analysis)
+        bus.connect("message::state-changed",
+                self._busMessageStateChangedCb, analysis)
+
+    def _probeImage(self, analysis):
+        """
+        Build the factory of a still image from its header, with the caps the
+        decoder would output.
 
-    def _analyze(self):
+        @return: The factory, or C{None} if the pipeline must be used.
+        """
+        if not gst.uri_is_valid(analysis.uri) or \
+                gst.uri_get_protocol(analysis.uri) != "file":
+            return None
+
+        info = probe_image(gst.uri_get_location(analysis.uri))
+        if info is None:
+            return None
+
+        if gst.element_factory_find(_image_decoders[info.format]) is None:
+            # let the pipeline report the missing plugin
+            return None
+
+        caps = get_image_caps(info)
+
+        factory = PictureFileSourceFactory(analysis.uri)
+        factory.duration = gst.CLOCK_TIME_NONE
+        factory.addOutputStream(VideoStream(caps, "src0", is_image=True))
+        analysis.mime = "image/" + info.format
+        analysis.mark("total")
+        return factory
+
+    def _analyze(self, uri):
         """
         Sets up a pipeline to analyze the given uri
         """
-        self.current_uri = self.queue[0]
-        self.info("Analyzing %s", self.current_uri)
+        analysis = Analysis(uri)
+        self.analyses.append(analysis)
+
+        factory = self.cache.lookup(uri)
+        if factory is not None:
+            self.info("Using cached discovery of %s", uri)
+            self._emitDone(analysis, factory)
+            self._finishAnalysisAfterResult(analysis)
+            return analysis
+
+        factory = self._probeImage(analysis)
+        if factory is not None:
+            self.info("Got %s from the image header", uri)
+            if not self.header_only:
+                self.cache.store(factory)
+            self._emitDone(analysis, factory)
+            self._finishAnalysisAfterResult(analysis)
+            return analysis
+
+        self.info("Analyzing %s", uri)
+        self.beginSpan("discover", uri, uri=uri)
 
         # setup graph and start analyzing
-        self.pipeline = gst.Pipeline("Discoverer-%s" % self.current_uri)
+        analysis.pipeline = gst.Pipeline("Discoverer-%s" % uri)
 
         # create the source element
-        source = self._createSource()
+        source = self._createSource(analysis)
         if source is None:
-            self._finishAnalysis("no source")
-            return False
+            self._finishAnalysis(analysis, "no source")
+            return analysis
+        analysis.source = source
 
         # create decodebin(2)
-        dbin = self._createDecodeBin()
+        dbin = self._createDecodeBin(analysis)
 
-        self.pipeline.add(source, dbin)
+        analysis.pipeline.add(source, dbin)
         source.link(dbin)
         self.info("analysis pipeline created")
 
         # connect to bus messages
-        self._connectToBus()
+        self._connectToBus(analysis)
 
         self.info("setting pipeline to PAUSED")
 
         # go to PAUSED
-        if self.pipeline.set_state(gst.STATE_PAUSED) == gst.STATE_CHANGE_FAILURE:
-            if not self.error:
-                self.error = _("Pipeline didn't want to go to PAUSED.")
+        if analysis.pipeline.set_state(gst.STATE_PAUSED) == \
+                gst.STATE_CHANGE_FAILURE:
+            if not analysis.error:
+                analysis.error = _("Pipeline didn't want to go to PAUSED.")
             self.info("Pipeline didn't want to go to PAUSED")
-            self._finishAnalysis("failure going to PAUSED")
+            self._finishAnalysis(analysis, "failure going to PAUSED")
 
-            return False
+            return analysis
 
-        self._scheduleTimeout()
+        self._scheduleTimeout(analysis)
 
-        # return False so we don't get called again
-        return False
+        return analysis
 
-    def _busMessageEosCb(self, unused_bus, message):
+    def _busMessageEosCb(self, unused_bus, message, analysis):
         self.debug("got EOS")
 
-        self._finishAnalysis("EOS")
+        self._finishAnalysis(analysis, "EOS")
 
-    def _busMessageErrorCb(self, unused_bus, message):
+    def _busMessageErrorCb(self, unused_bus, message, analysis):
         gerror, detail = message.parse_error()
 
-        if self.error is not None:
+        if analysis.error is not None:
             # don't clobber existing errors
             return
 
-        self.error = _("An internal error occurred while analyzing this file: %s") % gerror.message
-        self.error_detail = detail
+        analysis.error = _("An internal error occurred while analyzing this file: %s") % gerror.message
+        analysis.error_detail = detail
 
-        self._finishAnalysis("ERROR")
+        self._finishAnalysis(analysis, "ERROR")
 
-    def _busMessageElementCb(self, unused_bus, message):
+    def _busMessageElementCb(self, unused_bus, message, analysis):
         self.debug("Element message %s", message.structure.to_string())
         if message.structure.get_name() == "redirect":
             self.warning("We don't implement redirections currently, ignoring file")
-            if self.error is None:
-                self.error = _("File contains a redirection to another clip.")
-                self.error_detail = _("PiTiVi currently does not handle redirection files.")
+            if analysis.error is None:
+                analysis.error = _("File contains a redirection to another clip.")
+                analysis.error_detail = _("PiTiVi currently does not handle redirection files.")
 
-            self._finishAnalysis("redirect")
+            self._finishAnalysis(analysis, "redirect")
             return
 
         if gst.pbutils.is_missing_plugin_message(message):
-            self._busMessageMissingPlugins(message)
+            self._busMessageMissingPlugins(message, analysis)
 
-    def _busMessageMissingPlugins(self, message):
-        self.missing_plugin_messages.append(message)
+    def _busMessageMissingPlugins(self, message, analysis):
+        analysis.missing_plugin_messages.append(message)
 
-    def _busMessageStateChangedCb(self, unused_bus, message):
-        if message.src != self.pipeline:
+    def _busMessageStateChangedCb(self, unused_bus, message, analysis):
+        if message.src != analysis.pipeline:
             return
 
         state_change = message.parse_state_changed()
@@ -484,89 +799,35 @@ class Discoverer(Signallable, Loggable):
 
         if prev == gst.STATE_READY and new == gst.STATE_PAUSED and \
                 pending == gst.STATE_VOID_PENDING:
-            have_video, have_audio, have_image = self._getCurrentStreamTypes()
-            if self.unfixed_pads or self.unknown_pads or have_video or have_image:
-                # go to PLAYING to generate the thumbnails
-                if self.pipeline.set_state(gst.STATE_PLAYING) == gst.STATE_CHANGE_FAILURE:
-                    if not self.error:
-                        self.error = _("Pipeline didn't want to go to PLAYING.")
+            analysis.mark("preroll")
+            if analysis.unfixed_pads or analysis.unknown_pads:
+                # go to PLAYING so that caps get fixed by in band data
+                if analysis.pipeline.set_state(gst.STATE_PLAYING) == \
+                        gst.STATE_CHANGE_FAILURE:
+                    if not analysis.error:
+                        analysis.error = _("Pipeline didn't want to go to PLAYING.")
                     self.info("Pipeline didn't want to go to PAUSED")
-                    self._finishAnalysis("failure going to PAUSED")
-            elif self.unfixed_pads == 0:
+                    self._finishAnalysis(analysis, "failure going to PAUSED")
+            elif analysis.unfixed_pads == 0:
                 # check for unfixed_pads until elements are fixed to do
                 # negotiation before pushing in band data
-                self._finishAnalysis("got to PAUSED and no unfixed pads")
+                self._finishAnalysis(analysis,
+                        "got to PAUSED and no unfixed pads")
 
-    def _busMessageTagCb(self, unused_bus, message):
+    def _busMessageTagCb(self, unused_bus, message, analysis):
         self.debug("Got tags %s", message.structure.to_string())
-        self.current_tags.append(message.parse_tag())
+        analysis.tags.append(message.parse_tag())
 
-    def _maybeQueryDuration(self, pad):
-        if self.current_duration == gst.CLOCK_TIME_NONE:
+    def _maybeQueryDuration(self, analysis, pad):
+        if analysis.duration == gst.CLOCK_TIME_NONE:
+            start = time.time()
             result = pad.query_duration(gst.FORMAT_TIME)
+            analysis.timings["duration"] = \
+                    analysis.timings.get("duration", 0) + time.time() - start
             if result is not None:
                 duration, format = result
                 if format == gst.FORMAT_TIME:
-                    self.current_duration = duration
-
-    def _gettempdir(self):
-        tmp = tempfile.gettempdir()
-        tmp = os.path.join(tmp, 'pitivi-%s' % os.getenv('USER'))
-        if not os.path.exists(tmp):
-            os.mkdir(tmp)
-        return tmp
-
-    def _getThumbnailFilenameFromPad(self, pad):
-        base = xdg_cache_home()
-        name = self.current_uri
-        md5sum = hashlib.md5()
-        md5sum.update(self.current_uri)
-        name = md5sum.hexdigest() + '.png'
-        directory = os.path.join(base, "pitivi")
-        try:
-            os.makedirs(directory)
-        except OSError, e:
-            # 17 = file exists
-            if e.errno != 17:
-                raise
-        filename = os.path.join(base, "pitivi", name)
-
-        return filename
-
-    def _videoPadSeekCb(self, pad):
-        try:
-            duration = self.pipeline.query_duration(gst.FORMAT_TIME)[0]
-        except gst.QueryError:
-            duration = 0
-
-        self.debug("doing thumbnail seek at %s", gst.TIME_ARGS(duration))
-
-        if duration:
-            self.pipeline.seek_simple(gst.FORMAT_TIME,
-                    gst.SEEK_FLAG_FLUSH, duration / 3)
-
-        pad.set_blocked_async(False, self._videoPadBlockCb)
-
-    def _videoPadBlockCb(self, pad, blocked):
-        self.debug("video pad blocked: %s" % blocked)
-        if blocked:
-            gobject.timeout_add(0, self._videoPadSeekCb, pad)
-
-    def _addVideoBufferProbe(self, pad):
-        closure = {}
-        closure['probe_id'] = pad.add_buffer_probe(self._videoBufferProbeCb,
-                closure)
-
-    def _removeVideoBufferProbe(self, pad, closure):
-        pad.remove_buffer_probe(closure['probe_id'])
-
-    def _videoBufferProbeCb(self, pad, buf, closure):
-        self.log("video buffer probe for pad %s", pad)
-        self._removeVideoBufferProbe(pad, closure)
-
-        pad.set_blocked_async(True, self._videoPadBlockCb)
-
-        return False
+                    analysis.duration = duration
 
     def _padEventProbeCb(self, pad, event):
         self.log("got event %s from src %s on pad %s",
@@ -583,59 +844,25 @@ class Discoverer(Signallable, Loggable):
         pad.add_event_probe(self._padEventProbeCb)
         pad.add_buffer_probe(self._padBufferProbeCb)
 
-    def _newVideoPadCb(self, pad):
+    def _newVideoPadCb(self, analysis, pad):
         """ a new video pad was found """
         self.debug("pad %r", pad)
 
         self._addPadProbes(pad)
 
-        thumbnail = self._getThumbnailFilenameFromPad(pad)
-        self.thumbnails[pad] = thumbnail
-        have_thumbnail = os.path.exists(thumbnail)
-
-        if have_thumbnail:
-            self.debug("we already have a thumbnail %s for %s", thumbnail, pad)
-            sink = gst.element_factory_make("fakesink")
-            # use this and not fakesink.props.num_buffers = 1 to avoid some
-            # not-expected errors when discovering pictures
-            eossir = EOSSir()
-            self.dynamic_elements.extend([eossir, sink])
-            self.pipeline.add(eossir, sink)
-            eossir.set_state(gst.STATE_PLAYING)
-            sink.set_state(gst.STATE_PLAYING)
+        sink = gst.element_factory_make("fakesink")
+        # use this and not fakesink.props.num_buffers = 1 to avoid some
+        # not-expected errors when discovering pictures
+        eossir = EOSSir()
+        analysis.dynamic_elements.extend([eossir, sink])
+        analysis.pipeline.add(eossir, sink)
+        eossir.set_state(gst.STATE_PLAYING)
+        sink.set_state(gst.STATE_PLAYING)
 
-            pad.link(eossir.get_pad("sink"))
-            eossir.link(sink)
+        pad.link(eossir.get_pad("sink"))
+        eossir.link(sink)
 
-            return
-
-        stream = get_stream_for_pad(pad)
-        if isinstance(stream, VideoStream) and not stream.is_image:
-            self._addVideoBufferProbe(pad)
-
-        queue = gst.element_factory_make("queue")
-        queue.props.max_size_bytes = 5 * 1024 * 1024
-        queue.props.max_size_time = 5 * gst.SECOND
-        vscale = gst.element_factory_make("videoscale")
-        vscale.props.method = 0
-        csp = gst.element_factory_make("ffmpegcolorspace")
-        pngenc = gst.element_factory_make("pngenc")
-        pngenc.props.snapshot = True
-        pngsink = gst.element_factory_make("filesink")
-        pngsink.props.location = thumbnail
-
-        self.dynamic_elements.extend([queue, vscale, csp, pngenc, pngsink])
-
-        self.pipeline.add(queue, vscale, csp, pngenc, pngsink)
-        gst.element_link_many(queue, csp, vscale)
-        vscale.link(pngenc, gst.Caps("video/x-raw-rgb,width=[1,96],height=[1,96];video/x-raw-yuv,width=[1,96],height=[1,96]"))
-        gst.element_link_many(pngenc, pngsink)
-        pad.link(queue.get_pad("sink"))
-
-        for element in [queue, vscale, csp, pngenc, pngsink]:
-            element.sync_state_with_parent()
-
-    def _newPadCb(self, pad):
+    def _newPadCb(self, analysis, pad):
         stream = get_stream_for_pad(pad)
         if isinstance(stream, TextStream):
             self.info("skipping subtitle pad")
@@ -646,17 +873,17 @@ class Discoverer(Signallable, Loggable):
         queue = gst.element_factory_make('queue')
         fakesink = gst.element_factory_make('fakesink')
         fakesink.props.num_buffers = 1
-        self.dynamic_elements.append(queue)
-        self.dynamic_elements.append(fakesink)
+        analysis.dynamic_elements.append(queue)
+        analysis.dynamic_elements.append(fakesink)
 
-        self.pipeline.add(queue, fakesink)
+        analysis.pipeline.add(queue, fakesink)
         pad.link(queue.get_pad('sink'))
         queue.link(fakesink)
 
         queue.sync_state_with_parent()
         fakesink.sync_state_with_parent()
 
-    def _capsNotifyCb(self, pad, unused_property, ghost=None):
+    def _capsNotifyCb(self, pad, unused_property, analysis, ghost=None):
         if ghost is None:
             ghost = pad
 
@@ -669,32 +896,28 @@ class Discoverer(Signallable, Loggable):
 
         self.info("got fixed caps for pad %s", pad)
 
-        self.unfixed_pads -= 1
-        self.debug("unfixed pads %d", self.unfixed_pads)
-        stream = self._addStreamFromPad(ghost)
-        if isinstance(stream, VideoStream):
-            stream.thumbnail = self.thumbnails[ghost]
+        analysis.unfixed_pads -= 1
+        self.debug("unfixed pads %d", analysis.unfixed_pads)
+        self._addStreamFromPad(analysis, ghost)
 
-    def _newDecodedPadCb(self, unused_element, pad, is_last):
+    def _newDecodedPadCb(self, unused_element, pad, is_last, analysis):
         self.info("pad:%s caps:%s is_last:%s", pad, pad.get_caps(), is_last)
 
         caps_str = str(pad.get_caps())
         if caps_str.startswith("video/x-raw"):
-            self._newVideoPadCb(pad)
+            self._newVideoPadCb(analysis, pad)
         else:
-            self._newPadCb(pad)
+            self._newPadCb(analysis, pad)
 
         # try to get the duration
-        self._maybeQueryDuration(pad)
+        self._maybeQueryDuration(analysis, pad)
 
         caps = pad.props.caps
 
         if caps is not None and caps.is_fixed():
             self.debug("got fixed caps for pad %s", pad)
 
-            stream = self._addStreamFromPad(pad)
-            if isinstance(stream, VideoStream):
-                stream.thumbnail = self.thumbnails[pad]
+            self._addStreamFromPad(analysis, pad)
         else:
             # add the stream once the caps are fixed
             if gst.version() < (0, 10, 21, 1) and \
@@ -703,22 +926,22 @@ class Discoverer(Signallable, Loggable):
                 # the isinstance check is there so that we don't have to create
                 # ghost pads in the tests
                 pad.get_target().connect("notify::caps",
-                        self._capsNotifyCb, pad)
+                        self._capsNotifyCb, analysis, pad)
             else:
-                pad.connect("notify::caps", self._capsNotifyCb)
-            self.unfixed_pads += 1
-            self.debug("unfixed pads %d", self.unfixed_pads)
+                pad.connect("notify::caps", self._capsNotifyCb, analysis)
+            analysis.unfixed_pads += 1
+            self.debug("unfixed pads %d", analysis.unfixed_pads)
 
-    def _unknownType(self, decodebin, pad, caps):
+    def _unknownType(self, decodebin, pad, caps, analysis):
         # decodebin2 sends ASYNC_DONE when it finds an unknown type so we have
         # to deal with that...
-        self.unknown_pads += 1
+        analysis.unknown_pads += 1
 
-    def _addStreamFromPad(self, pad):
-        self._maybeQueryDuration(pad)
+    def _addStreamFromPad(self, analysis, pad):
+        self._maybeQueryDuration(analysis, pad)
         self.debug("adding stream from pad %s caps %s", pad, pad.props.caps)
         stream  = get_stream_for_pad(pad)
-        self.current_streams.append(stream)
+        analysis.streams.append(stream)
 
         return stream
 
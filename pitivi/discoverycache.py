@@ -0,0 +1,272 @@
+# PiTiVi , Non-linear video editor
+#
+#       discoverycache.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+"""
+On-disk cache of discovery results.
+
+Discovering a file means building a pipeline, typefinding and prerolling it.
+The result only depends on the file contents, so it's stored here keyed by
+URI and checked against the size and modification time of the file before
+being used again.
+"""
+
+import os
+import time
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+import gst
+
+from pitivi.log.loggable import Loggable
+from pitivi.reflect import qual, namedAny
+from pitivi.settings import xdg_cache_home
+from pitivi.stream import VideoStream
+
+CACHE_VERSION = 1
+
+
+class DiscoveryCache(Loggable):
+    """
+    Stores the streams, duration and thumbnails of discovered files.
+
+    Entries are loaded lazily and written back by L{save}.
+
+    @ivar hits: The number of lookups that returned a factory.
+    @type hits: C{int}
+    @ivar misses: The number of lookups that didn't.
+    @type misses: C{int}
+    """
+
+    def __init__(self, filename=None, max_entries=10000):
+        """
+        @param filename: Where to store the cache, defaults to
+        C{discovery.json} in the pitivi cache directory.
+        @param max_entries: The number of entries to keep, the least
+        recently used ones are dropped when saving.
+        """
+        Loggable.__init__(self)
+        if filename is None:
+            filename = os.path.join(xdg_cache_home(), "pitivi",
+                    "discovery.json")
+        self.filename = filename
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = None
+        self._dirty = False
+
+    def _getEntries(self):
+        if self._entries is not None:
+            return self._entries
+
+        self._entries = {}
+        try:
+            f = open(self.filename)
+        except IOError:
+            return self._entries
+
+        try:
+            try:
+                data = json.load(f)
+            except ValueError, e:
+                self.warning("ignoring corrupted cache %s: %s",
+                        self.filename, e)
+                return self._entries
+        finally:
+            f.close()
+
+        if data.get("version") != CACHE_VERSION:
+            self.info("ignoring cache version %s", data.get("version"))
+            return self._entries
+
+        self._entries = data["entries"]
+        self.debug("loaded %d entries", len(self._entries))
+        return self._entries
+
+    def _statUri(self, uri):
+        if not gst.uri_is_valid(uri) or gst.uri_get_protocol(uri) != "file":
+            return None
+
+        try:
+            return os.stat(gst.uri_get_location(uri))
+        except OSError:
+            return None
+
+    def lookup(self, uri):
+        """
+        Return a new factory for C{uri} built from the cache, or C{None} if
+        the file isn't in the cache or has changed since it was stored.
+
+        @rtype: L{FileSourceFactory} or C{None}
+        """
+        entries = self._getEntries()
+        entry = entries.get(uri)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        stat = self._statUri(uri)
+        if stat is None or entry["size"] != stat.st_size or \
+                entry["mtime"] != stat.st_mtime:
+            self.debug("%s changed since it was cached", uri)
+            self._removeEntry(uri)
+            self.misses += 1
+            return None
+
+        for stream in entry["streams"]:
+            thumbnail = stream.get("thumbnail")
+            if thumbnail is not None and not os.path.exists(thumbnail):
+                # rediscover to regenerate the thumbnail
+                self.misses += 1
+                return None
+
+        factory = self._factoryFromEntry(uri, entry)
+        entry["used"] = time.time()
+        self._dirty = True
+        self.hits += 1
+        return factory
+
+    def store(self, factory):
+        """
+        Store the result of discovering C{factory.uri}.
+        """
+        stat = self._statUri(factory.uri)
+        if stat is None:
+            return
+
+        streams = []
+        for stream in factory.getOutputStreams():
+            streams.append({"type": qual(stream.__class__),
+                    "caps": str(stream.caps),
+                    "pad_name": stream.pad_name,
+                    "is_image": getattr(stream, "is_image", False),
+                    "thumbnail": getattr(stream, "thumbnail", None)})
+
+        self._getEntries()[factory.uri] = {"size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "type": qual(factory.__class__),
+                "duration": factory.duration,
+                "streams": streams,
+                "used": time.time()}
+        self._dirty = True
+
+    def getEntry(self, uri):
+        """
+        Return what is stored about C{uri}, as plain data that can be copied
+        to another cache with L{setEntry}, or C{None}.
+        """
+        return self._getEntries().get(uri)
+
+    def setEntry(self, uri, entry):
+        """
+        Store an entry returned by L{getEntry}.
+        """
+        self._getEntries()[uri] = entry
+        self._dirty = True
+
+    def remove(self, uri):
+        """
+        Forget about C{uri}.
+        """
+        if uri in self._getEntries():
+            self._removeEntry(uri)
+
+    def _removeEntry(self, uri):
+        entry = self._entries.pop(uri)
+        self._dirty = True
+        # the discoverer reuses existing thumbnails, make sure it doesn't
+        # pick up one of the old file
+        for stream in entry["streams"]:
+            thumbnail = stream.get("thumbnail")
+            if thumbnail is None:
+                continue
+            try:
+                os.unlink(thumbnail)
+            except OSError:
+                pass
+
+    def _factoryFromEntry(self, uri, entry):
+        factory = namedAny(entry["type"])(uri)
+        factory.duration = entry["duration"]
+        for stream_entry in entry["streams"]:
+            klass = namedAny(stream_entry["type"])
+            caps = gst.Caps(str(stream_entry["caps"]))
+            pad_name = stream_entry["pad_name"]
+            if pad_name is not None:
+                pad_name = str(pad_name)
+            if issubclass(klass, VideoStream):
+                stream = klass(caps, pad_name, stream_entry["is_image"])
+                thumbnail = stream_entry["thumbnail"]
+                if thumbnail is not None:
+                    thumbnail = str(thumbnail)
+                stream.thumbnail = thumbnail
+            else:
+                stream = klass(caps, pad_name)
+            factory.addOutputStream(stream)
+
+        return factory
+
+    def save(self):
+        """
+        Write the cache to disk if it changed.
+        """
+        if not self._dirty:
+            return
+
+        entries = self._entries
+        if len(entries) > self.max_entries:
+            by_use = sorted(entries.iteritems(),
+                    key=lambda item: item[1]["used"])
+            for uri, entry in by_use[:len(entries) - self.max_entries]:
+                del entries[uri]
+
+        # write a temporary file and rename it so that a crash never leaves
+        # a truncated cache behind
+        directory = os.path.dirname(self.filename)
+        tmp = self.filename + ".tmp"
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            f = open(tmp, "w")
+            try:
+                json.dump({"version": CACHE_VERSION, "entries": entries}, f)
+            finally:
+                f.close()
+            os.rename(tmp, self.filename)
+        except (IOError, OSError), e:
+            self.warning("couldn't save %s: %s", self.filename, e)
+            return
+
+        self._dirty = False
+        self.debug("saved %d entries", len(entries))
+
+_default_cache = None
+
+
+def get_default_cache():
+    """
+    Return the cache shared by all the discoverers of this process.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = DiscoveryCache()
+    return _default_cache
@@ -0,0 +1,125 @@
+# PiTiVi , Non-linear video editor
+#
+#       discoveryreport.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+"""
+Summary of the time spent importing files, by format.
+"""
+
+PHASES = ["typefind", "preroll", "duration", "total", "thumbnail"]
+
+UNKNOWN = "unknown"
+
+
+class PhaseStats(object):
+    """
+    The timings of one phase for the files of a format, in seconds.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def getMean(self):
+        if not self.count:
+            return 0.0
+        return self.sum / self.count
+
+
+class DiscoveryReport(object):
+    """
+    Collects the timings emitted by the discoverer and the thumbnailer.
+
+    @ivar formats: The stats of each phase, by format.
+    @type formats: C{dict} of C{str} to C{dict} of C{str} to L{PhaseStats}
+    """
+
+    def __init__(self):
+        self.formats = {}
+        self._mimes = {}
+
+    def clear(self):
+        self.formats = {}
+        self._mimes = {}
+
+    def addTimings(self, uri, timings, mime=None):
+        """
+        Account the timings of C{uri}.
+
+        @param timings: Seconds spent, by phase.
+        @type timings: C{dict}
+        @param mime: The format of the file, if not given the format of
+        previous timings of C{uri} is used.
+        """
+        if mime is None:
+            mime = self._mimes.get(uri, UNKNOWN)
+        else:
+            self._mimes[uri] = mime
+
+        phases = self.formats.setdefault(mime, {})
+        for phase, value in timings.iteritems():
+            phases.setdefault(phase, PhaseStats()).add(value)
+
+    def getTimeSpent(self, mime):
+        """
+        Return the time spent importing files of type C{mime}.
+        """
+        phases = self.formats[mime]
+        return sum([phases[phase].sum for phase in ("total", "thumbnail")
+                if phase in phases])
+
+    def getSortedFormats(self):
+        """
+        Return the formats, the ones that took the longest to import first.
+        """
+        return sorted(self.formats, key=self.getTimeSpent, reverse=True)
+
+    def format(self):
+        """
+        Return the report as a table, with the mean and maximum of each
+        phase in milliseconds.
+        """
+        columns = ["%-24s %6s" % ("format", "files")]
+        columns.extend(["%17s" % phase for phase in PHASES])
+        lines = [" ".join(columns)]
+
+        for mime in self.getSortedFormats():
+            phases = self.formats[mime]
+            files = 0
+            if "total" in phases:
+                files = phases["total"].count
+            columns = ["%-24s %6d" % (mime, files)]
+            for phase in PHASES:
+                stats = phases.get(phase)
+                if stats is None:
+                    columns.append("%17s" % "-")
+                else:
+                    columns.append("%8.1f/%8.1f" % (stats.getMean() * 1000,
+                            stats.max * 1000))
+            lines.append(" ".join(columns))
+
+        return "\n".join(lines)
+
+    # passing the report to a log call only formats it if it's logged
+    __str__ = format
@@ -25,7 +25,6 @@
 Effects global handling
 """
 import gst
-import gtk
 import gobject
 import re
 import os
@@ -287,6 +286,9 @@ class EffectsHandler(object):
         return effects_categories.extended(self.video_categories).extended(self.audio_categories)
 
     def getEffectIcon(self, effect_name):
+        # imported here so that projects can be loaded without a display
+        import gtk
+
         icontheme = gtk.icon_theme_get_default()
         pixdir = get_pixmap_dir()
         icon = None
@@ -202,6 +202,11 @@ class SourceFactory(ObjectFactory):
     @type max_bins: C{int}
     @ivar current_bins: Number of bin instances created and not released.
     @type current_bins: C{int}
+    @ivar proxy_uri: An edit friendly copy of the first video stream, used
+    instead of the original while L{use_proxy} is set.
+    @type proxy_uri: C{str}
+    @ivar use_proxy: Whether new bins decode the proxy, unset while rendering.
+    @type use_proxy: C{bool}
     """
 
     __signals__ = {
@@ -218,6 +223,8 @@ class SourceFactory(ObjectFactory):
         name = name or os.path.basename(unquote(uri))
         ObjectFactory.__init__(self, name)
         self.uri = uri
+        self.proxy_uri = None
+        self.use_proxy = True
         self.max_bins = -1
         self.current_bins = 0
         self._filtercaps = gst.Caps("video/x-raw-rgb;video/x-raw-yuv")
@@ -333,6 +340,10 @@ class SourceFactory(ObjectFactory):
                 bin.decodebin.disconnect_by_func(self._singlePadRemovedCb)
             del bin.decodebin
 
+        if hasattr(bin, "uri"):
+            del bin.uri
+            del bin.stream
+
         if hasattr(bin, "child"):
             bin.child.set_state(gst.STATE_NULL)
             del bin.child
@@ -362,10 +373,53 @@ class SourceFactory(ObjectFactory):
             bin.remove_pad(bin.ghostpad)
             del bin.ghostpad
 
+    def getProxyStream(self):
+        """
+        Return the stream a proxy can be made for, the first video stream
+        that isn't a picture, or None.
+        """
+        for stream in self.getOutputStreams(VideoStream):
+            if not stream.is_image:
+                return stream
+
+        return None
+
+    def getDecodeArguments(self, output_stream):
+        """
+        Return the uri, caps and stream to decode C{output_stream} from: the
+        proxy while it's used, the original otherwise.
+
+        The proxy only contains the video stream, scaled down, so any raw
+        video is accepted from it.
+        """
+        proxy_stream = self.getProxyStream()
+        if self.proxy_uri is None or not self.use_proxy or \
+                proxy_stream is None or \
+                not isinstance(output_stream, VideoStream) or \
+                output_stream.pad_name != proxy_stream.pad_name:
+            return self.uri, output_stream.caps, output_stream
+
+        return self.proxy_uri, \
+                gst.Caps("video/x-raw-yuv;video/x-raw-rgb"), None
+
+    def isBinOutdated(self, bin):
+        """
+        Whether C{bin} decodes the proxy while the original should be used,
+        or the other way around.
+        """
+        if not hasattr(bin, "uri"):
+            return False
+
+        uri = self.getDecodeArguments(bin.stream)[0]
+        return uri != bin.uri
+
     def _makeStreamBinReal(self, output_stream):
         b = gst.Bin()
-        b.decodebin = self.singleDecodeBinClass(uri=self.uri, caps=output_stream.caps,
-                                           stream=output_stream)
+        uri, caps, stream = self.getDecodeArguments(output_stream)
+        b.uri = uri
+        b.stream = output_stream
+        b.decodebin = self.singleDecodeBinClass(uri=uri, caps=caps,
+                                           stream=stream)
         b.decodebin.connect("pad-added", self._singlePadAddedCb, b)
         b.decodebin.connect("pad-removed", self._singlePadRemovedCb, b)
         return b
@@ -23,6 +23,8 @@
 Base Formatter classes
 """
 
+from __future__ import with_statement
+
 import os
 from urlparse import urlparse
 from pitivi.project import Project
@@ -84,6 +86,7 @@ class Formatter(Signallable, Loggable):
 
         self.avalaible_effects = avalaible_effects
         self.project = None
+        self._load_span_open = False
 
     #{ Load/Save methods
 
@@ -94,7 +97,17 @@ class Formatter(Signallable, Loggable):
         try:
             self._loadProjectUnchecked(location)
         except FormatterError, e:
-            self.emit("new-project-failed", location, e)
+            self._projectLoadFailed(location, e)
+
+    def _projectLoadFailed(self, uri, exception):
+        self._endLoadSpan(success=False)
+        self.emit("new-project-failed", uri, exception)
+
+    def _endLoadSpan(self, **args):
+        # loading can fail before the span starts, or more than once
+        if self._load_span_open:
+            self._load_span_open = False
+            self.endSpan("load-project", **args)
 
     def _validateUri(self, uri):
         # check if the location is
@@ -127,9 +140,14 @@ class Formatter(Signallable, Loggable):
         self.log("location:%s, project:%r", location, project)
         self._validateUri(location)
 
+        # traced until new-project-loaded, which can come after discovery
+        self.beginSpan("load-project", uri=location)
+        self._load_span_open = True
+
         # parse the format (subclasses)
         # FIXME : maybe have a convenience method for opening a location
-        self._loadProject(location, project)
+        with self.span("parse-project", uri=location):
+            self._loadProject(location, project)
 
     def _projectNameFromURI(self, uri):
         path = urlparse(uri).path
@@ -165,6 +183,7 @@ class Formatter(Signallable, Loggable):
             # then
             # .. Fill in the timeline
             self._fillTimeline()
+            self._endLoadSpan()
             self.emit("new-project-loaded", self.project)
         else:
             self.debug("Got undiscovered sources, calling discoverer")
@@ -195,7 +214,9 @@ class Formatter(Signallable, Loggable):
             raise FormatterURIError()
         if overwrite == False and uri_is_reachable(location):
             raise FormatterOverwriteError()
-        if self._saveProject(project, location):
+        with self.span("save-project", uri=location, backup=backup):
+            saved = self._saveProject(project, location)
+        if saved:
             if not backup:
                 project.uri = location
                 project.name = self._projectNameFromURI(location)
@@ -379,6 +400,7 @@ class Formatter(Signallable, Loggable):
     def _sourcesReadyCb(self, sources):
         self.debug("Sources inspected, calling fillTimeline")
         self._fillTimeline()
+        self._endLoadSpan()
         self.emit("new-project-loaded", self.project)
 
 
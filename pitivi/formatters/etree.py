@@ -20,11 +20,14 @@
 # Free Software Foundation, Inc., 59 Temple Place - Suite 330,
 # Boston, MA 02111-1307, USA.
 
+import os
+
 import gobject
 gobject.threads_init()
 import gst
 
-from xml.etree.ElementTree import Element, SubElement, tostring, parse
+from xml.etree.ElementTree import Element, SubElement, tostring, \
+        iterparse
 
 from pitivi.reflect import qual, namedAny
 from pitivi.factories.base import SourceFactory
@@ -32,7 +35,8 @@ from pitivi.factories.file import FileSourceFactory
 from pitivi.factories.operation import EffectFactory
 from pitivi.timeline.track import Track, TrackEffect
 from pitivi.timeline.timeline import TimelineObject
-from pitivi.formatters.base import Formatter, FormatterError
+from pitivi.formatters.base import Formatter, FormatterError, \
+        FormatterParseError
 from pitivi.utils import get_filesystem_encoding
 from pitivi.settings import ExportSettings
 from pitivi.stream import match_stream_groups_map
@@ -54,6 +58,151 @@ def indent(elem, level=0):
         if level and (not elem.tail or not elem.tail.strip()):
             elem.tail = i
 
+class ElementParser(object):
+    """
+    Parses an XML document incrementally, calling handlers on elements as
+    soon as they're complete.
+
+    Handled elements are detached from their parent right after their
+    handler returns, so the only parts of the document kept in memory are
+    the elements currently being parsed and the ones the handlers keep.
+
+    A handler can return C{True} to stop parsing. L{parse} can then be
+    called again with other handlers to go on from where it stopped, the
+    document is only read once.
+
+    @ivar done: Whether the whole document was parsed.
+    @type done: C{bool}
+    """
+
+    def __init__(self, source):
+        """
+        @param source: A file name or a file object.
+        """
+        self._file = None
+        if not hasattr(source, "read"):
+            source = self._file = open(source, "rb")
+        self._events = iterparse(source, ("start", "end"))
+        self._parents = []
+        self.done = False
+
+    def parse(self, handlers):
+        """
+        Parse until a handler returns C{True} or the document ends.
+
+        @param handlers: Maps C{(parent_tag, tag)} tuples to callables taking
+        the element.
+        @type handlers: C{dict}
+        """
+        parents = self._parents
+        for event, element in self._events:
+            if event == "start":
+                parents.append(element)
+                continue
+
+            parents.pop()
+            if not parents:
+                break
+
+            parent = parents[-1]
+            handler = handlers.get((parent.tag, element.tag))
+            if handler is None:
+                continue
+
+            stop = handler(element)
+            parent.remove(element)
+            if stop:
+                return
+
+        self.done = True
+        self.close()
+
+    def close(self):
+        """
+        Stop parsing and close the file, if it was opened here.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def iterparse_elements(source, handlers):
+    """
+    Parse an XML document incrementally with L{ElementParser}, calling
+    C{handlers} until one of them returns C{True}.
+    """
+    parser = ElementParser(source)
+    try:
+        parser.parse(handlers)
+    finally:
+        parser.close()
+
+class IndentedXMLWriter(object):
+    """
+    Writes an XML document to a file while it's being generated.
+
+    Container elements are opened with L{start} and closed with L{end},
+    complete subtrees are written with L{write} and can be thrown away
+    right after. The output is the same as calling L{indent} on the whole
+    tree and serializing it with L{tostring}, without ever holding the
+    whole tree in memory.
+    """
+
+    def __init__(self, output):
+        self.output = output
+        # [element, has_children] for each open container
+        self._open = []
+
+    def _writeStartTag(self, element):
+        # let ElementTree do the escaping and attribute ordering
+        shallow = Element(element.tag, element.attrib)
+        shallow.text = "\n"
+        data = tostring(shallow)
+        self.output.write(data[:-len("\n</%s>" % element.tag)])
+
+    def _beginChild(self):
+        if not self._open:
+            return
+
+        parent = self._open[-1]
+        if not parent[1]:
+            self._writeStartTag(parent[0])
+            parent[1] = True
+        self.output.write("\n" + len(self._open) * "  ")
+
+    def start(self, element):
+        """
+        Open a container element. Its attributes are written along with its
+        first child, so that empty containers are written as C{<tag />}.
+        """
+        self._beginChild()
+        self._open.append([element, False])
+
+    def end(self):
+        """
+        Close the most recently opened container element.
+        """
+        element, has_children = self._open.pop()
+        if not has_children:
+            self.output.write(tostring(element))
+            return
+
+        self.output.write("\n" + len(self._open) * "  ")
+        self.output.write("</%s>" % element.tag)
+        if not self._open:
+            # indent() gives the root element a tail too
+            self.output.write("\n")
+
+    def write(self, element):
+        """
+        Write a complete element in the currently open container.
+        """
+        self._beginChild()
+        indent(element, len(self._open))
+        # the separator before the next sibling is written by the writer
+        element.tail = None
+        self.output.write(tostring(element))
+
 class ElementTreeFormatterContext(object):
     def __init__(self):
         self.streams = {}
@@ -76,6 +225,8 @@ class ElementTreeFormatter(Formatter):
         self.factoriesnode = None
         self.timelinenode = None
         self._settingsnode = None
+        self._location = None
+        self._parser = None
         self._context = ElementTreeFormatterContext()
 
     def _new_element_id(self):
@@ -199,6 +350,17 @@ class ElementTreeFormatter(Formatter):
                 # the file was moved
                 factory.uri = factory.filename = filename1
 
+        proxy = element.attrib.get("proxy", None)
+        if proxy is not None:
+            if isinstance(proxy, unicode):
+                proxy = proxy.encode("utf-8")
+            # proxies live in the cache, they might have been cleaned up, and
+            # the source might have changed since the proxy was made
+            location = gst.uri_get_location(proxy)
+            if os.path.exists(location) and \
+                    location == get_proxy_filename(factory.uri):
+                factory.proxy_uri = proxy
+
         self._context.factories[element.attrib["id"]] = factory
         return factory
 
@@ -211,6 +373,8 @@ class ElementTreeFormatter(Formatter):
         else:
             filename = source.filename
         element.attrib["filename"] = filename
+        if source.proxy_uri is not None:
+            element.attrib["proxy"] = source.proxy_uri
 
         return element
 
@@ -678,35 +842,107 @@ class ElementTreeFormatter(Formatter):
         root.append(self._saveTimeline(project.timeline))
         return root
 
+    def _writeProject(self, project, writer):
+        """
+        Write the project with C{writer} as we go, the result is the same as
+        indenting and serializing the tree built by L{_serializeProject}.
+        """
+        writer.start(self._saveMainTag())
+
+        # settings
+        if project.settings:
+            writer.write(self._saveProjectSettings(project.settings))
+
+        # sources
+        writer.start(Element("factories"))
+        writer.start(Element("sources"))
+        for factory in project.sources.getSources():
+            if isinstance(factory, SourceFactory):
+                element = self._saveSource(factory)
+                writer.write(element)
+                self._context.factories[factory] = self._refElement(element)
+        writer.end()
+        writer.end()
+
+        # timeline
+        writer.start(Element("timeline"))
+        writer.start(Element("tracks"))
+        for track in project.timeline.tracks:
+            writer.start(Element("track"))
+            writer.write(self._saveStream(track.stream))
+            writer.start(Element("track-objects"))
+            for track_object in track.track_objects:
+                element = self._saveTrackObject(track_object)
+                writer.write(element)
+                self._context.track_objects[track_object] = \
+                        self._refElement(element)
+            writer.end()
+            writer.end()
+        writer.end()
+
+        writer.start(Element("timeline-objects"))
+        for timeline_object in project.timeline.timeline_objects:
+            writer.write(self._saveTimelineObject(timeline_object))
+        writer.end()
+        writer.end()
+
+        writer.end()
+
+    def _refElement(self, element):
+        # references only need the id, don't keep the written subtree alive
+        return Element(element.tag, id=element.attrib["id"])
+
     ## Formatter method implementations
 
     def _saveProject(self, project, location):
-        root = self._serializeProject(project)
         f = file(location.split('file://')[1], "w")
-        indent(root)
-        f.write(tostring(root))
-        f.close()
+        try:
+            self._writeProject(project, IndentedXMLWriter(f))
+        finally:
+            f.close()
 
         return True
 
     def _loadProject(self, location, project):
         self.debug("location:%s, project:%r", location, project)
-        # open the given location
-        self._context.rootelement = parse(location.split('://', 1)[1])
-        self.factoriesnode = self._context.rootelement.find("factories")
-        self.timelinenode = self._context.rootelement.find("timeline")
-        self._settingsnode = self._context.rootelement.find("export-settings")
-        if project and self._settingsnode != None:
-            project.setSettings(self._loadProjectSettings(self._settingsnode))
+        self._location = location.split('://', 1)[1]
+        self._sources = []
 
-        # rediscover the factories
-        closure = {"rediscovered": 0}
+        def settingsCb(element):
+            self._settingsnode = element
+            if project:
+                project.setSettings(self._loadProjectSettings(element))
+
+        def sourceCb(element):
+            self._sources.append(self._loadFactory(element))
+
+        def factoriesCb(element):
+            # the timeline is only needed after the sources have been
+            # rediscovered, parsing goes on in _loadTimelineIncrementally
+            return True
+
+        # only parse up to the sources so we can start rediscovering them as
+        # soon as possible
+        self._closeParser()
         try:
-            sources = self._loadSources()
+            self._parser = ElementParser(self._location)
+            self._parser.parse({
+                    ("pitivi", "export-settings"): settingsCb,
+                    ("sources", "source"): sourceCb,
+                    ("pitivi", "factories"): factoriesCb})
         except FormatterError, e:
-            self.emit("new-project-failed", location, e)
+            self._closeParser()
+            self._projectLoadFailed(location, e)
+            return
+        except SyntaxError, e:
+            # what ElementTree raises on malformed documents
+            self._closeParser()
+            self._projectLoadFailed(location, FormatterParseError(str(e)))
             return
 
+        # rediscover the factories
+        closure = {"rediscovered": 0, "added": 0, "uris": set()}
+        sources = self._sources
         uris = [source.uri for source in sources]
         discoverer = project.sources.discoverer
         discoverer.connect("discovery-done", self._discovererDiscoveryDoneCb,
@@ -717,9 +953,8 @@ class ElementTreeFormatter(Formatter):
         if not sources:
             self._finishLoadingProject(project)
             return
-        # start the rediscovering from the first source
-        source = sources[0]
-        discoverer.addUri(source.uri)
+        # the discoverer analyzes several of them at the same time
+        discoverer.addUris(uris)
 
     def _findFactoryContextKey(self, old_factory):
         key = None
@@ -774,6 +1009,7 @@ class ElementTreeFormatter(Formatter):
 
         # replace the old factory with the new rediscovered one
         old_factories[old_factory_index] = factory
+        factory.proxy_uri = old_factory.proxy_uri
 
         # make self._context.factories[key] point to the new factory
         context_key = self._findFactoryContextKey(old_factory)
@@ -788,16 +1024,18 @@ class ElementTreeFormatter(Formatter):
             return
 
         self._replaceMatchingOldFactory(factory, old_factories)
-        project.sources.addFactory(factory)
+        closure["uris"].add(factory.uri)
+
+        # sources are discovered in any order, add them to the project in
+        # the order they were saved in
+        while closure["added"] < len(old_factories) and \
+                old_factories[closure["added"]].uri in closure["uris"]:
+            project.sources.addFactory(old_factories[closure["added"]])
+            closure["added"] += 1
 
         closure["rediscovered"] += 1
         if closure["rediscovered"] == len(old_factories):
             self._finishLoadingProject(project)
-            return
-
-        # schedule the next source
-        next = old_factories[closure["rediscovered"]]
-        discoverer.addUri(next.uri)
 
     def _discovererDiscoveryErrorCb(self, discoverer, uri, error, detail,
             project, sources, uris, closure):
@@ -805,7 +1043,8 @@ class ElementTreeFormatter(Formatter):
             # someone else is using discoverer, this signal isn't for us
             return
 
-        self.emit("new-project-failed", uri,
+        self._closeParser()
+        self._projectLoadFailed(uri,
                 FormatterError("%s: %s" % (error, detail)))
 
     def newProject(self):
@@ -821,7 +1060,58 @@ class ElementTreeFormatter(Formatter):
 
     def _fillTimeline(self):
         # fill up self.project
-        self._loadTimeline(self.timelinenode)
+        if self.timelinenode is not None:
+            self._loadTimeline(self.timelinenode)
+        else:
+            try:
+                self._loadTimelineIncrementally(self._parser)
+            finally:
+                self._closeParser()
+
+    def _closeParser(self):
+        if self._parser is not None:
+            self._parser.close()
+            self._parser = None
+
+    def _loadTimelineIncrementally(self, parser):
+        """
+        Like L{_loadTimeline}, but go on with the parsing L{_loadProject}
+        paused after the factories, and load each track object and timeline
+        object as soon as its element is complete, instead of keeping the
+        whole timeline tree around.
+
+        @type parser: L{ElementParser}
+        """
+        timeline = self.project.timeline
+        tracks = []
+        timeline_objects = []
+
+        def trackStreamCb(element):
+            tracks.append(Track(self._loadStream(element)))
+
+        def trackObjectCb(element):
+            self._loadTrackObject(tracks[-1], element)
+
+        def timelineObjectCb(element):
+            timeline_objects.append(self._loadTimelineObject(element))
+
+        def timelineCb(element):
+            return True
+
+        parser.parse({
+                ("track", "stream"): trackStreamCb,
+                ("track-objects", "track-object"): trackObjectCb,
+                ("timeline-objects", "timeline-object"): timelineObjectCb,
+                ("pitivi", "timeline"): timelineCb})
+
+        # same order as _loadTimeline
+        for track in tracks:
+            timeline.addTrack(track)
+
+        for timeline_object in timeline_objects:
+            timeline.addTimelineObject(timeline_object)
+
+        return timeline
 
     @classmethod
     def canHandle(cls, uri):
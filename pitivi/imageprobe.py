@@ -0,0 +1,176 @@
+# PiTiVi , Non-linear video editor
+#
+#       imageprobe.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+"""
+Read the dimensions of still images from their headers.
+
+Building a pipeline to discover a picture costs far more than decoding a few
+bytes of header, which matters when importing thousands of photos.
+"""
+
+import struct
+
+PNG_SIGNATURE = "\x89PNG\r\n\x1a\n"
+
+# color types with an alpha channel
+PNG_COLOR_GRAY_ALPHA = 4
+PNG_COLOR_RGB_ALPHA = 6
+
+# start of frame markers, the others (DHT, JPG, DAC) share the 0xc? range
+JPEG_SOF_MARKERS = [marker for marker in range(0xc0, 0xd0)
+        if marker not in (0xc4, 0xc8, 0xcc)]
+# baseline, extended and progressive huffman coding, the lossless,
+# hierarchical and arithmetic coded frames aren't supported by jpegdec
+JPEG_DECODABLE_SOF_MARKERS = [0xc0, 0xc1, 0xc2]
+# markers not followed by a segment length
+JPEG_STANDALONE_MARKERS = [0x01] + range(0xd0, 0xd9)
+
+# don't read whole files that aren't what they claim to be
+MAX_HEADER_SIZE = 1024 * 1024
+
+
+class ImageInfo(object):
+    """
+    What could be read from the header of an image.
+
+    @ivar format: The format of the image, C{"png"} or C{"jpeg"}.
+    @type format: C{str}
+    @ivar width: The width of the image in pixels.
+    @type width: C{int}
+    @ivar height: The height of the image in pixels.
+    @type height: C{int}
+    @ivar has_alpha: Whether the decoded image has an alpha channel.
+    @type has_alpha: C{bool}
+    """
+
+    def __init__(self, format, width, height, has_alpha=False):
+        self.format = format
+        self.width = width
+        self.height = height
+        self.has_alpha = has_alpha
+
+    def __repr__(self):
+        return "<ImageInfo %s %dx%d%s>" % (self.format, self.width,
+                self.height, self.has_alpha and " alpha" or "")
+
+
+def _probePng(f):
+    if f.read(8) != PNG_SIGNATURE:
+        return None
+
+    length, chunk_type = struct.unpack(">I4s", f.read(8))
+    if chunk_type != "IHDR" or length < 13:
+        return None
+    width, height, depth, color_type = struct.unpack(">IIBB", f.read(10))
+    if depth == 16:
+        # decoded with 16 bits per component
+        return None
+    f.seek(length - 10 + 4, 1)
+    has_alpha = color_type in (PNG_COLOR_GRAY_ALPHA, PNG_COLOR_RGB_ALPHA)
+
+    # a tRNS chunk gives an alpha channel to the other color types, it must
+    # come before the image data
+    while not has_alpha and f.tell() < MAX_HEADER_SIZE:
+        header = f.read(8)
+        if len(header) < 8:
+            return None
+        length, chunk_type = struct.unpack(">I4s", header)
+        if chunk_type == "tRNS":
+            has_alpha = True
+        elif chunk_type in ("IDAT", "IEND"):
+            break
+        f.seek(length + 4, 1)
+
+    if not width or not height:
+        return None
+
+    return ImageInfo("png", width, height, has_alpha)
+
+
+def _probeJpeg(f):
+    if f.read(2) != "\xff\xd8":
+        return None
+
+    while f.tell() < MAX_HEADER_SIZE:
+        byte = f.read(1)
+        if byte != "\xff":
+            return None
+        marker = f.read(1)
+        # markers can be padded with any number of 0xff
+        while marker == "\xff":
+            marker = f.read(1)
+        if not marker:
+            return None
+
+        marker = ord(marker)
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        if marker in (0xd9, 0xda):
+            # end of image or start of scan before any frame header
+            return None
+
+        data = f.read(2)
+        if len(data) < 2:
+            return None
+        length = struct.unpack(">H", data)[0]
+        if marker in JPEG_SOF_MARKERS:
+            if marker not in JPEG_DECODABLE_SOF_MARKERS:
+                return None
+            data = f.read(6)
+            if len(data) < 6:
+                return None
+            precision, height, width, components = \
+                    struct.unpack(">BHHB", data)
+            if not width or not height:
+                # height can be defined later by a DNL marker, let the
+                # decoder figure it out
+                return None
+            if precision != 8 or components not in (1, 3):
+                # 12 bit and CMYK images, which not all decoders support
+                return None
+            return ImageInfo("jpeg", width, height)
+
+        f.seek(length - 2, 1)
+
+    return None
+
+_probes = {"\x89P": _probePng, "\xff\xd8": _probeJpeg}
+
+
+def probe_image(filename):
+    """
+    Return the L{ImageInfo} of the still image in C{filename}, or C{None} if
+    it isn't an image this module knows about or its header is broken.
+    """
+    try:
+        f = open(filename, "rb")
+    except IOError:
+        return None
+
+    try:
+        probe = _probes.get(f.read(2))
+        if probe is None:
+            return None
+        f.seek(0)
+        try:
+            return probe(f)
+        except (IOError, struct.error):
+            return None
+    finally:
+        f.close()
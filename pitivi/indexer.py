@@ -0,0 +1,453 @@
+# PiTiVi , Non-linear video editor
+#
+#       indexer.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+"""
+Bulk indexing of media files, without a user interface.
+
+Walks directories and fills the discovery cache, the thumbnails and the
+waveform peaks of the files found, so that importing them in pitivi later
+doesn't have to decode anything. Files are indexed by several worker
+processes; only the main process writes the discovery cache, the workers
+send their results back over a pipe, one JSON line per file.
+
+Files that are already indexed are skipped, so an interrupted run can be
+resumed by running the same command again.
+"""
+
+import os
+import sys
+import select
+import shutil
+import tempfile
+import subprocess
+from optparse import OptionParser
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+import gobject
+
+from pitivi.log.loggable import Loggable
+from pitivi.discoverer import Discoverer
+from pitivi.discoverycache import DiscoveryCache, get_default_cache
+from pitivi.mediafilter import MediaFilter
+from pitivi.peakcache import PeakGenerator, get_default_peak_cache
+from pitivi.stream import AudioStream, VideoStream
+from pitivi.thumbnailer import Thumbnailer
+from pitivi.threads import cpu_count
+from pitivi.utils import quote_uri
+
+WORKER_COMMAND = [sys.executable, "-c",
+        "import sys, pygst; pygst.require('0.10'); "
+        "from pitivi.indexer import worker_main; sys.exit(worker_main())"]
+
+# how many results to collect before saving the discovery cache, so that
+# little is lost if the run is interrupted
+SAVE_INTERVAL = 50
+
+
+def walk_uris(paths, media_filter=None):
+    """
+    Yield the URIs of the files in C{paths} and, recursively, in their
+    directories. Hidden directories and the files not accepted by
+    C{media_filter} are skipped, files given explicitly are not.
+    """
+    if media_filter is None:
+        media_filter = MediaFilter()
+
+    for path in paths:
+        path = os.path.abspath(path)
+        if not os.path.isdir(path):
+            yield quote_uri("file://%s" % path)
+            continue
+
+        for directory, dirs, files in os.walk(path):
+            dirs[:] = sorted([name for name in dirs
+                    if not name.startswith(".")])
+            for name in sorted(files):
+                filename = os.path.join(directory, name)
+                if media_filter.accepts(filename):
+                    yield quote_uri("file://%s" % filename)
+
+
+def is_indexed(cache, peak_cache, uri, thumbnails=True, peaks=True):
+    """
+    Return whether C{uri} has an up to date entry in C{cache}, and its
+    thumbnails and peaks if they're wanted.
+    """
+    factory = cache.lookup(uri)
+    if factory is None:
+        return False
+
+    if thumbnails:
+        for stream in factory.getOutputStreams(VideoStream):
+            if stream.thumbnail is None and not stream.is_image:
+                return False
+
+    if peaks:
+        for stream in factory.getOutputStreams(AudioStream):
+            if not peak_cache.has(uri, stream.pad_name):
+                return False
+
+    return True
+
+
+class IndexSummary(object):
+    """
+    What happened to the files of a run.
+
+    @ivar indexed: The number of files indexed.
+    @type indexed: C{int}
+    @ivar skipped: The number of files that were already indexed.
+    @type skipped: C{int}
+    @ivar failures: The files that couldn't be indexed, or only partly, with
+    the reason.
+    @type failures: C{list} of (C{str}, C{str})
+    """
+
+    def __init__(self):
+        self.indexed = 0
+        self.skipped = 0
+        self.failures = []
+
+    def addFailure(self, uri, reason):
+        self.failures.append((uri, reason))
+
+    def format(self):
+        """
+        Return the summary as text, with the failures grouped by reason.
+        """
+        lines = ["%d files indexed, %d already indexed, %d failed" %
+                (self.indexed, self.skipped, len(self.failures))]
+
+        by_reason = {}
+        for uri, reason in self.failures:
+            by_reason.setdefault(reason, []).append(uri)
+        reasons = sorted(by_reason,
+                key=lambda reason: (-len(by_reason[reason]), reason))
+        for reason in reasons:
+            lines.append("")
+            lines.append("%s (%d):" % (reason, len(by_reason[reason])))
+            lines.extend(["  %s" % uri for uri in by_reason[reason]])
+
+        return "\n".join(lines)
+
+
+class IndexWorker(Loggable):
+    """
+    Indexes one file at a time, in a worker process.
+
+    Discovery results go to a scratch L{DiscoveryCache} that is replaced for
+    every file, the entry is returned to the main process. Thumbnails and
+    peaks are written to the shared caches directly, one file each.
+    """
+
+    def __init__(self, thumbnails=True, peaks=True):
+        Loggable.__init__(self)
+        self.directory = tempfile.mkdtemp(prefix="pitivi-index-")
+        self.cache = None
+        self.peak_cache = get_default_peak_cache()
+        self.discoverer = Discoverer(max_pipelines=1)
+        self.discoverer.connect("discovery-done", self._discoveryDoneCb)
+        self.discoverer.connect("discovery-error", self._discoveryErrorCb)
+
+        self.thumbnailer = None
+        if thumbnails:
+            self.thumbnailer = Thumbnailer()
+            self.thumbnailer.connect("ready", self._thumbnailerReadyCb)
+
+        self.peak_generator = None
+        if peaks:
+            self.peak_generator = PeakGenerator(self.peak_cache)
+            self.peak_generator.connect("done", self._peaksDoneCb)
+
+        self.mainloop = gobject.MainLoop()
+        self._result = None
+        self._factory = None
+
+    def cleanup(self):
+        shutil.rmtree(self.directory, True)
+
+    def index(self, uri, entry=None):
+        """
+        Index C{uri}.
+
+        @param entry: The entry of C{uri} in the main discovery cache, if
+        any, so that only what is missing is done.
+        @return: The URI, its discovery cache entry and the errors.
+        @rtype: C{dict}
+        """
+        self.debug("indexing %s", uri)
+        filename = os.path.join(self.directory, "discovery.json")
+        if os.path.exists(filename):
+            # saved by the discoverer while indexing the previous file
+            os.unlink(filename)
+        self.cache = DiscoveryCache(filename)
+        if entry is not None:
+            self.cache.setEntry(uri, entry)
+        self.discoverer.cache = self.cache
+        if self.thumbnailer is not None:
+            self.thumbnailer.cache = self.cache
+
+        self._result = {"uri": uri, "entry": None, "errors": []}
+        self._factory = None
+        self.discoverer.addUri(uri)
+        self.mainloop.run()
+
+        self._result["entry"] = self.cache.getEntry(uri)
+        return self._result
+
+    def _discoveryDoneCb(self, unused_discoverer, uri, factory):
+        self._factory = factory
+        if self.thumbnailer is None or not self.thumbnailer.add(factory):
+            self._makePeaks()
+
+    def _discoveryErrorCb(self, unused_discoverer, uri, error, unused_detail):
+        self._result["errors"].append(error)
+        self.mainloop.quit()
+
+    def _thumbnailerReadyCb(self, thumbnailer):
+        for stream in self._factory.getOutputStreams(VideoStream):
+            if stream.thumbnail is None and not stream.is_image:
+                self._result["errors"].append("Couldn't make a thumbnail.")
+                break
+        self._makePeaks()
+
+    def _makePeaks(self):
+        if self.peak_generator is not None:
+            uri = self._factory.uri
+            pad_names = [stream.pad_name for stream in
+                    self._factory.getOutputStreams(AudioStream)
+                    if not self.peak_cache.has(uri, stream.pad_name)]
+            if pad_names:
+                self.peak_generator.generate(uri, pad_names)
+                return
+
+        self.mainloop.quit()
+
+    def _peaksDoneCb(self, unused_generator, success):
+        if not success:
+            self._result["errors"].append("Couldn't compute the waveform.")
+        self.mainloop.quit()
+
+
+def worker_main():
+    """
+    Run a worker process: read requests from stdin and write results to
+    stdout, one JSON object per line, until stdin is closed.
+    """
+    gobject.threads_init()
+    options = json.loads(sys.stdin.readline())
+    # keep stdout for the results, anything else printed goes to stderr
+    results = os.fdopen(os.dup(1), "w")
+    os.dup2(2, 1)
+
+    worker = IndexWorker(options["thumbnails"], options["peaks"])
+    try:
+        try:
+            while True:
+                line = sys.stdin.readline()
+                if not line:
+                    break
+                request = json.loads(line)
+                result = worker.index(request["uri"], request["entry"])
+                results.write(json.dumps(result) + "\n")
+                results.flush()
+        except KeyboardInterrupt:
+            # the main process handles it
+            pass
+    finally:
+        worker.cleanup()
+
+    return 0
+
+
+class WorkerProcess(object):
+    """
+    A worker process, as seen from the main process.
+
+    @ivar uri: The URI being indexed, if any.
+    @type uri: C{str}
+    """
+
+    def __init__(self, options):
+        env = dict(os.environ)
+        # the worker must find the same modules as we do
+        env["PYTHONPATH"] = os.pathsep.join([path for path in sys.path
+                if path])
+        self.process = subprocess.Popen(WORKER_COMMAND,
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env,
+                close_fds=True)
+        self.stdout = self.process.stdout
+        self.uri = None
+        self._write(options)
+
+    def _write(self, data):
+        try:
+            self.process.stdin.write(json.dumps(data) + "\n")
+            self.process.stdin.flush()
+        except IOError:
+            # the process died, read() will tell
+            pass
+
+    def send(self, uri, entry):
+        self.uri = uri
+        self._write({"uri": uri, "entry": entry})
+
+    def read(self):
+        """
+        Return the result of the current URI, or C{None} if the process
+        died.
+        """
+        line = self.stdout.readline()
+        self.uri = None
+        if not line:
+            return None
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+
+    def stop(self):
+        try:
+            self.process.stdin.close()
+        except IOError:
+            pass
+        self.process.wait()
+
+
+class BulkIndexer(Loggable):
+    """
+    Dispatches URIs to worker processes and collects their results in the
+    discovery cache.
+    """
+
+    def __init__(self, jobs, thumbnails=True, peaks=True, out=sys.stdout):
+        Loggable.__init__(self)
+        self.jobs = jobs
+        self.options = {"thumbnails": thumbnails, "peaks": peaks}
+        self.out = out
+        self.cache = get_default_cache()
+        self.peak_cache = get_default_peak_cache()
+        self.summary = IndexSummary()
+        self._unsaved = 0
+
+    def run(self, uris):
+        """
+        Index C{uris}, skipping the ones that are already indexed.
+        """
+        pending = []
+        for uri in uris:
+            if is_indexed(self.cache, self.peak_cache, uri, **self.options):
+                self.summary.skipped += 1
+            else:
+                pending.append(uri)
+        total = len(pending)
+        self.info("%d files to index, %d already indexed", total,
+                self.summary.skipped)
+
+        idle = [WorkerProcess(self.options)
+                for i in xrange(min(self.jobs, total))]
+        busy = []
+        try:
+            while pending or busy:
+                while idle and pending:
+                    worker = idle.pop()
+                    uri = pending.pop(0)
+                    worker.send(uri, self.cache.getEntry(uri))
+                    busy.append(worker)
+
+                readable = select.select([worker.stdout for worker in busy],
+                        [], [])[0]
+                for worker in list(busy):
+                    if worker.stdout not in readable:
+                        continue
+
+                    busy.remove(worker)
+                    uri = worker.uri
+                    result = worker.read()
+                    if result is None:
+                        self._addResult(uri, None, ["The worker crashed."])
+                        worker.stop()
+                        worker = WorkerProcess(self.options)
+                    else:
+                        self._addResult(uri, result["entry"],
+                                result["errors"])
+                    idle.append(worker)
+                    self._printProgress(total, uri)
+        finally:
+            for worker in idle + busy:
+                worker.stop()
+            self.cache.save()
+
+    def _addResult(self, uri, entry, errors):
+        if entry is not None:
+            self.cache.setEntry(uri, entry)
+            self._unsaved += 1
+            if self._unsaved >= SAVE_INTERVAL:
+                self.cache.save()
+                self._unsaved = 0
+
+        if errors:
+            self.summary.addFailure(uri, errors[0])
+        else:
+            self.summary.indexed += 1
+
+    def _printProgress(self, total, uri):
+        done = self.summary.indexed + len(self.summary.failures)
+        self.out.write("[%d/%d] %s\n" % (done, total, uri))
+        self.out.flush()
+
+
+def main(argv):
+    parser = OptionParser(usage="%prog [options] PATH...",
+            description="Discover the media files in PATH and its "
+            "subdirectories, and generate their thumbnails and waveforms, "
+            "so that they import quickly in pitivi.")
+    parser.add_option("-j", "--jobs", type="int", default=cpu_count(),
+            help="number of files indexed at the same time "
+            "[default: %default]")
+    parser.add_option("--no-thumbnails", action="store_false",
+            dest="thumbnails", default=True,
+            help="don't generate thumbnails")
+    parser.add_option("--no-peaks", action="store_false", dest="peaks",
+            default=True, help="don't compute waveforms")
+    options, args = parser.parse_args(argv[1:])
+    if not args:
+        parser.error("no path given")
+    if options.jobs < 1:
+        parser.error("--jobs must be at least 1")
+
+    indexer = BulkIndexer(options.jobs, options.thumbnails, options.peaks)
+    interrupted = False
+    try:
+        indexer.run(walk_uris(args))
+    except KeyboardInterrupt:
+        interrupted = True
+
+    print
+    print indexer.summary.format()
+    if interrupted:
+        print
+        print "Interrupted, run the same command again to resume."
+        return 1
+
+    return 0
@@ -41,6 +41,10 @@ _log_handlers_limited = []
 
 _initialized = False
 
+# bumped every time category levels or log handlers change, so that
+# Loggable instances know when their cached level has become stale
+_levelGeneration = 0
+
 _stdout = None
 _stderr = None
 _old_hup_handler = None
@@ -153,6 +157,27 @@ def getCategoryLevel(category):
     return _categories[category]
 
 
+def getEffectiveLevel(category):
+    """
+    @param category: string
+
+    Get the most verbose level for which a message in this category can
+    reach at least one log handler. Messages above this level can be
+    dropped before doing any formatting.
+    """
+    if _log_handlers:
+        # unfiltered handlers see everything
+        return LOG
+    if not _log_handlers_limited:
+        return 0
+    return getCategoryLevel(category)
+
+
+def _invalidateLevels():
+    global _levelGeneration
+    _levelGeneration += 1
+
+
 def setLogSettings(state):
     """Update the current log settings.
     This can restore an old saved log settings object returned by
@@ -161,6 +186,7 @@ def setLogSettings(state):
     """
 
     global _DEBUG
+    global _categories
     global _log_handlers
     global _log_handlers_limited
 
@@ -171,6 +197,7 @@ def setLogSettings(state):
 
     for category in _categories:
         registerCategory(category)
+    _invalidateLevels()
 
 
 def getLogSettings():
@@ -186,12 +213,7 @@ def getLogSettings():
 
 
 def _canShortcutLogging(category, level):
-    if _log_handlers:
-        # we have some loggers operating without filters, have to do
-        # everything
-        return False
-    else:
-        return level > getCategoryLevel(category)
+    return level > getEffectiveLevel(category)
 
 
 def scrubFilename(filename):
@@ -249,7 +271,7 @@ def getFileLine(where=-1):
             stackFrame = stackFrame.f_back
 
     if not co:
-        return "<unknown file>", 0
+        return "<unknown file>", 0, None
 
     return scrubFilename(co.co_filename), lineno, name
 
@@ -307,45 +329,42 @@ def doLog(level, object, category, format, args, where=-1,
     """
     ret = {}
 
+    limited = bool(_log_handlers_limited) and \
+            level <= getCategoryLevel(category)
+    if not _log_handlers and not limited:
+        # nobody is going to see this message, don't bother formatting it
+        # or walking the stack
+        return ret
+
     if args:
         message = format % args
     else:
         message = format
 
-    # first all the unlimited ones
-    if _log_handlers:
-        if filePath is None and line is None:
-            (filePath, line, funcname) = getFileLine(where=where)
-        ret['filePath'] = filePath
-        ret['line'] = line
-        if funcname:
-            message = "\033[00m\033[32;01m%s:\033[00m %s" % (funcname, message)
-        for handler in _log_handlers:
-            try:
-                handler(level, object, category, file, line, message)
-            except TypeError, e:
-                raise SystemError("handler %r raised a TypeError: %s" % (
-                    handler, getExceptionMessage(e)))
+    funcname = None
+    if filePath is None and line is None:
+        (filePath, line, funcname) = getFileLine(where=where)
+    ret['filePath'] = filePath
+    ret['line'] = line
+    if funcname:
+        message = "\033[00m\033[32;01m%s:\033[00m %s" % (funcname, message)
 
-    if level > getCategoryLevel(category):
-        return ret
+    # first all the unlimited ones
+    for handler in _log_handlers:
+        try:
+            handler(level, object, category, filePath, line, message)
+        except TypeError, e:
+            raise SystemError("handler %r raised a TypeError: %s" % (
+                handler, getExceptionMessage(e)))
 
-    if _log_handlers_limited:
-        if filePath is None and line is None:
-            (filePath, line, funcname) = getFileLine(where=where)
-        ret['filePath'] = filePath
-        ret['line'] = line
-        if funcname:
-            message = "\033[00m\033[32;01m%s:\033[00m %s" % (funcname, message)
+    if limited:
         for handler in _log_handlers_limited:
-            # set this a second time, just in case there weren't unlimited
-            # loggers there before
             try:
                 handler(level, object, category, filePath, line, message)
             except TypeError:
                 raise SystemError("handler %r raised a TypeError" % handler)
 
-        return ret
+    return ret
 
 
 def errorObject(object, cat, format, *args):
@@ -503,6 +522,7 @@ def setDebug(string):
     # reparse all already registered category levels
     for category in _categories:
         registerCategory(category)
+    _invalidateLevels()
 
 
 def getDebug():
@@ -535,6 +555,7 @@ def reset():
     _log_handlers = []
     _log_handlers_limited = []
     _initialized = False
+    _invalidateLevels()
 
 
 def addLogHandler(func):
@@ -555,6 +576,7 @@ def addLogHandler(func):
 
     if func not in _log_handlers:
         _log_handlers.append(func)
+        _invalidateLevels()
 
 
 def addLimitedLogHandler(func):
@@ -574,6 +596,7 @@ def addLimitedLogHandler(func):
 
     if func not in _log_handlers_limited:
         _log_handlers_limited.append(func)
+        _invalidateLevels()
 
 
 def removeLogHandler(func):
@@ -589,6 +612,7 @@ def removeLogHandler(func):
     @raises ValueError: if func is not registered
     """
     _log_handlers.remove(func)
+    _invalidateLevels()
 
 
 def removeLimitedLogHandler(func):
@@ -604,6 +628,7 @@ def removeLimitedLogHandler(func):
     @raises ValueError: if func is not registered
     """
     _log_handlers_limited.remove(func)
+    _invalidateLevels()
 
 # public log functions
 
@@ -722,6 +747,15 @@ class Loggable(object):
        messages under.
     """
 
+    # cached getEffectiveLevel(self.logCategory), valid for as long as
+    # _logLevelGeneration matches the module-wide _levelGeneration. This
+    # lets disabled log calls return before doing any work.
+    _logLevel = 0
+    _logLevelGeneration = -1
+
+    def _refreshLogLevel(self):
+        self._logLevel = getEffectiveLevel(self.logCategory)
+        self._logLevelGeneration = _levelGeneration
 
     def writeMarker(self, marker, level):
         """
@@ -744,35 +778,45 @@ class Loggable(object):
 
     def error(self, *args):
         """Log an error.  By default this will also raise an exception."""
-        if _canShortcutLogging(self.logCategory, ERROR):
+        if self._logLevelGeneration != _levelGeneration:
+            self._refreshLogLevel()
+        if ERROR > self._logLevel:
             return
         errorObject(self.logObjectName(), self.logCategory,
             *self.logFunction(*args))
 
     def warning(self, *args):
         """Log a warning.  Used for non-fatal problems."""
-        if _canShortcutLogging(self.logCategory, WARN):
+        if self._logLevelGeneration != _levelGeneration:
+            self._refreshLogLevel()
+        if WARN > self._logLevel:
             return
         warningObject(self.logObjectName(), self.logCategory,
             *self.logFunction(*args))
 
     def info(self, *args):
         """Log an informational message.  Used for normal operation."""
-        if _canShortcutLogging(self.logCategory, INFO):
+        if self._logLevelGeneration != _levelGeneration:
+            self._refreshLogLevel()
+        if INFO > self._logLevel:
             return
         infoObject(self.logObjectName(), self.logCategory,
             *self.logFunction(*args))
 
     def debug(self, *args):
         """Log a debug message.  Used for debugging."""
-        if _canShortcutLogging(self.logCategory, DEBUG):
+        if self._logLevelGeneration != _levelGeneration:
+            self._refreshLogLevel()
+        if DEBUG > self._logLevel:
             return
         debugObject(self.logObjectName(), self.logCategory,
             *self.logFunction(*args))
 
     def log(self, *args):
         """Log a log message.  Used for debugging recurring events."""
-        if _canShortcutLogging(self.logCategory, LOG):
+        if self._logLevelGeneration != _levelGeneration:
+            self._refreshLogLevel()
+        if LOG > self._logLevel:
             return
         logObject(self.logObjectName(), self.logCategory,
             *self.logFunction(*args))
@@ -795,7 +839,9 @@ class Loggable(object):
                  call to doLog that should show the same location
         @rtype:  dict
         """
-        if _canShortcutLogging(self.logCategory, level):
+        if self._logLevelGeneration != _levelGeneration:
+            self._refreshLogLevel()
+        if level > self._logLevel:
             return {}
         args = self.logFunction(*args)
         return doLog(level, self.logObjectName(), self.logCategory,
@@ -809,7 +855,9 @@ class Loggable(object):
         @param swallow: whether to swallow the failure or not
         @type  swallow: bool
         """
-        if _canShortcutLogging(self.logCategory, WARN):
+        if self._logLevelGeneration != _levelGeneration:
+            self._refreshLogLevel()
+        if WARN > self._logLevel:
             if swallow:
                 return
             return failure
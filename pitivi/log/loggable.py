@@ -19,8 +19,9 @@
 # Free Software Foundation, Inc., 59 Temple Place - Suite 330,
 # Boston, MA 02111-1307, USA.
 
-from pitivi.log.log import _canShortcutLogging, doLog, ERROR
+from pitivi.log.log import doLog, ERROR
 from pitivi.log import log
+from pitivi.log import tracing
 
 def _errorObject(object, cat, format, *args):
     """
@@ -41,7 +42,40 @@ class Loggable(log.Loggable):
         return res
 
     def error(self, *args):
-        if _canShortcutLogging(self.logCategory, ERROR):
+        if self._logLevelGeneration != log._levelGeneration:
+            self._refreshLogLevel()
+        if ERROR > self._logLevel:
             return
         _errorObject(self.logObjectName(), self.logCategory,
             *self.logFunction(*args))
+
+    def span(self, name, **args):
+        """
+        Trace the block of a C{with} statement as C{name}.
+
+        @see: L{tracing.span}
+        """
+        if not tracing._enabled:
+            return tracing._null_span
+        return tracing.Span(name, self.logCategory, args)
+
+    def beginSpan(self, name, span_id=None, **args):
+        """
+        Start tracing an operation which completes asynchronously.
+
+        @param span_id: Identifies the operation if this object can have
+        more than one of them in flight, defaults to the object itself.
+        """
+        if tracing._enabled:
+            if span_id is None:
+                span_id = id(self)
+            tracing.beginAsync(name, self.logCategory, span_id, args)
+
+    def endSpan(self, name, span_id=None, **args):
+        """
+        Finish tracing an operation started with L{beginSpan}.
+        """
+        if tracing._enabled:
+            if span_id is None:
+                span_id = id(self)
+            tracing.endAsync(name, self.logCategory, span_id, args)
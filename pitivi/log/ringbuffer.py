@@ -0,0 +1,254 @@
+# PiTiVi , Non-linear video editor
+#
+#       pitivi/log/ringbuffer.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+"""
+Asynchronous log output.
+
+L{RingBufferLogHandler} is a log handler that only appends records to
+bounded buffers from the logging thread, which can be a GStreamer streaming
+thread. Records are formatted and written from a dedicated writer thread,
+so that enabling debug output doesn't distort the timing of the code being
+debugged.
+"""
+
+import os
+import sys
+import thread
+import threading
+import time
+from collections import deque
+
+from pitivi.log import log
+
+# thread ident -> tag shown in the log output
+_thread_tags = {}
+
+
+def setThreadTag(tag, ident=None):
+    """
+    Set the tag shown for records logged from the given thread.
+
+    @param tag: A short name for the thread, or C{None} to remove it.
+    @type tag: C{str}
+    @param ident: The thread ident, defaults to the calling thread.
+    @type ident: C{int}
+    """
+    if ident is None:
+        ident = thread.get_ident()
+    if tag is None:
+        _thread_tags.pop(ident, None)
+    else:
+        _thread_tags[ident] = tag
+
+
+def getThreadTag(ident=None):
+    """
+    Return the tag of the given thread, defaulting to its ident.
+    """
+    if ident is None:
+        ident = thread.get_ident()
+    tag = _thread_tags.get(ident)
+    if tag is None:
+        tag = "0x%x" % ident
+    return tag
+
+
+def formatRecord(record):
+    """
+    Format a record the same way L{log.stderrHandler} does, with the
+    thread tag instead of the raw thread ident.
+    """
+    timestamp, ident, tag, level, object, category, file, line, message = \
+            record
+    if tag is None:
+        tag = "0x%x" % ident
+
+    o = ""
+    if object:
+        o = '"' + object + '"'
+
+    return '%s [%5d] [%-14s] %-32s %-17s %-15s %-4s %s (%s:%d)\n' % (
+            log.getFormattedLevelName(level), os.getpid(),
+            tag[:14], o[:32], category,
+            time.strftime("%b %d %H:%M:%S", time.localtime(timestamp)),
+            "", message, file, line or 0)
+
+
+class RingBufferLogHandler(object):
+    """
+    A log handler that defers formatting and writing to a writer thread.
+
+    Logging threads only append a tuple to a bounded C{deque}, which is
+    atomic and doesn't need any lock. When the pending buffer is full
+    records are dropped and counted instead of blocking the logging thread.
+
+    The handler also keeps a history of the most recent records. In
+    C{dump_only} mode nothing is written until L{dumpHistory} is called,
+    which is meant to be done from a crash handler.
+
+    @ivar dropped: The number of records dropped because the writer thread
+    couldn't keep up.
+    @type dropped: C{int}
+    """
+
+    def __init__(self, output=None, capacity=10000, history=50000,
+            interval=0.05, dump_only=False):
+        """
+        @param output: The file to write to, defaults to C{sys.stderr}.
+        @param capacity: Maximum number of records waiting to be written.
+        @param history: Number of records kept for L{dumpHistory}.
+        @param interval: Seconds the writer thread sleeps when idle.
+        @param dump_only: Only keep the history, don't write anything.
+        """
+        if output is None:
+            output = sys.stderr
+        self.output = output
+        self.capacity = capacity
+        self.interval = interval
+        self.dump_only = dump_only
+        self.dropped = 0
+        self._reported_dropped = 0
+        self._pending = deque()
+        # deque(maxlen=) needs python 2.6
+        self._history = deque()
+        self._history_size = history
+        self._running = False
+        self._writer = None
+
+    def __call__(self, level, object, category, file, line, message):
+        ident = thread.get_ident()
+        # look the tag up now, the thread might be gone when we format
+        record = (time.time(), ident, _thread_tags.get(ident), level,
+                object, category, file, line, message)
+        history = self._history
+        history.append(record)
+        if len(history) > self._history_size:
+            try:
+                history.popleft()
+            except IndexError:
+                # another thread trimmed it first
+                pass
+        if self.dump_only:
+            return
+
+        # len() and append() are not atomic together, so capacity is a soft
+        # limit. That's fine, all we want is to never block here.
+        if len(self._pending) >= self.capacity:
+            self.dropped += 1
+            return
+        self._pending.append(record)
+
+    def install(self):
+        """
+        Replace L{log.stderrHandler} with this handler and start writing.
+
+        In C{dump_only} mode nothing is written until a dump, so
+        L{log.stderrHandler} is kept and this handler only records.
+        """
+        setThreadTag("main")
+        self.start()
+        if not self.dump_only:
+            try:
+                log.removeLimitedLogHandler(log.stderrHandler)
+            except ValueError:
+                pass
+        log.addLimitedLogHandler(self)
+
+    def uninstall(self):
+        """
+        Restore L{log.stderrHandler}, writing out pending records first.
+        """
+        try:
+            log.removeLimitedLogHandler(self)
+        except ValueError:
+            pass
+        self.stop()
+        if not self.dump_only:
+            log.addLimitedLogHandler(log.stderrHandler)
+
+    def start(self):
+        if self._running or self.dump_only:
+            return
+        self._running = True
+        self._writer = threading.Thread(target=self._writerLoop,
+                name="log-writer")
+        self._writer.setDaemon(True)
+        self._writer.start()
+
+    def stop(self):
+        """
+        Stop the writer thread after it has written all pending records.
+        """
+        if not self._running:
+            return
+        self._running = False
+        self._writer.join()
+        self._writer = None
+
+    def flush(self):
+        """
+        Write all the pending records from the calling thread.
+        """
+        pending = self._pending
+        write = self.output.write
+        try:
+            while pending:
+                write(formatRecord(pending.popleft()))
+            if self.dropped != self._reported_dropped:
+                write("log: %d records dropped so far\n" % self.dropped)
+                self._reported_dropped = self.dropped
+            self.output.flush()
+        except IOError:
+            # same as log.safeprintf, there's nothing we can do
+            pass
+
+    def getHistory(self, seconds=None):
+        """
+        Return the records from the last C{seconds} seconds, or all the
+        records in the history.
+        """
+        records = list(self._history)
+        if seconds is not None:
+            start = time.time() - seconds
+            records = [record for record in records if record[0] >= start]
+        return records
+
+    def dumpHistory(self, seconds=None, output=None):
+        """
+        Write out the records logged during the last C{seconds} seconds.
+
+        @param output: Where to write, defaults to the handler output.
+        """
+        if output is None:
+            output = self.output
+        records = self.getHistory(seconds)
+        log.safeprintf(output,
+                "log: dumping %d records from the last %s seconds "
+                "(%d dropped)\n", len(records), seconds, self.dropped)
+        for record in records:
+            log.safeprintf(output, formatRecord(record))
+        output.flush()
+
+    def _writerLoop(self):
+        while self._running:
+            if self._pending:
+                self.flush()
+            else:
+                time.sleep(self.interval)
+        self.flush()
@@ -36,6 +36,14 @@ class LogFunctionTester(log.Loggable):
         return (("override " + format), ) + args[1:]
 
 
+class Unformattable(object):
+
+    def __str__(self):
+        raise AssertionError("disabled log call was formatted")
+
+    __repr__ = __str__
+
+
 class TestLog(unittest.TestCase):
 
     def setUp(self):
@@ -138,6 +146,45 @@ class TestLog(unittest.TestCase):
         self.tester.warning("also visible")
         assert self.message == 'also visible'
 
+    # test that disabled calls are dropped before formatting
+
+    def testDisabledNotFormatted(self):
+        log.setDebug("testlog:3")
+        log.addLimitedLogHandler(self.handler)
+
+        self.tester.debug("%s", Unformattable())
+        log.debugObject(None, 'testlog', "%s", Unformattable())
+        assert not self.message
+
+    def testNoHandlersNotFormatted(self):
+        log.setDebug("testlog:5")
+
+        self.tester.debug("%s", Unformattable())
+
+    # test that the level cached on the instance follows changes
+
+    def testCachedLevelInvalidated(self):
+        log.setDebug("testlog:3")
+        log.addLimitedLogHandler(self.handler)
+
+        self.tester.debug("hidden")
+        assert not self.message
+
+        log.setDebug("testlog:4")
+        self.tester.debug("shown")
+        assert self.level == log.DEBUG
+        assert 'shown' in self.message
+
+        self.level = self.message = None
+        log.removeLimitedLogHandler(self.handler)
+        self.tester.debug("hidden")
+        assert not self.message
+
+        log.addLogHandler(self.handler)
+        self.tester.log("shown")
+        assert self.level == log.LOG
+        assert 'shown' in self.message
+
 
 class TestOwnLogHandler(unittest.TestCase):
 
@@ -0,0 +1,207 @@
+# PiTiVi , Non-linear video editor
+#
+#       pitivi/log/tracing.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+"""
+Span tracing.
+
+Spans record how long an operation took. When tracing is enabled they are
+kept in a bounded in-memory buffer, which can be exported at any time in the
+Chrome trace event format understood by chrome://tracing and Perfetto.
+
+Synchronous operations are traced with L{span}, which returns a context
+manager. Operations that complete later, in a callback, are traced with
+L{beginAsync} and L{endAsync}.
+
+When tracing is disabled, which is the default, all of this costs a single
+check.
+"""
+
+import os
+import thread
+import time
+from collections import deque
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+_enabled = False
+_max_events = 200000
+_events = deque()
+
+
+def enable(max_events=None):
+    """
+    Start recording spans.
+
+    @param max_events: The number of events to keep, older ones are dropped.
+    @type max_events: C{int}
+    """
+    global _enabled, _max_events
+    if max_events is not None:
+        _max_events = max_events
+    _enabled = True
+
+
+def disable():
+    """
+    Stop recording spans. Recorded events are kept until L{clear} is called.
+    """
+    global _enabled
+    _enabled = False
+
+
+def isEnabled():
+    return _enabled
+
+
+def clear():
+    _events.clear()
+
+
+def getEvents():
+    """
+    Return a list of the recorded events, as Chrome trace event dicts.
+    """
+    return list(_events)
+
+
+def _now():
+    # chrome traces are in microseconds
+    return time.time() * 1000000
+
+
+def _record(event):
+    _events.append(event)
+    if len(_events) > _max_events:
+        try:
+            _events.popleft()
+        except IndexError:
+            pass
+
+
+class Span(object):
+    """
+    Context manager recording the time spent in the enclosed block.
+    """
+
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = _now()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = _now()
+        event = {"name": self.name, "cat": self.category, "ph": "X",
+                "ts": self.start, "dur": end - self.start,
+                "pid": os.getpid(), "tid": thread.get_ident()}
+        if self.args:
+            event["args"] = self.args
+        if exc_type is not None:
+            event.setdefault("args", {})["exception"] = exc_type.__name__
+        _record(event)
+        return False
+
+
+class _NullSpan(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_null_span = _NullSpan()
+
+
+def span(name, category="", args=None):
+    """
+    Return a context manager that traces the enclosed block as C{name}.
+    """
+    if not _enabled:
+        return _null_span
+    return Span(name, category, args)
+
+
+def _recordAsync(phase, name, category, id, args):
+    event = {"name": name, "cat": category, "ph": phase,
+            "id": str(id), "ts": _now(),
+            "pid": os.getpid(), "tid": thread.get_ident()}
+    if args:
+        event["args"] = args
+    _record(event)
+
+
+def beginAsync(name, category, id, args=None):
+    """
+    Mark the beginning of an operation that finishes in another call.
+
+    @param id: Identifies the operation, the same value must be passed to
+    L{endAsync}.
+    """
+    if _enabled:
+        _recordAsync("b", name, category, id, args)
+
+
+def endAsync(name, category, id, args=None):
+    """
+    Mark the end of an operation started with L{beginAsync}.
+    """
+    if _enabled:
+        _recordAsync("e", name, category, id, args)
+
+
+def instant(name, category="", args=None):
+    """
+    Record a point in time, e.g. an incoming bus message.
+    """
+    if _enabled:
+        event = {"name": name, "cat": category, "ph": "i", "s": "t",
+                "ts": _now(), "pid": os.getpid(),
+                "tid": thread.get_ident()}
+        if args:
+            event["args"] = args
+        _record(event)
+
+
+def exportChromeTrace(output):
+    """
+    Write the recorded events as a Chrome trace.
+
+    @param output: A file name or a file object.
+    """
+    if isinstance(output, basestring):
+        output = open(output, "w")
+        close = True
+    else:
+        close = False
+
+    try:
+        # arguments can be anything, just make sure we can always export
+        json.dump({"traceEvents": getEvents(), "displayTimeUnit": "ms"},
+                output, default=str)
+    finally:
+        if close:
+            output.close()
@@ -0,0 +1,201 @@
+# PiTiVi , Non-linear video editor
+#
+#       mediafilter.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+"""
+Tell media files from the other files found when importing folders.
+
+Folders of media also contain sidecar files, project files and such, and
+every file given to the discoverer costs a pipeline, even when it fails. The
+extension is enough to tell most files apart: known media extensions are
+accepted and known sidecar and document extensions are rejected. Other files,
+including the ones whose name only has dots in it, are recognized from their
+first bytes.
+"""
+
+import os
+
+DEFAULT_EXTENSIONS = [
+    # video
+    "3g2", "3gp", "asf", "avi", "divx", "dv", "f4v", "flv", "m2t", "m2ts",
+    "m2v", "m4v", "mkv", "mov", "mp4", "mpe", "mpeg", "mpg", "mts", "mxf",
+    "nut", "ogm", "ogv", "ogx", "qt", "rm", "rmvb", "ts", "vob", "webm",
+    "wmv", "y4m",
+    # audio
+    "aac", "ac3", "aif", "aifc", "aiff", "amr", "ape", "au", "flac", "m4a",
+    "mka", "mp2", "mp3", "mpc", "oga", "ogg", "opus", "snd", "spx", "wav",
+    "wma", "wv",
+    # pictures
+    "bmp", "gif", "jpe", "jpeg", "jpg", "pgm", "png", "pnm", "ppm", "svg",
+    "tga", "tif", "tiff", "webp"]
+
+# files that are never media, or that look like media without being worth
+# importing, like the JPEG thumbnails cameras write next to their clips
+DEFAULT_IGNORED_EXTENSIONS = [
+    # sidecar and camera files
+    "bdm", "bup", "cpi", "ctg", "idx", "ifo", "lrv", "mpl", "smi", "srt",
+    "ssa", "sub", "thm", "xmp",
+    # projects and playlists
+    "cue", "edl", "m3u", "pls", "ptv", "xges", "xptv",
+    # documents and data
+    "bak", "cfg", "csv", "db", "doc", "htm", "html", "ini", "json", "log",
+    "md5", "nfo", "odt", "part", "pdf", "rtf", "sfv", "tmp", "txt", "xml",
+    # archives and programs
+    "7z", "bz2", "dmg", "exe", "gz", "iso", "rar", "tar", "zip"]
+
+DEFAULT_MIME_TYPES = ["video/", "audio/", "image/", "application/ogg"]
+
+# (offset, bytes, mime type), checked in order
+MAGIC = [
+    (0, "OggS", "application/ogg"),
+    (0, "\x1a\x45\xdf\xa3", "video/x-matroska"),
+    (4, "ftyp", "video/quicktime"),
+    (4, "moov", "video/quicktime"),
+    (4, "mdat", "video/quicktime"),
+    (4, "wide", "video/quicktime"),
+    (0, "\x00\x00\x01\xba", "video/mpeg"),
+    (0, "\x00\x00\x01\xb3", "video/mpeg"),
+    (0, "\x30\x26\xb2\x75\x8e\x66\xcf\x11", "video/x-ms-asf"),
+    (0, "FLV\x01", "video/x-flv"),
+    (0, "ID3", "audio/mpeg"),
+    (0, "fLaC", "audio/x-flac"),
+    (0, ".snd", "audio/basic"),
+    (0, "#!AMR", "audio/AMR"),
+    (0, "\x89PNG\r\n\x1a\n", "image/png"),
+    (0, "\xff\xd8\xff", "image/jpeg"),
+    (0, "GIF8", "image/gif"),
+    (0, "II*\x00", "image/tiff"),
+    (0, "MM\x00*", "image/tiff"),
+    (0, "BM", "image/bmp"),
+    ]
+
+# RIFF and IFF containers, the form type is at offset 8
+RIFF_TYPES = {"AVI ": "video/x-msvideo", "WAVE": "audio/x-wav",
+        "WEBP": "image/webp"}
+IFF_TYPES = {"AIFF": "audio/x-aiff", "AIFC": "audio/x-aiff"}
+
+MPEG_TS_PACKET_SIZE = 188
+
+SNIFF_SIZE = 2 * MPEG_TS_PACKET_SIZE + 1
+
+
+def sniff_mime_type(data):
+    """
+    Return the MIME type of a file starting with C{data}, or C{None} if it
+    isn't a format this module knows about.
+    """
+    for offset, magic, mime in MAGIC:
+        if data[offset:offset + len(magic)] == magic:
+            return mime
+
+    if data[:4] == "RIFF":
+        return RIFF_TYPES.get(data[8:12])
+    if data[:4] == "FORM":
+        return IFF_TYPES.get(data[8:12])
+
+    # MPEG audio frame sync, 11 set bits
+    if len(data) >= 2 and data[0] == "\xff" and ord(data[1]) & 0xe0 == 0xe0:
+        return "audio/mpeg"
+
+    # MPEG transport streams have no header, look for the sync byte of
+    # consecutive packets
+    if len(data) > 2 * MPEG_TS_PACKET_SIZE and data[0] == "\x47" and \
+            data[MPEG_TS_PACKET_SIZE] == "\x47" and \
+            data[2 * MPEG_TS_PACKET_SIZE] == "\x47":
+        return "video/mpegts"
+
+    return None
+
+
+def sniff_file(filename):
+    """
+    Return the MIME type of C{filename} from its first bytes, or C{None}.
+    """
+    try:
+        f = open(filename, "rb")
+    except IOError:
+        return None
+
+    try:
+        try:
+            data = f.read(SNIFF_SIZE)
+        except IOError:
+            return None
+    finally:
+        f.close()
+
+    return sniff_mime_type(data)
+
+
+class MediaFilter(object):
+    """
+    Decides which files are worth discovering.
+
+    Files with an allowed extension are accepted without being opened, and
+    files with an ignored one are rejected. The other files are sniffed and
+    accepted if their MIME type starts with one of the allowed ones. Hidden
+    files are never accepted.
+
+    @ivar extensions: The allowed extensions, in lower case, without dot.
+    @type extensions: C{set} of C{str}
+    @ivar ignored_extensions: The rejected extensions, in lower case, without
+    dot.
+    @type ignored_extensions: C{set} of C{str}
+    @ivar mime_types: The allowed MIME types or prefixes of MIME types.
+    @type mime_types: C{list} of C{str}
+    """
+
+    def __init__(self, extensions=None, mime_types=None,
+            ignored_extensions=None):
+        if extensions is None:
+            extensions = DEFAULT_EXTENSIONS
+        if mime_types is None:
+            mime_types = DEFAULT_MIME_TYPES
+        if ignored_extensions is None:
+            ignored_extensions = DEFAULT_IGNORED_EXTENSIONS
+        self.extensions = self._normalize(extensions)
+        self.ignored_extensions = self._normalize(ignored_extensions)
+        self.mime_types = list(mime_types)
+
+    def _normalize(self, extensions):
+        return set([extension.lower().lstrip(".")
+                for extension in extensions])
+
+    def accepts(self, filename):
+        """
+        Return whether C{filename} should be discovered.
+        """
+        name = os.path.basename(filename)
+        if name.startswith("."):
+            return False
+
+        extension = os.path.splitext(name)[1][1:].lower()
+        if extension in self.extensions:
+            return True
+        if extension in self.ignored_extensions:
+            return False
+
+        # unknown extensions are often not extensions at all, like in
+        # "Interview 2010.03.05"
+        mime = sniff_file(filename)
+        if mime is None:
+            return False
+        for allowed in self.mime_types:
+            if mime.startswith(allowed):
+                return True
+        return False
@@ -0,0 +1,867 @@
+# PiTiVi , Non-linear video editor
+#
+#       parallelrender.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+"""
+Rendering of a project in several processes at once.
+
+A single pipeline only keeps a few cores busy. The timeline is split into
+ranges, preferably at the edges of clips and never in the middle of a
+transition, each range is rendered by a C{pitivi-render} process with the
+same settings and the encoded pieces are then remuxed into the output file
+one after the other, without being decoded.
+"""
+
+from __future__ import with_statement
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+from threading import Lock
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+import gobject
+import gst
+
+from pitivi.log.loggable import Loggable
+from pitivi.signalinterface import Signallable
+from pitivi.render import ProjectRenderer, PROGRESS_INTERVAL, \
+        settings_to_arguments, path_to_uri
+from pitivi.threads import cpu_count
+
+WORKER_COMMAND = [sys.executable, "-c",
+        "import sys, pygst; pygst.require('0.10'); "
+        "from pitivi.render import main; sys.exit(main(sys.argv))"]
+
+# ranges shorter than this aren't worth a process
+MIN_RANGE_DURATION = 10 * gst.SECOND
+
+# how much the remuxer queues per stream, the streams of the pieces are
+# interleaved by time so this only needs to cover the muxer latency
+MAX_QUEUE_BYTES = 16 * 1024 * 1024
+
+# where decodebin2 stops when a stream isn't in one of the encoded formats
+RAW_CAPS = gst.Caps("video/x-raw-yuv; video/x-raw-rgb; "
+        "audio/x-raw-int; audio/x-raw-float")
+
+
+def align_time(position, framerate, up=False):
+    """
+    Return the start of the frame containing C{position}, or of the next
+    frame if C{up} is C{True} and C{position} isn't the start of one.
+
+    @param framerate: The frame rate, or C{None} to leave C{position} alone.
+    @type framerate: C{gst.Fraction}
+    """
+    if framerate is None:
+        return position
+
+    def frame_start(frame):
+        return gst.util_uint64_scale(frame, gst.SECOND * framerate.denom,
+                framerate.num)
+
+    frame = gst.util_uint64_scale(position, framerate.num,
+            gst.SECOND * framerate.denom)
+    # frame starts are rounded down, so the frame found may end up being
+    # the previous one
+    if frame_start(frame + 1) <= position:
+        frame += 1
+    aligned = frame_start(frame)
+    if up and aligned < position:
+        aligned = frame_start(frame + 1)
+    return aligned
+
+
+def get_cut_points(timeline):
+    """
+    Return the sorted positions where a clip starts or ends in C{timeline}.
+    """
+    points = set()
+    for track in timeline.tracks:
+        for track_object in track.track_objects:
+            points.add(track_object.start)
+            points.add(track_object.start + track_object.duration)
+    return sorted(points)
+
+
+def get_busy_regions(timeline):
+    """
+    Return the C{(start, end)} ranges of C{timeline} covered by transitions,
+    which can't be split.
+    """
+    regions = []
+    for track in timeline.tracks:
+        for transition in track.transitions.itervalues():
+            if transition.duration > 0:
+                regions.append((transition.start,
+                        transition.start + transition.duration))
+    return sorted(regions)
+
+
+def _in_region(position, regions):
+    for start, end in regions:
+        if start < position < end:
+            return end
+    return None
+
+
+def plan_ranges(duration, count, cut_points=(), busy=(), framerate=None):
+    """
+    Split C{[0, duration)} in at most C{count} contiguous ranges of about
+    the same duration.
+
+    Each boundary is moved to the closest cut point within half a range of
+    it, or else to the closest frame boundary. Boundaries never fall inside
+    a busy region, they're moved to its end instead.
+
+    @param cut_points: Preferred boundaries, see L{get_cut_points}.
+    @param busy: Ranges that mustn't be split, see L{get_busy_regions}.
+    @param framerate: The frame rate boundaries are aligned to.
+    @return: The C{(start, end)} ranges.
+    @rtype: C{list} of C{tuple}
+    """
+    candidates = [point for point in cut_points
+            if 0 < point < duration and _in_region(point, busy) is None and
+            align_time(point, framerate) == point]
+
+    boundaries = [0]
+    for index in xrange(1, count):
+        ideal = duration * index / count
+        window = duration / count / 2
+        best = None
+        for point in candidates:
+            if point > boundaries[-1] and abs(point - ideal) <= window and \
+                    (best is None or abs(point - ideal) < abs(best - ideal)):
+                best = point
+
+        if best is None:
+            best = align_time(ideal, framerate)
+            end = _in_region(best, busy)
+            while end is not None:
+                best = align_time(end, framerate, up=True)
+                end = _in_region(best, busy)
+
+        if boundaries[-1] < best < duration:
+            boundaries.append(best)
+    boundaries.append(duration)
+
+    return zip(boundaries[:-1], boundaries[1:])
+
+
+def get_encoded_caps(settings):
+    """
+    Return the caps produced by the encoders of C{settings}, where the
+    pieces are demuxed without being decoded.
+    """
+    caps = gst.Caps()
+    for name in (settings.vencoder, settings.aencoder):
+        if name is None:
+            continue
+        factory = gst.element_factory_find(name)
+        for template in factory.get_static_pad_templates():
+            if template.direction == gst.PAD_SRC:
+                caps.append(template.get_caps())
+    return caps
+
+
+def get_output_kinds(settings, have_video, have_audio):
+    """
+    Return the kinds of streams, C{"video"} and C{"audio"}, written to the
+    output file.
+    """
+    kinds = set()
+    if have_video and settings.vencoder is not None:
+        kinds.add("video")
+    if have_audio and settings.aencoder is not None:
+        kinds.add("audio")
+    return kinds
+
+
+def get_stream_kind(caps):
+    """
+    Return C{"video"} or C{"audio"}, whichever C{caps} are.
+    """
+    return caps[0].get_name().split("/", 1)[0]
+
+
+def is_header(caps, buf):
+    """
+    Return whether C{buf} holds the codec headers of its stream, which are
+    only kept from the first piece.
+    """
+    if buf.flag_is_set(gst.BUFFER_FLAG_IN_CAPS):
+        return True
+
+    # the demuxers don't always flag the headers of the xiph codecs
+    name = caps[0].get_name()
+    if name == "video/x-theora":
+        return bool(buf.data) and ord(buf.data[0]) & 0x80 != 0
+    if name == "audio/x-vorbis":
+        return bool(buf.data) and ord(buf.data[0]) & 0x01 != 0
+    return False
+
+
+def get_theora_granule_shift(caps):
+    """
+    Return the keyframe granule shift of a theora stream from the
+    identification header in C{caps}, or C{None}.
+    """
+    structure = caps[0]
+    if not structure.has_field("streamheader"):
+        return None
+    header = structure["streamheader"][0].data
+    if len(header) < 42 or not header.startswith("\x80theora"):
+        return None
+    return ((ord(header[40]) & 0x03) << 3) | (ord(header[41]) >> 5)
+
+
+def granulepos_to_time(caps, granulepos):
+    """
+    Return the position of C{granulepos}, or C{None} for the streams
+    without granule positions.
+    """
+    if granulepos == gst.BUFFER_OFFSET_NONE:
+        return None
+
+    structure = caps[0]
+    name = structure.get_name()
+    if name == "audio/x-vorbis":
+        return gst.util_uint64_scale(granulepos, gst.SECOND,
+                structure["rate"])
+    if name == "video/x-theora":
+        shift = get_theora_granule_shift(caps)
+        if shift is None:
+            return None
+        frames = (granulepos >> shift) + (granulepos & ((1 << shift) - 1))
+        framerate = structure["framerate"]
+        return gst.util_uint64_scale(frames, gst.SECOND * framerate.denom,
+                framerate.num)
+    return None
+
+
+def guess_timestamp_base(timestamp, start):
+    """
+    Return where the timestamps of a piece rendered from C{start} count
+    from, given the timestamp of one of its first buffers.
+
+    Depending on the muxer, the timestamps of a piece start either at the
+    start of its range or at 0. All the streams of a piece must be rebased
+    on the same position, so that the offset between them, like an encoder
+    delay, is kept.
+    """
+    if timestamp < start / 2:
+        return 0
+    return start
+
+
+def guess_granule_base(caps, granulepos, timestamp):
+    """
+    Return the position the granule positions of a rendered piece count
+    from, given the first buffer of the piece.
+
+    The timestamps of a piece start at the start of its range, but the
+    encoders may count their granules either from there or from 0.
+    """
+    position = granulepos_to_time(caps, granulepos)
+    if position is None or timestamp == gst.CLOCK_TIME_NONE:
+        return 0
+    if position < timestamp / 2:
+        return 0
+    return timestamp
+
+
+def shift_granulepos(caps, granulepos, offset, base=0):
+    """
+    Return C{granulepos} of a piece starting at C{base} in its own file and
+    placed at C{offset}, as a position in the whole output.
+
+    Only ogg uses granule positions, for the other formats the timestamps
+    are enough and C{granulepos} is returned as is.
+    """
+    if granulepos == gst.BUFFER_OFFSET_NONE or offset == base:
+        return granulepos
+
+    structure = caps[0]
+    name = structure.get_name()
+    if name == "audio/x-vorbis":
+        rate = structure["rate"]
+        return granulepos + gst.util_uint64_scale(offset, rate, gst.SECOND) \
+                - gst.util_uint64_scale(base, rate, gst.SECOND)
+    if name == "video/x-theora":
+        shift = get_theora_granule_shift(caps)
+        if shift is None:
+            return granulepos
+        framerate = structure["framerate"]
+
+        def frames(position):
+            return gst.util_uint64_scale(position, framerate.num,
+                    gst.SECOND * framerate.denom)
+        return granulepos + ((frames(offset) - frames(base)) << shift)
+    return granulepos
+
+
+def _strip_headers(caps):
+    caps = caps.copy()
+    for structure in caps:
+        if structure.has_field("streamheader"):
+            structure.remove_field("streamheader")
+    return caps
+
+
+class Concatenator(Signallable, Loggable):
+    """
+    Remuxes the pieces rendered by the workers into a single file, without
+    decoding them.
+
+    The pieces are demuxed one after the other and their buffers are pushed
+    to the muxer with their timestamps moved to where the piece starts in
+    the timeline. The pieces must have been encoded with the same settings,
+    so that the codec headers of the first piece are valid for all of them;
+    the headers of the other pieces are checked and dropped.
+
+    A piece can also be a range of a file encoded elsewhere, which is
+    copied as is, see L{pitivi.smartrender}.
+
+    The "done" signal is emitted with an error message, or C{None} if the
+    output file was written.
+
+    @ivar incompatible: Whether the concatenation failed because a piece
+    wasn't encoded like the first one.
+    @type incompatible: C{bool}
+    """
+
+    __signals__ = {
+        "done": ["error"],
+        }
+
+    def __init__(self, pieces, output_uri, settings, kinds=None):
+        """
+        @param pieces: The URIs of the pieces, where they start in the
+        output and the C{[media_start, media_stop)} range of the piece to
+        copy, or C{None} and C{None} to copy the whole piece.
+        @type pieces: C{list} of C{tuple}
+        @type settings: L{ExportSettings}
+        @param kinds: The kinds of streams to write, see
+        L{get_output_kinds}, defaults to those of the first piece.
+        @type kinds: C{set}
+        """
+        Loggable.__init__(self)
+        self.pieces = pieces
+        self.output_uri = output_uri
+        self.settings = settings
+        self.kinds = kinds
+        self.incompatible = False
+        self._index = 0
+        self._input = None
+        self._seeked = False
+        self._sinks = {}
+        self._timestamp_base = None
+        self._base_lock = Lock()
+        self._granule_bases = {}
+        self._inside = {}
+        self._checked = set()
+        self._output = None
+        self._sources = {}
+        self._caps = {}
+        self._finished = False
+
+    def start(self):
+        self._startPiece(0)
+
+    def _startPiece(self, index):
+        self._index = index
+        uri, offset, media_start, media_stop = self.pieces[index]
+        self.debug("remuxing %s from %s", uri, gst.TIME_ARGS(offset))
+
+        self._input = gst.Pipeline("concatenate-%d" % index)
+        source = gst.element_make_from_uri(gst.URI_SRC, uri)
+        dbin = gst.element_factory_make("decodebin2")
+        # stop at the encoded streams, the others can't be copied
+        caps = get_encoded_caps(self.settings)
+        caps.append(RAW_CAPS)
+        dbin.props.caps = caps
+        dbin.connect("new-decoded-pad", self._newDecodedPadCb)
+        self._input.add(source, dbin)
+        source.link(dbin)
+
+        self._seeked = False
+        self._sinks = {}
+        self._timestamp_base = None
+        self._granule_bases = {}
+        self._inside = {}
+        self._checked = set()
+        bus = self._input.get_bus()
+        bus.add_signal_watch()
+        bus.connect("message", self._inputMessageCb)
+
+        if index == 0 or media_start is not None:
+            # the muxer is set up from the streams of the first piece, and
+            # ranges are seeked to once prerolled
+            self._input.set_state(gst.STATE_PAUSED)
+        else:
+            self._input.set_state(gst.STATE_PLAYING)
+
+    def _newDecodedPadCb(self, unused_dbin, pad, unused_is_last):
+        # called from a streaming thread
+        kind = get_stream_kind(pad.get_caps())
+        if self.kinds is not None and kind not in self.kinds:
+            sink = gst.element_factory_make("fakesink")
+        else:
+            sink = gst.element_factory_make("appsink")
+            sink.props.emit_signals = True
+            sink.connect("new-buffer", self._newBufferCb)
+            self._sinks[sink] = kind
+        sink.props.sync = False
+        self._input.add(sink)
+        sink.sync_state_with_parent()
+        pad.link(sink.get_pad("sink"))
+
+    def _newBufferCb(self, sink):
+        # called from a streaming thread, pushing blocks while the muxer is
+        # busy with the other streams
+        buf = sink.emit("pull-buffer")
+        kind = self._sinks[sink]
+        if kind not in self._sources or self._finished:
+            # reported when the piece is finished
+            return
+        caps = self._caps[kind]
+        if self._index > 0:
+            if kind not in self._checked:
+                self._checked.add(kind)
+                piece_caps = sink.get_pad("sink").get_negotiated_caps()
+                if not piece_caps.is_equal(caps):
+                    self.incompatible = True
+                    gobject.idle_add(self._finish,
+                            "%s isn't encoded like the first piece" %
+                            self.pieces[self._index][0])
+            if self.incompatible or is_header(caps, buf):
+                return
+
+        uri, offset, media_start, media_stop = self.pieces[self._index]
+        if media_start is not None:
+            if buf.timestamp != gst.CLOCK_TIME_NONE:
+                self._inside[kind] = \
+                        media_start <= buf.timestamp < media_stop
+            # buffers without a timestamp go with the previous one
+            if not self._inside.get(kind, False) and \
+                    not is_header(caps, buf):
+                return
+            base = media_start
+        else:
+            base = self._getTimestampBase(buf.timestamp, offset)
+
+        buf = buf.make_metadata_writable()
+        if buf.timestamp != gst.CLOCK_TIME_NONE:
+            buf.timestamp = offset + buf.timestamp - base
+        if media_start is None:
+            if kind not in self._granule_bases and not is_header(caps, buf) \
+                    and buf.offset_end != gst.BUFFER_OFFSET_NONE:
+                self._granule_bases[kind] = guess_granule_base(caps,
+                        buf.offset_end, base)
+            base = self._granule_bases.get(kind, 0)
+        buf.offset_end = shift_granulepos(caps, buf.offset_end, offset, base)
+        buf.set_caps(caps)
+        self._sources[kind].emit("push-buffer", buf)
+
+    def _getTimestampBase(self, timestamp, offset):
+        # called from the streaming threads of all the streams of the piece
+        with self._base_lock:
+            if self._timestamp_base is None:
+                if timestamp == gst.CLOCK_TIME_NONE:
+                    return 0
+                self._timestamp_base = guess_timestamp_base(timestamp,
+                        offset)
+            return self._timestamp_base
+
+    def _inputMessageCb(self, bus, message):
+        if self._finished:
+            return
+        if message.type == gst.MESSAGE_ASYNC_DONE:
+            uri, offset, media_start, media_stop = self.pieces[self._index]
+            if media_start is not None and not self._seeked:
+                self._seeked = True
+                self._input.seek(1.0, gst.FORMAT_TIME, gst.SEEK_FLAG_FLUSH,
+                        gst.SEEK_TYPE_SET, media_start,
+                        gst.SEEK_TYPE_SET, media_stop)
+            elif self._output is None:
+                self._startOutput()
+            else:
+                self._input.set_state(gst.STATE_PLAYING)
+        elif message.type == gst.MESSAGE_EOS:
+            self._finishPiece()
+        elif message.type == gst.MESSAGE_ERROR:
+            gerror, detail = message.parse_error()
+            self._finish("couldn't read %s: %s" %
+                    (self.pieces[self._index][0], gerror.message))
+
+    def _startOutput(self):
+        self._output = gst.Pipeline("concatenate-output")
+        muxer = gst.element_factory_make(self.settings.muxer)
+        for name, value in self.settings.containersettings.iteritems():
+            muxer.set_property(name, value)
+        sink = gst.element_make_from_uri(gst.URI_SINK, self.output_uri)
+        self._output.add(muxer, sink)
+        muxer.link(sink)
+
+        for appsink, kind in self._sinks.iteritems():
+            caps = appsink.get_pad("sink").get_negotiated_caps()
+            source = gst.element_factory_make("appsrc")
+            source.props.caps = caps
+            source.props.format = gst.FORMAT_TIME
+            source.props.block = True
+            source.props.max_bytes = MAX_QUEUE_BYTES
+            self._output.add(source)
+            source.link(muxer)
+            self._sources[kind] = source
+            self._caps[kind] = caps
+
+        bus = self._output.get_bus()
+        bus.add_signal_watch()
+        bus.connect("message", self._outputMessageCb)
+        self._output.set_state(gst.STATE_PLAYING)
+        self._input.set_state(gst.STATE_PLAYING)
+
+    def _finishPiece(self):
+        kinds = set(self._sinks.itervalues())
+        self._stopInput()
+        if kinds != set(self._sources):
+            self._finish("%s doesn't have the same streams as the first piece"
+                    % self.pieces[self._index][0])
+            return
+
+        if self._index + 1 < len(self.pieces):
+            self._startPiece(self._index + 1)
+            return
+
+        for source in self._sources.itervalues():
+            source.emit("end-of-stream")
+
+    def _outputMessageCb(self, bus, message):
+        if message.type == gst.MESSAGE_EOS:
+            self._finish(None)
+        elif message.type == gst.MESSAGE_ERROR:
+            gerror, detail = message.parse_error()
+            self._finish("couldn't write %s: %s" %
+                    (self.output_uri, gerror.message))
+
+    def _stopInput(self):
+        if self._input is not None:
+            self._input.get_bus().remove_signal_watch()
+            self._input.set_state(gst.STATE_NULL)
+            self._input = None
+
+    def _finish(self, error):
+        if self._finished:
+            return
+        self._finished = True
+        self._stopInput()
+        if self._output is not None:
+            self._output.get_bus().remove_signal_watch()
+            self._output.set_state(gst.STATE_NULL)
+            self._output = None
+        self._sources = {}
+        self.emit("done", error)
+
+
+class RenderProcess(object):
+    """
+    A C{pitivi-render} process, as seen from the process that started it.
+
+    @ivar fraction: How much has been rendered, from 0 to 1.
+    @type fraction: C{float}
+    @ivar error: Why the render failed, if it did.
+    @type error: C{str}
+    @ivar finished: Whether the process exited.
+    @type finished: C{bool}
+    """
+
+    def __init__(self, args, callback):
+        """
+        @param args: The command line arguments of C{pitivi-render}.
+        @type args: C{list} of C{str}
+        @param callback: Called from the main loop with the process and each
+        event it reports, then with C{None} when the process exits.
+        """
+        self.fraction = 0.0
+        self.error = None
+        self.finished = False
+        self.callback = callback
+        self.process = subprocess.Popen(WORKER_COMMAND + args,
+                stdout=subprocess.PIPE, close_fds=True)
+        self._buffer = ""
+        gobject.io_add_watch(self.process.stdout,
+                gobject.IO_IN | gobject.IO_HUP, self._readCb)
+
+    def _readCb(self, stdout, condition):
+        data = os.read(stdout.fileno(), 4096)
+        if data:
+            self._buffer += data
+            while "\n" in self._buffer:
+                line, self._buffer = self._buffer.split("\n", 1)
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # printed by something else than the renderer
+                    continue
+                self._handleEvent(event)
+            return True
+
+        self.process.wait()
+        if self.process.returncode != 0 and self.error is None:
+            self.error = "exited with status %d" % self.process.returncode
+        self.finished = True
+        self.callback(self, None)
+        return False
+
+    def _handleEvent(self, event):
+        if event["event"] == "progress":
+            self.fraction = event["fraction"]
+        elif event["event"] == "done":
+            self.fraction = 1.0
+        elif event["event"] == "error":
+            self.error = event["message"]
+        self.callback(self, event)
+
+    def kill(self):
+        if not self.finished:
+            os.kill(self.process.pid, 15)
+            self.process.wait()
+            self.finished = True
+
+
+class RangeWorker(RenderProcess):
+    """
+    A C{pitivi-render} process rendering one range.
+
+    @ivar done: How much of the range has been rendered.
+    @type done: C{long}
+    """
+
+    def __init__(self, project_uri, output_uri, start, end, settings,
+            callback):
+        self.output_uri = output_uri
+        self.start = start
+        self.end = end
+        self.done = 0
+        args = [project_uri, output_uri, "--force",
+                "--start", str(start), "--end", str(end)]
+        RenderProcess.__init__(self, args + settings_to_arguments(settings),
+                callback)
+
+    def _handleEvent(self, event):
+        if event["event"] == "progress":
+            self.done = event["position"] - self.start
+        elif event["event"] == "done":
+            self.done = self.end - self.start
+        RenderProcess._handleEvent(self, event)
+
+
+class ParallelRenderer(ProjectRenderer):
+    """
+    Renders the timeline in ranges, in as many processes as there are
+    jobs, and concatenates the pieces.
+
+    The ranges are planned with L{plan_ranges} once the project is loaded,
+    then this process only waits for the workers.
+
+    @ivar pieces: The pieces of the output, C{(start, end, uri,
+    media_start)} tuples, see L{_renderPieces}.
+    @type pieces: C{list} of C{tuple}
+    """
+
+    def __init__(self, project_uri, output_uri, options=None,
+            out=sys.stdout, interval=PROGRESS_INTERVAL, jobs=None):
+        """
+        @param jobs: The number of worker processes, defaults to the number
+        of processors.
+        """
+        ProjectRenderer.__init__(self, project_uri, output_uri, options,
+                out, interval)
+        if jobs is None:
+            jobs = cpu_count()
+        self.jobs = jobs
+        self.workers = []
+        self.pieces = []
+        self.directory = None
+        self.concatenator = None
+        self._kinds = set()
+        self._pending = []
+        self._piece_count = 0
+        self._total = 0
+        self._progress_id = None
+
+    def _getFramerate(self):
+        if "video" in self._kinds:
+            return self.settings.videorate
+        return None
+
+    def _planRanges(self, start, end):
+        """
+        Split C{[start, end)} of the timeline in ranges for the workers.
+        """
+        timeline = self.project.timeline
+        count = max(1, min(self.jobs, (end - start) / MIN_RANGE_DURATION))
+        cut_points = [point - start for point in get_cut_points(timeline)
+                if start < point < end]
+        busy = [(max(start, busy_start) - start, min(end, busy_end) - start)
+                for busy_start, busy_end in get_busy_regions(timeline)
+                if busy_start < end and busy_end > start]
+        return [(start + range_start, start + range_end)
+                for range_start, range_end in plan_ranges(end - start, count,
+                cut_points, busy, self._getFramerate())]
+
+    def _startRender(self, have_video, have_audio):
+        self._duration = self.project.timeline.duration
+        self.start = 0
+        self.end = self._duration
+        self._kinds = get_output_kinds(self.settings, have_video, have_audio)
+        ranges = self._planRanges(0, self._duration)
+
+        self._report("started", output=self.output_uri,
+                duration=self._duration, video=have_video, audio=have_audio,
+                ranges=ranges)
+        self._started = time.time()
+        self._renderPieces([(start, end, None, None)
+                for start, end in ranges])
+
+    def _renderPieces(self, pieces):
+        """
+        Render the pieces of the output and concatenate them.
+
+        The pieces are C{(start, end, uri, media_start)} tuples. Those
+        without an C{uri} are rendered by the workers, at most C{jobs} at
+        a time. The others are either already rendered, when
+        C{media_start} is C{None}, or copied from C{uri} starting at
+        C{media_start}.
+        """
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix="pitivi-render-")
+        extension = os.path.splitext(self.output_uri)[1]
+        self.pieces = []
+        for start, end, uri, media_start in pieces:
+            if uri is None:
+                if len(pieces) == 1:
+                    # nothing to concatenate
+                    uri = self.output_uri
+                else:
+                    uri = path_to_uri(os.path.join(self.directory,
+                            "piece-%03d%s" % (self._piece_count, extension)))
+                    self._piece_count += 1
+                self._pending.append((uri, start, end))
+                self._total += end - start
+            self.pieces.append((start, end, uri, media_start))
+
+        if self._progress_id is None:
+            self._progress_id = gobject.timeout_add(self.interval,
+                    self._progressCb)
+        self._startWorkers()
+        self._maybeConcatenate()
+
+    def _startWorkers(self):
+        running = len([worker for worker in self.workers
+                if not worker.finished])
+        while self._pending and running < self.jobs:
+            output_uri, start, end = self._pending.pop(0)
+            worker = RangeWorker(self.project_uri, output_uri,
+                    start, end, self.settings, self._workerCb)
+            self.workers.append(worker)
+            running += 1
+
+    def _maybeConcatenate(self):
+        if self._pending or \
+                not all(worker.finished for worker in self.workers):
+            return
+
+        if len(self.pieces) == 1 and self.pieces[0][2] == self.output_uri:
+            self._eosCb(None)
+        else:
+            self._concatenate()
+
+    def _workerCb(self, worker, event):
+        if self.error is not None:
+            return
+
+        if event is not None:
+            if event["event"] == "missing":
+                self._report("missing", uri=event["uri"])
+            return
+
+        if worker.error is not None:
+            self._fail("couldn't render %s to %s: %s" %
+                    (gst.TIME_ARGS(worker.start), gst.TIME_ARGS(worker.end),
+                    worker.error))
+            return
+
+        self._report("range-done", start=worker.start, end=worker.end,
+                elapsed=time.time() - self._started)
+        self._startWorkers()
+        self._maybeConcatenate()
+
+    def _progressCb(self):
+        if self.error is not None or self.concatenator is not None:
+            self._progress_id = None
+            return False
+
+        if self._total:
+            done = sum(worker.done for worker in self.workers)
+            self._report("progress", position=done, duration=self._total,
+                    fraction=float(done) / self._total,
+                    elapsed=time.time() - self._started)
+        return True
+
+    def _concatenate(self):
+        self._report("concatenating", pieces=len(self.pieces))
+        pieces = []
+        for start, end, uri, media_start in self.pieces:
+            if media_start is None:
+                pieces.append((uri, start, None, None))
+            else:
+                pieces.append((uri, start, media_start,
+                        media_start + end - start))
+        self.concatenator = Concatenator(pieces, self.output_uri,
+                self.settings, self._kinds)
+        self.concatenator.connect("done", self._concatenatorDoneCb)
+        self.concatenator.start()
+
+    def _concatenatorDoneCb(self, concatenator, error):
+        if error is not None:
+            self._fail(error)
+            return
+        self._eosCb(None)
+
+    def _fail(self, message):
+        for worker in self.workers:
+            worker.kill()
+        ProjectRenderer._fail(self, message)
+
+    def _cleanUp(self):
+        for worker in self.workers:
+            worker.kill()
+        self.workers = []
+        self._pending = []
+        if self.directory is not None:
+            shutil.rmtree(self.directory, True)
+            self.directory = None
+        ProjectRenderer._cleanUp(self)
@@ -0,0 +1,362 @@
+# PiTiVi , Non-linear video editor
+#
+#       peakcache.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+"""
+On-disk cache of the waveform peaks of audio streams.
+
+Drawing a waveform means decoding the whole stream. The peaks are small
+compared to the samples, so they're computed once, stored here and used by
+the previewer instead of decoding again.
+"""
+
+import os
+import sys
+import array
+import hashlib
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+import gobject
+import gst
+
+from pitivi.log.loggable import Loggable
+from pitivi.signalinterface import Signallable
+from pitivi.settings import xdg_cache_home
+
+PEAKS_VERSION = 1
+
+# the resolution of the waveforms drawn by the previewer, 1000 pixels for 30
+# seconds
+PEAK_INTERVAL = 30 * gst.MSECOND
+
+
+class Peaks(object):
+    """
+    The peaks of an audio stream.
+
+    @ivar channels: The number of channels.
+    @type channels: C{int}
+    @ivar interval: The duration covered by each peak.
+    @type interval: C{long}
+    @ivar values: The peaks of all the channels, interleaved, between 0
+    and 1.
+    @type values: C{array.array} of floats
+    """
+
+    def __init__(self, channels, interval, values=None):
+        self.channels = channels
+        self.interval = interval
+        if values is None:
+            values = array.array("f")
+        self.values = values
+
+    def __len__(self):
+        return len(self.values) / self.channels
+
+    def getColumns(self, start, duration, columns):
+        """
+        Return the highest peaks of the C{columns} equal parts of the given
+        time range, for each channel.
+
+        @rtype: C{list} of C{list} of C{float}
+        """
+        result = [[] for channel in xrange(self.channels)]
+        length = len(self)
+        for column in xrange(columns):
+            first = (start + duration * column / columns) / self.interval
+            last = (start + duration * (column + 1) / columns) / self.interval
+            last = min(max(last, first + 1), length)
+            for channel in xrange(self.channels):
+                if first >= length:
+                    result[channel].append(0.0)
+                    continue
+                result[channel].append(max(self.values[
+                        first * self.channels + channel:
+                        last * self.channels:self.channels]))
+
+        return result
+
+
+class PeakCache(Loggable):
+    """
+    Stores the L{Peaks} of audio streams, one file per stream.
+
+    Like in L{DiscoveryCache}, entries are checked against the size and
+    modification time of the file they were computed from.
+    """
+
+    def __init__(self, directory=None):
+        """
+        @param directory: Where to store the peaks, defaults to C{peaks} in
+        the pitivi cache directory.
+        """
+        Loggable.__init__(self)
+        if directory is None:
+            directory = os.path.join(xdg_cache_home(), "pitivi", "peaks")
+        self.directory = directory
+
+    def _getFilename(self, uri, pad_name):
+        return os.path.join(self.directory,
+                hashlib.md5("%s\0%s" % (uri, pad_name)).hexdigest() + ".peaks")
+
+    def _statUri(self, uri):
+        if not gst.uri_is_valid(uri) or gst.uri_get_protocol(uri) != "file":
+            return None
+
+        try:
+            return os.stat(gst.uri_get_location(uri))
+        except OSError:
+            return None
+
+    def _readHeader(self, uri, pad_name):
+        try:
+            f = open(self._getFilename(uri, pad_name), "rb")
+        except IOError:
+            return None, None
+
+        try:
+            header = json.loads(f.readline())
+        except ValueError:
+            f.close()
+            return None, None
+
+        stat = self._statUri(uri)
+        if header.get("version") != PEAKS_VERSION or stat is None or \
+                header["size"] != stat.st_size or \
+                header["mtime"] != stat.st_mtime:
+            f.close()
+            return None, None
+
+        return f, header
+
+    def has(self, uri, pad_name):
+        """
+        Return whether up to date peaks of the stream are stored, without
+        loading them.
+        """
+        f, header = self._readHeader(uri, pad_name)
+        if f is None:
+            return False
+        f.close()
+        return True
+
+    def lookup(self, uri, pad_name):
+        """
+        Return the peaks of the stream C{pad_name} of C{uri}, or C{None} if
+        they aren't stored or the file changed since they were.
+
+        @rtype: L{Peaks} or C{None}
+        """
+        f, header = self._readHeader(uri, pad_name)
+        if f is None:
+            return None
+
+        values = array.array("f")
+        try:
+            values.fromstring(f.read())
+        finally:
+            f.close()
+        if header["byteorder"] != sys.byteorder:
+            values.byteswap()
+
+        return Peaks(header["channels"], header["interval"], values)
+
+    def store(self, uri, pad_name, peaks):
+        """
+        Store the peaks of the stream C{pad_name} of C{uri}.
+        """
+        stat = self._statUri(uri)
+        if stat is None:
+            return
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        filename = self._getFilename(uri, pad_name)
+        header = {"version": PEAKS_VERSION,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "channels": peaks.channels,
+                "interval": peaks.interval,
+                "byteorder": sys.byteorder}
+        try:
+            f = open(filename + ".tmp", "wb")
+            try:
+                f.write(json.dumps(header) + "\n")
+                peaks.values.tofile(f)
+            finally:
+                f.close()
+            os.rename(filename + ".tmp", filename)
+        except (IOError, OSError), e:
+            self.warning("couldn't store peaks of %s: %s", uri, e)
+
+
+class PeakGenerator(Signallable, Loggable):
+    """
+    Computes the peaks of the audio streams of a file in a single decoding
+    pass and stores them in a L{PeakCache}.
+
+    The "done" signal is emitted when the file has been decoded, with
+    C{True} if the peaks were stored.
+
+    @ivar timeout: How long to wait without any progress before giving up,
+    in seconds.
+    @type timeout: C{int}
+    """
+
+    __signals__ = {
+        "done": ["success"],
+        }
+
+    def __init__(self, cache, timeout=30):
+        Loggable.__init__(self)
+        self.cache = cache
+        self.timeout = timeout
+        self._uri = None
+        self._pad_names = []
+        self._peaks = {}
+        self._levels = {}
+        self._pipeline = None
+        self._bus = None
+        self._timeout_id = 0
+        self._progress = False
+
+    def generate(self, uri, pad_names):
+        """
+        Start computing the peaks of the streams C{pad_names} of C{uri}.
+        """
+        self._uri = uri
+        self._pad_names = pad_names
+        self._peaks = {}
+        self._levels = {}
+        self._progress = False
+
+        source = gst.element_make_from_uri(gst.URI_SRC, uri)
+        if source is None:
+            self._finish(False)
+            return
+
+        self._pipeline = gst.Pipeline("PeakGenerator-%s" % uri)
+        dbin = gst.element_factory_make("decodebin2")
+        dbin.connect("new-decoded-pad", self._newDecodedPadCb)
+        self._pipeline.add(source, dbin)
+        source.link(dbin)
+
+        self._bus = self._pipeline.get_bus()
+        self._bus.add_signal_watch()
+        self._bus.connect("message::element", self._busElementCb)
+        self._bus.connect("message::eos", self._busEosCb)
+        self._bus.connect("message::error", self._busErrorCb)
+
+        self._timeout_id = gobject.timeout_add_seconds(self.timeout,
+                self._timeoutCb)
+        if self._pipeline.set_state(gst.STATE_PLAYING) == \
+                gst.STATE_CHANGE_FAILURE:
+            self._finish(False)
+
+    def _newDecodedPadCb(self, unused_dbin, pad, unused_is_last):
+        # called from a streaming thread
+        if str(pad.get_caps()).startswith("audio/x-raw") and \
+                pad.get_name() in self._pad_names:
+            conv = gst.element_factory_make("audioconvert")
+            level = gst.element_factory_make("level")
+            level.props.interval = PEAK_INTERVAL
+            level.props.message = True
+            sink = gst.element_factory_make("fakesink")
+            elements = [conv, level, sink]
+            self._pipeline.add(*elements)
+            gst.element_link_many(*elements)
+            self._levels[level] = pad.get_name()
+        else:
+            sink = gst.element_factory_make("fakesink")
+            elements = [sink]
+            self._pipeline.add(sink)
+
+        # decode as fast as possible
+        sink.props.sync = False
+        for element in elements:
+            element.sync_state_with_parent()
+        pad.link(elements[0].get_pad("sink"))
+
+    def _busElementCb(self, unused_bus, message):
+        pad_name = self._levels.get(message.src)
+        if pad_name is None or message.structure.get_name() != "level":
+            return
+
+        self._progress = True
+        decibels = message.structure["peak"]
+        peaks = self._peaks.get(pad_name)
+        if peaks is None:
+            peaks = Peaks(len(decibels), PEAK_INTERVAL)
+            self._peaks[pad_name] = peaks
+        for value in decibels:
+            # silence is -inf
+            peaks.values.append(min(1.0, 10 ** (max(value, -200.0) / 20)))
+
+    def _busEosCb(self, unused_bus, unused_message):
+        for pad_name, peaks in self._peaks.iteritems():
+            self.cache.store(self._uri, pad_name, peaks)
+        self._finish(bool(self._peaks))
+
+    def _busErrorCb(self, unused_bus, message):
+        gerror, detail = message.parse_error()
+        self.warning("error computing the peaks of %s: %s", self._uri,
+                gerror.message)
+        self._finish(False)
+
+    def _timeoutCb(self):
+        if self._progress:
+            self._progress = False
+            return True
+
+        self._timeout_id = 0
+        self.warning("timeout computing the peaks of %s", self._uri)
+        self._finish(False)
+        return False
+
+    def _finish(self, success):
+        if self._timeout_id:
+            gobject.source_remove(self._timeout_id)
+            self._timeout_id = 0
+
+        if self._bus is not None:
+            self._bus.remove_signal_watch()
+            self._bus = None
+
+        if self._pipeline is not None:
+            self._pipeline.set_state(gst.STATE_NULL)
+            self._pipeline = None
+        self._levels = {}
+
+        self.emit("done", success)
+
+_default_cache = None
+
+
+def get_default_peak_cache():
+    """
+    Return the peak cache shared by this process.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = PeakCache()
+    return _default_cache
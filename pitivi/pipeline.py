@@ -22,6 +22,9 @@
 """
 High-level pipelines
 """
+from __future__ import with_statement
+
+import time
 from threading import Lock
 from pitivi.signalinterface import Signallable
 from pitivi.factories.base import SourceFactory, SinkFactory
@@ -108,6 +111,7 @@ class Pipeline(Signallable, Loggable):
        by any of the L{Action}s.
      - C{eos} : The Pipeline has finished playing.
      - C{error} : An error happened.
+     - C{seek-done} : The Pipeline has prerolled after a L{seek}.
 
     @ivar actions: The Action(s) currently used.
     @type actions: List of L{Action}
@@ -119,6 +123,9 @@ class Pipeline(Signallable, Loggable):
     @type tees: Dictionnary of (L{SourceFactory},L{MultimediaStream}) to C{gst.Element}
     @ivar queues: The queues used before consumers, FOR ACTION USAGE ONLY
     @type queues: Dictionnary of (L{SinkFactory},L{MultimediaStream}) to C{gst.Element}
+    @ivar seek_latency: How long the last seek took to be displayed, in
+    seconds.
+    @type seek_latency: C{float}
     """
 
     __signals__ = {
@@ -132,7 +139,8 @@ class Pipeline(Signallable, Loggable):
         "unhandled-stream" : ["factory", "stream"],
         "eos" : [],
         "error" : ["message", "details"],
-        "element-message": ["message"]
+        "element-message": ["message"],
+        "seek-done" : ["position", "latency"]
         }
 
     def __init__(self):
@@ -148,7 +156,18 @@ class Pipeline(Signallable, Loggable):
         self._listening = False # for the position handler
         self._listeningInterval = 300 # default 300ms
         self._listeningSigId = 0
+        self._listeningClock = False
         self._stream_entry_from_pad = {}
+        self._state_change_traced = False
+        self._seek_started = None
+        self._seek_position = None
+        self.seek_latency = None
+        self._last_position = gst.CLOCK_TIME_NONE
+        # (position, running time) while playing
+        self._anchor = None
+        self._duration = gst.CLOCK_TIME_NONE
+        # where playback stops, after seekRange()
+        self._segment_stop = None
 
     def release(self):
         """
@@ -269,7 +288,12 @@ class Pipeline(Signallable, Loggable):
         the requested state.
         """
         self.debug("state:%r", state)
-        res = self._pipeline.set_state(state)
+        with self.span("set_state", state=state.value_nick):
+            res = self._pipeline.set_state(state)
+        if res == gst.STATE_CHANGE_ASYNC and not self._state_change_traced:
+            # traced until the pipeline has no pending state change
+            self._state_change_traced = True
+            self.beginSpan("state-change", state=state.value_nick)
         if res == gst.STATE_CHANGE_FAILURE:
             # reset to NULL
             self._pipeline.set_state(gst.STATE_NULL)
@@ -344,6 +368,50 @@ class Pipeline(Signallable, Loggable):
         self.log("Got position %s", gst.TIME_ARGS(cur))
         return cur
 
+    def getClockPosition(self):
+        """
+        Get the current position of the L{Pipeline} without querying it.
+
+        While playing, the position is extrapolated from the last one queried
+        by the running time of the pipeline, which is taken from its clock,
+        so it's cheap enough to be called at every screen refresh. It never
+        goes past the duration, or the stop of L{seekRange}. Otherwise it's
+        the last position known.
+
+        @return: The current position or gst.CLOCK_TIME_NONE
+        @rtype: L{long}
+        """
+        if self._anchor is None:
+            return self._last_position
+
+        running_time = self._getRunningTime()
+        if running_time is None:
+            return self._last_position
+
+        position, anchor_running_time = self._anchor
+        position += max(0, running_time - anchor_running_time)
+        stop = self._segment_stop
+        if stop is None:
+            stop = self._duration
+        if 0 <= stop < position:
+            return stop
+        return position
+
+    def _getRunningTime(self):
+        clock = self._pipeline.get_clock()
+        if clock is None:
+            return None
+        return clock.get_time() - self._pipeline.get_base_time()
+
+    def _anchorPosition(self, position):
+        # the clock position continues from here
+        self._last_position = position
+        running_time = self._getRunningTime()
+        if running_time is None:
+            self._anchor = None
+        else:
+            self._anchor = (position, running_time)
+
     def getDuration(self, format=gst.FORMAT_TIME):
         """
         Get the duration of the C{Pipeline}.
@@ -355,19 +423,26 @@ class Pipeline(Signallable, Loggable):
             self.handleException(e)
             raise PipelineError("Couldn't get duration")
         self.log("Got duration %s", gst.TIME_ARGS(dur))
+        self._duration = dur
         self.emit("duration-changed", dur)
         return dur
 
-    def activatePositionListener(self, interval=300):
+    def activatePositionListener(self, interval=300, clock=False):
         """
         Activate the position listener.
 
         When activated, the Pipeline will emit the 'position' signal at the
-        specified interval when it is the PLAYING or PAUSED state.
+        specified interval when it is in the PLAYING state and the position
+        has changed. In between, L{getClockPosition} can be used.
 
         @see: L{deactivatePositionListener}
         @param interval: Interval between position queries in milliseconds
         @type interval: L{int} milliseconds
+        @param clock: Whether to emit the position given by
+        L{getClockPosition} instead of querying it, for pipelines playing in
+        sync with their clock. The position is then only queried when
+        playback starts, stops, or a seek is done.
+        @type clock: C{bool}
         @return: Whether the position listener was activated or not
         @rtype: L{bool}
         """
@@ -375,6 +450,7 @@ class Pipeline(Signallable, Loggable):
             return True
         self._listening = True
         self._listeningInterval = interval
+        self._listeningClock = clock
         # if we're in paused or playing, switch it on
         self._listenToPosition(self.getState() == STATE_PLAYING)
         return True
@@ -390,9 +466,16 @@ class Pipeline(Signallable, Loggable):
 
     def _positionListenerCb(self):
         try:
-            cur = self.getPosition()
-            if cur != gst.CLOCK_TIME_NONE:
-                self.emit('position', cur)
+            if self._listeningClock and self._anchor is not None:
+                cur = self.getClockPosition()
+                if cur != self._last_position:
+                    self._last_position = cur
+                    self.emit('position', cur)
+            else:
+                cur = self.getPosition()
+                if cur != gst.CLOCK_TIME_NONE and cur != self._last_position:
+                    self._anchorPosition(cur)
+                    self.emit('position', cur)
         finally:
             return True
 
@@ -407,14 +490,20 @@ class Pipeline(Signallable, Loggable):
             gobject.source_remove(self._listeningSigId)
             self._listeningSigId = 0
 
-    def seek(self, position, format=gst.FORMAT_TIME):
+    def seek(self, position, format=gst.FORMAT_TIME, flags=0):
         """
         Seeks in the L{Pipeline} to the given position.
 
+        The "seek-done" signal is emitted once the pipeline has prerolled at
+        the new position, with the time it took.
+
         @param position: Position to seek to
         @type position: L{long}
         @param format: The C{Format} of the seek position
         @type format: C{gst.Format}
+        @param flags: C{gst.SEEK_FLAG_KEY_UNIT} or C{gst.SEEK_FLAG_ACCURATE},
+        to trade precision for speed or the other way round.
+        @type flags: C{gst.SeekFlags}
         @raise PipelineError: If seek failed
         """
         if format == gst.FORMAT_TIME:
@@ -428,15 +517,55 @@ class Pipeline(Signallable, Loggable):
         if format==gst.FORMAT_TIME:
             position = max(0, min(position, self.getDuration()))
 
-        res = self._pipeline.seek(1.0, format, gst.SEEK_FLAG_FLUSH,
+        # the running time starts again once the seek is done
+        self._anchor = None
+        self._last_position = position
+        self._segment_stop = None
+        if self._seek_started is not None:
+            # superseded before it was done
+            self.endSpan("seek")
+        self._seek_started = time.time()
+        self._seek_position = position
+        self.beginSpan("seek", position=position, flags=int(flags))
+        res = self._pipeline.seek(1.0, format, gst.SEEK_FLAG_FLUSH | flags,
                                   gst.SEEK_TYPE_SET, position,
                                   gst.SEEK_TYPE_NONE, -1)
         if not res:
             self.debug("seeking failed")
+            self._seek_started = None
+            self.endSpan("seek", success=False)
             raise PipelineError("seek failed")
         self.debug("seeking succesfull")
         self.emit('position', position)
 
+    def seekRange(self, start, stop, format=gst.FORMAT_TIME):
+        """
+        Seeks in the L{Pipeline} to C{start}, playback then stops at C{stop}.
+
+        Unlike L{seek}, the seek is accurate, so that contiguous ranges can
+        be rendered separately without losing or repeating frames.
+
+        @param start: Position to seek to
+        @type start: L{long}
+        @param stop: Position to stop at
+        @type stop: L{long}
+        @param format: The C{Format} of the seek positions
+        @type format: C{gst.Format}
+        @raise PipelineError: If seek failed
+        """
+        self.debug("start:%r, stop:%r, format:%r", start, stop, format)
+        res = self._pipeline.seek(1.0, format,
+                gst.SEEK_FLAG_FLUSH | gst.SEEK_FLAG_ACCURATE,
+                gst.SEEK_TYPE_SET, start, gst.SEEK_TYPE_SET, stop)
+        if not res:
+            self.debug("seeking failed")
+            raise PipelineError("seek failed")
+        if format == gst.FORMAT_TIME:
+            self._anchor = None
+            self._last_position = start
+            self._segment_stop = stop
+        self.emit('position', start)
+
     def seekRelative(self, time):
         seekvalue = max(0, min(self.getPosition() + time,
             self.getDuration()))
@@ -814,11 +943,20 @@ class Pipeline(Signallable, Loggable):
                         pass
                 elif prev == STATE_PAUSED and new == STATE_PLAYING:
                     self._listenToPosition(True)
+                    self._queryAnchor()
                 elif prev == STATE_PLAYING and new == STATE_PAUSED:
                     self._listenToPosition(False)
+                    self._queryAnchor()
+                    self._anchor = None
 
                 if emit_state_change:
+                    if self._state_change_traced:
+                        self._state_change_traced = False
+                        self.endSpan("state-change")
                     self.emit('state-changed', new)
+        elif message.type == gst.MESSAGE_ASYNC_DONE:
+            if self._seek_started is not None:
+                self._seekDone()
         elif message.type == gst.MESSAGE_ERROR:
             error, detail = message.parse_error()
             self._handleErrorMessage(error, detail, message.src)
@@ -828,6 +966,23 @@ class Pipeline(Signallable, Loggable):
         else:
             self.info("%s [%r]" , message.type, message.src)
 
+    def _queryAnchor(self):
+        try:
+            self._anchorPosition(self.getPosition())
+        except PipelineError:
+            self._anchor = None
+
+    def _seekDone(self):
+        # the sinks have prerolled, the new frame is being displayed
+        self.seek_latency = time.time() - self._seek_started
+        self._seek_started = None
+        if self.getState() == STATE_PLAYING:
+            self._queryAnchor()
+        self.endSpan("seek", latency=self.seek_latency)
+        self.info("seek to %s done in %.1f ms",
+                gst.TIME_ARGS(self._seek_position), self.seek_latency * 1000)
+        self.emit("seek-done", self._seek_position, self.seek_latency)
+
     def _queryDurationAsync(self, *args, **kwargs):
         try:
             self.getDuration()
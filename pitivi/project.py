@@ -27,13 +27,14 @@ Project class
 from pitivi.log.loggable import Loggable
 from pitivi.timeline.timeline import Timeline
 from pitivi.stream import AudioStream, VideoStream
-from pitivi.pipeline import Pipeline
+from pitivi.pipeline import Pipeline, PipelineError
 from pitivi.factories.timeline import TimelineSourceFactory
 from pitivi.sourcelist import SourceList
 from pitivi.settings import ExportSettings
 from pitivi.signalinterface import Signallable
 from pitivi.action import ViewAction
 from pitivi.utils import Seeker
+from pitivi.rendercache import RenderCache
 import gst
 
 class ProjectError(Exception):
@@ -55,6 +56,8 @@ class Project(Signallable, Loggable):
     @type pipeline: L{Pipeline}
     @ivar factory: The timeline factory
     @type factory: L{TimelineSourceFactory}
+    @ivar render_cache: The rendered heavy regions of the timeline
+    @type render_cache: L{RenderCache}
     @ivar format: The format under which the project is currently stored.
     @type format: L{FormatterClass}
     @ivar loaded: Whether the project is fully loaded or not.
@@ -85,6 +88,7 @@ class Project(Signallable, Loggable):
         self.sources = SourceList()
         self.sources.connect("source-added", self._sourceAddedCb)
         self.sources.connect("source-removed", self._sourceRemovedCb)
+        self.sources.connect("proxy-done", self._sourceProxyDoneCb)
 
         self._dirty = False
 
@@ -95,11 +99,14 @@ class Project(Signallable, Loggable):
         self.view_action = ViewAction()
         self.view_action.addProducers(self.factory)
         self.seeker = Seeker(80)
+        self.pipeline.connect("seek-done", self.seeker.seekDone)
+        self.render_cache = RenderCache(self)
 
         settings = self.getSettings()
         self._videocaps = settings.getVideoCaps()
 
     def release(self):
+        self.render_cache.setEnabled(False)
         self.pipeline.release()
         self.pipeline = None
 
@@ -206,3 +213,29 @@ class Project(Signallable, Loggable):
 
     def _sourceRemovedCb(self, sourclist, uri, factory):
         self.timeline.removeFactory(factory)
+
+    def _sourceProxyDoneCb(self, sourcelist, factory):
+        if not self.timeline.use_proxies:
+            # rendering, the proxy is used once the render is over
+            return
+
+        if not [obj for obj in self.timeline.timeline_objects
+                if obj.factory is factory]:
+            return
+
+        state = self.pipeline.getState()
+        if state in (gst.STATE_NULL, gst.STATE_READY):
+            self.timeline.updateProxies(factory)
+            return
+
+        # the bins can only be replaced while the pipeline is stopped
+        try:
+            position = self.pipeline.getPosition()
+        except PipelineError:
+            position = 0
+        self.pipeline.stop()
+        self.timeline.updateProxies(factory)
+        self.pipeline.pause()
+        self.pipeline.seek(position)
+        if state == gst.STATE_PLAYING:
+            self.pipeline.play()
@@ -0,0 +1,215 @@
+# PiTiVi , Non-linear video editor
+#
+#       proxy.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+"""
+Proxies of heavy sources, used instead of them while editing.
+
+A proxy is a copy of the first video stream of a source, scaled down to
+L{PROXY_HEIGHT} lines and encoded to motion JPEG, so every frame can be
+decoded on its own. Seeking and playing it is much cheaper than decoding
+high resolution or long GOP footage. Proxies are stored in the cache
+directory, under a name made from the uri, size and modification time of
+the source. Their uri is kept in the C{proxy_uri} of the factory and saved
+with the project.
+
+The factories decode the proxy while their C{use_proxy} is set, see
+L{SourceFactory.getDecodeArguments}. The L{RenderAction} unsets it, so the
+originals are always rendered.
+"""
+
+import os
+import hashlib
+
+import gobject
+import gst
+
+from pitivi.backgroundjobs import BackgroundJobQueue
+from pitivi.settings import xdg_cache_home
+from pitivi.elements.singledecodebin import SingleDecodeBin
+from pitivi.utils import quote_uri
+
+PROXY_HEIGHT = 540
+PROXY_QUALITY = 85
+PROGRESS_INTERVAL = 1000
+
+
+def get_proxy_filename(uri):
+    """
+    Return the file where the proxy of C{uri} is stored.
+
+    The size and modification time of the source are part of the name, so
+    a file replaced at the same location gets a new proxy.
+    """
+    directory = os.path.join(xdg_cache_home(), "pitivi", "proxies")
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    key = uri
+    if gst.uri_is_valid(uri) and gst.uri_get_protocol(uri) == "file":
+        try:
+            stat = os.stat(gst.uri_get_location(uri))
+        except OSError:
+            pass
+        else:
+            key = "%s\0%d\0%r" % (uri, stat.st_size, stat.st_mtime)
+
+    return os.path.join(directory, hashlib.md5(key).hexdigest() + ".mkv")
+
+
+def get_proxy_caps(stream, height=PROXY_HEIGHT):
+    """
+    Return the caps of the proxy of C{stream}: at most C{height} lines, with
+    the same display aspect ratio.
+
+    @type stream: L{VideoStream}
+    """
+    height = min(stream.height, height)
+    width = int(round(stream.width * height / float(stream.height)))
+    # most encoders want even sizes
+    width += width % 2
+    height += height % 2
+
+    return gst.Caps("video/x-raw-yuv, width=(int)%d, height=(int)%d, "
+            "pixel-aspect-ratio=(fraction)%d/%d" % (width, height,
+            stream.par.num, stream.par.denom))
+
+
+def needs_proxy(factory, height=PROXY_HEIGHT):
+    """
+    Whether a proxy would make editing C{factory} lighter: it has a video
+    stream taller than the proxies.
+    """
+    stream = factory.getProxyStream()
+    return stream is not None and stream.height is not None and \
+            stream.height > height
+
+
+class ProxyMaker(BackgroundJobQueue):
+    """
+    Makes the proxies of sources, one source at a time, see
+    L{BackgroundJobQueue}.
+
+    The factories that need a proxy are queued with L{add}. If their proxy
+    already exists in the cache it's used right away, otherwise it's made
+    once the previous ones are done. Nothing is made until L{enabled} is
+    set.
+
+    The "proxy-done" signal is emitted when the proxy of a factory is set,
+    and "progress" from time to time while it's made.
+
+    @ivar enabled: Whether proxies are made.
+    @type enabled: C{bool}
+    @ivar height: The height of the proxies.
+    @type height: C{int}
+    """
+
+    __signals__ = {
+        "proxy-done": ["factory"],
+        "progress": ["factory", "fraction"],
+        }
+
+    job_name = "proxy"
+
+    def __init__(self, enabled=False, height=PROXY_HEIGHT):
+        BackgroundJobQueue.__init__(self)
+        self.enabled = enabled
+        self.height = height
+        self._progress_id = 0
+
+    def add(self, factory):
+        """
+        Give C{factory} a proxy, if it needs one.
+
+        @return: Whether the factory needs a proxy.
+        @rtype: C{bool}
+        """
+        if not needs_proxy(factory, self.height):
+            return False
+
+        filename = get_proxy_filename(factory.uri)
+        if os.path.exists(filename):
+            self._setFile(factory, filename)
+            return True
+
+        return BackgroundJobQueue.add(self, factory)
+
+    def setEnabled(self, enabled):
+        self.enabled = enabled
+        self._schedule()
+
+    def _canRun(self):
+        return self.enabled and BackgroundJobQueue._canRun(self)
+
+    def _getFilename(self, factory):
+        return get_proxy_filename(factory.uri)
+
+    def _setFile(self, factory, filename):
+        factory.proxy_uri = quote_uri("file://" + filename)
+        self.emit("proxy-done", factory)
+
+    def _start(self, factory, filename):
+        stream = factory.getProxyStream()
+        pipeline = gst.Pipeline("ProxyMaker-%s" % factory.uri)
+        dbin = SingleDecodeBin(uri=factory.uri, caps=stream.caps,
+                stream=stream)
+        csp = gst.element_factory_make("ffmpegcolorspace")
+        scale = gst.element_factory_make("videoscale")
+        capsfilter = gst.element_factory_make("capsfilter")
+        capsfilter.props.caps = get_proxy_caps(stream, self.height)
+        # every frame is a keyframe
+        encoder = gst.element_factory_make("jpegenc")
+        encoder.props.quality = PROXY_QUALITY
+        mux = gst.element_factory_make("matroskamux")
+        sink = gst.element_factory_make("filesink")
+        sink.props.location = self._getPartFilename()
+
+        pipeline.add(dbin, csp, scale, capsfilter, encoder, mux, sink)
+        gst.element_link_many(csp, scale, capsfilter, encoder, mux, sink)
+        dbin.connect("pad-added", self._padAddedCb, csp)
+        self._watchPipeline(pipeline, {"eos": self._busEosCb})
+
+        self._progress_id = gobject.timeout_add(PROGRESS_INTERVAL,
+                self._progressCb)
+        if pipeline.set_state(gst.STATE_PLAYING) == gst.STATE_CHANGE_FAILURE:
+            self._finish(False)
+
+    def _padAddedCb(self, unused_dbin, pad, csp):
+        # called from a streaming thread
+        pad.link(csp.get_pad("sink"))
+
+    def _progressCb(self):
+        factory = self._current[0]
+        try:
+            position = self._pipeline.query_position(gst.FORMAT_TIME)[0]
+        except gst.QueryError:
+            return True
+
+        if factory.duration and factory.duration != gst.CLOCK_TIME_NONE:
+            fraction = min(1.0, position / float(factory.duration))
+            self.emit("progress", factory, fraction)
+
+        return True
+
+    def _busEosCb(self, unused_bus, unused_message):
+        self._finish(True)
+
+    def _stop(self):
+        if self._progress_id:
+            gobject.source_remove(self._progress_id)
+            self._progress_id = 0
@@ -41,9 +41,11 @@ class receiver(object):
             rd.sender = None
             rd.sigids = {}
         if not (value is None):
+            # don't let the sender keep the instance alive, Signallables
+            # support weak connections
+            connect = getattr(value, "connect_weak", value.connect)
             for sig, hdlr in self.handlers.iteritems():
-                rd.sigids[sig] = value.connect(sig, MethodType(hdlr,
-                    instance))
+                rd.sigids[sig] = connect(sig, MethodType(hdlr, instance))
             rd.sender = value
         if self.setter:
             self.setter(instance)
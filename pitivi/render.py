@@ -0,0 +1,557 @@
+# PiTiVi , Non-linear video editor
+#
+#       render.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+"""
+Rendering of projects without a user interface.
+
+Does what the L{EncodingDialog} does, on a pipeline of its own: the project
+is loaded through the L{ProjectManager}, its export settings are adjusted
+from the command line and the timeline is rendered with a L{RenderAction}.
+
+Progress is written to stdout as one JSON object per line, so that render
+farms can follow it; everything else goes to stderr.
+"""
+
+import os
+import sys
+import time
+from optparse import OptionParser
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+import gobject
+import gst
+
+from pitivi.log.loggable import Loggable
+from pitivi.action import render_action_for_uri
+from pitivi.effects import EffectsHandler
+from pitivi.pipeline import Pipeline, PipelineError
+from pitivi.projectmanager import ProjectManager
+from pitivi.renderstats import RenderStats
+from pitivi.settings import export_settings_to_render_settings
+from pitivi.stream import AudioStream, VideoStream
+from pitivi.utils import quote_uri
+
+# how often progress is reported, in milliseconds
+PROGRESS_INTERVAL = 500
+
+
+def path_to_uri(path):
+    """
+    Return the URI of C{path}, which may already be one.
+    """
+    if gst.uri_is_valid(path):
+        return path
+    return quote_uri("file://%s" % os.path.abspath(path))
+
+
+def parse_fraction(value):
+    """
+    Parse a frame rate or pixel aspect ratio like C{25} or C{30000/1001}.
+
+    @rtype: C{gst.Fraction}
+    @raise ValueError: If C{value} isn't a positive fraction.
+    """
+    if "/" in value:
+        num, denom = value.split("/", 1)
+    else:
+        num, denom = value, "1"
+    fraction = gst.Fraction(int(num), int(denom))
+    if fraction.num <= 0 or fraction.denom <= 0:
+        raise ValueError("%s isn't a positive fraction" % value)
+    return fraction
+
+
+def parse_property(value):
+    """
+    Parse an element property given as C{NAME=VALUE}.
+
+    Values are converted to C{int}, C{float} or C{bool} when they look like
+    one, and kept as strings otherwise.
+
+    @rtype: C{tuple} of C{str} and the value
+    @raise ValueError: If C{value} has no C{=}.
+    """
+    if "=" not in value:
+        raise ValueError("%s should be NAME=VALUE" % value)
+
+    name, value = value.split("=", 1)
+    for klass in (int, float):
+        try:
+            return name, klass(value)
+        except ValueError:
+            pass
+    if value.lower() in ("true", "false"):
+        return name, value.lower() == "true"
+    return name, value
+
+
+def apply_overrides(settings, options):
+    """
+    Return a copy of C{settings} changed by the command line C{options}.
+
+    Options that weren't given are C{None} and leave the setting of the
+    project alone.
+
+    @type settings: L{ExportSettings}
+    @rtype: L{ExportSettings}
+    """
+    settings = settings.copy()
+    if options.width is not None:
+        settings.videowidth = options.width
+    if options.height is not None:
+        settings.videoheight = options.height
+    if options.framerate is not None:
+        settings.videorate = parse_fraction(options.framerate)
+    if options.par is not None:
+        settings.videopar = parse_fraction(options.par)
+    if options.channels is not None:
+        settings.audiochannels = options.channels
+    if options.samplerate is not None:
+        settings.audiorate = options.samplerate
+    if options.depth is not None:
+        settings.audiodepth = options.depth
+    if options.muxer is not None:
+        settings.muxer = options.muxer
+        settings.containersettings = {}
+    if options.vencoder is not None:
+        settings.vencoder = options.vencoder
+        settings.vcodecsettings = {}
+    if options.aencoder is not None:
+        settings.aencoder = options.aencoder
+        settings.acodecsettings = {}
+    if not options.video:
+        settings.vencoder = None
+    if not options.audio:
+        settings.aencoder = None
+
+    for value in options.muxer_properties:
+        name, value = parse_property(value)
+        settings.containersettings[name] = value
+    for value in options.vencoder_properties:
+        name, value = parse_property(value)
+        settings.vcodecsettings[name] = value
+    for value in options.aencoder_properties:
+        name, value = parse_property(value)
+        settings.acodecsettings[name] = value
+
+    return settings
+
+
+def settings_to_arguments(settings):
+    """
+    Return the command line options that make L{apply_overrides} turn any
+    settings into C{settings}.
+
+    @type settings: L{ExportSettings}
+    @rtype: C{list} of C{str}
+    """
+    args = ["--width", str(settings.videowidth),
+            "--height", str(settings.videoheight),
+            "--framerate", "%d/%d" % (settings.videorate.num,
+                settings.videorate.denom),
+            "--par", "%d/%d" % (settings.videopar.num, settings.videopar.denom),
+            "--channels", str(settings.audiochannels),
+            "--samplerate", str(settings.audiorate),
+            "--depth", str(settings.audiodepth),
+            "--muxer", settings.muxer]
+    if settings.vencoder is None:
+        args.append("--no-video")
+    else:
+        args.extend(["--vencoder", settings.vencoder])
+    if settings.aencoder is None:
+        args.append("--no-audio")
+    else:
+        args.extend(["--aencoder", settings.aencoder])
+
+    for option, properties in (("--muxer-property", settings.containersettings),
+            ("--vencoder-property", settings.vcodecsettings),
+            ("--aencoder-property", settings.acodecsettings)):
+        for name, value in sorted(properties.iteritems()):
+            args.extend([option, "%s=%s" % (name, value)])
+
+    return args
+
+
+def check_elements(settings):
+    """
+    Return the names of the elements used by C{settings} that aren't
+    installed.
+    """
+    missing = []
+    for name in (settings.muxer, settings.vencoder, settings.aencoder):
+        if name is not None and gst.element_factory_find(name) is None:
+            missing.append(name)
+    return missing
+
+
+def get_stream_types(timeline):
+    """
+    Return whether C{timeline} has video and audio to render.
+
+    @rtype: C{tuple} of two C{bool}
+    """
+    have_video = have_audio = False
+    for track in timeline.tracks:
+        if track.duration == 0:
+            continue
+        if isinstance(track.stream, VideoStream):
+            have_video = True
+        elif isinstance(track.stream, AudioStream):
+            have_audio = True
+    return have_video, have_audio
+
+
+def format_event(event, **fields):
+    """
+    Return the progress line of C{event}, a JSON object with an C{event}
+    key and C{fields}.
+    """
+    fields["event"] = event
+    return json.dumps(fields, sort_keys=True)
+
+
+class ProjectRenderer(Loggable):
+    """
+    Loads a project and renders its timeline to a file, running its own main
+    loop.
+
+    Only the C{[start, end)} range of the timeline is rendered if given.
+
+    @ivar settings: The settings used, known once the project is loaded.
+    @type settings: L{ExportSettings}
+    @ivar error: Why the render failed, if it did.
+    @type error: C{str}
+    """
+
+    def __init__(self, project_uri, output_uri, options=None,
+            out=sys.stdout, interval=PROGRESS_INTERVAL, start=None, end=None):
+        """
+        @param options: The command line options overriding the export
+        settings of the project, see L{apply_overrides}.
+        @param start: Where to start rendering, defaults to the beginning
+        of the timeline.
+        @param end: Where to stop rendering, defaults to the end of the
+        timeline.
+        @param out: Where to write the progress lines.
+        @param interval: How often to report progress, in milliseconds.
+        """
+        Loggable.__init__(self)
+        self.project_uri = project_uri
+        self.output_uri = output_uri
+        self.options = options
+        self.out = out
+        self.interval = interval
+        self.settings = None
+        self.error = None
+        self.project = None
+        self.pipeline = None
+        self.action = None
+        self.stats = None
+        self.mainloop = gobject.MainLoop()
+        self.start = start
+        self.end = end
+        self._duration = 0
+        self._started = 0
+
+        self.manager = ProjectManager(EffectsHandler())
+        self.manager.connect("new-project-loaded", self._projectLoadedCb)
+        self.manager.connect("new-project-failed", self._projectFailedCb)
+        self.manager.connect("missing-uri", self._missingUriCb)
+
+    def run(self):
+        """
+        Render the project.
+
+        @return: Whether the file was rendered.
+        @rtype: C{bool}
+        """
+        self._report("loading", project=self.project_uri)
+        gobject.idle_add(self._loadCb)
+        self.mainloop.run()
+        self._cleanUp()
+        return self.error is None
+
+    def _report(self, event, **fields):
+        self.out.write(format_event(event, **fields) + "\n")
+        self.out.flush()
+
+    def _fail(self, message):
+        self.error = message
+        self._report("error", message=message)
+        self.mainloop.quit()
+
+    def _loadCb(self):
+        self.manager.loadProject(self.project_uri)
+        return False
+
+    def _missingUriCb(self, unused_manager, unused_formatter, uri,
+            unused_factory):
+        self._report("missing", uri=uri)
+        # don't remap anything, the formatter fails right after
+        return False
+
+    def _projectFailedCb(self, unused_manager, uri, exception):
+        self._fail("couldn't load %s: %s" % (uri, exception))
+
+    def _projectLoadedCb(self, unused_manager, project):
+        self.project = project
+        # the project comes with a preview pipeline, it's left unused
+        have_video, have_audio = get_stream_types(project.timeline)
+        if not have_video and not have_audio:
+            self._fail("the timeline is empty")
+            return
+
+        settings = project.getSettings()
+        if self.options is not None:
+            settings = apply_overrides(settings, self.options)
+        missing = check_elements(settings)
+        if missing:
+            self._fail("missing elements: %s" % ", ".join(missing))
+            return
+        self.settings = settings
+
+        try:
+            self._startRender(have_video, have_audio)
+        except PipelineError, e:
+            self._fail("couldn't start rendering: %s" % e)
+
+    def _startRender(self, have_video, have_audio):
+        self.info("rendering %s to %s", self.project_uri, self.output_uri)
+        for factory in self.project.sources.getSources():
+            factory.setFilterCaps(self.settings.getVideoCaps())
+
+        render_settings = export_settings_to_render_settings(self.settings,
+                have_video, have_audio)
+        self.pipeline = Pipeline()
+        self.pipeline.connect("eos", self._eosCb)
+        self.pipeline.connect("error", self._errorCb)
+        self.pipeline.connect("position", self._positionCb)
+        self.action = render_action_for_uri(self.output_uri,
+                render_settings, self.project.factory)
+        self.pipeline.addAction(self.action)
+        self.action.activate()
+        if self.options is not None and self.options.stats is not None:
+            self.stats = RenderStats(self.pipeline, self.options.stats)
+            self.stats.attach()
+
+        self._duration = self.project.timeline.duration
+        if self.start is None:
+            self.start = 0
+        if self.end is None or self.end > self._duration:
+            self.end = self._duration
+        if self.start >= self.end:
+            self._fail("nothing to render between %s and %s" %
+                    (gst.TIME_ARGS(self.start), gst.TIME_ARGS(self.end)))
+            return
+
+        self._report("started", output=self.output_uri,
+                duration=self._duration, start=self.start, end=self.end,
+                video=have_video, audio=have_audio)
+        self._started = time.time()
+        self.pipeline.activatePositionListener(self.interval)
+        if self.start == 0 and self.end == self._duration:
+            self.pipeline.play()
+        else:
+            # the range can only be seeked to once the pipeline is prerolled
+            self.pipeline.connect("state-changed", self._stateChangedCb)
+            self.pipeline.pause()
+
+    def _stateChangedCb(self, pipeline, state):
+        if state != gst.STATE_PAUSED:
+            return
+
+        pipeline.disconnect_by_function(self._stateChangedCb)
+        try:
+            pipeline.seekRange(self.start, self.end)
+            pipeline.play()
+        except PipelineError, e:
+            self._fail("couldn't seek to %s: %s" %
+                    (gst.TIME_ARGS(self.start), e))
+
+    def _positionCb(self, unused_pipeline, position):
+        position = max(self.start, min(position, self.end))
+        fields = {}
+        if self.stats is not None:
+            row = self.stats.sample(position)
+            for name in ("fps", "realtime", "encoder_share"):
+                fields[name] = row[name]
+        self._report("progress", position=position,
+                duration=self._duration,
+                fraction=float(position - self.start) /
+                    (self.end - self.start),
+                elapsed=time.time() - self._started, **fields)
+
+    def _eosCb(self, unused_pipeline):
+        fields = {}
+        if self.stats is not None:
+            fields = self.stats.getSummary()
+        self._report("done", output=self.output_uri,
+                duration=self._duration, start=self.start, end=self.end,
+                elapsed=time.time() - self._started, **fields)
+        self.mainloop.quit()
+
+    def _errorCb(self, unused_pipeline, error, detail):
+        self._fail("%s (%s)" % (error.message, detail))
+
+    def _cleanUp(self):
+        if self.stats is not None:
+            self.stats.close()
+            self.stats = None
+
+        if self.pipeline is not None:
+            self.pipeline.deactivatePositionListener()
+            self.pipeline.stop()
+            self.action.deactivate()
+            self.pipeline.removeAction(self.action)
+            self.pipeline.release()
+            self.pipeline = None
+            self.action = None
+
+        if self.project is not None:
+            self.manager.closeRunningProject()
+            self.project = None
+
+
+def make_option_parser():
+    parser = OptionParser(usage="%prog [options] PROJECT OUTPUT",
+            description="Render the timeline of the pitivi project PROJECT "
+            "to OUTPUT, with the export settings saved in the project unless "
+            "overridden. Progress is written to stdout as JSON, one object "
+            "per line.")
+    parser.add_option("-f", "--force", action="store_true", default=False,
+            help="overwrite OUTPUT if it exists")
+    parser.add_option("--progress-interval", type="int",
+            default=PROGRESS_INTERVAL, metavar="MS",
+            help="how often to report progress [default: %default]")
+    parser.add_option("-j", "--jobs", type="int", default=1,
+            help="render that many parts of the timeline at the same time, "
+            "in separate processes [default: %default]")
+    parser.add_option("--smart", action="store_true", default=False,
+            help="copy the clips shown as is instead of rendering them "
+            "again; this only applies to files encoded with the very same "
+            "settings as OUTPUT, codec headers included, which is checked "
+            "by rendering a few frames first")
+    parser.add_option("--stats", metavar="FILE",
+            help="write statistics about the render to FILE, as CSV")
+    parser.add_option("--start", type="long", metavar="NS",
+            help="render from this position of the timeline, in nanoseconds")
+    parser.add_option("--end", type="long", metavar="NS",
+            help="render up to this position of the timeline, in "
+            "nanoseconds")
+
+    parser.add_option("--muxer", help="the muxer element, like oggmux")
+    parser.add_option("--vencoder", help="the video encoder element")
+    parser.add_option("--aencoder", help="the audio encoder element")
+    parser.add_option("--muxer-property", action="append", default=[],
+            dest="muxer_properties", metavar="NAME=VALUE",
+            help="set a property of the muxer, can be repeated")
+    parser.add_option("--vencoder-property", action="append", default=[],
+            dest="vencoder_properties", metavar="NAME=VALUE",
+            help="set a property of the video encoder, can be repeated")
+    parser.add_option("--aencoder-property", action="append", default=[],
+            dest="aencoder_properties", metavar="NAME=VALUE",
+            help="set a property of the audio encoder, can be repeated")
+    parser.add_option("--no-video", action="store_false", dest="video",
+            default=True, help="only render the audio")
+    parser.add_option("--no-audio", action="store_false", dest="audio",
+            default=True, help="only render the video")
+
+    parser.add_option("--width", type="int")
+    parser.add_option("--height", type="int")
+    parser.add_option("--framerate", metavar="NUM[/DENOM]")
+    parser.add_option("--par", metavar="NUM[/DENOM]",
+            help="the pixel aspect ratio")
+    parser.add_option("--channels", type="int")
+    parser.add_option("--samplerate", type="int")
+    parser.add_option("--depth", type="int")
+    return parser
+
+
+def check_options(parser, options):
+    """
+    Exit through C{parser.error} if the options don't make sense together.
+    """
+    if not options.video and not options.audio:
+        parser.error("--no-video and --no-audio leave nothing to render")
+    for option in ("framerate", "par"):
+        value = getattr(options, option)
+        if value is not None:
+            try:
+                parse_fraction(value)
+            except ValueError:
+                parser.error("invalid --%s: %s" % (option, value))
+    if options.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if (options.jobs > 1 or options.smart) and (options.start is not None or
+            options.end is not None):
+        parser.error("--jobs and --smart can't be used with --start or --end")
+    if (options.jobs > 1 or options.smart) and options.stats is not None:
+        parser.error("--stats can't be used with --jobs or --smart")
+    if options.start is not None and options.start < 0:
+        parser.error("--start can't be negative")
+    if options.start is not None and options.end is not None and \
+            options.start >= options.end:
+        parser.error("--start must be before --end")
+    for value in options.muxer_properties + options.vencoder_properties + \
+            options.aencoder_properties:
+        if "=" not in value:
+            parser.error("%s should be NAME=VALUE" % value)
+
+
+def main(argv):
+    parser = make_option_parser()
+    options, args = parser.parse_args(argv[1:])
+    if len(args) != 2:
+        parser.error("a project and an output file are needed")
+    check_options(parser, options)
+
+    project, output = args
+    if not gst.uri_is_valid(output) and os.path.exists(output) and \
+            not options.force:
+        parser.error("%s exists, use --force to overwrite it" % output)
+
+    if options.smart:
+        # imported here, it uses this module
+        from pitivi.smartrender import SmartRenderer
+        renderer = SmartRenderer(path_to_uri(project), path_to_uri(output),
+                options, interval=options.progress_interval,
+                jobs=options.jobs)
+    elif options.jobs > 1:
+        # imported here, it uses this module
+        from pitivi.parallelrender import ParallelRenderer
+        renderer = ParallelRenderer(path_to_uri(project), path_to_uri(output),
+                options, interval=options.progress_interval,
+                jobs=options.jobs)
+    else:
+        renderer = ProjectRenderer(path_to_uri(project), path_to_uri(output),
+                options, interval=options.progress_interval,
+                start=options.start, end=options.end)
+    try:
+        if not renderer.run():
+            print >> sys.stderr, renderer.error
+            return 1
+    except KeyboardInterrupt:
+        renderer._cleanUp()
+        return 1
+
+    return 0
@@ -0,0 +1,611 @@
+# PiTiVi , Non-linear video editor
+#
+#       rendercache.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+"""
+Pre-rendered regions of the timeline, played instead of the clips they're
+made of.
+
+The regions of a video track where effects, transitions or stacked clips
+have to be composited are rendered in the background, with
+C{pitivi-render}, to motion JPEG files in the cache directory. Once a
+region is rendered, its file is added to the composition of the track on top
+of the clips, and the effects and transitions of the region are left out of
+it.
+
+A region only spans the time where something is actually composited, so a
+chain of transitions gives one short region per transition. gnonlin can
+only leave whole objects out of a composition: the clips that start or end
+outside of a region keep playing under the rendered file, which hides them.
+
+Each region is identified by a hash of everything that makes up its
+picture, see L{get_region_key}. An edit that touches a region changes its
+key, which makes the file stale: the clips are put back into the
+composition right away, the file is removed and the region is rendered again
+once the edits stop. Files with the same key are reused across sessions, the
+least recently used ones are removed when the cache grows past
+L{MAX_CACHE_SIZE}.
+"""
+
+import os
+import hashlib
+
+import gobject
+import gst
+
+from pitivi.log.loggable import Loggable
+from pitivi.signalinterface import Signallable
+from pitivi.settings import xdg_cache_home
+from pitivi.stream import VideoStream
+from pitivi.timeline.track import SourceTrackObject, TrackEffect, \
+        VideoTransition
+from pitivi.elements.singledecodebin import SingleDecodeBin
+from pitivi.parallelrender import RangeWorker
+from pitivi.pipeline import PipelineError
+from pitivi.smartrender import SourceScanner
+from pitivi.utils import quote_uri
+
+# above the clips and the transitions of the first layer, below the mixer
+CACHE_PRIORITY = 1
+# how long to wait after the last edit before rendering, in milliseconds
+RENDER_DELAY = 3000
+# the size the rendered files are allowed to take, in bytes
+MAX_CACHE_SIZE = 2 * 1024 * 1024 * 1024
+
+
+def get_cache_directory():
+    directory = os.path.join(xdg_cache_home(), "pitivi", "render-cache")
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    return directory
+
+
+def get_cache_settings(settings):
+    """
+    Return the settings the regions are rendered with: the video of
+    C{settings}, encoded to motion JPEG so that every frame is a keyframe.
+
+    @type settings: L{ExportSettings}
+    """
+    settings = settings.copy()
+    settings.vencoder = "jpegenc"
+    settings.vcodecsettings = {}
+    settings.aencoder = None
+    settings.acodecsettings = {}
+    settings.muxer = "matroskamux"
+    settings.containersettings = {}
+    return settings
+
+
+def find_cache_file(key):
+    """
+    Return the file rendered for the region with C{key} and the timestamp
+    its frames start at, or C{None}.
+    """
+    prefix = key + "-"
+    for name in os.listdir(get_cache_directory()):
+        if name.startswith(prefix) and name.endswith(".mkv"):
+            try:
+                media_start = long(name[len(prefix):-len(".mkv")])
+            except ValueError:
+                continue
+            return os.path.join(get_cache_directory(), name), media_start
+
+    return None
+
+
+def touch_cache_file(filename):
+    """
+    Mark a rendered file as used, so that L{trim_cache} removes it last.
+    """
+    try:
+        os.utime(filename, None)
+    except OSError:
+        pass
+
+
+def trim_cache(max_size, keep=()):
+    """
+    Remove the least recently used rendered files until they take at most
+    C{max_size} bytes.
+
+    @param keep: The files that must not be removed.
+    @return: The removed files.
+    @rtype: C{list} of C{str}
+    """
+    directory = get_cache_directory()
+    files = []
+    for name in os.listdir(directory):
+        if not name.endswith(".mkv"):
+            continue
+        filename = os.path.join(directory, name)
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, filename))
+
+    size = sum([file_size for mtime, file_size, filename in files])
+    removed = []
+    for mtime, file_size, filename in sorted(files):
+        if size <= max_size:
+            break
+        if filename in keep:
+            continue
+        try:
+            os.unlink(filename)
+        except OSError:
+            continue
+        size -= file_size
+        removed.append(filename)
+
+    return removed
+
+
+def _end(track_object):
+    return track_object.start + track_object.duration
+
+
+def get_heavy_regions(track):
+    """
+    Return the regions of C{track} where more than one clip is decoded or an
+    effect is applied.
+
+    @return: The C{(start, end, track_objects)} of the regions, where
+    C{track_objects} are the active clips and effects that overlap the
+    region, some of which may start before it or end after it.
+    @rtype: C{list} of C{tuple}
+    """
+    objects = [obj for obj in track.track_objects if obj.active]
+    sources = sorted([obj for obj in objects
+            if isinstance(obj, SourceTrackObject)],
+            key=lambda obj: obj.start)
+
+    spans = [[obj.start, _end(obj)] for obj in objects
+            if isinstance(obj, TrackEffect)]
+    # stacked clips are composited, transitions are stacked clips too
+    for index, first in enumerate(sources):
+        for second in sources[index + 1:]:
+            if second.start >= _end(first):
+                break
+            spans.append([second.start, min(_end(first), _end(second))])
+
+    regions = []
+    for span in sorted(spans):
+        if regions and span[0] <= regions[-1][1]:
+            regions[-1][1] = max(regions[-1][1], span[1])
+        else:
+            regions.append(span)
+
+    return [(start, end, [obj for obj in objects
+            if obj.start < end and _end(obj) > start])
+            for start, end in regions]
+
+
+def _describe(track_object):
+    factory = track_object.factory
+    description = [track_object.__class__.__name__,
+            getattr(factory, "uri", None) or factory.name,
+            track_object.start, track_object.duration, track_object.in_point,
+            track_object.media_duration, track_object.priority]
+
+    if isinstance(track_object, TrackEffect):
+        element = track_object.getElement()
+        properties = []
+        for prop in gobject.list_properties(element):
+            if prop.name in ("name", "parent") or \
+                    not prop.flags & gobject.PARAM_READABLE:
+                continue
+            properties.append((prop.name,
+                    str(element.get_property(prop.name))))
+        description.append(sorted(properties))
+
+    for name, (prop, interpolator) in \
+            sorted(track_object.getInterpolators().items()):
+        description.append((name, [(keyframe.time, keyframe.value,
+                keyframe.mode) for keyframe in interpolator.getKeyframes()]))
+
+    return description
+
+
+def get_region_key(start, end, track_objects, settings):
+    """
+    Return a hash of what the picture of a region is made of: the clips and
+    effects in it, their keyframes, and the video settings.
+    """
+    description = [start, end, settings.videowidth, settings.videoheight,
+            settings.videorate.num, settings.videorate.denom,
+            settings.videopar.num, settings.videopar.denom]
+    for track_object in sorted(track_objects,
+            key=lambda obj: (obj.start, obj.priority)):
+        description.append(_describe(track_object))
+
+    return hashlib.md5(repr(description)).hexdigest()
+
+
+class CachedRegion(object):
+    """
+    A region of a video track that can be played from a file.
+
+    @ivar filename: The file rendered for the region, if any.
+    @type filename: C{str}
+    @ivar media_start: The timestamp the frames of the file start at.
+    @type media_start: C{long}
+    @ivar failed: Whether rendering the region failed.
+    @type failed: C{bool}
+    @ivar gnl_object: The source playing the file in the composition of the
+    track, while it's used.
+    """
+
+    def __init__(self, track, start, end, track_objects, key):
+        self.track = track
+        self.start = start
+        self.end = end
+        self.track_objects = track_objects
+        self.key = key
+        self.filename = None
+        self.media_start = 0
+        self.failed = False
+        self.gnl_object = None
+        self._cached = []
+        self._transitions = []
+
+    valid = property(lambda self: self.filename is not None)
+
+    def apply(self):
+        """
+        Play the file on top of the clips of the region, and leave the
+        objects that are entirely inside the region out of the composition.
+        """
+        if self.gnl_object is not None:
+            return
+
+        uri = quote_uri("file://" + self.filename)
+        self.gnl_object = gst.element_factory_make("gnlsource",
+                "render-cache-%s" % self.key)
+        self.gnl_object.add(SingleDecodeBin(uri=uri,
+                caps=gst.Caps("video/x-raw-yuv;video/x-raw-rgb")))
+        self.gnl_object.props.start = self.start
+        self.gnl_object.props.duration = self.end - self.start
+        self.gnl_object.props.media_start = self.media_start
+        self.gnl_object.props.media_duration = self.end - self.start
+        self.gnl_object.props.priority = CACHE_PRIORITY
+
+        # the objects sticking out of the region are still needed around it
+        self._cached = [track_object for track_object in self.track_objects
+                if self.start <= track_object.start and
+                _end(track_object) <= self.end]
+        for track_object in self._cached:
+            track_object.setCached(True)
+        self._transitions = [transition.operation
+                for transition in self.track.transitions.itervalues()
+                if isinstance(transition, VideoTransition) and
+                self.start <= transition.start and
+                transition.start + transition.duration <= self.end]
+        for operation in self._transitions:
+            operation.props.active = False
+        self.track.composition.add(self.gnl_object)
+
+    def unapply(self):
+        """
+        Play the clips of the region again.
+        """
+        if self.gnl_object is None:
+            return
+
+        self.track.composition.remove(self.gnl_object)
+        self.gnl_object.set_state(gst.STATE_NULL)
+        self.gnl_object = None
+        for track_object in self._cached:
+            track_object.setCached(False)
+        self._cached = []
+        for operation in self._transitions:
+            operation.props.active = True
+        self._transitions = []
+
+
+class RenderCache(Signallable, Loggable):
+    """
+    Renders the heavy regions of the timeline of a project and plays them
+    from the rendered files while previewing.
+
+    L{update} must be called after each edit. Nothing happens until
+    L{setEnabled} is called.
+
+    The "changed" signal is emitted when regions are added, removed,
+    rendered or invalidated, "progress" while a region is rendered.
+
+    @ivar regions: The heavy regions of the timeline, sorted by start.
+    @type regions: C{list} of L{CachedRegion}
+    @ivar rendering: The region being rendered.
+    @type rendering: L{CachedRegion}
+    """
+
+    __signals__ = {
+        "changed": [],
+        "progress": ["region", "fraction"],
+        }
+
+    def __init__(self, project):
+        """
+        @type project: L{Project}
+        """
+        Loggable.__init__(self)
+        self.project = project
+        self.enabled = False
+        self.regions = []
+        self.rendering = None
+        self._worker = None
+        self._scanner = None
+        self._render_id = 0
+        self._swap_pending = False
+        project.connect("settings-changed", self._settingsChangedCb)
+        project.timeline.connect("preview-changed", self._previewChangedCb)
+        project.pipeline.connect("state-changed",
+                self._pipelineStateChangedCb)
+
+    def setEnabled(self, enabled):
+        self.enabled = enabled
+        if enabled:
+            self.update()
+        else:
+            self._stopRender()
+            regions = self.regions
+            self.regions = []
+            self._swapRegions(regions)
+            self.emit("changed")
+
+    def getRegions(self):
+        """
+        Return the C{(start, end, valid)} of the regions, for display.
+        """
+        return [(region.start, region.end, region.valid)
+                for region in self.regions]
+
+    def update(self):
+        """
+        Find the heavy regions of the timeline again, stop using the files
+        of the regions that were edited and schedule their rendering.
+        """
+        if not self.enabled:
+            return
+
+        settings = self.project.getSettings()
+        old_regions = dict((region.key, region) for region in self.regions)
+        regions = []
+        for track in self.project.timeline.tracks:
+            if not isinstance(track.stream, VideoStream):
+                continue
+            for start, end, track_objects in get_heavy_regions(track):
+                key = get_region_key(start, end, track_objects, settings)
+                region = old_regions.pop(key, None)
+                if region is None:
+                    region = CachedRegion(track, start, end, track_objects,
+                            key)
+                    found = find_cache_file(key)
+                    if found is not None:
+                        region.filename, region.media_start = found
+                        touch_cache_file(region.filename)
+                regions.append(region)
+
+        self.regions = sorted(regions, key=lambda region: region.start)
+        self._swapRegions(old_regions.values())
+
+        for region in old_regions.itervalues():
+            self.debug("region %s is stale", region.key)
+            if region is self.rendering:
+                self._stopRender()
+            if region.valid:
+                self._removeFile(region)
+
+        self.emit("changed")
+        self._scheduleRender()
+
+    def _settingsChangedCb(self, project, old, new):
+        self.update()
+
+    def _previewChangedCb(self, timeline, preview):
+        self._swapRegions()
+
+    def _pipelineStateChangedCb(self, pipeline, state):
+        if self._swap_pending and state != gst.STATE_PLAYING:
+            self._swap_pending = False
+            self._swapRegions()
+
+    def _swapRegions(self, stale=()):
+        """
+        Play the rendered files of the regions if the timeline is previewed,
+        and stop playing the files of the C{stale} regions.
+
+        The bins of a composition can only be changed while the pipeline is
+        stopped. While playing, new files are only used once playback stops,
+        stale files are replaced right away since they don't show the
+        timeline anymore.
+        """
+        preview = self.project.timeline.preview
+        unapplied = [region for region in stale
+                if region.gnl_object is not None]
+        unapplied.extend([region for region in self.regions
+                if region.gnl_object is not None and not preview])
+        applied = [region for region in self.regions
+                if region.gnl_object is None and region.valid and preview]
+        if not unapplied and not applied:
+            return
+
+        pipeline = self.project.pipeline
+        state = pipeline.getState()
+        if state == gst.STATE_PLAYING and not unapplied:
+            self.debug("playing, %d files used once stopped", len(applied))
+            self._swap_pending = True
+            return
+
+        stopped = state in (gst.STATE_NULL, gst.STATE_READY)
+        if not stopped:
+            try:
+                position = pipeline.getPosition()
+            except PipelineError:
+                position = 0
+            pipeline.stop()
+
+        for region in unapplied:
+            region.unapply()
+        for region in applied:
+            region.apply()
+
+        if not stopped:
+            pipeline.pause()
+            pipeline.seek(position)
+            if state == gst.STATE_PLAYING:
+                pipeline.play()
+
+    def _scheduleRender(self):
+        if self._render_id:
+            gobject.source_remove(self._render_id)
+        self._render_id = gobject.timeout_add(RENDER_DELAY, self._renderCb)
+
+    def _renderCb(self):
+        self._render_id = 0
+        if not self.enabled or self.rendering is not None:
+            return False
+
+        for region in self.regions:
+            if not region.valid and not region.failed:
+                self._startRender(region)
+                break
+
+        return False
+
+    def _saveSnapshot(self):
+        # imported here to break a circular import
+        from pitivi.formatters.etree import ElementTreeFormatter
+        from pitivi.formatters.base import FormatterError
+
+        filename = os.path.join(get_cache_directory(),
+                "snapshot-%d.xptv" % os.getpid())
+        uri = quote_uri("file://" + filename)
+        formatter = ElementTreeFormatter(None)
+        try:
+            formatter.saveProject(self.project, uri, overwrite=True,
+                    backup=True)
+        except FormatterError, e:
+            self.warning("couldn't save a snapshot of the project: %s", e)
+            return None
+
+        return uri
+
+    def _startRender(self, region):
+        project_uri = self._saveSnapshot()
+        if project_uri is None:
+            region.failed = True
+            return
+
+        self.info("rendering region %s from %s to %s", region.key,
+                gst.TIME_ARGS(region.start), gst.TIME_ARGS(region.end))
+        self.rendering = region
+        filename = os.path.join(get_cache_directory(), region.key + ".part")
+        self._worker = RangeWorker(project_uri,
+                quote_uri("file://" + filename), region.start, region.end,
+                get_cache_settings(self.project.getSettings()),
+                self._workerCb)
+
+    def _stopRender(self):
+        if self._render_id:
+            gobject.source_remove(self._render_id)
+            self._render_id = 0
+        if self._worker is not None:
+            self._worker.kill()
+            self._worker = None
+        if self._scanner is not None:
+            self._scanner.stop()
+            self._scanner = None
+        if self.rendering is not None:
+            self._removePart(self.rendering)
+            self.rendering = None
+
+    def _removeFile(self, region):
+        try:
+            os.unlink(region.filename)
+        except OSError, e:
+            self.warning("couldn't remove %s: %s", region.filename, e)
+        region.filename = None
+
+    def _trimCache(self):
+        keep = [region.filename for region in self.regions if region.valid]
+        for filename in trim_cache(MAX_CACHE_SIZE, keep):
+            self.info("evicted %s from the cache", filename)
+
+    def _removePart(self, region):
+        filename = os.path.join(get_cache_directory(), region.key + ".part")
+        if os.path.exists(filename):
+            os.unlink(filename)
+
+    def _workerCb(self, worker, event):
+        if worker is not self._worker:
+            # killed
+            return
+
+        if event is not None:
+            if event["event"] == "progress":
+                self.emit("progress", self.rendering, worker.fraction)
+            return
+
+        self._worker = None
+        if worker.error is not None:
+            self._renderFailed("couldn't render: %s" % worker.error)
+            return
+
+        # the rendered frames may start at 0 or at the start of the region
+        filename = os.path.join(get_cache_directory(),
+                self.rendering.key + ".part")
+        self._scanner = SourceScanner(quote_uri("file://" + filename),
+                get_cache_settings(self.project.getSettings()))
+        self._scanner.connect("done", self._scannerDoneCb)
+        self._scanner.start()
+
+    def _scannerDoneCb(self, scanner, info, error):
+        scanner.stop()
+        if scanner is not self._scanner:
+            return
+
+        self._scanner = None
+        if error is not None or not info.keyframes:
+            self._renderFailed("couldn't read the rendered file: %s" % error)
+            return
+
+        region = self.rendering
+        self.rendering = None
+        media_start = info.keyframes[0]
+        filename = os.path.join(get_cache_directory(),
+                "%s-%d.mkv" % (region.key, media_start))
+        os.rename(os.path.join(get_cache_directory(), region.key + ".part"),
+                filename)
+        region.filename = filename
+        region.media_start = media_start
+        self._trimCache()
+        self._swapRegions()
+        self.emit("changed")
+        self._scheduleRender()
+
+    def _renderFailed(self, message):
+        region = self.rendering
+        self.warning("region %s: %s", region.key, message)
+        self._removePart(region)
+        region.failed = True
+        self.rendering = None
+        self.emit("changed")
+        self._scheduleRender()
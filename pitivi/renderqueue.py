@@ -0,0 +1,691 @@
+# PiTiVi , Non-linear video editor
+#
+#       renderqueue.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+"""
+Persistent queue of renders.
+
+Each job renders a project, or a range of it, with its own export settings
+in a C{pitivi-render} process. The jobs run in order, several at a time as
+long as the processes they use fit in a processor budget, and failed jobs
+are retried a few times.
+
+The queue is stored in a file shared by the processes using it: jobs can be
+added while the queue runs, and a queue that was stopped goes on where it
+was, the jobs that were running being started again. A single process is
+meant to run the queue at a time.
+"""
+
+import os
+import sys
+import fcntl
+import shutil
+import tempfile
+from optparse import OptionParser
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+import gobject
+import gst
+
+from pitivi.log.loggable import Loggable
+from pitivi.signalinterface import Signallable
+from pitivi.settings import get_dir, xdg_data_home
+from pitivi.render import make_option_parser, check_options, \
+        settings_to_arguments, format_event, path_to_uri
+from pitivi.parallelrender import RenderProcess
+from pitivi.threads import cpu_count
+
+QUEUE_VERSION = 1
+
+# how many times a failed job is started again
+DEFAULT_RETRIES = 2
+
+# how often the queue file is checked for changes made by other processes,
+# in milliseconds
+SYNC_INTERVAL = 2000
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+def _process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+class RenderJob(object):
+    """
+    A render in a L{RenderQueue}.
+
+    The range and the number of processes of the job are read from its
+    C{pitivi-render} options.
+
+    @ivar id: The number of the job in the queue, C{None} until added.
+    @type id: C{int}
+    @ivar arguments: The C{pitivi-render} options, see L{job_for_settings}.
+    @type arguments: C{list} of C{str}
+    @ivar snapshot_uri: The copy of the project the job renders, taken when
+    it was added to the queue, so that the project can be edited meanwhile.
+    @type snapshot_uri: C{URI}
+    @ivar state: C{JOB_QUEUED}, C{JOB_RUNNING}, C{JOB_DONE} or
+    C{JOB_FAILED}.
+    @ivar attempts: How many times the job was started.
+    @type attempts: C{int}
+    @ivar error: Why the last attempt failed.
+    @type error: C{str}
+    @ivar fraction: How much of the job is done, from 0 to 1.
+    @type fraction: C{float}
+    @ivar pid: The process running the queue when the job was started.
+    @type pid: C{int}
+    """
+
+    def __init__(self, project_uri, output_uri, arguments=(),
+            retries=DEFAULT_RETRIES):
+        """
+        @param retries: How many times to start the job again if it fails.
+        """
+        self.id = None
+        self.project_uri = project_uri
+        self.output_uri = output_uri
+        self.arguments = list(arguments)
+        self.retries = retries
+        self.snapshot_uri = None
+        self.state = JOB_QUEUED
+        self.attempts = 0
+        self.error = None
+        self.fraction = 0.0
+        self.pid = None
+
+        options, args = make_option_parser().parse_args(self.arguments)
+        self.start = options.start
+        self.end = options.end
+        self.jobs = options.jobs
+
+    def getCost(self):
+        """
+        Return the number of processors the job keeps busy.
+        """
+        return self.jobs
+
+    def getArguments(self):
+        """
+        Return the command line of the C{pitivi-render} process.
+        """
+        # retries overwrite what the failed attempts left
+        return [self.snapshot_uri or self.project_uri, self.output_uri,
+                "--force"] + self.arguments
+
+    def toData(self):
+        return {"id": self.id,
+                "project": self.project_uri,
+                "snapshot": self.snapshot_uri,
+                "output": self.output_uri,
+                "arguments": self.arguments,
+                "retries": self.retries,
+                "state": self.state,
+                "attempts": self.attempts,
+                "error": self.error,
+                "fraction": self.fraction,
+                "pid": self.pid}
+
+    def updateFromData(self, data):
+        """
+        Update the state of the job from what L{toData} returned in another
+        process.
+
+        @return: Whether something changed.
+        @rtype: C{bool}
+        """
+        changed = False
+        for name in ("state", "attempts", "error", "fraction", "pid"):
+            if getattr(self, name) != data[name]:
+                setattr(self, name, data[name])
+                changed = True
+        return changed
+
+
+def job_from_data(data):
+    job = RenderJob(data["project"], data["output"], data["arguments"],
+            data["retries"])
+    job.id = data["id"]
+    # queues written before the snapshots render the project itself
+    job.snapshot_uri = data.get("snapshot")
+    job.updateFromData(data)
+    return job
+
+
+def job_for_settings(project_uri, output_uri, settings=None, start=None,
+        end=None, jobs=1, retries=DEFAULT_RETRIES):
+    """
+    Return a job rendering C{[start, end)} of a project with C{settings}.
+
+    @param settings: The export settings, defaults to those of the project.
+    @type settings: L{ExportSettings}
+    @param jobs: The number of processes rendering the job, ranges are
+    rendered by a single one.
+    """
+    arguments = []
+    if start is not None:
+        arguments.extend(["--start", str(start)])
+    if end is not None:
+        arguments.extend(["--end", str(end)])
+    if jobs > 1 and start is None and end is None:
+        arguments.extend(["--jobs", str(jobs)])
+    if settings is not None:
+        arguments.extend(settings_to_arguments(settings))
+    return RenderJob(project_uri, output_uri, arguments, retries)
+
+
+class RenderQueue(Signallable, Loggable):
+    """
+    Runs render jobs and keeps them in a file.
+
+    Signals:
+     - C{job-added}: A job was added, here or by another process.
+     - C{job-removed}: A job was removed.
+     - C{job-changed}: The state of a job changed.
+     - C{job-progress}: A running job reported progress.
+     - C{idle}: There's nothing left to run.
+
+    @ivar jobs: The jobs, in the order they are run.
+    @type jobs: C{list} of L{RenderJob}
+    @ivar budget: How many processors the running jobs can use.
+    @type budget: C{int}
+    """
+
+    __signals__ = {
+        "job-added": ["job"],
+        "job-removed": ["job"],
+        "job-changed": ["job"],
+        "job-progress": ["job"],
+        "idle": [],
+        }
+
+    def __init__(self, filename=None, budget=None):
+        """
+        @param filename: Where to store the queue, defaults to
+        C{renderqueue.json} in the pitivi data directory.
+        @param budget: Defaults to the number of processors.
+        """
+        Loggable.__init__(self)
+        if filename is None:
+            filename = os.path.join(get_dir(os.path.join(xdg_data_home(),
+                    "pitivi")), "renderqueue.json")
+        if budget is None:
+            budget = cpu_count()
+        self.filename = filename
+        self.budget = budget
+        self.jobs = []
+        self.running = False
+        self._processes = {}
+        self._sync_id = None
+        self.sync()
+
+    def _read(self):
+        try:
+            f = open(self.filename)
+        except IOError:
+            return []
+
+        try:
+            try:
+                data = json.load(f)
+            except ValueError, e:
+                self.warning("ignoring corrupted queue %s: %s",
+                        self.filename, e)
+                return []
+        finally:
+            f.close()
+
+        if data.get("version") != QUEUE_VERSION:
+            self.info("ignoring queue version %s", data.get("version"))
+            return []
+        return data["jobs"]
+
+    def _write(self):
+        data = {"version": QUEUE_VERSION,
+                "jobs": [job.toData() for job in self.jobs]}
+        # readers never see a partial file
+        temp = self.filename + ".tmp"
+        f = open(temp, "w")
+        try:
+            json.dump(data, f, indent=1)
+        finally:
+            f.close()
+        os.rename(temp, self.filename)
+
+    def _merge(self, entries):
+        """
+        Take the changes made to the queue file by other processes, except
+        for the jobs running here.
+
+        @return: The signals to emit, C{(name, job)} tuples.
+        """
+        signals = []
+        known = dict((job.id, job) for job in self.jobs)
+        jobs = []
+        for data in entries:
+            job = known.pop(data["id"], None)
+            if job is None:
+                job = job_from_data(data)
+                signals.append(("job-added", job))
+            elif job.id not in self._processes and job.updateFromData(data):
+                signals.append(("job-changed", job))
+            jobs.append(job)
+
+        for job in known.itervalues():
+            self._killJob(job)
+            signals.append(("job-removed", job))
+        self.jobs = jobs
+        return signals
+
+    def _update(self, change=None, *args):
+        """
+        Merge the queue file, call C{change} and write the file back, with
+        the file locked.
+        """
+        lock = open(self.filename + ".lock", "a")
+        try:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            signals = self._merge(self._read())
+            if change is not None:
+                signals.extend(change(*args))
+            self._write()
+        finally:
+            lock.close()
+
+        for name, job in signals:
+            self.emit(name, job)
+
+    def sync(self):
+        """
+        Take the changes made by other processes and save those made here.
+        """
+        self._update()
+
+    def getJob(self, job_id):
+        for job in self.jobs:
+            if job.id == job_id:
+                return job
+        return None
+
+    def addJob(self, job, project=None):
+        """
+        Append C{job} to the queue and give it an id.
+
+        The project is copied next to the queue file first, and the copy is
+        what the job renders.
+
+        @param project: The project to save as the copy, defaults to reading
+        the file the job refers to.
+        @type project: L{Project}
+        @raise IOError: If the project file couldn't be copied.
+        @raise FormatterError: If C{project} couldn't be saved.
+        """
+        self._saveSnapshot(job, project)
+        self._update(self._addJob, job)
+        self._schedule()
+
+    def _saveSnapshot(self, job, project):
+        directory = get_dir(os.path.splitext(self.filename)[0] + "-projects")
+        fd, filename = tempfile.mkstemp(prefix="job-", suffix=".xptv",
+                dir=directory)
+        os.close(fd)
+        uri = path_to_uri(filename)
+        try:
+            if project is None:
+                shutil.copyfile(gst.uri_get_location(job.project_uri),
+                        filename)
+            else:
+                # imported here to break a circular import
+                from pitivi.formatters.etree import ElementTreeFormatter
+
+                formatter = ElementTreeFormatter(None)
+                formatter.saveProject(project, uri, overwrite=True,
+                        backup=True)
+        except:
+            self._removeFile(filename)
+            raise
+
+        job.snapshot_uri = uri
+
+    def _removeSnapshot(self, job):
+        if job.snapshot_uri is not None:
+            self._removeFile(gst.uri_get_location(job.snapshot_uri))
+
+    def _removeFile(self, filename):
+        try:
+            os.unlink(filename)
+        except OSError, e:
+            self.warning("couldn't remove %s: %s", filename, e)
+
+    def _addJob(self, job):
+        job.id = max([other.id for other in self.jobs] + [0]) + 1
+        self.jobs.append(job)
+        return [("job-added", job)]
+
+    def removeJob(self, job):
+        """
+        Remove C{job} from the queue, stopping it if it's running.
+        """
+        self._update(self._removeJob, job)
+        self._schedule()
+
+    def _removeJob(self, job):
+        if job not in self.jobs:
+            return []
+        self._killJob(job)
+        self.jobs.remove(job)
+        self._removeSnapshot(job)
+        return [("job-removed", job)]
+
+    def retryJob(self, job):
+        """
+        Queue a failed or finished job again.
+        """
+        self._update(self._retryJob, job)
+        self._schedule()
+
+    def _retryJob(self, job):
+        if job.state == JOB_RUNNING:
+            return []
+        job.state = JOB_QUEUED
+        job.attempts = 0
+        job.error = None
+        job.fraction = 0.0
+        return [("job-changed", job)]
+
+    def clearFinished(self):
+        """
+        Remove the jobs that are done or failed.
+        """
+        self._update(self._clearFinished)
+
+    def _clearFinished(self):
+        finished = [job for job in self.jobs
+                if job.state in (JOB_DONE, JOB_FAILED)]
+        for job in finished:
+            self.jobs.remove(job)
+            self._removeSnapshot(job)
+        return [("job-removed", job) for job in finished]
+
+    def start(self):
+        """
+        Start running the queued jobs, the jobs left running by a queue
+        that was stopped are queued again first.
+        """
+        self.running = True
+        self._update(self._requeueOrphans)
+        self._sync_id = gobject.timeout_add(SYNC_INTERVAL, self._syncCb)
+        self._schedule()
+
+    def _requeueOrphans(self):
+        signals = []
+        for job in self.jobs:
+            if job.state == JOB_RUNNING and job.id not in self._processes \
+                    and (job.pid is None or not _process_exists(job.pid)):
+                job.state = JOB_QUEUED
+                signals.append(("job-changed", job))
+        return signals
+
+    def stop(self):
+        """
+        Stop the running jobs, they are queued again.
+        """
+        self.running = False
+        if self._sync_id is not None:
+            gobject.source_remove(self._sync_id)
+            self._sync_id = None
+        self._update(self._stopJobs)
+
+    def _stopJobs(self):
+        signals = []
+        for job in self.jobs:
+            if job.id in self._processes:
+                self._killJob(job)
+                job.state = JOB_QUEUED
+                signals.append(("job-changed", job))
+        return signals
+
+    def isIdle(self):
+        """
+        Return whether no job is running nor queued.
+        """
+        return not self._processes and \
+                not [job for job in self.jobs if job.state == JOB_QUEUED]
+
+    def _schedule(self):
+        if not self.running:
+            return
+
+        used = sum(job.getCost() for job in self.jobs
+                if job.id in self._processes)
+        for job in self.jobs:
+            if job.state != JOB_QUEUED:
+                continue
+            # jobs bigger than the budget still run, alone
+            cost = min(job.getCost(), self.budget)
+            if used + cost > self.budget:
+                # the jobs run in order, the next one waits for room
+                break
+            self._update(self._startJob, job)
+            used += cost
+
+        if self.isIdle():
+            self.emit("idle")
+
+    def _startJob(self, job):
+        self.info("starting job %d: %s", job.id, job.output_uri)
+        job.state = JOB_RUNNING
+        job.attempts += 1
+        job.error = None
+        job.fraction = 0.0
+        job.pid = os.getpid()
+        self._processes[job.id] = self._makeProcess(job)
+        return [("job-changed", job)]
+
+    def _makeProcess(self, job):
+        return RenderProcess(job.getArguments(), self._processCb)
+
+    def _killJob(self, job):
+        process = self._processes.pop(job.id, None)
+        if process is not None:
+            process.kill()
+
+    def _processCb(self, process, event):
+        for job in self.jobs:
+            if self._processes.get(job.id) is process:
+                break
+        else:
+            # killed
+            return
+
+        if event is not None:
+            if event["event"] == "progress":
+                job.fraction = process.fraction
+                self.emit("job-progress", job)
+            return
+
+        self._update(self._finishJob, job, process)
+        self._schedule()
+
+    def _finishJob(self, job, process):
+        del self._processes[job.id]
+        if process.error is None:
+            job.state = JOB_DONE
+            job.fraction = 1.0
+        else:
+            self.warning("job %d failed: %s", job.id, process.error)
+            job.error = process.error
+            if job.attempts <= job.retries:
+                job.state = JOB_QUEUED
+            else:
+                job.state = JOB_FAILED
+        return [("job-changed", job)]
+
+    def _syncCb(self):
+        self.sync()
+        self._schedule()
+        return True
+
+
+def _get_jobs(parser, queue, ids):
+    if not ids:
+        parser.error("no job given")
+    jobs = []
+    for value in ids:
+        try:
+            job = queue.getJob(int(value))
+        except ValueError:
+            job = None
+        if job is None:
+            parser.error("no job %s" % value)
+        jobs.append(job)
+    return jobs
+
+
+def _add(queue, argv):
+    parser = OptionParser(usage="%prog add [--retries N] PROJECT OUTPUT "
+            "[RENDER OPTIONS]", description="Queue a render of PROJECT to "
+            "OUTPUT, the RENDER OPTIONS are those of pitivi-render.")
+    parser.disable_interspersed_args()
+    parser.add_option("--retries", type="int", default=DEFAULT_RETRIES,
+            help="how many times to start the job again if it fails "
+            "[default: %default]")
+    options, args = parser.parse_args(argv)
+    if len(args) < 2:
+        parser.error("a project and an output file are needed")
+
+    render_parser = make_option_parser()
+    render_options, rest = render_parser.parse_args(args[2:])
+    if rest:
+        parser.error("unexpected arguments: %s" % " ".join(rest))
+    check_options(render_parser, render_options)
+
+    job = RenderJob(path_to_uri(args[0]), path_to_uri(args[1]), args[2:],
+            options.retries)
+    try:
+        queue.addJob(job)
+    except IOError, e:
+        parser.error("couldn't copy the project: %s" % e)
+    print job.id
+    return 0
+
+
+def _list(queue, argv):
+    for job in queue.jobs:
+        line = "%3d  %-7s %3d%%  %s" % (job.id, job.state,
+                job.fraction * 100, job.output_uri)
+        if job.start is not None or job.end is not None:
+            line += " from %s to %s" % (gst.TIME_ARGS(job.start or 0),
+                    job.end is None and "the end" or gst.TIME_ARGS(job.end))
+        if job.error is not None:
+            line += ": " + job.error
+        print line
+    return 0
+
+
+def _remove(queue, argv):
+    parser = OptionParser(usage="%prog remove ID...")
+    options, args = parser.parse_args(argv)
+    for job in _get_jobs(parser, queue, args):
+        queue.removeJob(job)
+    return 0
+
+
+def _retry(queue, argv):
+    parser = OptionParser(usage="%prog retry ID...")
+    options, args = parser.parse_args(argv)
+    for job in _get_jobs(parser, queue, args):
+        queue.retryJob(job)
+    return 0
+
+
+def _clear(queue, argv):
+    queue.clearFinished()
+    return 0
+
+
+def _report(event, job):
+    print format_event(event, job=job.id, state=job.state,
+            output=job.output_uri, fraction=job.fraction,
+            attempts=job.attempts, error=job.error)
+    sys.stdout.flush()
+
+
+def _run(queue, argv):
+    parser = OptionParser(usage="%prog run [options]",
+            description="Run the queued jobs, progress is written to stdout "
+            "as JSON, one object per line.")
+    parser.add_option("-b", "--budget", type="int",
+            help="how many processors the jobs can use [default: all]")
+    parser.add_option("--watch", action="store_true", default=False,
+            help="wait for more jobs when the queue is empty")
+    options, args = parser.parse_args(argv)
+    if options.budget is not None:
+        if options.budget < 1:
+            parser.error("--budget must be at least 1")
+        queue.budget = options.budget
+
+    mainloop = gobject.MainLoop()
+    queue.connect("job-changed", lambda queue, job: _report("job", job))
+    queue.connect("job-progress",
+            lambda queue, job: _report("progress", job))
+    if not options.watch:
+        queue.connect("idle", lambda queue: mainloop.quit())
+    queue.start()
+    try:
+        if options.watch or not queue.isIdle():
+            mainloop.run()
+    finally:
+        queue.stop()
+
+    if [job for job in queue.jobs if job.state == JOB_FAILED]:
+        return 1
+    return 0
+
+
+COMMANDS = {
+    "add": _add,
+    "list": _list,
+    "remove": _remove,
+    "retry": _retry,
+    "clear": _clear,
+    "run": _run,
+    }
+
+
+def main(argv):
+    if len(argv) < 2 or argv[1] not in COMMANDS:
+        print >> sys.stderr, "usage: %s COMMAND [ARGS]\n\ncommands: %s" % \
+                (os.path.basename(argv[0]), ", ".join(sorted(COMMANDS)))
+        return 2
+
+    try:
+        return COMMANDS[argv[1]](RenderQueue(), argv[2:])
+    except KeyboardInterrupt:
+        return 1
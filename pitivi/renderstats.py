@@ -0,0 +1,281 @@
+# PiTiVi , Non-linear video editor
+#
+#       renderstats.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+"""
+Statistics about a render in progress.
+
+The statistics are sampled when the position of the pipeline is reported:
+the encoded frames per second, how much faster than realtime the timeline
+is rendered, how full the queues in front of the encoders are and how the
+time of the streaming threads is split between decoding and encoding.
+
+Full queues mean the encoders are the bottleneck, empty ones that the
+timeline is. The time spent in the decoders and encoders is measured with
+buffer probes on their pads: from a buffer entering the element to a
+buffer leaving it in the same thread. Elements that don't output a buffer
+for each input one, like audio encoders, are only partly accounted for.
+"""
+
+import os
+import csv
+import time
+import thread
+
+import gst
+
+from pitivi.log.loggable import Loggable
+from pitivi.settings import xdg_cache_home
+from pitivi.stream import AudioStream, VideoStream
+
+STATS_COLUMNS = ["elapsed", "position", "frames", "fps", "realtime",
+        "decoder_time", "encoder_time", "encoder_share"]
+
+
+def get_stats_filename():
+    """
+    Return a new file name for the statistics of a render, in the pitivi
+    cache directory.
+    """
+    directory = os.path.join(xdg_cache_home(), "pitivi", "render-stats")
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    return os.path.join(directory,
+            time.strftime("render-%Y%m%d-%H%M%S.csv"))
+
+
+def get_queue_fill(queue):
+    """
+    Return how full C{queue} is, from 0 to 1, by whichever of its limits is
+    the closest to being reached.
+    """
+    fill = 0.0
+    for level, limit in (("current-level-buffers", "max-size-buffers"),
+            ("current-level-bytes", "max-size-bytes"),
+            ("current-level-time", "max-size-time")):
+        maximum = queue.get_property(limit)
+        if maximum:
+            fill = max(fill, float(queue.get_property(level)) / maximum)
+    return min(fill, 1.0)
+
+
+class ElementTimer(object):
+    """
+    Measures the time spent by buffers going through elements.
+
+    @ivar total: The time measured, in seconds.
+    @type total: C{float}
+    @ivar buffers: The number of buffers output.
+    @type buffers: C{int}
+    """
+
+    def __init__(self):
+        self.total = 0.0
+        self.buffers = 0
+        self._entered = {}
+
+    def attach(self, element):
+        for pad in element.sink_pads():
+            pad.add_buffer_probe(self._enterCb)
+        for pad in element.src_pads():
+            pad.add_buffer_probe(self._leaveCb)
+
+    def _enterCb(self, unused_pad, unused_buf):
+        # called from a streaming thread
+        self._entered[thread.get_ident()] = time.time()
+        return True
+
+    def _leaveCb(self, unused_pad, buf):
+        # called from a streaming thread
+        entered = self._entered.pop(thread.get_ident(), None)
+        if entered is not None:
+            self.total += time.time() - entered
+        if not buf.flag_is_set(gst.BUFFER_FLAG_IN_CAPS):
+            self.buffers += 1
+        return True
+
+
+class RenderStats(Loggable):
+    """
+    Samples the statistics of a render and writes them to a CSV file.
+
+    L{attach} must be called once the render action is active, then
+    L{sample} every time the position is reported.
+
+    @ivar rows: The samples, dictionaries with the L{columns} as keys.
+    @type rows: C{list}
+    @ivar columns: L{STATS_COLUMNS}, followed by the fill level of each
+    queue, known after the first sample.
+    @type columns: C{list} of C{str}
+    """
+
+    def __init__(self, pipeline, filename=None):
+        """
+        @type pipeline: L{Pipeline}
+        @param filename: Where to write the samples, if anywhere.
+        """
+        Loggable.__init__(self)
+        self.pipeline = pipeline
+        self.filename = filename
+        self.rows = []
+        self.columns = list(STATS_COLUMNS)
+        self.decoders = ElementTimer()
+        self.encoders = ElementTimer()
+        self.video_encoders = ElementTimer()
+        self._queues = []
+        self._file = None
+        self._writer = None
+        self._started = None
+        self._first_frames = 0
+        self._previous = None
+
+    def _getTime(self):
+        return time.time()
+
+    def _instrument(self):
+        # new decoders show up while the timeline plays
+        for factory_entry in self.pipeline.factories.itervalues():
+            for stream_entry in factory_entry.streams.itervalues():
+                if stream_entry.bin is None:
+                    continue
+                for element in stream_entry.bin.recurse():
+                    if element.get_data("pitivi-render-stats"):
+                        continue
+                    element.set_data("pitivi-render-stats", True)
+                    factory = element.get_factory()
+                    if factory is None:
+                        # a plain bin
+                        continue
+                    klass = factory.get_klass()
+                    if "Decoder" in klass:
+                        self.decoders.attach(element)
+                    elif "Encoder" in klass:
+                        self.encoders.attach(element)
+                        if "Video" in klass:
+                            self.video_encoders.attach(element)
+
+    def _findQueues(self):
+        queues = []
+        names = set()
+        for factory_entry in self.pipeline.factories.itervalues():
+            for stream, stream_entry in factory_entry.streams.iteritems():
+                if stream_entry.queue is None:
+                    continue
+                if isinstance(stream, VideoStream):
+                    name = "video"
+                elif isinstance(stream, AudioStream):
+                    name = "audio"
+                else:
+                    name = "other"
+                index = 2
+                unique = name
+                while unique in names:
+                    unique = "%s%d" % (name, index)
+                    index += 1
+                names.add(unique)
+                queues.append(("queue_" + unique, stream_entry.queue))
+        return sorted(queues)
+
+    def attach(self):
+        """
+        Instrument the decoders and encoders already in the pipeline.
+        """
+        self._instrument()
+
+    def sample(self, position):
+        """
+        Take a sample of the statistics.
+
+        @param position: The position of the render in the timeline.
+        @return: The sample, see L{rows}.
+        @rtype: C{dict}
+        """
+        now = self._getTime()
+        self._instrument()
+        if self._started is None:
+            self._started = now
+            # frames encoded between attach() and now aren't sampled
+            self._first_frames = self.video_encoders.buffers
+            self._previous = (now, position, self._first_frames)
+            self._queues = self._findQueues()
+            self.columns.extend(name for name, queue in self._queues)
+            self._openFile()
+
+        frames = self.video_encoders.buffers
+        previous_time, previous_position, previous_frames = self._previous
+        elapsed = now - previous_time
+        fps = realtime = 0.0
+        if elapsed > 0:
+            fps = (frames - previous_frames) / elapsed
+            realtime = (position - previous_position) / \
+                    float(gst.SECOND) / elapsed
+        self._previous = (now, position, frames)
+
+        busy = self.decoders.total + self.encoders.total
+        share = 0.0
+        if busy:
+            share = self.encoders.total / busy
+
+        row = {"elapsed": now - self._started,
+                "position": position,
+                "frames": frames,
+                "fps": fps,
+                "realtime": realtime,
+                "decoder_time": self.decoders.total,
+                "encoder_time": self.encoders.total,
+                "encoder_share": share}
+        for name, queue in self._queues:
+            row[name] = get_queue_fill(queue)
+        self.rows.append(row)
+        if self._writer is not None:
+            self._writer.writerow(row)
+            self._file.flush()
+        return row
+
+    def _openFile(self):
+        if self.filename is None:
+            return
+        try:
+            self._file = open(self.filename, "wb")
+        except IOError, e:
+            self.warning("couldn't write the statistics to %s: %s",
+                    self.filename, e)
+            return
+        self._writer = csv.DictWriter(self._file, self.columns)
+        self._writer.writerow(dict((name, name) for name in self.columns))
+
+    def getSummary(self):
+        """
+        Return the averages over the whole render: encoded frames per
+        second, realtime factor and encoder time share.
+        """
+        if not self.rows:
+            return {}
+        last = self.rows[-1]
+        elapsed = last["elapsed"] or 1.0
+        first_position = self.rows[0]["position"]
+        return {"fps": (last["frames"] - self._first_frames) / elapsed,
+                "realtime": (last["position"] - first_position) /
+                    float(gst.SECOND) / elapsed,
+                "encoder_share": last["encoder_share"]}
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
@@ -21,7 +21,6 @@
 
 # FIXME/IDEA : Add a decorator to easily add signals (ex: @signal(name="mysignal"))
 # FIXME/IDEA : Add a function to quickly define signals (a-la pygobject gsignals)
-# FIXME/IDEA : Use Weak dictionnaries for tracking connected callbacks/objects
 # FIXME/IDEA : Make specific exceptions !
 # FIXME : How to handle classes which are already using gobject (i.e. gst.Pipeline)
 
@@ -30,6 +29,66 @@ Interfaces for event-based programming
 """
 
 from random import randint
+from types import MethodType
+import weakref
+
+# id -> Signallable, for every live object that ever had a handler connected
+_live_signallables = weakref.WeakValueDictionary()
+
+class _WeakCallback(object):
+    """
+    Calls a function or bound method without keeping its receiver alive.
+    """
+
+    def __init__(self, cb, expired_cb):
+        if isinstance(cb, MethodType) and cb.im_self is not None:
+            self.func = cb.im_func
+            self.ref = weakref.ref(cb.im_self, expired_cb)
+        else:
+            # there's no receiver to wait for, plain functions (often
+            # lambdas or closures) are kept alive
+            self.func = cb
+            self.ref = None
+
+    def resolve(self):
+        """
+        Return the callback, or None if its receiver was collected.
+        """
+        if self.ref is None:
+            return self.func
+        obj = self.ref()
+        if obj is None:
+            return None
+        return MethodType(self.func, obj, obj.__class__)
+
+    def matches(self, cb):
+        resolved = self.resolve()
+        return resolved is not None and resolved == cb
+
+def signal_handler_report():
+    """
+    Count the handlers connected to every live L{Signallable}.
+
+    Useful to find handlers which were never disconnected, and the objects
+    they keep alive.
+
+    @return: C{(count, class name, signal name)} tuples, highest count first.
+    @rtype: C{list}
+    """
+    counts = {}
+    for obj in _live_signallables.values():
+        group = getattr(obj, "_signal_group", None)
+        if group is None:
+            continue
+        for signame, sigids in group.handlers.iteritems():
+            if sigids:
+                key = (obj.__class__.__name__, signame)
+                counts[key] = counts.get(key, 0) + len(sigids)
+
+    report = [(count, cls, signame)
+            for (cls, signame), count in counts.iteritems()]
+    report.sort(reverse=True)
+    return report
 
 class Signallable(object):
     """
@@ -53,6 +112,9 @@ class Signallable(object):
             #     kwargs (dictionnary))
             self.ids = {}
             self.callback_ids = {}
+            # weakly connected callbacks aren't in callback_ids, as that
+            # would keep them alive. key: signal id, value: _WeakCallback
+            self.weak_ids = {}
             # self.handlers is a dictionnary of callback ids per
             # signals.
             self.handlers = {}
@@ -77,6 +139,31 @@ class Signallable(object):
             self.handlers[signame].append(uuid)
             return uuid
 
+        def connect_weak(self, signame, cb, args, kwargs):
+            """ connect without keeping the callback receiver alive """
+            sigid = self.connect(signame, cb, args, kwargs)
+            # move the callback out of callback_ids
+            self.disconnect_callback_id(cb, sigid)
+
+            group_ref = weakref.ref(self)
+            def expired(ref):
+                group = group_ref()
+                if group is not None and sigid in group.ids:
+                    group.disconnect(sigid)
+
+            weak_cb = _WeakCallback(cb, expired)
+            self.ids[sigid] = (weak_cb, args, kwargs)
+            self.weak_ids[sigid] = weak_cb
+            return sigid
+
+        def disconnect_callback_id(self, cb, sigid):
+            sigids = self.callback_ids.get(cb)
+            if sigids is None:
+                return
+            sigids.remove(sigid)
+            if not sigids:
+                del self.callback_ids[cb]
+
         def disconnect(self, sigid):
             """ disconnect """
             try:
@@ -91,28 +178,40 @@ class Signallable(object):
                 except ValueError:
                     continue
 
-                self.callback_ids.get(cb, []).remove(sigid)
+                if self.weak_ids.pop(sigid, None) is None:
+                    self.disconnect_callback_id(cb, sigid)
 
         def disconnect_by_function(self, function):
-            try:
-                sig_ids = self.callback_ids[function]
-            except KeyError:
+            sig_ids = list(self.callback_ids.get(function, []))
+            sig_ids.extend([sigid for sigid, weak_cb in self.weak_ids.items()
+                    if weak_cb.matches(function)])
+            if not sig_ids:
                 raise Exception("function is not a known callback")
 
-            for sigid in list(sig_ids):
+            for sigid in sig_ids:
                 self.disconnect(sigid)
 
-            del self.callback_ids[function]
-
         def emit(self, signame, *args, **kwargs):
             """ emit """
             # emits the signal,
             # will concatenate the given args/kwargs with
             # the ones supplied in .connect()
             res = None
-            for sigid in self.handlers[signame]:
-                # cb: callable
-                cb, orar, kwar = self.ids[sigid]
+            # iterate on a copy, handlers can be disconnected while we emit
+            for sigid in list(self.handlers[signame]):
+                try:
+                    # cb: callable
+                    cb, orar, kwar = self.ids[sigid]
+                except KeyError:
+                    # disconnected by a previous handler
+                    continue
+                if sigid in self.weak_ids:
+                    cb = cb.resolve()
+                    if cb is None:
+                        # the receiver is gone but its weakref callback
+                        # didn't run yet
+                        self.disconnect(sigid)
+                        continue
                 ar = args[:] + orar
                 kw = kwargs.copy()
                 kw.update(kwar)
@@ -155,10 +254,27 @@ class Signallable(object):
         """
         if not hasattr(self, "_signal_group"):
             self._signal_group = self.SignalGroup(self)
+            _live_signallables[id(self)] = self
 
         return self._signal_group.connect(signame,
                                            cb, args, kwargs)
 
+    def connect_weak(self, signame, cb, *args, **kwargs):
+        """
+        Like L{connect}, but without keeping the callback alive.
+
+        If the callback is a bound method only a weak reference to its
+        object is kept, and the handler is disconnected automatically when
+        that object is collected. Use this for handlers of short-lived
+        objects that might otherwise never be disconnected.
+        """
+        if not hasattr(self, "_signal_group"):
+            self._signal_group = self.SignalGroup(self)
+            _live_signallables[id(self)] = self
+
+        return self._signal_group.connect_weak(signame,
+                                               cb, args, kwargs)
+
     def disconnect(self, sigid):
         """
         Disconnect signal using give signal id
@@ -0,0 +1,544 @@
+# PiTiVi , Non-linear video editor
+#
+#       smartrender.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+"""
+Rendering that copies the untouched parts of the timeline.
+
+Where the timeline shows a single file as is, without effects, keyframes,
+transitions or anything on top of it, and the file is already encoded in
+the output format, its compressed data can be copied to the output instead
+of being decoded and encoded again. Those copies start and end on keyframes
+of the file; everything else is rendered by the workers of
+L{ParallelRenderer} and the pieces are concatenated.
+
+The concatenated pieces must share their codec headers, which is only the
+case when the copied file was encoded with the very same settings. Before
+planning, a few frames are rendered with the output settings and the
+headers of the files are compared with theirs, the files that don't match
+are rendered. Should the concatenation still find different headers, the
+copies are rendered too.
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+import gst
+
+from pitivi.log.loggable import Loggable
+from pitivi.signalinterface import Signallable
+from pitivi.factories.file import FileSourceFactory, PictureFileSourceFactory
+from pitivi.timeline.track import SourceTrackObject
+from pitivi.parallelrender import ParallelRenderer, RangeWorker, \
+        RAW_CAPS, get_busy_regions, get_encoded_caps, get_output_kinds, \
+        get_stream_kind
+from pitivi.render import PROGRESS_INTERVAL, path_to_uri
+
+# copies shorter than this aren't worth a cut
+MIN_COPY_DURATION = 2 * gst.SECOND
+# how much of the timeline is rendered to get the headers of the output
+HEADER_PROBE_DURATION = gst.SECOND / 5
+
+
+def _subtract(start, end, ranges):
+    """
+    Return the parts of C{[start, end)} not covered by C{ranges}.
+    """
+    free = []
+    position = start
+    for range_start, range_end in sorted(ranges):
+        if range_end <= position or range_start >= end:
+            continue
+        if range_start > position:
+            free.append((position, range_start))
+        position = max(position, range_end)
+    if position < end:
+        free.append((position, end))
+    return free
+
+
+def _is_untouched(timeline_object, tracks):
+    factory = timeline_object.factory
+    if not isinstance(factory, FileSourceFactory) or \
+            isinstance(factory, PictureFileSourceFactory):
+        return False
+
+    track_objects = timeline_object.track_objects
+    if len(track_objects) != len(tracks) or \
+            set(track_object.track for track_object in track_objects) != \
+            set(tracks):
+        return False
+
+    first = track_objects[0]
+    for track_object in track_objects:
+        if not isinstance(track_object, SourceTrackObject):
+            return False
+        if (track_object.start, track_object.duration,
+                track_object.in_point) != \
+                (first.start, first.duration, first.in_point):
+            return False
+        # not slowed down nor sped up
+        if track_object.media_duration != track_object.duration:
+            return False
+        for prop, interpolator in \
+                track_object.getInterpolators().itervalues():
+            if not interpolator.isUntouched():
+                return False
+    return True
+
+
+def get_clean_spans(timeline):
+    """
+    Return the ranges of C{timeline} showing a single file as is.
+
+    The clip must have the same part of the file in every track with
+    content, without keyframes or speed changes, and nothing else may be
+    played at the same time: no other clip, effect or transition.
+
+    @return: C{(start, end, uri, media_start)} tuples, where
+    C{media_start} is the position in the file at C{start}.
+    @rtype: C{list} of C{tuple}
+    """
+    tracks = [track for track in timeline.tracks if track.duration > 0]
+    busy = get_busy_regions(timeline)
+    spans = []
+    for timeline_object in timeline.timeline_objects:
+        if not _is_untouched(timeline_object, tracks):
+            continue
+
+        start = timeline_object.start
+        end = start + timeline_object.duration
+        others = list(busy)
+        for track in timeline.tracks:
+            for track_object in track.track_objects:
+                if track_object.timeline_object is not timeline_object:
+                    others.append((track_object.start,
+                            track_object.start + track_object.duration))
+
+        in_point = timeline_object.in_point
+        uri = timeline_object.factory.uri
+        for span_start, span_end in _subtract(start, end, others):
+            spans.append((span_start, span_end, uri,
+                    in_point + span_start - start))
+    return sorted(spans)
+
+
+def can_copy(info, settings, kinds):
+    """
+    Return whether the streams of a file can be copied to the output.
+
+    The file needs a single stream of each of C{kinds}, encoded in the
+    format of the output encoders with the size, frame rate and sample rate
+    of C{settings}. Videos with reordered frames can't be copied.
+
+    @type info: L{SourceInfo}
+    @type settings: L{ExportSettings}
+    """
+    if info.ambiguous:
+        return False
+    # copies are cut by timestamp, which would separate the reordered
+    # frames from the ones they depend on
+    if "video" in kinds and info.reordered:
+        return False
+
+    encoded = get_encoded_caps(settings)
+    for kind in kinds:
+        caps = info.caps.get(kind)
+        if caps is None or not caps.can_intersect(encoded):
+            return False
+        structure = caps[0]
+        if kind == "video":
+            expected = {"width": settings.videowidth,
+                    "height": settings.videoheight,
+                    "framerate": settings.videorate}
+            if structure.has_field("pixel-aspect-ratio"):
+                par = structure["pixel-aspect-ratio"]
+            else:
+                par = gst.Fraction(1, 1)
+            if par != settings.videopar:
+                return False
+        else:
+            expected = {"rate": settings.audiorate,
+                    "channels": settings.audiochannels}
+        for name, value in expected.iteritems():
+            if not structure.has_field(name) or structure[name] != value:
+                return False
+    return True
+
+
+def headers_match(info, reference, kinds):
+    """
+    Return whether the streams of a file have the same caps, codec headers
+    included, as those of C{reference}, so that they can be concatenated.
+
+    @type info: L{SourceInfo}
+    @param reference: What was found in a file rendered with the output
+    settings.
+    @type reference: L{SourceInfo}
+    """
+    for kind in kinds:
+        caps = info.caps.get(kind)
+        reference_caps = reference.caps.get(kind)
+        if caps is None or reference_caps is None or \
+                not caps.is_equal(reference_caps):
+            return False
+    return True
+
+
+def plan_segments(duration, spans, infos, video=True,
+        min_copy=MIN_COPY_DURATION):
+    """
+    Split C{[0, duration)} in segments that are copied from files and
+    segments that are rendered.
+
+    The copies are the parts of C{spans} starting and ending on keyframes
+    of the file, or at its end. Without video any position will do.
+
+    @param spans: See L{get_clean_spans}.
+    @param infos: The L{SourceInfo} of the files that can be copied, by URI.
+    @type infos: C{dict}
+    @param video: Whether the output has video.
+    @return: C{(start, end, uri, media_start)} tuples, C{uri} and
+    C{media_start} being C{None} for the rendered segments.
+    @rtype: C{list} of C{tuple}
+    """
+    copies = []
+    for start, end, uri, media_start in spans:
+        info = infos.get(uri)
+        if info is None:
+            continue
+
+        media_stop = media_start + end - start
+        if video:
+            following = [keyframe for keyframe in info.keyframes
+                    if media_start <= keyframe < media_stop]
+            if not following:
+                continue
+            copy_start = following[0]
+            if media_stop < info.duration:
+                # up to the keyframe the rest of the file starts with
+                copy_stop = max(keyframe for keyframe in info.keyframes
+                        if keyframe <= media_stop)
+            else:
+                copy_stop = media_stop
+        else:
+            copy_start, copy_stop = media_start, media_stop
+
+        if copy_stop - copy_start < min_copy:
+            continue
+        offset = start + copy_start - media_start
+        copies.append((offset, offset + copy_stop - copy_start, uri,
+                copy_start))
+
+    segments = []
+    position = 0
+    for copy in sorted(copies):
+        if copy[0] > position:
+            segments.append((position, copy[0], None, None))
+        segments.append(copy)
+        position = copy[1]
+    if position < duration:
+        segments.append((position, duration, None, None))
+    return segments
+
+
+class SourceInfo(object):
+    """
+    What L{SourceScanner} found out about a file.
+
+    @ivar caps: The encoded caps of the streams, by kind.
+    @type caps: C{dict}
+    @ivar keyframes: The timestamps of the video keyframes.
+    @type keyframes: C{list}
+    @ivar duration: The end of the last buffer.
+    @type duration: C{long}
+    @ivar ambiguous: Whether there's more than one stream of a kind.
+    @type ambiguous: C{bool}
+    @ivar reordered: Whether the video frames are stored in another order
+    than they are shown, like B-frames.
+    @type reordered: C{bool}
+    """
+
+    def __init__(self, uri):
+        self.uri = uri
+        self.caps = {}
+        self.keyframes = []
+        self.duration = 0
+        self.ambiguous = False
+        self.reordered = False
+
+
+class SourceScanner(Signallable, Loggable):
+    """
+    Demuxes a file without decoding it to find its encoded caps and
+    keyframes.
+
+    The "done" signal is emitted with the L{SourceInfo} and an error
+    message, or C{None}.
+    """
+
+    __signals__ = {
+        "done": ["info", "error"],
+        }
+
+    def __init__(self, uri, settings):
+        """
+        @param settings: The settings of the output, only its encoded
+        formats are looked for.
+        @type settings: L{ExportSettings}
+        """
+        Loggable.__init__(self)
+        self.info = SourceInfo(uri)
+        self.settings = settings
+        self._pipeline = None
+        self._last_video_timestamp = None
+
+    def start(self):
+        self.debug("scanning %s", self.info.uri)
+        self._pipeline = gst.Pipeline("scan")
+        source = gst.element_make_from_uri(gst.URI_SRC, self.info.uri)
+        dbin = gst.element_factory_make("decodebin2")
+        caps = get_encoded_caps(self.settings)
+        caps.append(RAW_CAPS)
+        dbin.props.caps = caps
+        dbin.connect("new-decoded-pad", self._newDecodedPadCb)
+        self._pipeline.add(source, dbin)
+        source.link(dbin)
+
+        bus = self._pipeline.get_bus()
+        bus.add_signal_watch()
+        bus.connect("message", self._messageCb)
+        self._pipeline.set_state(gst.STATE_PLAYING)
+
+    def stop(self):
+        if self._pipeline is not None:
+            self._pipeline.get_bus().remove_signal_watch()
+            self._pipeline.set_state(gst.STATE_NULL)
+            self._pipeline = None
+
+    def _newDecodedPadCb(self, unused_dbin, pad, unused_is_last):
+        # called from a streaming thread
+        caps = pad.get_caps()
+        kind = get_stream_kind(caps)
+        if kind in self.info.caps:
+            self.info.ambiguous = True
+        self.info.caps[kind] = caps
+
+        sink = gst.element_factory_make("fakesink")
+        sink.props.sync = False
+        sink.props.signal_handoffs = True
+        sink.connect("handoff", self._handoffCb, kind)
+        self._pipeline.add(sink)
+        sink.sync_state_with_parent()
+        pad.link(sink.get_pad("sink"))
+
+    def _handoffCb(self, unused_sink, buf, pad, kind):
+        # called from a streaming thread
+        if buf.timestamp == gst.CLOCK_TIME_NONE:
+            return
+        # the fixed caps have the codec headers
+        self.info.caps[kind] = pad.get_negotiated_caps()
+        end = buf.timestamp
+        if buf.duration != gst.CLOCK_TIME_NONE:
+            end += buf.duration
+        self.info.duration = max(self.info.duration, end)
+        if kind == "video":
+            last = self._last_video_timestamp
+            if last is not None and buf.timestamp < last:
+                self.info.reordered = True
+            self._last_video_timestamp = buf.timestamp
+        if kind == "video" and \
+                not buf.flag_is_set(gst.BUFFER_FLAG_DELTA_UNIT) and \
+                not buf.flag_is_set(gst.BUFFER_FLAG_IN_CAPS):
+            self.info.keyframes.append(buf.timestamp)
+
+    def _messageCb(self, unused_bus, message):
+        if message.type == gst.MESSAGE_EOS:
+            self.stop()
+            self.info.keyframes.sort()
+            self.emit("done", self.info, None)
+        elif message.type == gst.MESSAGE_ERROR:
+            gerror, detail = message.parse_error()
+            self.stop()
+            self.emit("done", self.info, gerror.message)
+
+
+class SmartRenderer(ParallelRenderer):
+    """
+    Renders the timeline like L{ParallelRenderer}, copying what it can
+    instead of rendering it.
+
+    The files shown as is are scanned one after the other, the start of the
+    timeline is rendered to check that their codec headers are those of the
+    output with L{headers_match}, then the segments are planned with
+    L{plan_segments}.
+    """
+
+    def __init__(self, project_uri, output_uri, options=None,
+            out=sys.stdout, interval=PROGRESS_INTERVAL, jobs=None):
+        ParallelRenderer.__init__(self, project_uri, output_uri, options,
+                out, interval, jobs)
+        self.scanner = None
+        self.probe_worker = None
+        self._spans = []
+        self._infos = {}
+        self._to_scan = []
+        self._stream_types = (False, False)
+
+    def _startRender(self, have_video, have_audio):
+        self._stream_types = (have_video, have_audio)
+        self._kinds = get_output_kinds(self.settings, have_video, have_audio)
+        self._spans = get_clean_spans(self.project.timeline)
+        if not self._spans:
+            ParallelRenderer._startRender(self, have_video, have_audio)
+            return
+
+        self._to_scan = []
+        for start, end, uri, media_start in self._spans:
+            if uri not in self._to_scan:
+                self._to_scan.append(uri)
+        self._report("scanning", uris=self._to_scan)
+        self._scanNext()
+
+    def _scanNext(self):
+        if not self._to_scan:
+            if self._infos:
+                self._probeHeaders()
+            else:
+                self._plan()
+            return
+
+        self.scanner = SourceScanner(self._to_scan.pop(0), self.settings)
+        self.scanner.connect("done", self._scannerDoneCb)
+        self.scanner.start()
+
+    def _scannerDoneCb(self, scanner, info, error):
+        self.scanner = None
+        if self.error is not None:
+            return
+
+        if error is not None:
+            self.warning("couldn't scan %s: %s", info.uri, error)
+        elif can_copy(info, self.settings, self._kinds):
+            self._infos[info.uri] = info
+        self._scanNext()
+
+    def _probeHeaders(self):
+        """
+        Render the start of the timeline with the output settings, to get
+        the codec headers the rendered pieces will have.
+        """
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix="pitivi-render-")
+        extension = os.path.splitext(self.output_uri)[1]
+        uri = path_to_uri(os.path.join(self.directory, "headers" + extension))
+        end = min(self.project.timeline.duration, HEADER_PROBE_DURATION)
+        self._report("probing", uri=uri)
+        self.probe_worker = RangeWorker(self.project_uri, uri, 0, end,
+                self.settings, self._probeWorkerCb)
+
+    def _probeWorkerCb(self, worker, event):
+        if event is not None or self.error is not None:
+            return
+
+        self.probe_worker = None
+        if worker.error is not None:
+            self._dropCopies("couldn't render the headers: %s" % worker.error)
+            return
+
+        self.scanner = SourceScanner(worker.output_uri, self.settings)
+        self.scanner.connect("done", self._probeScannerDoneCb)
+        self.scanner.start()
+
+    def _probeScannerDoneCb(self, scanner, reference, error):
+        self.scanner = None
+        if self.error is not None:
+            return
+
+        if error is not None:
+            self._dropCopies("couldn't read the headers: %s" % error)
+            return
+
+        for uri, info in self._infos.items():
+            if not headers_match(info, reference, self._kinds):
+                self._report("incompatible", uri=uri)
+                del self._infos[uri]
+        self._plan()
+
+    def _dropCopies(self, message):
+        self.warning("%s, nothing is copied", message)
+        self._infos = {}
+        self._plan()
+
+    def _plan(self):
+        have_video, have_audio = self._stream_types
+        timeline = self.project.timeline
+        self._duration = timeline.duration
+        self.start = 0
+        self.end = self._duration
+        segments = plan_segments(self._duration, self._spans, self._infos,
+                "video" in self._kinds)
+        copies = [segment for segment in segments if segment[2] is not None]
+        if not copies:
+            ParallelRenderer._startRender(self, have_video, have_audio)
+            return
+
+        pieces = []
+        for segment in segments:
+            if segment in copies:
+                pieces.append(segment)
+            else:
+                pieces.extend(self._splitSegment(segment))
+        self._report("started", output=self.output_uri,
+                duration=self._duration, video=have_video, audio=have_audio,
+                ranges=[piece[:2] for piece in pieces if piece[2] is None],
+                copies=[copy[:2] for copy in copies])
+        self._started = time.time()
+        self._renderPieces(pieces)
+
+    def _splitSegment(self, segment):
+        start, end, uri, media_start = segment
+        return [(range_start, range_end, None, None)
+                for range_start, range_end in self._planRanges(start, end)]
+
+    def _concatenatorDoneCb(self, concatenator, error):
+        if error is None or not concatenator.incompatible:
+            ParallelRenderer._concatenatorDoneCb(self, concatenator, error)
+            return
+
+        # render the copies instead
+        self._report("fallback", message=error)
+        self.concatenator = None
+        pieces = []
+        for piece in self.pieces:
+            if piece[3] is None:
+                pieces.append(piece)
+            else:
+                pieces.extend(self._splitSegment(piece))
+        self._renderPieces(pieces)
+
+    def _cleanUp(self):
+        if self.scanner is not None:
+            self.scanner.stop()
+            self.scanner = None
+        if self.probe_worker is not None:
+            self.probe_worker.kill()
+            self.probe_worker = None
+        ParallelRenderer._cleanUp(self)
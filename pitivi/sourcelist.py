@@ -26,6 +26,9 @@ Handles the list of source for a project
 
 import urllib
 from pitivi.discoverer import Discoverer
+from pitivi.thumbnailer import Thumbnailer
+from pitivi.proxy import ProxyMaker
+from pitivi.discoveryreport import DiscoveryReport
 from pitivi.signalinterface import Signallable
 from pitivi.log.loggable import Loggable
 
@@ -40,6 +43,10 @@ class SourceList(Signallable, Loggable):
 
     @ivar discoverer: The discoverer object used internally
     @type discoverer: L{Discoverer}
+    @ivar report: The time spent importing the sources.
+    @type report: L{DiscoveryReport}
+    @ivar proxies: Makes the proxies of the sources, disabled by default.
+    @type proxies: L{ProxyMaker}
 
     Signals:
      - C{source-added} : A source has been discovered and added to the SourceList.
@@ -49,6 +56,10 @@ class SourceList(Signallable, Loggable):
      - C{discovery-error} : The given uri is not a media file.
      - C{ready} : No more files are being discovered/added.
      - C{starting} : Some files are being discovered/added.
+     - C{progress} : The number of files discovered so far, and the number of
+       files being discovered in total.
+     - C{source-updated} : The thumbnails of a source have been generated.
+     - C{proxy-done} : The proxy of a source has been made.
     """
 
     __signals__ = {
@@ -58,6 +69,9 @@ class SourceList(Signallable, Loggable):
         "source-added" : ["factory"],
         "source-removed" : ["uri"],
         "discovery-error" : ["uri", "reason"],
+        "progress" : ["done", "total"],
+        "source-updated" : ["factory"],
+        "proxy-done" : ["factory"],
         }
 
     def __init__(self):
@@ -71,9 +85,19 @@ class SourceList(Signallable, Loggable):
         self.discoverer.connect("discovery-done", self._discoveryDoneCb)
         self.discoverer.connect("starting", self._discovererStartingCb)
         self.discoverer.connect("ready", self._discovererReadyCb)
+        self.discoverer.connect("progress", self._discovererProgressCb)
         self.discoverer.connect("missing-plugins",
                 self._discovererMissingPluginsCb)
 
+        self.thumbnailer = Thumbnailer(self.discoverer.cache)
+        self.thumbnailer.connect("thumbnail-done", self._thumbnailDoneCb)
+
+        self.proxies = ProxyMaker()
+        self.proxies.connect("proxy-done", self._proxyDoneCb)
+
+        self.report = DiscoveryReport()
+        self.discoverer.connect("timing", self._discovererTimingCb)
+        self.thumbnailer.connect("timing", self._thumbnailerTimingCb)
 
     def addUri(self, uri):
         """
@@ -88,15 +112,27 @@ class SourceList(Signallable, Loggable):
 
         self.discoverer.addUri(uri)
 
-    def addUris(self, uris):
+    def addUris(self, uris, skip_existing=False):
         """
         Add c{uris} to the source list.
 
         The uris will be analyzed before being added.
+
+        @param skip_existing: Ignore the uris that are already in the source
+        list, instead of raising L{SourceListError}.
+        @type skip_existing: C{bool}
         """
+        if skip_existing:
+            uris = [uri for uri in uris if uri not in self._sources]
         for uri in uris:
             self.addUri(uri)
 
+    def getPendingCount(self):
+        """
+        Return the number of uris waiting to be analyzed.
+        """
+        return len(self.discoverer.queue)
+
     def removeUri(self, uri):
         """
         Remove the factory for c{uri} from the source list.
@@ -112,6 +148,9 @@ class SourceList(Signallable, Loggable):
             # this can only happen if discoverer hasn't finished scanning the
             # source, so factory must be None
             assert factory is None
+        else:
+            self.thumbnailer.remove(factory)
+            self.proxies.remove(factory)
 
         self.emit("source-removed", uri, factory)
 
@@ -136,6 +175,8 @@ class SourceList(Signallable, Loggable):
         self._sources[factory.uri] = factory
         self._ordered_sources.append(factory)
         self.emit("source-added", factory)
+        self.thumbnailer.add(factory)
+        self.proxies.add(factory)
 
     def getSources(self):
         """ Returns the list of sources used.
@@ -161,10 +202,39 @@ class SourceList(Signallable, Loggable):
         self.emit("discovery-error", uri, reason, extra)
 
     def _discovererStartingCb(self, unused_discoverer):
+        # make room for discovery, thumbnails and proxies can wait
+        self.thumbnailer.pause()
+        self.proxies.pause()
         self.emit("starting")
 
     def _discovererReadyCb(self, unused_discoverer):
+        self.info("import times in ms (mean/max):\n%s", self.report)
         self.emit("ready")
+        self.thumbnailer.resume()
+        self.proxies.resume()
+
+    def _discovererProgressCb(self, unused_discoverer, done, total):
+        self.emit("progress", done, total)
+
+    def _discovererTimingCb(self, unused_discoverer, uri, mime, timings):
+        self.report.addTimings(uri, timings, mime)
+
+    def _thumbnailerTimingCb(self, unused_thumbnailer, uri, timings):
+        self.report.addTimings(uri, timings)
+
+    def _thumbnailDoneCb(self, unused_thumbnailer, factory):
+        if self._sources.get(factory.uri) is not factory:
+            # the source was removed in the meantime
+            return
+
+        self.emit("source-updated", factory)
+
+    def _proxyDoneCb(self, unused_proxies, factory):
+        if self._sources.get(factory.uri) is not factory:
+            # the source was removed in the meantime
+            return
+
+        self.emit("proxy-done", factory)
 
     def _discovererMissingPluginsCb(self, discoverer, uri, factory,
             details, descriptions, missingPluginsCallback):
@@ -466,8 +466,9 @@ class StreamGroupWalker(object):
     """
     Utility class used to match two groups of streams.
 
-    This class implements a greedy algorithm to compare two sets of streams. See
-    match_stream_groups for an example of usage.
+    This class enumerates every possible pairing of two sets of streams, which
+    takes factorial time. match_stream_groups finds the same best match with
+    the hungarian algorithm instead.
     """
     def __init__(self, group_a, group_b,
             stream_a=None, stream_b=None, parent=None):
@@ -513,6 +514,71 @@ class StreamGroupWalker(object):
 
         return matches
 
+def _max_weight_assignment(weights):
+    """
+    Solve the assignment problem on the square matrix C{weights} with the
+    hungarian algorithm, in O(n^3).
+
+    @return: The column assigned to each row, so that the sum of the weights
+    is the highest possible.
+    @rtype: C{list} of C{int}
+    """
+    size = len(weights)
+    highest = max([max(row) for row in weights] + [0])
+    # minimize costs instead of maximizing weights, rows and columns are
+    # numbered from 1, 0 is the column being added
+    cost = [None] + [[None] + [highest - weight for weight in row]
+            for row in weights]
+    infinity = highest * size + 1
+    row_potential = [0] * (size + 1)
+    column_potential = [0] * (size + 1)
+    column_row = [0] * (size + 1)
+    way = [0] * (size + 1)
+
+    for row in xrange(1, size + 1):
+        column_row[0] = row
+        column = 0
+        slack = [infinity] * (size + 1)
+        used = [False] * (size + 1)
+        while True:
+            used[column] = True
+            current_row = column_row[column]
+            delta = infinity
+            next_column = 0
+            for other in xrange(1, size + 1):
+                if used[other]:
+                    continue
+                reduced = cost[current_row][other] - \
+                        row_potential[current_row] - column_potential[other]
+                if reduced < slack[other]:
+                    slack[other] = reduced
+                    way[other] = column
+                if slack[other] < delta:
+                    delta = slack[other]
+                    next_column = other
+
+            for other in xrange(size + 1):
+                if used[other]:
+                    row_potential[column_row[other]] += delta
+                    column_potential[other] -= delta
+                else:
+                    slack[other] -= delta
+
+            column = next_column
+            if column_row[column] == 0:
+                break
+
+        # augment along the alternating path
+        while column:
+            previous = way[column]
+            column_row[column] = column_row[previous]
+            column = previous
+
+    assignment = [0] * size
+    for column in xrange(1, size + 1):
+        assignment[column_row[column] - 1] = column - 1
+    return assignment
+
 def match_stream_groups(group_a, group_b):
     """
     Match two groups of streams.
@@ -521,26 +587,40 @@ def match_stream_groups(group_a, group_b):
     a dictionary of (stream_a, stream_b) -> rank, where stream_a belongs to
     group_a, stream_b belongs to group_b and rank is stream_compare(stream_a,
     stream_b).
-    The algorithm tries all the possible combinations of group_a and group_b and
-    returns the "best" match between group_a and group_b, ie the dictionary
-    having the sum of the ranks maximized.
+    The "best" match between group_a and group_b is returned, ie the
+    dictionary having the sum of the ranks maximized. Pairs of streams that
+    don't match at all are left out. When several matches are equally good,
+    the one pairing the streams that come first in group_a with the streams
+    that come first in group_b is returned.
     """
-    walker = StreamGroupWalker(group_a, group_b)
-    walkers = [walker]
-    best_rank = 0
+    group_a = list(group_a)
+    group_b = list(group_b)
+    if not group_a or not group_b:
+        return {}
+    size = max(len(group_a), len(group_b))
+
+    # the smaller group is padded with streams that don't match anything.
+    # Ranks are scaled so that ties are broken by a number having one digit
+    # in base size per stream of group_a, the highest one for the first
+    # stream of group_b.
+    scale = size ** size
+    weights = []
+    for i in xrange(size):
+        row = []
+        for j in xrange(size):
+            rank = STREAM_MATCH_NONE
+            if i < len(group_a) and j < len(group_b):
+                rank = stream_compare(group_a[i], group_b[j])
+            row.append(rank * scale + (size - 1 - j) * size ** (size - 1 - i))
+        weights.append(row)
+
     best_map = {}
-    while walkers:
-        walker = walkers.pop(0)
-        child_walkers = walker.advance()
-        if child_walkers:
-            walkers.extend(child_walkers)
+    for i, j in enumerate(_max_weight_assignment(weights)):
+        if i >= len(group_a) or j >= len(group_b):
             continue
-
-        current_map = walker.getMatches()
-        current_rank = sum(current_map.values())
-        if current_rank > best_rank:
-            best_rank = current_rank
-            best_map = current_map
+        rank = stream_compare(group_a[i], group_b[j])
+        if rank > STREAM_MATCH_NONE:
+            best_map[group_a[i], group_b[j]] = rank
 
     return best_map
 
@@ -22,7 +22,14 @@
 Threading support
 """
 
+from __future__ import with_statement
+
+import heapq
+import os
 import threading
+import time
+import gobject
+
 from pitivi.signalinterface import Signallable
 from pitivi.log.loggable import Loggable
 
@@ -73,41 +80,271 @@ class CallbackThread(Thread):
     def process(self):
         self.callback(*self.args, **self.kwargs)
 
-class ThreadMaster(Loggable):
+# job priorities, lower values run first like gobject.PRIORITY_*
+PRIORITY_HIGH = -100
+PRIORITY_DEFAULT = 0
+PRIORITY_LOW = 100
+
+(FUTURE_PENDING,
+ FUTURE_RUNNING,
+ FUTURE_DONE,
+ FUTURE_FAILED,
+ FUTURE_CANCELLED) = range(5)
+
+
+class CancellationToken(object):
     """
-    Controls all thread existing in pitivi
+    Passed to every job run by a L{WorkerPool}. Long running jobs should
+    check L{cancelled} regularly and return early when it is set.
     """
 
     def __init__(self):
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._event.isSet()
+
+    def cancel(self):
+        self._event.set()
+
+    def wait(self, timeout):
+        """
+        Sleep for at most C{timeout} seconds, waking up early on cancellation.
+
+        @return: Whether the token was cancelled.
+        @rtype: C{bool}
+        """
+        self._event.wait(timeout)
+        return self._event.isSet()
+
+
+class Future(Signallable):
+    """
+    The result of a job submitted to a L{WorkerPool}.
+
+    Signals are always emitted from the main loop, never from the worker
+    thread that ran the job.
+
+    Signals:
+     - C{done} : The job returned C{result}.
+     - C{error} : The job raised C{exception}.
+     - C{cancelled} : The job was cancelled before it could finish.
+
+    @ivar state: One of the C{FUTURE_*} constants.
+    @ivar token: The L{CancellationToken} passed to the job.
+    """
+
+    __signals__ = {
+        "done": ["result"],
+        "error": ["exception"],
+        "cancelled": None,
+        }
+
+    def __init__(self, priority=PRIORITY_DEFAULT):
+        self.priority = priority
+        self.state = FUTURE_PENDING
+        self.token = CancellationToken()
+        self.result = None
+        self.exception = None
+        self._pool = None
+
+    def cancel(self):
+        """
+        Cancel the job. If it is already running, it is up to the job to
+        notice it through its token.
+        """
+        self.token.cancel()
+        if self._pool is not None:
+            self._pool._cancelPending(self)
+
+    def isFinished(self):
+        return self.state in (FUTURE_DONE, FUTURE_FAILED, FUTURE_CANCELLED)
+
+    def _deliver(self):
+        if self.state == FUTURE_DONE:
+            self.emit("done", self.result)
+        elif self.state == FUTURE_FAILED:
+            self.emit("error", self.exception)
+        elif self.state == FUTURE_CANCELLED:
+            self.emit("cancelled")
+        return False
+
+
+def cpu_count():
+    try:
+        return max(1, os.sysconf("SC_NPROCESSORS_ONLN"))
+    except (AttributeError, ValueError, OSError):
+        return 2
+
+
+class WorkerPool(Loggable):
+    """
+    Runs jobs on a bounded number of worker threads.
+
+    Jobs are callables taking a L{CancellationToken} as first argument. They
+    are queued by priority, then in submission order, and their results are
+    delivered on the main loop through the L{Future} returned by L{submit}.
+
+    @ivar max_workers: The maximum number of threads running jobs.
+    """
+
+    def __init__(self, max_workers=None):
         Loggable.__init__(self)
-        self.threads = []
-
-    def addThread(self, threadclass, *args):
-        """ Start the given Thread """
-        # IDEA : We might need a limit of concurrent threads ?
-        # ... or some priorities ?
-        # FIXME : we should only accept subclasses of our Thread class
-        self.log("Adding thread of type %r", threadclass)
-        thread = threadclass(*args)
-        thread.connect("done", self._threadDoneCb)
-        self.threads.append(thread)
-        self.log("starting it...")
-        thread.start()
-        self.log("started !")
-
-    def _threadDoneCb(self, thread):
-        self.log("thread %r is done", thread)
-        self.threads.remove(thread)
-
-    def stopAllThreads(self):
-        """ Stop all running Thread(s) controlled by this master """
-        self.log("stopping all threads")
-        joinedthreads = 0
-        while(joinedthreads < len(self.threads)):
-            for thread in self.threads:
-                self.log("Trying to stop thread %r", thread)
-                try:
-                    thread.join()
-                    joinedthreads += 1
-                except:
-                    self.warning("what happened ??")
+        if max_workers is None:
+            max_workers = min(4, cpu_count())
+        self.max_workers = max_workers
+        self._cond = threading.Condition()
+        self._queue = []
+        self._sequence = 0
+        self._workers = []
+        self._idle = 0
+        self._running = set()
+        self._stopping = False
+
+        # metrics
+        self.peak_queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    def submit(self, func, args=(), priority=PRIORITY_DEFAULT):
+        """
+        Queue C{func(token, *args)} to be run on a worker thread.
+
+        @param priority: One of the C{PRIORITY_*} constants.
+        @return: The future of the job.
+        @rtype: L{Future}
+        @raise RuntimeError: If the pool is being stopped.
+        """
+        future = Future(priority)
+        future._pool = self
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("worker pool is stopped")
+            heapq.heappush(self._queue,
+                    (priority, self._sequence, future, func, args))
+            self._sequence += 1
+            self.peak_queued = max(self.peak_queued, len(self._queue))
+            # every idle worker will pick one job
+            if len(self._queue) > self._idle and \
+                    len(self._workers) < self.max_workers:
+                self._startWorker()
+            self._cond.notify()
+        self.log("queued %r with priority %d, queue depth %d",
+                func, priority, len(self._queue))
+
+        return future
+
+    def getStats(self):
+        """
+        Return a snapshot of the pool metrics.
+
+        @rtype: C{dict}
+        """
+        with self._cond:
+            return {"queued": len(self._queue),
+                    "peak_queued": self.peak_queued,
+                    "active": len(self._running),
+                    "workers": len(self._workers),
+                    "max_workers": self.max_workers,
+                    "completed": self.completed,
+                    "failed": self.failed,
+                    "cancelled": self.cancelled}
+
+    def stopAllThreads(self, timeout=5.0):
+        """
+        Stop the pool.
+
+        Queued jobs are cancelled, running jobs have their token cancelled and
+        are given up to C{timeout} seconds in total to return.
+
+        @return: Whether all the worker threads were stopped in time.
+        @rtype: C{bool}
+        """
+        self.debug("stopping, stats %r", self.getStats())
+        with self._cond:
+            self._stopping = True
+            while self._queue:
+                future = heapq.heappop(self._queue)[2]
+                self._finish(future, FUTURE_CANCELLED)
+            for future in self._running:
+                future.token.cancel()
+            self._cond.notifyAll()
+            workers = list(self._workers)
+
+        deadline = time.time() + timeout
+        stopped = True
+        for worker in workers:
+            worker.join(max(0, deadline - time.time()))
+            if worker.isAlive():
+                self.warning("worker %s didn't stop in time", worker.getName())
+                stopped = False
+
+        return stopped
+
+    def _startWorker(self):
+        # called with self._cond held
+        worker = threading.Thread(target=self._workerLoop,
+                name="pitivi-worker-%d" % len(self._workers))
+        # don't let a stuck job keep the process alive
+        worker.setDaemon(True)
+        self._workers.append(worker)
+        worker.start()
+
+    def _cancelPending(self, future):
+        with self._cond:
+            if future.state != FUTURE_PENDING:
+                return
+            for i, entry in enumerate(self._queue):
+                if entry[2] is future:
+                    del self._queue[i]
+                    heapq.heapify(self._queue)
+                    break
+            self._finish(future, FUTURE_CANCELLED)
+
+    def _finish(self, future, state, result=None, exception=None):
+        # called with self._cond held
+        future.state = state
+        future.result = result
+        future.exception = exception
+        future._pool = None
+        if state == FUTURE_DONE:
+            self.completed += 1
+        elif state == FUTURE_FAILED:
+            self.failed += 1
+        else:
+            self.cancelled += 1
+        gobject.idle_add(future._deliver)
+
+    def _workerLoop(self):
+        while True:
+            with self._cond:
+                self._idle += 1
+                while not self._queue and not self._stopping:
+                    self._cond.wait()
+                self._idle -= 1
+                if self._stopping:
+                    self._workers.remove(threading.currentThread())
+                    return
+
+                priority, sequence, future, func, args = \
+                        heapq.heappop(self._queue)
+                future.state = FUTURE_RUNNING
+                self._running.add(future)
+
+            state = FUTURE_DONE
+            result = exception = None
+            try:
+                result = func(future.token, *args)
+            except Exception, e:
+                self.warning("job %r failed: %s", func, e)
+                state = FUTURE_FAILED
+                exception = e
+
+            if future.token.cancelled and state == FUTURE_DONE:
+                state = FUTURE_CANCELLED
+
+            with self._cond:
+                self._running.discard(future)
+                self._finish(future, state, result, exception)
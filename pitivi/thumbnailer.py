@@ -0,0 +1,251 @@
+# PiTiVi , Non-linear video editor
+#
+#       thumbnailer.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+"""
+Thumbnails of the sources shown in the source list.
+
+Discovery only needs the streams and the duration of a file, decoding a frame
+to make its thumbnail takes longer than that. Thumbnails are generated
+afterwards, in batches, while nothing is being discovered.
+"""
+
+import os
+import struct
+import zlib
+import hashlib
+
+import gobject
+import gst
+
+from pitivi.backgroundjobs import BackgroundJobQueue
+from pitivi.settings import xdg_cache_home
+from pitivi.stream import VideoStream
+
+THUMBNAIL_SIZE = 96
+
+THUMBNAIL_CAPS = "video/x-raw-rgb, bpp=(int)24, depth=(int)24, " \
+        "endianness=(int)4321, red_mask=(int)0xff0000, " \
+        "green_mask=(int)0xff00, blue_mask=(int)0xff, " \
+        "width=(int)[1, %(size)d], height=(int)[1, %(size)d]" % \
+        {"size": THUMBNAIL_SIZE}
+
+
+def get_thumbnail_filename(uri):
+    """
+    Return the file where the thumbnail of C{uri} is stored.
+    """
+    directory = os.path.join(xdg_cache_home(), "pitivi")
+    try:
+        os.makedirs(directory)
+    except OSError, e:
+        # 17 = file exists
+        if e.errno != 17:
+            raise
+
+    return os.path.join(directory, hashlib.md5(uri).hexdigest() + ".png")
+
+
+def _pngChunk(chunk_type, data):
+    return struct.pack(">I", len(data)) + chunk_type + data + \
+            struct.pack(">I", zlib.crc32(chunk_type + data) & 0xffffffff)
+
+
+def write_png(filename, width, height, data):
+    """
+    Write packed 24 bit RGB C{data} as a PNG file. Rows are expected to be
+    padded to 4 bytes, like in GStreamer buffers.
+    """
+    stride = (width * 3 + 3) & ~3
+    # every row starts with its filter type, 0 is none
+    rows = ["\0" + data[row * stride:row * stride + width * 3]
+            for row in xrange(height)]
+
+    f = open(filename + ".tmp", "wb")
+    try:
+        f.write("\x89PNG\r\n\x1a\n")
+        f.write(_pngChunk("IHDR",
+                struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        f.write(_pngChunk("IDAT", zlib.compress("".join(rows))))
+        f.write(_pngChunk("IEND", ""))
+    finally:
+        f.close()
+    os.rename(filename + ".tmp", filename)
+
+
+class Thumbnailer(BackgroundJobQueue):
+    """
+    Generates the thumbnails of the video streams of sources, one source at
+    a time, in batches, see L{BackgroundJobQueue}.
+
+    The "thumbnail-done" signal is emitted when the thumbnails of a factory
+    are set. The "timing" signal is emitted after each attempt to make a
+    thumbnail, with the time it took in the C{thumbnail} key.
+
+    @ivar timeout: How long to wait for a thumbnail, in seconds.
+    @type timeout: C{int}
+    """
+
+    __signals__ = {
+        "thumbnail-done": ["factory"],
+        "timing": ["uri", "timings"],
+        }
+
+    job_name = "thumbnail"
+
+    def __init__(self, cache=None, batch_size=8, timeout=10):
+        """
+        @param cache: Where discovery results are stored, updated with the
+        new thumbnails.
+        @type cache: L{DiscoveryCache}
+        """
+        BackgroundJobQueue.__init__(self, batch_size)
+        self.cache = cache
+        self.timeout = timeout
+        self._sink = None
+        self._seeked = False
+        self._timeout_id = 0
+
+    def add(self, factory):
+        """
+        Queue the video streams of C{factory} that have no thumbnail.
+
+        @return: Whether the factory was queued.
+        @rtype: C{bool}
+        """
+        if not self._getStreams(factory):
+            return False
+
+        return BackgroundJobQueue.add(self, factory)
+
+    def _getStreams(self, factory):
+        # pictures are shown as they are
+        return [stream for stream in factory.getOutputStreams(VideoStream)
+                if stream.thumbnail is None and not stream.is_image]
+
+    def _getFilename(self, factory):
+        return get_thumbnail_filename(factory.uri)
+
+    def _setFile(self, factory, filename):
+        for stream in self._getStreams(factory):
+            stream.thumbnail = filename
+
+        if self.cache is not None:
+            self.cache.store(factory)
+        self.emit("thumbnail-done", factory)
+
+    def _start(self, factory, filename):
+        self._seeked = False
+
+        uri = factory.uri
+        if factory.proxy_uri is not None and factory.use_proxy:
+            # the proxy is much faster to seek in
+            uri = factory.proxy_uri
+        source = gst.element_make_from_uri(gst.URI_SRC, uri)
+        if source is None:
+            self._finish(False)
+            return
+
+        pipeline = gst.Pipeline("Thumbnailer-%s" % factory.uri)
+        dbin = gst.element_factory_make("decodebin2")
+        dbin.connect("new-decoded-pad", self._newDecodedPadCb)
+        pipeline.add(source, dbin)
+        source.link(dbin)
+        self._watchPipeline(pipeline, {"async-done": self._busAsyncDoneCb})
+
+        self._timeout_id = gobject.timeout_add_seconds(self.timeout,
+                self._timeoutCb)
+        if pipeline.set_state(gst.STATE_PAUSED) == gst.STATE_CHANGE_FAILURE:
+            self._finish(False)
+
+    def _newDecodedPadCb(self, unused_dbin, pad, unused_is_last):
+        # called from a streaming thread
+        elements = []
+        if str(pad.get_caps()).startswith("video/x-raw") and \
+                self._sink is None:
+            csp = gst.element_factory_make("ffmpegcolorspace")
+            vscale = gst.element_factory_make("videoscale")
+            sink = gst.element_factory_make("fakesink")
+            elements = [csp, vscale, sink]
+            self._pipeline.add(*elements)
+            csp.link(vscale)
+            vscale.link(sink, gst.Caps(THUMBNAIL_CAPS))
+            self._sink = sink
+        else:
+            elements = [gst.element_factory_make("fakesink")]
+            self._pipeline.add(*elements)
+
+        for element in elements:
+            element.sync_state_with_parent()
+        pad.link(elements[0].get_pad("sink"))
+
+    def _busAsyncDoneCb(self, unused_bus, unused_message):
+        if self._sink is None:
+            self._finish(False)
+            return
+
+        if not self._seeked:
+            self._seeked = True
+            try:
+                duration = self._pipeline.query_duration(gst.FORMAT_TIME)[0]
+            except gst.QueryError:
+                duration = 0
+
+            # the first frame is often black, use one from further in
+            if duration and self._pipeline.seek_simple(gst.FORMAT_TIME,
+                    gst.SEEK_FLAG_FLUSH | gst.SEEK_FLAG_KEY_UNIT,
+                    duration / 3):
+                self.debug("doing thumbnail seek at %s",
+                        gst.TIME_ARGS(duration / 3))
+                return
+
+        buf = self._sink.props.last_buffer
+        if buf is None:
+            self._finish(False)
+            return
+
+        structure = buf.caps[0]
+        try:
+            write_png(self._getPartFilename(), structure["width"],
+                    structure["height"], buf.data)
+        except (IOError, OSError), e:
+            self.warning("couldn't write thumbnail: %s", e)
+            self._finish(False)
+            return
+
+        self._finish(True)
+
+    def _timeoutCb(self):
+        self._timeout_id = 0
+        self.warning("timeout making thumbnail for %s", self._current[0].uri)
+        self._finish(False)
+
+        return False
+
+    def _stop(self):
+        if self._timeout_id:
+            gobject.source_remove(self._timeout_id)
+            self._timeout_id = 0
+        self._sink = None
+
+    def _jobDone(self, factory, success, duration):
+        self.emit("timing", factory.uri, {"thumbnail": duration})
+
+    def _batchDone(self):
+        if self.cache is not None:
+            self.cache.save()
@@ -20,10 +20,13 @@
 # Free Software Foundation, Inc., 59 Temple Place - Suite 330,
 # Boston, MA 02111-1307, USA.
 
+from __future__ import with_statement
+
 from bisect import bisect_left
 
 from pitivi.signalinterface import Signallable
 from pitivi.log.loggable import Loggable
+from pitivi.log import tracing
 from pitivi.utils import UNKNOWN_DURATION, closest_item, PropertyChangeTracker
 from pitivi.timeline.track import TrackObject, SourceTrackObject,\
      TrackEffect, TrackError
@@ -1050,6 +1053,10 @@ class EditingContext(object):
         self._snap = snap
 
     def editTo(self, position, priority):
+        with tracing.span("%s.editTo" % type(self).__name__, "timeline"):
+            return self._editToUnchecked(position, priority)
+
+    def _editToUnchecked(self, position, priority):
         if self._mode == self.DEFAULT:
             position, priority = self._defaultTo(position, priority)
         if self._mode == self.ROLL:
@@ -1476,6 +1483,8 @@ class Timeline(Signallable, Loggable):
      - C{track-added} : A L{timeline.Track} was added.
      - C{track-removed} : A L{timeline.Track} was removed.
      - C{selection-changed} : The current selection changed.
+     - C{preview-changed} : The timeline is now played back for previewing,
+       or rendered.
 
     @ivar tracks: list of Tracks controlled by the Timeline
     @type tracks: List of L{timeline.Track}
@@ -1483,6 +1492,11 @@ class Timeline(Signallable, Loggable):
     @type duration: C{long}
     @ivar selection: The currently selected TimelineObjects
     @type selection: L{Selection}
+    @ivar use_proxies: Whether the sources are decoded from their proxies.
+    @type use_proxies: C{bool}
+    @ivar preview: Whether the timeline is played back for previewing, which
+    allows proxies and the render cache to be used.
+    @type preview: C{bool}
     """
     __signals__ = {
         'duration-changed': ['duration'],
@@ -1491,7 +1505,8 @@ class Timeline(Signallable, Loggable):
         'track-added': ['track'],
         'track-removed': ['track'],
         'selection-changed': [],
-        'disable-updates': ['bool']
+        'disable-updates': ['bool'],
+        'preview-changed': ['preview'],
     }
 
     def __init__(self):
@@ -1506,6 +1521,8 @@ class Timeline(Signallable, Loggable):
         self.dead_band = 10
         self.edges = TimelineEdges()
         self.property_trackers = {}
+        self.use_proxies = True
+        self.preview = True
 
     def addTrack(self, track):
         """
@@ -1626,6 +1643,49 @@ class Timeline(Signallable, Loggable):
         for obj in objs:
             self.removeTimelineObject(obj, deep=True)
 
+    def setPreview(self, preview):
+        """
+        Play the timeline back for previewing, or render it: proxies are
+        only used while previewing.
+
+        @precondition: The pipeline must be in the NULL or READY state.
+        """
+        self.preview = preview
+        self.setUseProxies(preview)
+        self.emit("preview-changed", preview)
+
+    def setUseProxies(self, use_proxies):
+        """
+        Decode the sources from their proxies, or from the original files.
+
+        @precondition: The pipeline must be in the NULL or READY state.
+        """
+        self.use_proxies = use_proxies
+        self.updateProxies()
+
+    def updateProxies(self, factory=None):
+        """
+        Rebuild the bins of the track objects that don't decode what their
+        factory wants anymore, after a proxy was made or L{setUseProxies} was
+        called.
+
+        @param factory: Only update the track objects of this factory.
+        @precondition: The pipeline must be in the NULL or READY state.
+        """
+        for track in self.tracks:
+            for track_object in track.track_objects:
+                if not isinstance(track_object, SourceTrackObject):
+                    continue
+                if factory is not None and track_object.factory is not factory:
+                    continue
+                track_object.factory.use_proxy = self.use_proxies
+
+                for bin in track_object.gnl_object.elements():
+                    if track_object.factory.isBinOutdated(bin):
+                        self.debug("rebuilding the bin of %r", track_object)
+                        track_object.rebuildBin()
+                    break
+
     def _timelineObjectStartChangedCb(self, timeline_object, start):
         self.timeline_objects.remove(timeline_object)
         start_insort_right(self.timeline_objects, timeline_object)
@@ -19,6 +19,8 @@
 # Free Software Foundation, Inc., 59 Temple Place - Suite 330,
 # Boston, MA 02111-1307, USA.
 
+from __future__ import with_statement
+
 import gst
 import gobject
 
@@ -276,6 +278,13 @@ class Interpolator(Signallable, Loggable):
                 yield kf
         yield self.end
 
+    def isUntouched(self):
+        """Return whether the curve is flat at the default property value"""
+        if list(self.getInteriorKeyframes()):
+            return False
+        return self.start.value == self._default and \
+                self.end.value == self._default
+
     def updateMediaStart(self, start):
         self._keyframeTimeValueChanged(self.start, start, self.start.value)
         self.start.setObjectTime(start)
@@ -321,6 +330,8 @@ class TrackObject(Signallable, Loggable):
         self._public_priority = priority
         self._position = 0
         self._stagger = 0
+        self._active = True
+        self._cached = False
         self.gnl_object = obj = self._makeGnlObject()
         self.keyframes = []
 
@@ -456,13 +467,25 @@ class TrackObject(Signallable, Loggable):
     start = property(_getStart, setStart)
 
     def _getActive(self):
-        return self.gnl_object.props.active
+        return self._active
 
     def setActive(self, active):
-        self.gnl_object.props.active = active
+        self._active = active
+        self._updateGnlActive()
 
     active = property(_getActive, setActive)
 
+    def setCached(self, cached):
+        """
+        Leave the object out of the composition while a render cache file
+        is played in its place, without changing L{active}.
+        """
+        self._cached = cached
+        self._updateGnlActive()
+
+    def _updateGnlActive(self):
+        self.gnl_object.props.active = self._active and not self._cached
+
     def _getDuration(self):
         return self.gnl_object.props.duration
 
@@ -644,6 +667,14 @@ class TrackObject(Signallable, Loggable):
             self.factory.releaseBin(bin)
         self._rebuild_interpolators = True
 
+    def rebuildBin(self):
+        """
+        Replace the bin with a new one from the factory, keeping the
+        keyframes.
+        """
+        self.releaseBin()
+        self.makeBin()
+
     def _notifyStartCb(self, obj, pspec):
         self.emit('start-changed', obj.props.start)
 
@@ -1015,23 +1046,46 @@ class Track(Signallable, Loggable):
                 t(source.props.start + source.props.duration))
 
     def _updateDefaultSourcesUnchecked(self):
+        gaps = [(gap.start, gap.initial_duration)
+                for gap in Gap.findAllGaps(self.track_objects)]
+
+        # an edit only changes a few gaps: keep the sources that still fill
+        # one, move the others to the new gaps and only create or remove the
+        # difference, making sources is much slower than moving them
+        sources = []
+        unused = []
         for source in self.default_sources:
+            span = (source.props.start, source.props.duration)
+            if span in gaps:
+                gaps.remove(span)
+                sources.append(source)
+            else:
+                unused.append(source)
+
+        for start, duration in gaps:
+            if unused:
+                gnl_object = unused.pop(0)
+                gnl_object.props.start = start
+                gnl_object.props.duration = duration
+                self.debug("moving default source %s",
+                        self._sourceDebug(gnl_object))
+            else:
+                source = self._getDefaultTrackObjectForStream(self.stream)
+                gnl_object = source.gnl_object
+                gnl_object.props.start = start
+                gnl_object.props.duration = duration
+                self.debug("adding default source %s",
+                        self._sourceDebug(gnl_object))
+                self.composition.add(gnl_object)
+            sources.append(gnl_object)
+
+        for source in unused:
             self.debug("removing default source %s", self._sourceDebug(source))
             self._shutdownDefaultSource(source)
             self.composition.remove(source)
             source.set_state(gst.STATE_NULL)
-        gaps = Gap.findAllGaps(self.track_objects)
 
-        self.default_sources = []
-        for gap in gaps:
-            source = self._getDefaultTrackObjectForStream(self.stream)
-            gnl_object = source.gnl_object
-            gnl_object.props.start = gap.start
-            gnl_object.props.duration = gap.initial_duration
-            self.debug("adding default source %s",
-                    self._sourceDebug(source.gnl_object))
-            self.composition.add(gnl_object)
-            self.default_sources.append(gnl_object)
+        self.default_sources = sources
 
     def updateDefaultSources(self):
         if not self.composition.props.update:
@@ -1286,6 +1340,10 @@ class Track(Signallable, Loggable):
     valid_arrangement = True
 
     def updateTransitions(self):
+        with self.span("updateTransitions"):
+            self._updateTransitionsUnchecked()
+
+    def _updateTransitionsUnchecked(self):
         # create all new transitions
         valid_slots = set()
         all_valid = True
@@ -40,6 +40,9 @@ from pitivi.action import render_action_for_uri, ViewAction
 from pitivi.factories.base import SourceFactory
 from pitivi.factories.timeline import TimelineSourceFactory
 from pitivi.settings import export_settings_to_render_settings
+from pitivi.renderstats import RenderStats, get_stats_filename
+from pitivi.renderqueue import RenderQueue, job_for_settings
+from pitivi.formatters.base import FormatterError
 from pitivi.stream import VideoStream, AudioStream
 from pitivi.utils import beautify_length
 
@@ -60,6 +63,8 @@ class EncodingDialog(GladeWindow, Loggable):
         self.cancelbutton = self.widgets["cancelbutton"]
         self.recordbutton = self.widgets["recordbutton"]
         self.recordbutton.set_sensitive(False)
+        self.queuebutton = self.widgets["queuebutton"]
+        self.queuebutton.set_sensitive(False)
         self.vinfo = self.widgets["videoinfolabel"]
         self.ainfo = self.widgets["audioinfolabel"]
         self.window.set_icon_from_file(configure.get_pixmap_dir() + "/pitivi-render-16.png")
@@ -75,6 +80,7 @@ class EncodingDialog(GladeWindow, Loggable):
         self.outfile = None
         self.rendering = False
         self.renderaction = None
+        self.stats = None
         self.settings = project.getSettings()
         self.timestarted = 0
         self._displaySettings()
@@ -119,6 +125,7 @@ class EncodingDialog(GladeWindow, Loggable):
             shortfilename = os.path.basename(urlparse(self.outfile).path)
             button.set_label(urllib.url2pathname(shortfilename))
             self.recordbutton.set_sensitive(True)
+            self.queuebutton.set_sensitive(True)
             self.progressbar.set_text("")
             self.app.settings.lastExportFolder = dialog.get_current_folder()
         dialog.destroy()
@@ -128,13 +135,16 @@ class EncodingDialog(GladeWindow, Loggable):
         timediff = time.time() - self.timestarted
         length = self.project.timeline.duration
         self.progressbar.set_fraction(float(min(position, length)) / float(length))
+        row = self.stats.sample(position)
         if timediff > 5.0 and position:
             # only display ETA after 5s in order to have enough averaging and
             # if the position is non-null
             totaltime = (timediff * float(length) / float(position)) - timediff
             length = beautify_length(int(totaltime * gst.SECOND))
             if length:
-                self.progressbar.set_text(_("About %s left") % length)
+                self.progressbar.set_text(
+                        _("About %(time)s left, %(fps).1f frames per second")
+                        % {"time": length, "fps": row["fps"]})
 
     def _changeSourceSettings(self, settings):
         videocaps = settings.getVideoCaps()
@@ -151,9 +161,28 @@ class EncodingDialog(GladeWindow, Loggable):
             self.cancelbutton.set_label("gtk-cancel")
             self.progressbar.set_text(_("Rendering"))
             self.recordbutton.set_sensitive(False)
+            self.queuebutton.set_sensitive(False)
             self.filebutton.set_sensitive(False)
             self.settingsbutton.set_sensitive(False)
 
+    def _queueButtonClickedCb(self, unused_button):
+        if not self.outfile or self.rendering:
+            return
+
+        # the queue renders a copy of the project as it is now, in a
+        # pitivi-render-queue process, so the project can be edited meanwhile
+        job = job_for_settings(self.project.uri, self.outfile, self.settings)
+        try:
+            RenderQueue().addJob(job, project=self.project)
+        except (IOError, OSError, FormatterError), e:
+            self.warning("couldn't queue the render: %s", e)
+            self.progressbar.set_text(_("Couldn't add the render to the queue"))
+            return
+
+        self.info("queued render job %d", job.id)
+        self.progressbar.set_text(_("Added to the render queue"))
+        self.queuebutton.set_sensitive(False)
+
     def _settingsButtonClickedCb(self, unused_button):
         dialog = ExportSettingsDialog(self.app, self.settings)
         res = dialog.run()
@@ -169,6 +198,7 @@ class EncodingDialog(GladeWindow, Loggable):
         self.progressbar.set_text(_("Rendering Complete"))
         self.progressbar.set_fraction(1.0)
         self.recordbutton.set_sensitive(False)
+        self.queuebutton.set_sensitive(False)
         self.filebutton.set_sensitive(True)
         self.settingsbutton.set_sensitive(True)
         self.cancelbutton.set_label("gtk-close")
@@ -217,6 +247,8 @@ class EncodingDialog(GladeWindow, Loggable):
             self.pipeline.addAction(self.renderaction)
             self.debug("Activating render action")
             self.renderaction.activate()
+            self.stats = RenderStats(self.pipeline, get_stats_filename())
+            self.stats.attach()
             self.debug("Setting all active ViewAction to sync=False")
             for ac in self.pipeline.actions:
                 if isinstance(ac, ViewAction) and ac.isActive():
@@ -242,3 +274,6 @@ class EncodingDialog(GladeWindow, Loggable):
             self.pipeline.disconnect_by_function(self._positionCb)
             self.pipeline.disconnect_by_function(self._eosCb)
             self.renderaction = None
+            self.info("render statistics written to %s", self.stats.filename)
+            self.stats.close()
+            self.stats = None
@@ -1038,7 +1038,7 @@ class PitiviMainWindow(gtk.Window, Loggable):
     def _setProjectPipeline(self):
         if self.project_pipeline:
             # connect to timeline
-            self.project_pipeline.activatePositionListener()
+            self.project_pipeline.activatePositionListener(clock=True)
             self._timelinePipelinePositionChangedCb(self.project_pipeline, 0)
 
     project_pipeline = receiver()
@@ -1153,7 +1153,7 @@ class PitiviMainWindow(gtk.Window, Loggable):
         self.viewer.setPipeline(pipeline)
         self.viewer.play()
 
-    def _timelineSeekCb(self, ruler, position, format):
+    def _timelineSeekCb(self, ruler, position, format, flags):
         self.debug("position:%s", gst.TIME_ARGS (position))
         if self.viewer.action != self.project.view_action:
             self.viewer.setPipeline(None)
@@ -1167,6 +1167,6 @@ class PitiviMainWindow(gtk.Window, Loggable):
         # set to the pipeline.
         self.project.pipeline.pause()
         try:
-            self.project.pipeline.seek(position, format)
+            self.project.pipeline.seek(position, format, flags)
         except:
             self.debug("Seeking failed")
@@ -19,44 +19,111 @@
 # Free Software Foundation, Inc., 59 Temple Place - Suite 330,
 # Boston, MA 02111-1307, USA.
 
+from __future__ import with_statement
+
 import os
 import threading
-from urllib import quote, unquote
-from urlparse import urlsplit, urlunsplit
-from pitivi.threads import Thread
-
-def quote_uri(uri):
-    parts = list(urlsplit(uri, allow_fragments=False))
-    parts[2] = quote(parts[2])
-    uri = urlunsplit(parts)
-    return uri
+import gobject
+from urllib import unquote
+from pitivi.log.loggable import Loggable
+from pitivi.mediafilter import MediaFilter
+# re-exported, it used to live here
+from pitivi.utils import quote_uri
 
-class PathWalker(Thread):
+class PathWalker(Loggable):
     """
-    Thread for recursively searching in a list of directories
+    Job for recursively searching in a list of directories, meant to be
+    submitted to a L{WorkerPool}. The URIs found are passed to the callback
+    from the main loop.
+
+    Only the files accepted by L{media_filter} are passed on, in batches of
+    at most L{batch_size} URIs. When the C{pending} callable says that more
+    than L{max_pending} URIs are still waiting to be discovered, the walk
+    pauses until they are, so that huge trees don't fill the discoverer
+    queue all at once.
+
+    @ivar media_filter: Decides which files are passed on.
+    @type media_filter: L{MediaFilter}
+    @ivar batch_size: The maximum number of URIs passed to the callback at
+    once.
+    @type batch_size: C{int}
+    @ivar max_pending: How many URIs can wait for discovery before the walk
+    pauses.
+    @type max_pending: C{int}
     """
 
-    def __init__(self, paths, callback):
-        Thread.__init__(self)
+    def __init__(self, paths, callback, media_filter=None, pending=None,
+            batch_size=32, max_pending=128):
+        """
+        @param pending: Called from the walking thread, returns the number of
+        URIs waiting to be discovered.
+        @type pending: C{callable}
+        """
+        Loggable.__init__(self)
         self.log("New PathWalker for %s" % paths)
         self.paths = paths
         self.callback = callback
-        self.stopme = threading.Event()
+        if media_filter is None:
+            media_filter = MediaFilter()
+        self.media_filter = media_filter
+        self.pending = pending
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.skipped = 0
+        self._seen = set()
+        # URIs passed to idle_add but not to the callback yet
+        self._in_flight = 0
+        self._lock = threading.Lock()
 
-    def process(self):
+    def __call__(self, token):
         for folder in self.paths:
             self.log("folder %s" % folder)
             if folder.startswith("file://"):
                 folder = unquote(folder[len("file://"):])
             for path, dirs, files in os.walk(folder):
-                if self.stopme.isSet():
+                if token.cancelled:
                     return
+                # skip hidden directories
+                dirs[:] = [name for name in dirs if not name.startswith(".")]
+
                 uris = []
                 for afile in files:
-                    uris.append(quote_uri("file://%s" %
-                            os.path.join(path, afile)))
-                if uris:
-                    self.callback(uris)
+                    filename = os.path.join(path, afile)
+                    if not self.media_filter.accepts(filename):
+                        self.skipped += 1
+                        continue
+                    uri = quote_uri("file://%s" % filename)
+                    if uri in self._seen:
+                        continue
+                    self._seen.add(uri)
+
+                    uris.append(uri)
+                    if len(uris) == self.batch_size:
+                        if not self._emitBatch(token, uris):
+                            return
+                        uris = []
+
+                if uris and not self._emitBatch(token, uris):
+                    return
+
+        self.debug("walk done, %d files skipped", self.skipped)
+
+    def _emitBatch(self, token, uris):
+        # wait for the discoverer to catch up
+        while self.pending is not None and \
+                self.pending() + self._in_flight >= self.max_pending:
+            if token.wait(0.1):
+                return False
+
+        if token.cancelled:
+            return False
+        with self._lock:
+            self._in_flight += len(uris)
+        gobject.idle_add(self._emitUris, uris)
+        return True
 
-    def abort(self):
-        self.stopme.set()
+    def _emitUris(self, uris):
+        with self._lock:
+            self._in_flight -= len(uris)
+        self.callback(uris)
+        return False
@@ -41,6 +41,7 @@ from pitivi.ui.zoominterface import Zoomable
 from pitivi.log.loggable import Loggable
 from pitivi.factories.file import PictureFileSourceFactory
 from pitivi.thumbnailcache import ThumbnailCache
+from pitivi.peakcache import get_default_peak_cache
 from pitivi.ui.prefs import PreferencesDialog
 from pitivi.receiver import receiver, handler
 
@@ -189,9 +190,8 @@ class RandomAccessPreviewer(Previewer):
         # FIXME:
         # why doesn't this work?
         # bin = factory.makeBin(stream_)
-        uri = factory.uri
-        caps = stream_.caps
-        bin = SingleDecodeBin(uri=uri, caps=caps, stream=stream_)
+        uri, caps, stream = factory.getDecodeArguments(stream_)
+        bin = SingleDecodeBin(uri=uri, caps=caps, stream=stream)
 
         # assume 50 pixel height
         self.theight = 50
@@ -287,6 +287,7 @@ class RandomAccessPreviewer(Previewer):
         always be called from the main thread of the application."""
         waiting = self.waiting_timestamp
         self.waiting_timestamp = None
+        self.endSpan("thumbnail")
 
         if segment != waiting:
             segment = waiting
@@ -329,6 +330,7 @@ class RandomAccessPreviewer(Previewer):
         playback are asyncrhonous, you may have to call _nextThumbnail() in a
         message handler or other callback."""
         self.waiting_timestamp = segment
+        self.beginSpan("thumbnail", segment=segment)
 
     def _connectSettings(self, settings):
         Previewer._connectSettings(self, settings)
@@ -413,6 +415,9 @@ class RandomAccessAudioPreviewer(RandomAccessPreviewer):
     def __init__(self, instance, factory, stream_):
         self.tdur = 30 * gst.SECOND
         self.base_width = int(Zoomable.max_zoom)
+        # peaks computed beforehand, by pitivi-index for example
+        self._peaks = get_default_peak_cache().lookup(factory.uri,
+                stream_.pad_name)
         RandomAccessPreviewer.__init__(self, instance, factory, stream_)
 
     @property
@@ -421,6 +426,10 @@ class RandomAccessAudioPreviewer(RandomAccessPreviewer):
 
     def _pipelineInit(self, factory, sbin):
         self.spacing = 0
+        self._audio_cur = None
+        if self._peaks is not None:
+            # waveforms are drawn from the peaks, no need to decode
+            return
 
         self.audioSink = ArraySink()
         conv = gst.element_factory_make("audioconvert")
@@ -433,7 +442,6 @@ class RandomAccessAudioPreviewer(RandomAccessPreviewer):
         bus.connect("message::segment-done", self._busMessageSegmentDoneCb)
         bus.connect("message::error", self._busMessageErrorCb)
 
-        self._audio_cur = None
         self.audioPipeline.set_state(gst.STATE_PAUSED)
 
     def _spacing(self):
@@ -456,6 +464,10 @@ class RandomAccessAudioPreviewer(RandomAccessPreviewer):
     def _startThumbnail(self, (timestamp, duration)):
         RandomAccessPreviewer._startThumbnail(self, (timestamp, duration))
         self._audio_cur = timestamp, duration
+        if self._peaks is not None:
+            self._finishWaveform()
+            return True
+
         res = self.audioPipeline.seek(1.0,
             gst.FORMAT_TIME,
             gst.SEEK_FLAG_FLUSH | gst.SEEK_FLAG_ACCURATE | gst.SEEK_FLAG_SEGMENT,
@@ -472,8 +484,11 @@ class RandomAccessAudioPreviewer(RandomAccessPreviewer):
         surface = cairo.ImageSurface(cairo.FORMAT_A8,
             self.base_width, self.theight)
         cr = cairo.Context(surface)
-        self._plotWaveform(cr, self.base_width)
-        self.audioSink.reset()
+        if self._peaks is not None:
+            self._plotPeaks(cr, self.base_width)
+        else:
+            self._plotWaveform(cr, self.base_width)
+            self.audioSink.reset()
 
         for width in [25, 100, 200]:
             scaled = cairo.ImageSurface(cairo.FORMAT_A8,
@@ -529,6 +544,25 @@ class RandomAccessAudioPreviewer(RandomAccessPreviewer):
         cr.set_source_rgba(0, 0, 0, 1.0)
         cr.stroke()
 
+    def _plotPeaks(self, cr, base_width):
+        cr.set_source_rgba(1, 1, 1, 0.0)
+        cr.rectangle(0, 0, base_width, self.theight)
+        cr.fill()
+
+        timestamp, duration = self._audio_cur
+        columns = self._peaks.getColumns(timestamp, duration, base_width)
+        hscale = self.theight / (2 * self._peaks.channels)
+
+        y = hscale
+        for peaks in columns:
+            for x, peak in enumerate(peaks):
+                cr.move_to(x, y - (peak * hscale))
+                cr.line_to(x, y + (peak * hscale))
+            y += 2 * hscale
+
+        cr.set_source_rgba(0, 0, 0, 1.0)
+        cr.stroke()
+
     def _thumbForTime(self, cr, time, x, y):
         segment = self._segment_for_time(time)
         twidth = self.twidth
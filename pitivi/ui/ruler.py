@@ -49,6 +49,7 @@ class ScaleRuler(gtk.Layout, Zoomable, Loggable):
     min_tick_spacing = 3
     scale = [0, 0, 0, 0.5, 1, 2, 5, 10, 15, 30, 60, 120, 300, 600, 3600]
     subdivide = ((1, 1.0), (2, 0.5), (10, .25))
+    cache_bar_height = 3
 
     def __init__(self, instance, hadj):
         gtk.Layout.__init__(self)
@@ -81,6 +82,8 @@ class ScaleRuler(gtk.Layout, Zoomable, Loggable):
         self.frame_height = 5.0
         self.frame_rate = gst.Fraction(1/1)
         self.app = instance
+        # the L{RenderCache} whose regions are shown, if any
+        self.render_cache = None
 
     def _hadjValueChangedCb(self, hadj):
         self.pixel_position_offset = Zoomable.nsToPixel(self.position) - hadj.get_value()
@@ -150,6 +153,7 @@ class ScaleRuler(gtk.Layout, Zoomable, Loggable):
         if self.getShadedDuration() <= 0:
             self.debug("no timeline to seek on, ignoring")
         self.pressed = True
+        self.app.current.seeker.beginScrub()
         # seek at position
         cur = self.pixelToNs(event.x)
         self._doSeek(cur)
@@ -158,6 +162,7 @@ class ScaleRuler(gtk.Layout, Zoomable, Loggable):
     def do_button_release_event(self, event):
         self.debug("button released at x:%d", event.x)
         self.pressed = False
+        self.app.current.seeker.endScrub()
         return False
 
     def do_motion_notify_event(self, event):
@@ -181,7 +186,7 @@ class ScaleRuler(gtk.Layout, Zoomable, Loggable):
 
 ## Seeking methods
 
-    def _seekerSeekCb(self, seeker, position, format):
+    def _seekerSeekCb(self, seeker, position, format, flags):
         # clamping values within acceptable range
         duration = self.getShadedDuration()
         if duration in (0, gst.CLOCK_TIME_NONE):
@@ -231,6 +236,7 @@ class ScaleRuler(gtk.Layout, Zoomable, Loggable):
 
         self.drawBackground(allocation)
         self.drawRuler(allocation)
+        self.drawRenderCache(allocation)
 
     def setProjectFrameRate(self, rate):
         self.frame_rate = rate
@@ -366,6 +372,24 @@ class ScaleRuler(gtk.Layout, Zoomable, Loggable):
                 frame_num = (frame_num + 1) % 2
                 paintpos += frame_width
 
+    def drawRenderCache(self, allocation):
+        if self.render_cache is None:
+            return
+
+        context = self.pixmap.cairo_create()
+        for start, end, valid in self.render_cache.getRegions():
+            x = self.nsToPixel(start) - self.pixmap_offset
+            width = self.nsToPixel(end) - self.nsToPixel(start)
+            if x + width < 0 or x > allocation.width:
+                continue
+            # green when played from the cache, orange until rendered
+            if valid:
+                context.set_source_rgb(0.3, 0.7, 0.2)
+            else:
+                context.set_source_rgb(0.9, 0.5, 0.1)
+            context.rectangle(x, 0, width, self.cache_bar_height)
+            context.fill()
+
     def drawPosition(self, context, allocation):
         if self.getShadedDuration() <= 0:
             return
@@ -31,18 +31,21 @@ from gettext import gettext as _
 from gettext import ngettext
 
 import pitivi.ui.dnd as dnd
-from pitivi.ui.pathwalker import PathWalker, quote_uri
+from pitivi.ui.pathwalker import PathWalker
+from pitivi.threads import PRIORITY_LOW
 from pitivi.ui.filelisterrordialog import FileListErrorDialog
 from pitivi.configure import get_pixmap_dir
 from pitivi.signalgroup import SignalGroup
 from pitivi.stream import VideoStream, AudioStream, TextStream, \
         MultimediaStream
 from pitivi.settings import GlobalSettings
-from pitivi.utils import beautify_length
+from pitivi.utils import beautify_length, quote_uri
 from pitivi.ui.common import beautify_factory, factory_name, \
     beautify_stream, PADDING
 from pitivi.log.loggable import Loggable
 from pitivi.sourcelist import SourceListError
+from pitivi.mediafilter import MediaFilter, DEFAULT_EXTENSIONS, \
+    DEFAULT_MIME_TYPES, DEFAULT_IGNORED_EXTENSIONS
 
 SHOW_TREEVIEW = 1
 SHOW_ICONVIEW = 2
@@ -62,6 +65,24 @@ GlobalSettings.addConfigOption('lastClipView',
     key='last-clip-view',
     type_=int,
     default=SHOW_ICONVIEW)
+# files found when importing folders, space separated
+GlobalSettings.addConfigOption('importExtensions',
+    section='clip-library',
+    key='import-extensions',
+    default=" ".join(DEFAULT_EXTENSIONS))
+GlobalSettings.addConfigOption('importMimeTypes',
+    section='clip-library',
+    key='import-mime-types',
+    default=" ".join(DEFAULT_MIME_TYPES))
+GlobalSettings.addConfigOption('importIgnoredExtensions',
+    section='clip-library',
+    key='import-ignored-extensions',
+    default=" ".join(DEFAULT_IGNORED_EXTENSIONS))
+# edit high resolution clips through scaled down, intra-frame copies
+GlobalSettings.addConfigOption('useProxies',
+    section='clip-library',
+    key='use-proxies',
+    default=True)
 
 (COL_ICON,
  COL_ICON_LARGE,
@@ -96,6 +117,22 @@ ui = '''
 INVISIBLE = gtk.gdk.pixbuf_new_from_file(os.path.join(get_pixmap_dir(), 
     "invisible.png"))
 
+def load_picture_icons(token, filename):
+    """
+    Load the small and large icons of a picture, on a worker thread.
+
+    The loader scales the picture down while decoding it.
+
+    @raise gobject.GError: If the picture can't be loaded.
+    """
+    if token.cancelled:
+        return None
+    pixbuf = gtk.gdk.pixbuf_new_from_file_at_size(filename, 96, 96)
+    thumbnail = pixbuf.scale_simple(64,
+            max(1, 64 * pixbuf.get_height() / pixbuf.get_width()),
+            gtk.gdk.INTERP_BILINEAR)
+    return thumbnail, pixbuf
+
 class SourceList(gtk.VBox, Loggable):
     """ Widget for listing sources """
 
@@ -115,6 +152,8 @@ class SourceList(gtk.VBox, Loggable):
         # icon, infotext, objectfactory, uri, length
         self.storemodel = gtk.ListStore(gtk.gdk.Pixbuf, gtk.gdk.Pixbuf, str, object, str, str,
             str, str)
+        # factory -> future of the pictures whose icons are being loaded
+        self._picture_loads = {}
 
         # Scrolled Windows
         self.treeview_scrollwin = gtk.ScrolledWindow()
@@ -384,6 +423,11 @@ class SourceList(gtk.VBox, Loggable):
             project.sources, "ready", None, self._sourcesStoppedImportingCb)
         self.project_signals.connect(
             project.sources, "starting", None, self._sourcesStartedImportingCb)
+        self.project_signals.connect(
+            project.sources, "progress", None, self._sourcesProgressCb)
+        self.project_signals.connect(
+            project.sources, "source-updated", None, self._sourceUpdatedCb)
+        project.sources.proxies.setEnabled(self.settings.useProxies)
 
 
     ## Explanatory message methods
@@ -468,9 +512,18 @@ class SourceList(gtk.VBox, Loggable):
 
     def addFolders(self, folders):
         """ walks the trees of the folders in the list and adds the files it finds """
-        self.app.threads.addThread(PathWalker, folders, self.app.current.sources.addUris)
-
-    def _addFactory(self, factory):
+        sources = self.app.current.sources
+        media_filter = MediaFilter(self.settings.importExtensions.split(),
+                self.settings.importMimeTypes.split(),
+                self.settings.importIgnoredExtensions.split())
+        # files of the folders may have been imported already
+        walker = PathWalker(folders,
+                lambda uris: sources.addUris(uris, skip_existing=True),
+                media_filter=media_filter, pending=sources.getPendingCount)
+        self.app.threads.submit(walker, priority=PRIORITY_LOW)
+
+    def _getIcons(self, factory):
+        """ Return the small and large icons of the given factory """
         video = factory.getOutputStreams(VideoStream)
         if video and video[0].thumbnail:
             thumbnail_file = video[0].thumbnail
@@ -490,6 +543,12 @@ class SourceList(gtk.VBox, Loggable):
                 desiredheight = int(96 / float(video[0].dar))
                 thumbnail_large = pixbuf.scale_simple(96,
                         desiredheight, gtk.gdk.INTERP_BILINEAR)
+        elif video and video[0].is_image:
+            # pictures don't get a thumbnail, they are loaded in the
+            # background and the default icon is shown until then
+            self._loadPictureIcons(factory)
+            thumbnail = self.videofilepixbuf
+            thumbnail_large = self.videofilepixbuf
         else:
             if video:
                 thumbnail = self.videofilepixbuf
@@ -498,6 +557,49 @@ class SourceList(gtk.VBox, Loggable):
                 thumbnail = self.audiofilepixbuf
                 thumbnail_large = self.audiofilepixbuf
 
+        return thumbnail, thumbnail_large
+
+    def _loadPictureIcons(self, factory):
+        future = self._picture_loads.get(factory)
+        if future is not None and not future.token.cancelled:
+            return
+        future = self.app.threads.submit(load_picture_icons,
+                (gst.uri_get_location(factory.uri),), priority=PRIORITY_LOW)
+        future.connect("done", self._pictureIconsDoneCb, factory)
+        future.connect("error", self._pictureIconsErrorCb, factory)
+        future.connect("cancelled", self._pictureIconsCancelledCb, factory)
+        self._picture_loads[factory] = future
+
+    def _pictureIconsDoneCb(self, future, icons, factory):
+        self._pictureIconsFinished(future, factory)
+        if icons is None:
+            return
+        for row in self.storemodel:
+            if row[COL_FACTORY] is factory:
+                row[COL_ICON], row[COL_ICON_LARGE] = icons
+                break
+
+    def _pictureIconsErrorCb(self, future, exception, factory):
+        self._pictureIconsFinished(future, factory)
+        if not isinstance(exception, gobject.GError):
+            raise exception
+        self.error("Failure to load picture '%s': %s", factory.uri, exception)
+
+    def _pictureIconsCancelledCb(self, future, factory):
+        self._pictureIconsFinished(future, factory)
+
+    def _pictureIconsFinished(self, future, factory):
+        # the picture may have been added again since
+        if self._picture_loads.get(factory) is future:
+            del self._picture_loads[factory]
+
+    def _cancelPictureLoads(self):
+        for future in self._picture_loads.values():
+            future.cancel()
+
+    def _addFactory(self, factory):
+        thumbnail, thumbnail_large = self._getIcons(factory)
+
         if not factory.duration or factory.duration == gst.CLOCK_TIME_NONE:
             duration = ''
         else:
@@ -532,8 +634,18 @@ class SourceList(gtk.VBox, Loggable):
             self.infobar.hide_all()
 
 
+    def _sourceUpdatedCb(self, unused_sourcelist, factory):
+        """ the thumbnails of the given factory are ready """
+        for row in self.storemodel:
+            if row[COL_FACTORY] is factory:
+                row[COL_ICON], row[COL_ICON_LARGE] = self._getIcons(factory)
+                break
+
     def _sourceRemovedCb(self, sourcelist, uri, factory):
         """ the given uri was removed from the sourcelist """
+        future = self._picture_loads.get(factory)
+        if future is not None:
+            future.cancel()
         # find the good line in the storemodel and remove it
         model = self.storemodel
         for row in model:
@@ -558,6 +670,9 @@ class SourceList(gtk.VBox, Loggable):
     def _sourcesStoppedImportingCb(self, unused_sourcelist):
         self.infostub.stoppingImport()
 
+    def _sourcesProgressCb(self, unused_sourcelist, done, total):
+        self.infostub.setProgress(done, total)
+
     def _removeInfoStub(self, unused_i):
         self.remove(self.infostub)
 
@@ -846,6 +961,7 @@ class SourceList(gtk.VBox, Loggable):
 
     def _newProjectCreatedCb(self, app, project):
         # clear the storemodel
+        self._cancelPictureLoads()
         self.storemodel.clear()
         self._connectToProject(project)
 
@@ -859,6 +975,7 @@ class SourceList(gtk.VBox, Loggable):
 
     def _newProjectFailedCb(self, unused_pitivi, unused_reason,
         unused_uri):
+        self._cancelPictureLoads()
         self.storemodel.clear()
         self.project_signals.disconnectAll()
 
@@ -1007,6 +1124,12 @@ class InfoStub(gtk.HBox, Loggable):
             self.hide()
             self.emit("remove-me")
 
+    def setProgress(self, done, total):
+        if not self._busyshowing:
+            return
+        self.infolabel.set_text(_("Importing clips (%d of %d)...") %
+                (done, total))
+
     def addErrors(self, *args):
         self.errors.append(args)
 
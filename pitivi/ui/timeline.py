@@ -44,6 +44,15 @@ from pitivi.ui.filelisterrordialog import FileListErrorDialog
 from pitivi.ui.curve import Curve
 
 from pitivi.factories.operation import EffectFactory
+from pitivi.settings import GlobalSettings
+
+GlobalSettings.addConfigOption('useRenderCache',
+    section='user-interface',
+    key='use-render-cache',
+    default=True)
+
+# how often the playhead moves while playing, in milliseconds, at most
+PLAYHEAD_REFRESH_INTERVAL = 16
 
 DND_EFFECT_LIST = [[dnd.VIDEO_EFFECT_TUPLE[0], dnd.EFFECT_TUPLE[0]],\
                   [dnd.AUDIO_EFFECT_TUPLE[0], dnd.EFFECT_TUPLE[0]]]
@@ -214,17 +223,25 @@ class Timeline(gtk.Table, Loggable, Zoomable):
         self._finish_drag = False
         self._position = 0
         self._state = gst.STATE_NULL
+        self._playhead_id = 0
+        self._playhead_interval = 0
+        self._playhead_pixel = None
         self._createUI()
         self._prev_duration = 0
         self.shrink = True
         self.rate = gst.Fraction(1,1)
+        for signal in ("commit", "undo", "redo"):
+            self.app.action_log.connect(signal, self._actionLogChangedCb)
 
     def _createUI(self):
         self.leftSizeGroup = gtk.SizeGroup(gtk.SIZE_GROUP_HORIZONTAL)
         self.props.row_spacing = 2
         self.props.column_spacing = 2
         self.hadj = gtk.Adjustment()
+        self.hadj.connect("value-changed", self._hadjValueChangedCb)
         self.vadj = gtk.Adjustment()
+        self.connect("map", self._mapCb)
+        self.connect("unmap", self._mapCb)
 
         # zooming slider
         self._zoomAdjustment = gtk.Adjustment()
@@ -536,16 +553,98 @@ class Timeline(gtk.Table, Loggable, Zoomable):
             self._zoomAdjustment.set_value(self.getCurrentZoomLevel())
         self.ruler.queue_resize()
         self.ruler.queue_draw()
+        self._playhead_pixel = None
+        self._updatePlayheadRefresh()
 
     def timelinePositionChanged(self, position):
         self._position = position
-        self.ruler.timelinePositionChanged(position)
-        self._canvas.timelinePositionChanged(position)
+        if not self._playhead_id:
+            # while playing, the playhead follows the clock
+            self._movePlayhead(position)
         if self._state == gst.STATE_PLAYING:
             self.scrollToPlayhead()
+        self._updatePlayheadRefresh()
+
+    def _movePlayhead(self, position):
+        # only redraw when it moves by a pixel
+        pixel = self.nsToPixel(position)
+        if pixel == self._playhead_pixel:
+            return
+        self._playhead_pixel = pixel
+        self.ruler.timelinePositionChanged(position)
+        self._canvas.timelinePositionChanged(position)
 
     def stateChanged(self, state):
         self._state = state
+        was_refreshing = bool(self._playhead_id)
+        self._updatePlayheadRefresh()
+        if was_refreshing and state != gst.STATE_PLAYING:
+            if self.project is not None and self.project.pipeline is not None:
+                # where it stopped, not where it was last polled
+                position = self.project.pipeline.getClockPosition()
+                if position != gst.CLOCK_TIME_NONE:
+                    self._position = position
+            self._movePlayhead(self._position)
+
+    def _playheadRefreshCb(self):
+        if self.project is None or self.project.pipeline is None:
+            self._playhead_id = 0
+            return False
+
+        position = self.project.pipeline.getClockPosition()
+        if position != gst.CLOCK_TIME_NONE:
+            self._position = position
+            self._movePlayhead(position)
+        if self._getPlayheadInterval() != self._playhead_interval:
+            # it left the view, or the zoom changed under us
+            self._playhead_id = 0
+            self._updatePlayheadRefresh()
+            return False
+        return True
+
+    def _getPlayheadInterval(self):
+        """
+        Return how often the playhead has to be moved, in milliseconds, or 0
+        if it doesn't need to follow the clock.
+
+        The clock is only polled while playing and while the playhead can be
+        seen. There's no point in polling more often than the playhead moves
+        by a pixel, so the interval grows when zoomed out.
+        """
+        if self._state != gst.STATE_PLAYING or \
+                not self.flags() & gtk.MAPPED:
+            return 0
+
+        pixel = self.nsToPixel(self._position)
+        scroll_pos = self.hadj.get_value()
+        if pixel < scroll_pos or \
+                pixel > scroll_pos + self.hadj.get_page_size():
+            # the position listener still moves it, and scrolls it back
+            # into the view
+            return 0
+
+        return max(PLAYHEAD_REFRESH_INTERVAL,
+                int(Zoomable.pixelToNs(1) / gst.MSECOND))
+
+    def _updatePlayheadRefresh(self):
+        interval = self._getPlayheadInterval()
+        if interval == self._playhead_interval and \
+                bool(self._playhead_id) == bool(interval):
+            return
+
+        if self._playhead_id:
+            gobject.source_remove(self._playhead_id)
+            self._playhead_id = 0
+        self._playhead_interval = interval
+        if interval:
+            self._playhead_id = gobject.timeout_add(interval,
+                    self._playheadRefreshCb)
+
+    def _hadjValueChangedCb(self, unused_adjustment):
+        self._updatePlayheadRefresh()
+
+    def _mapCb(self, unused_widget):
+        self._updatePlayheadRefresh()
 
     def scrollToPlayhead(self):
         """
@@ -587,6 +686,10 @@ class Timeline(gtk.Table, Loggable, Zoomable):
             self.ruler.zoomChanged()
             self._settingsChangedCb(self.project, None, self.project.getSettings())
             self._seeker = self.project.seeker
+            self.render_cache = self.project.render_cache
+            self.render_cache.setEnabled(self.app.settings.useRenderCache)
+        else:
+            self.render_cache = None
 
     project = receiver(_setProject)
 
@@ -596,6 +699,25 @@ class Timeline(gtk.Table, Loggable, Zoomable):
         self.rate = float(1 / rate)
         self.ruler.setProjectFrameRate(rate)
 
+    def _actionLogChangedCb(self, action_log, stack, *unused):
+        # the edits are done, see which cached regions they touched
+        if self.project is not None:
+            self.project.render_cache.update()
+
+## Render cache callbacks
+
+    def _setRenderCache(self):
+        self.ruler.render_cache = self.render_cache
+        self.ruler.doPixmap()
+        self.ruler.queue_draw()
+
+    render_cache = receiver(_setRenderCache)
+
+    @handler(render_cache, "changed")
+    def _renderCacheChangedCb(self, render_cache):
+        self.ruler.doPixmap()
+        self.ruler.queue_draw()
+
 ## Timeline callbacks
 
     def _setTimeline(self):
@@ -62,6 +62,12 @@ class PlayheadController(Controller, Zoomable):
     def __init__(self, *args, **kwargs):
         Controller.__init__(self, *args, **kwargs)
 
+    def drag_start(self, item, target, event):
+        self._canvas.app.current.seeker.beginScrub()
+
+    def drag_end(self, item, target, event):
+        self._canvas.app.current.seeker.endScrub()
+
     def set_pos(self, item, pos):
         self._canvas.app.current.seeker.seek(
             Zoomable.pixelToNs(pos[0]))
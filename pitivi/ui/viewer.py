@@ -140,11 +140,12 @@ class PitiviViewer(gtk.VBox, Loggable):
         if self.pipeline == None:
             return
         self.pipeline.connect('position', self._posCb)
-        self.pipeline.activatePositionListener()
+        self.pipeline.activatePositionListener(clock=True)
         self.pipeline.connect('state-changed', self._currentStateCb)
         self.pipeline.connect('element-message', self._elementMessageCb)
         self.pipeline.connect('duration-changed', self._durationChangedCb)
         self.pipeline.connect('eos', self._eosCb)
+        self.pipeline.connect('seek-done', self.seeker.seekDone)
         # if we have an action set it to that new pipeline
         if self.action:
             self.pipeline.setAction(self.action)
@@ -164,6 +165,7 @@ class PitiviViewer(gtk.VBox, Loggable):
 
         self.pipeline.disconnect_by_function(self._posCb)
         self.pipeline.disconnect_by_function(self._elementMessageCb)
+        self.pipeline.disconnect_by_function(self.seeker.seekDone)
         #self.deactivatePositionListener()
         self.pipeline.stop()
 
@@ -327,6 +329,7 @@ class PitiviViewer(gtk.VBox, Loggable):
         event.button = 2
         self.info("button pressed")
         self.moving_slider = True
+        self.seeker.beginScrub()
         self.valuechangedid = slider.connect("value-changed", self._sliderValueChangedCb)
         self.pipeline.pause()
         return False
@@ -336,6 +339,7 @@ class PitiviViewer(gtk.VBox, Loggable):
         event.button = 2
         self.info("slider button release at %s", time_to_string(long(slider.get_value())))
         self.moving_slider = False
+        self.seeker.endScrub()
         if self.valuechangedid:
             slider.disconnect(self.valuechangedid)
             self.valuechangedid = 0
@@ -366,9 +370,9 @@ class PitiviViewer(gtk.VBox, Loggable):
         except:
             self.warning("seek failed")
 
-    def _seekerSeekCb(self, seeker, position, format):
+    def _seekerSeekCb(self, seeker, position, format, flags):
         try:
-            self.pipeline.seek(position, format)
+            self.pipeline.seek(position, format, flags)
         except PipelineError:
             self.error("seek failed %s %s", gst.TIME_ARGS(position), format)
 
@@ -24,9 +24,12 @@
 # set of utility functions
 
 import sys
+import time
 import gobject
 import gst, bisect
 import os
+from urllib import quote
+from urlparse import urlsplit, urlunsplit
 from pitivi.signalinterface import Signallable
 import pitivi.log.log as log
 from gettext import ngettext
@@ -37,6 +40,14 @@ except ImportError:
 
 UNKNOWN_DURATION = 2 ** 63 - 1
 
+# above this many seconds of timeline per second, scrubbing seeks to
+# keyframes
+SCRUB_FAST_SPEED = 2.0
+# how long the pointer must rest before the exact frame is shown, in ms
+SCRUB_SETTLE_TIMEOUT = 150
+# seeks that take longer than this are assumed to be lost, in ms
+SCRUB_SEEK_TIMEOUT = 1000
+
 def between(a, b, c):
     return (a <= b) and (b <= c)
 
@@ -247,6 +258,17 @@ def uri_is_reachable(uri):
             _("%s doesn't yet handle non local projects") % APPNAME)
     return os.path.isfile(gst.uri_get_location(uri))
 
+def quote_uri(uri):
+    """
+    Escape the path of C{uri}, made from a file name.
+
+    @type uri: C{str}
+    @rtype: C{URI}
+    """
+    parts = list(urlsplit(uri, allow_fragments=False))
+    parts[2] = quote(parts[2])
+    return urlunsplit(parts)
+
 class PropertyChangeTracker(Signallable):
 
     __signals__ = {}
@@ -283,17 +305,53 @@ class PropertyChangeTracker(Signallable):
         self.emit(property_name + '-changed', object, old_value, value)
 
 class Seeker(Signallable):
-    __signals__ = {'seek': ['position', 'format']}
+    """
+    Rate-limits seeks.
+
+    Seeks requested within C{timeout} of each other are merged and only the
+    last one is done.
+
+    Between L{beginScrub} and L{endScrub}, while the pointer drags the
+    position around, seeks are instead done as soon as the previous one is
+    done, which must be told with L{seekDone}, and the ones requested in
+    between are dropped. A seek that isn't done within C{SCRUB_SEEK_TIMEOUT}
+    is assumed to be lost and the next one is done anyway. While the pointer moves quickly they go to the
+    nearest keyframe, which is much cheaper to decode, and the exact frame
+    is shown once it stops.
+
+    The "seek" signal is emitted with the position, its format and the
+    C{gst.SeekFlags} to add to the seek.
+
+    @ivar scrubbing: Whether the pointer is dragging the position around.
+    @type scrubbing: C{bool}
+    @ivar dropped: How many scrubbing seeks were dropped.
+    @type dropped: C{int}
+    """
+
+    __signals__ = {'seek': ['position', 'format', 'flags']}
 
     def __init__(self, timeout):
         self.timeout = timeout
         self.pending_seek_id = None
         self.position = None
         self.format = None
+        self.flags = 0
+        self.scrubbing = False
+        self.dropped = 0
+        self._busy_position = None
+        self._busy_id = None
+        self._last_motion = None
+        self._last_flags = 0
+        self._settle_id = None
 
     def seek(self, position, format=gst.FORMAT_TIME, on_idle=False):
+        if self.scrubbing:
+            self._scrub(position, format)
+            return
+
         self.position = position
         self.format = format
+        self.flags = 0
 
         if self.pending_seek_id is None:
             if on_idle:
@@ -303,22 +361,147 @@ class Seeker(Signallable):
             self.pending_seek_id = self._scheduleSeek(self.timeout,
                     self._seekTimeoutCb)
 
+    def beginScrub(self):
+        """
+        Start following the pointer, see L{Seeker}.
+        """
+        self.scrubbing = True
+        self._last_motion = None
+
+    def endScrub(self):
+        """
+        Stop following the pointer, and show the exact frame it stopped at.
+        """
+        if not self.scrubbing:
+            return
+
+        self.scrubbing = False
+        self._cancelSettle()
+        self._settle()
+
+    def seekDone(self, unused_pipeline=None, position=None, *unused):
+        """
+        Tell the seeker the last seek is done, so the next one can be done.
+
+        Meant to be connected to the "seek-done" signal of the L{Pipeline},
+        which other seekers may be seeking too.
+
+        @param position: Where the pipeline seeked to, seeks done elsewhere
+        than where this seeker is waiting are ignored.
+        """
+        if self._isBusy():
+            if position is not None and position != self._busy_position:
+                return
+            self._clearBusy()
+
+        if self.position is not None and self.pending_seek_id is None:
+            self._emitSeek()
+
+    def _getTime(self):
+        return time.time()
+
     def _scheduleSeek(self, timeout, callback):
         return gobject.timeout_add(timeout, callback)
 
+    def _unscheduleSeek(self, seek_id):
+        gobject.source_remove(seek_id)
+
+    def _scrub(self, position, format):
+        now = self._getTime()
+        fast = False
+        if self._last_motion is not None and format == gst.FORMAT_TIME:
+            last_time, last_position = self._last_motion
+            elapsed = now - last_time
+            if elapsed > 0:
+                speed = abs(position - last_position) / \
+                        float(gst.SECOND) / elapsed
+                fast = speed > SCRUB_FAST_SPEED
+        self._last_motion = (now, position)
+
+        if self.position is not None:
+            # the previous one was never done
+            self.dropped += 1
+        self.position = position
+        self.format = format
+        if fast:
+            self.flags = gst.SEEK_FLAG_KEY_UNIT
+        else:
+            self.flags = gst.SEEK_FLAG_ACCURATE
+
+        self._cancelSettle()
+        if fast:
+            self._settle_id = self._scheduleSeek(SCRUB_SETTLE_TIMEOUT,
+                    self._settleTimeoutCb)
+
+        if not self._isBusy():
+            self._emitSeek()
+
+    def _cancelSettle(self):
+        if self._settle_id is not None:
+            self._unscheduleSeek(self._settle_id)
+            self._settle_id = None
+
+    def _settleTimeoutCb(self):
+        self._settle_id = None
+        self._settle()
+        return False
+
+    def _settle(self):
+        if self.position is not None:
+            # not done yet, make it exact
+            self.flags = gst.SEEK_FLAG_ACCURATE
+        elif self._last_motion is not None and \
+                self._last_flags != gst.SEEK_FLAG_ACCURATE:
+            self.position = self._last_motion[1]
+            self.format = gst.FORMAT_TIME
+            self.flags = gst.SEEK_FLAG_ACCURATE
+        if self.position is not None and not self._isBusy():
+            self._emitSeek()
+
+    def _isBusy(self):
+        return self._busy_id is not None
+
+    def _clearBusy(self):
+        if self._busy_id is not None:
+            self._unscheduleSeek(self._busy_id)
+            self._busy_id = None
+        self._busy_position = None
+
+    def _busyTimeoutCb(self):
+        # the pipeline never told us it was done, or it seeked elsewhere
+        # than asked because the position was out of the timeline
+        self._busy_id = None
+        self._busy_position = None
+        if self.position is not None:
+            self._emitSeek()
+        return False
+
+    def _emitSeek(self):
+        position, self.position = self.position, None
+        format, self.format = self.format, None
+        flags, self.flags = self.flags, 0
+        self._last_flags = flags
+        self._clearBusy()
+        if flags:
+            # scrubbing, wait for L{seekDone}
+            self._busy_position = position
+            self._busy_id = self._scheduleSeek(SCRUB_SEEK_TIMEOUT,
+                    self._busyTimeoutCb)
+        try:
+            self.emit('seek', position, format, flags)
+        except:
+            log.doLog(log.ERROR, None, "seeker", "Error while seeking to position:%s format:%r",
+                      (gst.TIME_ARGS(position), format))
+            # if an exception happened while seeking, properly
+            # reset ourselves
+            self._clearBusy()
+            return False
+        return True
+
     def _seekTimeoutCb(self):
         self.pending_seek_id = None
         if self.position != None and self.format != None:
-            position, self.position = self.position, None
-            format, self.format = self.format, None
-            try:
-                self.emit('seek', position, format)
-            except:
-                log.doLog(log.ERROR, None, "seeker", "Error while seeking to position:%s format:%r",
-                          (gst.TIME_ARGS(position), format))
-                # if an exception happened while seeking, properly
-                # reset ourselves
-                return False
+            self._emitSeek()
         return False
 
 def get_filesystem_encoding():
@@ -0,0 +1,122 @@
+# PiTiVi , Non-linear video editor
+#
+#       tests/benchmark_default_sources.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+"""
+Measure how the black and silent sources filling the gaps of a track are
+updated after an edit, comparing recreating all of them with reusing them.
+
+"created" is the number of default sources made by the edits, "elements"
+the number of elements in the composition afterwards.
+
+Run with:
+    PYTHONPATH=.. python benchmark_default_sources.py [GAPS] [EDITS]
+"""
+
+import sys
+import time
+
+import gst
+
+from pitivi.timeline.gap import Gap
+from pitivi.timeline.track import Track, SourceTrackObject
+from pitivi.stream import VideoStream
+from common import StubFactory
+
+GAPS = 300
+EDITS = 50
+
+
+class CountingTrack(Track):
+    created = 0
+
+    def _getDefaultTrackObjectForStream(self, stream):
+        self.created += 1
+        return Track._getDefaultTrackObjectForStream(self, stream)
+
+
+class RecreatingTrack(CountingTrack):
+    """
+    How default sources were updated before: all of them are removed and
+    made again.
+    """
+
+    def _updateDefaultSourcesUnchecked(self):
+        for source in self.default_sources:
+            self._shutdownDefaultSource(source)
+            self.composition.remove(source)
+            source.set_state(gst.STATE_NULL)
+
+        self.default_sources = []
+        for gap in Gap.findAllGaps(self.track_objects):
+            source = self._getDefaultTrackObjectForStream(self.stream)
+            gnl_object = source.gnl_object
+            gnl_object.props.start = gap.start
+            gnl_object.props.duration = gap.initial_duration
+            self.composition.add(gnl_object)
+            self.default_sources.append(gnl_object)
+
+
+def run(klass, gaps, edits):
+    factory = StubFactory()
+    stream = VideoStream(gst.Caps("video/x-raw-rgb"))
+    factory.addOutputStream(stream)
+    track = klass(stream)
+
+    track.disableUpdates()
+    objs = []
+    for i in xrange(gaps):
+        obj = SourceTrackObject(factory, stream)
+        obj.start = (2 * i + 1) * gst.SECOND
+        obj.duration = gst.SECOND
+        track.addTrackObject(obj)
+        objs.append(obj)
+    track.enableUpdates()
+    track.created = 0
+
+    start = time.time()
+    for i in xrange(edits):
+        # nudge a clip back and forth, like a drag does
+        obj = objs[i * 7 % gaps]
+        track.disableUpdates()
+        obj.start += gst.SECOND / 2 * (i % 2 and -1 or 1)
+        track.enableUpdates()
+    elapsed = time.time() - start
+
+    elements = len(list(track.composition))
+    track.removeAllTrackObjects()
+    return elapsed / edits, track.created, elements
+
+
+def main():
+    gaps = GAPS
+    edits = EDITS
+    if len(sys.argv) > 1:
+        gaps = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        edits = int(sys.argv[2])
+
+    print "%d gaps, %d edits" % (gaps, edits)
+    for name, klass in (("recreate", RecreatingTrack),
+            ("reuse", CountingTrack)):
+        per_edit, created, elements = run(klass, gaps, edits)
+        print "%-10s %8.2f ms/edit  created %6d  elements %5d" % (name,
+                per_edit * 1000, created, elements)
+
+if __name__ == '__main__':
+    main()
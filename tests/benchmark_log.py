@@ -0,0 +1,77 @@
+# PiTiVi , Non-linear video editor
+#
+#       tests/benchmark_log.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+"""
+Measure the cost of log calls that are disabled by the current debug level.
+
+Run with:
+    PYTHONPATH=.. python benchmark_log.py
+"""
+
+import timeit
+
+from pitivi.log import log
+from pitivi.log.loggable import Loggable
+
+ITERATIONS = 1000000
+
+
+class Benchmarked(Loggable):
+
+    def __init__(self):
+        Loggable.__init__(self)
+        self.value = 42
+
+    def noop(self, *args):
+        pass
+
+
+def _nullHandler(level, object, category, file, line, message):
+    pass
+
+
+def run(statement, setup):
+    timer = timeit.Timer(statement, setup)
+    best = min(timer.repeat(repeat=3, number=ITERATIONS))
+    return best * 1e9 / ITERATIONS
+
+
+def main():
+    log.reset()
+    log.setDebug("*:2")
+    log.addLimitedLogHandler(_nullHandler)
+
+    setup = "from __main__ import Benchmarked; obj = Benchmarked()"
+    results = [
+        ("empty method call",
+            run("obj.noop('value %d', obj.value)", setup)),
+        ("disabled Loggable.debug()",
+            run("obj.debug('value %d', obj.value)", setup)),
+        ("disabled Loggable.log()",
+            run("obj.log('value %d', obj.value)", setup)),
+        ("disabled log.debug()",
+            run("log.debug('benchmark', 'value %d', 42)",
+                "from pitivi.log import log")),
+    ]
+
+    for name, ns in results:
+        print "%-28s %8.1f ns/call" % (name, ns)
+
+if __name__ == '__main__':
+    main()
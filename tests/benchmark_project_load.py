@@ -0,0 +1,174 @@
+# PiTiVi , Non-linear video editor
+#
+#       tests/benchmark_project_load.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+"""
+Compare loading a large .xptv project with parse() and with the incremental
+parser used by the etree formatter.
+
+"sources" is the time until the sources are known, which is when the source
+list can be shown and discovery starts. Peak memory is the peak RSS of a
+separate process running each strategy.
+
+Run with:
+    PYTHONPATH=.. python benchmark_project_load.py [TRACK_OBJECTS]
+"""
+
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from xml.etree.ElementTree import Element, parse
+
+from pitivi.formatters.etree import IndentedXMLWriter, ElementParser
+
+TRACK_OBJECTS = 20000
+SOURCES = 200
+
+
+def writeProject(path, count):
+    output = file(path, "w")
+    writer = IndentedXMLWriter(output)
+    writer.start(Element("pitivi", formatter="etree", version="0.1"))
+    writer.start(Element("factories"))
+    writer.start(Element("sources"))
+    for i in xrange(SOURCES):
+        source = Element("source", id=str(i), duration="1000000000",
+                default_duration="1000000000",
+                type="pitivi.factories.file.FileSourceFactory",
+                filename="file:///tmp/source%d.ogg" % i)
+        streams = Element("output-streams")
+        source.append(streams)
+        streams.append(Element("stream", id=str(i + count * 2),
+                caps="video/x-raw-yuv", name="src0",
+                type="pitivi.stream.VideoStream"))
+        writer.write(source)
+    writer.end()
+    writer.end()
+
+    writer.start(Element("timeline"))
+    writer.start(Element("tracks"))
+    writer.start(Element("track"))
+    writer.write(Element("stream", id="-1", caps="video/x-raw-yuv",
+            type="pitivi.stream.VideoStream"))
+    writer.start(Element("track-objects"))
+    for i in xrange(count):
+        track_object = Element("track-object", id=str(SOURCES + i),
+                type="pitivi.timeline.track.SourceTrackObject",
+                start="(gint64)%d" % (i * 1000), duration="(gint64)1000",
+                in_point="(gint64)0", media_duration="(gint64)1000",
+                priority="(int)0", active="(bool)True")
+        track_object.append(Element("factory-ref", id=str(i % SOURCES)))
+        track_object.append(Element("stream-ref", id=str(i % SOURCES)))
+        track_object.append(Element("curves"))
+        writer.write(track_object)
+    writer.end()
+    writer.end()
+    writer.end()
+
+    writer.start(Element("timeline-objects"))
+    for i in xrange(count):
+        timeline_object = Element("timeline-object")
+        timeline_object.append(Element("factory-ref", id=str(i % SOURCES)))
+        refs = Element("track-object-refs")
+        refs.append(Element("track-object-ref", id=str(SOURCES + i)))
+        timeline_object.append(refs)
+        writer.write(timeline_object)
+    writer.end()
+    writer.end()
+    writer.end()
+    output.close()
+
+
+def loadTree(path):
+    # what the formatter used to do: keep the tree until the timeline is
+    # loaded
+    start = time.time()
+    root = parse(path)
+    sources = [dict(element.attrib)
+            for element in root.find("factories").find("sources")]
+    first = time.time() - start
+
+    objects = []
+    for track in root.find("timeline").find("tracks"):
+        for element in track.find("track-objects"):
+            objects.append(dict(element.attrib))
+    for element in root.find("timeline").find("timeline-objects"):
+        objects.append(element.find("factory-ref").attrib["id"])
+
+    return first, time.time() - start, len(sources), len(objects)
+
+
+def loadIncremental(path):
+    start = time.time()
+    sources = []
+    parser = ElementParser(path)
+    parser.parse({
+            ("sources", "source"): lambda e: sources.append(dict(e.attrib)),
+            ("pitivi", "factories"): lambda e: True})
+    first = time.time() - start
+
+    objects = []
+    parser.parse({
+            ("track-objects", "track-object"):
+                    lambda e: objects.append(dict(e.attrib)),
+            ("timeline-objects", "timeline-object"):
+                    lambda e: objects.append(
+                            e.find("factory-ref").attrib["id"]),
+            ("pitivi", "timeline"): lambda e: True})
+    parser.close()
+
+    return first, time.time() - start, len(sources), len(objects)
+
+
+def runChild(strategy, path):
+    first, total, sources, objects = \
+            {"tree": loadTree, "incremental": loadIncremental}[strategy](path)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print first, total, sources, objects, peak
+
+
+def main():
+    count = TRACK_OBJECTS
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+
+    fd, path = tempfile.mkstemp(suffix=".xptv")
+    os.close(fd)
+    try:
+        writeProject(path, count)
+        print "%d track objects, %d kB" % (count,
+                os.path.getsize(path) / 1024)
+        for strategy in ("tree", "incremental"):
+            output = subprocess.Popen([sys.executable, __file__,
+                    "--child", strategy, path],
+                    stdout=subprocess.PIPE).communicate()[0]
+            first, total, sources, objects, peak = output.split()
+            print "%-12s sources %7.1f ms  total %7.1f ms  peak %7d kB" % (
+                    strategy, float(first) * 1000, float(total) * 1000,
+                    int(peak))
+    finally:
+        os.unlink(path)
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ["--child"]:
+        runChild(sys.argv[2], sys.argv[3])
+    else:
+        main()
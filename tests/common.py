@@ -7,8 +7,12 @@ gobject.threads_init()
 import gst
 import os
 import gc
+import shutil
+import tempfile
 import unittest
 from pitivi.factories.base import ObjectFactory, SourceFactory, SinkFactory
+from pitivi.factories.file import FileSourceFactory, PictureFileSourceFactory
+from pitivi.stream import VideoStream, AudioStream
 from pitivi.factories.operation import EffectFactory
 from pitivi.pipeline import Pipeline
 
@@ -167,3 +171,59 @@ class FakeEffectFactory(EffectFactory):
     def __init__(self):
         EffectFactory.__init__(self, 'identity', "identity")
         self.duration = 42 * gst.SECOND
+
+def make_file_factory(uri, width=320, height=240, video=True,
+        is_image=False):
+    """
+    Return a factory with an audio stream and, unless C{video} is unset, a
+    video stream of C{width} by C{height}.
+    """
+    if is_image:
+        factory = PictureFileSourceFactory(uri)
+    else:
+        factory = FileSourceFactory(uri)
+    if video:
+        factory.addOutputStream(VideoStream(gst.Caps("video/x-raw-yuv, "
+                "width=%d, height=%d, pixel-aspect-ratio=1/1" %
+                (width, height)), "src0", is_image=is_image))
+    factory.addOutputStream(AudioStream(gst.Caps("audio/x-raw-int"), "src1"))
+    return factory
+
+def stub_job_queue(cls):
+    """
+    Return a subclass of the L{BackgroundJobQueue} C{cls} which starts its
+    batches right away instead of from idle callbacks, and only records the
+    factories whose jobs are started in C{started}.
+    """
+    class StubJobQueue(cls):
+        def __init__(self, *args, **kwargs):
+            cls.__init__(self, *args, **kwargs)
+            self.started = []
+
+        def _schedule(self):
+            if self._canRun() and self._current is None and \
+                    not self._batch and self.queue:
+                self._startBatchCb()
+
+        def _start(self, factory, filename):
+            self.started.append(factory)
+
+    StubJobQueue.__name__ = "Stub" + cls.__name__
+    return StubJobQueue
+
+class CacheDirTestCase(unittest.TestCase):
+    """
+    Points XDG_CACHE_HOME to C{self.directory}, a temporary directory.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.xdg_cache_home = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = self.directory
+
+    def tearDown(self):
+        if self.xdg_cache_home is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.xdg_cache_home
+        shutil.rmtree(self.directory)
@@ -20,57 +20,109 @@
 # Free Software Foundation, Inc., 59 Temple Place - Suite 330,
 # Boston, MA 02111-1307, USA.
 
+import os
+import shutil
+import tempfile
 import gobject
 gobject.threads_init()
 import gst
 
 from common import TestCase
-from pitivi.discoverer import Discoverer
+from test_imageprobe import make_png
+from pitivi.discoverer import Discoverer, Analysis, DEFAULT_TIMEOUT, \
+        MIN_TIMEOUT, MAX_TIMEOUT
+from pitivi.discoverycache import DiscoveryCache
 from pitivi.factories.file import FileSourceFactory, PictureFileSourceFactory
 
 class AddUrisStubDiscoverer(Discoverer):
-    analysis_scheduled = 0
-    current_uri = "bar"
+    def __init__(self, *args, **kwargs):
+        Discoverer.__init__(self, *args, **kwargs)
+        self.started = []
 
     def _scheduleAnalysis(self):
-        self.analysis_scheduled += 1
+        # fill the free slots right away instead of from idle callbacks
+        if self.queue and len(self.analyses) < self.max_pipelines:
+            self._analyzeNextCb()
 
-    def _finishAnalysis(self, reason):
-        self.analysis_scheduled -= 1
-        return Discoverer._finishAnalysis(self, reason)
+    def _analyze(self, uri):
+        analysis = Analysis(uri)
+        self.analyses.append(analysis)
+        self.started.append(uri)
+
+        return analysis
 
 class TestAnalysisQueue(TestCase):
+    def setUp(self):
+        TestCase.setUp(self)
+        self.progress = []
+        self.ready = 0
+
+    def _progressCb(self, discoverer, done, total):
+        self.progress.append((done, total))
+
+    def _readyCb(self, discoverer):
+        self.ready += 1
+
+    def _makeDiscoverer(self, max_pipelines):
+        discoverer = AddUrisStubDiscoverer(max_pipelines=max_pipelines)
+        discoverer.connect("progress", self._progressCb)
+        discoverer.connect("ready", self._readyCb)
+        return discoverer
+
     def testAddUri(self):
-        discoverer = AddUrisStubDiscoverer()
+        discoverer = self._makeDiscoverer(1)
         self.failIf(discoverer.working)
         # add a file, should start working
         discoverer.addUri('meh')
         self.failUnless(discoverer.working)
-        self.failUnlessEqual(discoverer.analysis_scheduled, 1)
+        self.failUnlessEqual(discoverer.started, ['meh'])
 
         # finish analysis, no other files queued
-        discoverer._finishAnalysis("foo")
+        discoverer._finishAnalysis(discoverer.analyses[0], "foo")
         self.failIf(discoverer.working)
-        self.failUnlessEqual(discoverer.analysis_scheduled, 0)
+        self.failUnlessEqual(self.ready, 1)
+        self.failUnlessEqual(self.progress, [(1, 1)])
 
         # add another file, should start working
         discoverer.addUri('meh1')
         self.failUnless(discoverer.working)
-        self.failUnlessEqual(discoverer.analysis_scheduled, 1)
+        self.failUnlessEqual(discoverer.started, ['meh', 'meh1'])
 
         # queue another while the first isn't finished yet
         discoverer.addUri('meh2')
         # this shouldn't trigger a new analysis until the previous is done
-        self.failUnless(discoverer.analysis_scheduled, 1)
+        self.failUnlessEqual(discoverer.started, ['meh', 'meh1'])
 
-        discoverer._finishAnalysis("foo")
+        discoverer._finishAnalysis(discoverer.analyses[0], "foo")
         # something queued, keep working
         self.failUnless(discoverer.working)
-        self.failUnlessEqual(discoverer.analysis_scheduled, 1)
+        self.failUnlessEqual(discoverer.started, ['meh', 'meh1', 'meh2'])
 
-        discoverer._finishAnalysis("foo")
+        discoverer._finishAnalysis(discoverer.analyses[0], "foo")
         self.failIf(discoverer.working)
-        self.failUnlessEqual(discoverer.analysis_scheduled, 0)
+        self.failUnlessEqual(self.ready, 2)
+        self.failUnlessEqual(self.progress, [(1, 1), (1, 2), (2, 2)])
+
+    def testConcurrentAnalyses(self):
+        discoverer = self._makeDiscoverer(2)
+        discoverer.addUris(['a', 'b', 'c'])
+        # two pipelines at most
+        self.failUnlessEqual(discoverer.started, ['a', 'b'])
+        self.failUnlessEqual(discoverer.queue, ['c'])
+
+        # analyses can finish in any order, each has its own state
+        analysis_a, analysis_b = discoverer.analyses
+        discoverer._finishAnalysis(analysis_b, "foo")
+        self.failUnlessEqual(discoverer.started, ['a', 'b', 'c'])
+        self.failUnlessEqual(discoverer.queue, [])
+
+        discoverer._finishAnalysis(analysis_a, "foo")
+        self.failUnless(discoverer.working)
+        discoverer._finishAnalysis(discoverer.analyses[0], "foo")
+        self.failIf(discoverer.working)
+
+        self.failUnlessEqual(self.ready, 1)
+        self.failUnlessEqual(self.progress, [(1, 3), (2, 3), (3, 3)])
 
 class Discoverer1(Discoverer):
     use_decodebin2 = True
@@ -85,46 +137,48 @@ class Discoverer1(Discoverer):
         # methods alive across mainloop iterations
         pass
 
-    def _scheduleTimeout(self):
+    def _scheduleTimeout(self, analysis):
         self.timeout_scheduled = True
-        self.timeout_id = 1
+        analysis.timeout_id = 1
         if self.timeout_expired:
-            self._timeoutCb()
+            self._timeoutCb(analysis)
 
-    def _removeTimeout(self):
-        self.timeout_id = 0
+    def _removeTimeout(self, analysis):
+        analysis.timeout_id = 0
         self.timeout_cancelled = True
 
     def _useDecodeBinTwo(self):
         return self.use_decodebin2
 
-    def _createSource(self):
-        if self.current_uri == 'foo':
+    def _createSource(self, analysis):
+        if analysis.uri == 'foo':
             # create something that will go to paused
             source = gst.element_factory_make('videotestsrc')
             source.props.num_buffers = 1
         else:
-            source = Discoverer._createSource(self)
+            source = Discoverer._createSource(self, analysis)
 
         return source
 
-    def _newVideoPadCb(self, pad):
-        Discoverer._newVideoPadCb(self, pad)
+    def _newVideoPadCb(self, analysis, pad):
+        Discoverer._newVideoPadCb(self, analysis, pad)
         self.new_video_pad_cb += 1
 
-    def _newPadCb(self, pad):
-        Discoverer._newPadCb(self, pad)
+    def _newPadCb(self, analysis, pad):
+        Discoverer._newPadCb(self, analysis, pad)
         self.new_pad_cb += 1
 
 class TestAnalysis(TestCase):
     def setUp(self):
         TestCase.setUp(self)
         self.discoverer = Discoverer1()
-        self.discoverer.current_uri = "meh"
-        self.discoverer.pipeline = gst.Bin()
+        self.analysis = Analysis("meh")
+        self.analysis.pipeline = gst.Bin()
+        self.discoverer.analyses.append(self.analysis)
 
     def tearDown(self):
         self.discoverer = None
+        self.analysis = None
         TestCase.tearDown(self)
 
     def testNoSource(self):
@@ -137,7 +191,7 @@ class TestAnalysis(TestCase):
 
         self.discoverer.addUri('buh://asd')
         self.discoverer.connect('discovery-error', no_media_file_cb)
-        self.discoverer._analyze()
+        self.discoverer._analyzeNextCb()
         self.failUnlessEqual(bag['error'], 'No available source handler.')
 
     def testErrorSettingPaused(self):
@@ -151,7 +205,7 @@ class TestAnalysis(TestCase):
         self.discoverer.addUri('file://i/cant/possibly/exist/and/if/you/'
             'really/have/a/file/named/like/this/you/deserve/a/faillure')
         self.discoverer.connect('discovery-error', no_media_file_cb)
-        self.discoverer._analyze()
+        self.discoverer._analyzeNextCb()
         self.failUnlessEqual(bag['error'], 'Pipeline didn\'t want '
                 'to go to PAUSED.')
 
@@ -163,10 +217,12 @@ class TestAnalysis(TestCase):
         def discovery_error_cb(disc, uri, error, error_detail):
             bag['error'] = error
 
+        # only look at the analyses started here
+        self.discoverer.analyses.remove(self.analysis)
         self.discoverer.connect('discovery-error', discovery_error_cb)
         self.discoverer.addUri('foo')
         self.failUnlessEqual(bag['error'], None)
-        self.discoverer._analyze()
+        self.discoverer._analyzeNextCb()
         # check that a timeout is scheduled once we start analyzing so we don't
         # hang on one single file
         self.failUnless(self.discoverer.timeout_scheduled)
@@ -175,14 +231,15 @@ class TestAnalysis(TestCase):
 
         self.discoverer.timeout_expired = False
         self.discoverer.addUri('foo')
-        self.discoverer._analyze()
+        self.discoverer._analyzeNextCb()
+        analysis = self.discoverer.analyses[0]
         # at this point the timeout is scheduled but not expired, so the
         # discoverer should still be working
         self.failUnless(self.discoverer.timeout_scheduled)
         self.failIf(self.discoverer.timeout_cancelled)
         self.failUnless(self.discoverer.working)
         # a call go _finishAnalysis() cancels the timeout
-        self.discoverer._finishAnalysis("foo")
+        self.discoverer._finishAnalysis(analysis, "foo")
         self.failUnless(self.discoverer.timeout_cancelled)
         self.failIf(self.discoverer.working)
 
@@ -205,68 +262,55 @@ class TestAnalysis(TestCase):
             return pad.query_default(query)
 
         pad = gst.Pad('src', gst.PAD_SRC)
-        self.failUnlessEqual(self.discoverer.current_duration,
+        self.failUnlessEqual(self.analysis.duration,
                 gst.CLOCK_TIME_NONE)
 
         pad.set_query_function(pad_query_fail)
-        self.discoverer._maybeQueryDuration(pad)
-        self.failUnlessEqual(self.discoverer.current_duration,
+        self.discoverer._maybeQueryDuration(self.analysis, pad)
+        self.failUnlessEqual(self.analysis.duration,
                 gst.CLOCK_TIME_NONE)
 
         # retry on other pads
         pad.set_query_function(pad_query_succeed)
-        self.discoverer._maybeQueryDuration(pad)
-        self.failUnlessEqual(self.discoverer.current_duration,
+        self.discoverer._maybeQueryDuration(self.analysis, pad)
+        self.failUnlessEqual(self.analysis.duration,
                 10 * gst.SECOND)
 
         # duration should be cached
         pad.set_query_function(pad_query_succeed2)
-        self.discoverer._maybeQueryDuration(pad)
-        self.failUnlessEqual(self.discoverer.current_duration,
+        self.discoverer._maybeQueryDuration(self.analysis, pad)
+        self.failUnlessEqual(self.analysis.duration,
                 10 * gst.SECOND)
 
-    def testGetThumbnailFilenameFromPad(self):
-        pad = gst.Pad('src0', gst.PAD_SRC)
-        pad1 = gst.Pad('src1', gst.PAD_SRC)
-        self.discoverer.current_uri = "meh"
-        filename1 = self.discoverer._getThumbnailFilenameFromPad(pad)
-        filename2 = self.discoverer._getThumbnailFilenameFromPad(pad)
-        self.discoverer.current_uri = "boo"
-        filename3 = self.discoverer._getThumbnailFilenameFromPad(pad1)
-        self.failUnlessEqual(filename1, filename2)
-        self.failIfEqual(filename2, filename3)
-        # TODO: check for non ascii filenames (which is half broken in python
-        # on UNIX anyway...)
-
     def testBusEos(self):
         bag = {'called': False}
-        def finish_analysis(reason):
+        def finish_analysis(analysis, reason):
             bag['called'] = True
 
         self.discoverer._finishAnalysis = finish_analysis
-        self.discoverer._busMessageEosCb(None, None)
+        self.discoverer._busMessageEosCb(None, None, self.analysis)
         self.failUnless(bag['called'], True)
 
     def testBusElement(self):
         bag = {'called': False}
-        def finish_analysis(reason):
+        def finish_analysis(analysis, reason):
             bag['called'] = True
 
         self.discoverer._finishAnalysis = finish_analysis
-        self.failUnlessEqual(self.discoverer.error, None)
+        self.failUnlessEqual(self.analysis.error, None)
         src = gst.Pad('src', gst.PAD_SRC)
         # we ignore non-redirect messages
         structure = gst.Structure('meh')
         message = gst.message_new_element(src, structure)
-        self.discoverer._busMessageElementCb(None, message)
-        self.failUnlessEqual(self.discoverer.error, None)
+        self.discoverer._busMessageElementCb(None, message, self.analysis)
+        self.failUnlessEqual(self.analysis.error, None)
         self.failUnlessEqual(bag['called'], False)
 
         # error out on redirects
         structure = gst.Structure('redirect')
         message = gst.message_new_element(src, structure)
-        self.discoverer._busMessageElementCb(None, message)
-        self.failIfEqual(self.discoverer.error, None)
+        self.discoverer._busMessageElementCb(None, message, self.analysis)
+        self.failIfEqual(self.analysis.error, None)
         self.failUnlessEqual(bag['called'], True)
 
     def testBusError(self):
@@ -282,31 +326,40 @@ class TestAnalysis(TestCase):
         gerror = gst.GError(gst.STREAM_ERROR, gst.STREAM_ERROR_FAILED, 'meh')
         message = gst.message_new_error(src, gerror, 'debug1')
 
-        self.failUnlessEqual(self.discoverer.error, None)
-        self.discoverer.addUri('popme')
-        self.discoverer._busMessageErrorCb(None, message)
+        self.failUnlessEqual(self.analysis.error, None)
+        self.discoverer._busMessageErrorCb(None, message, self.analysis)
         self.failUnlessEqual(dic['debug'], 'debug1')
 
-        # errors shouldn't be overridden
+        # each analysis has its own error
+        analysis = Analysis("popme")
+        self.discoverer.analyses.append(analysis)
         gerror = gst.GError(gst.STREAM_ERROR, gst.STREAM_ERROR_FAILED, 'muh')
         message = gst.message_new_error(src, gerror, 'debug2')
-        self.discoverer.addUri('popme')
-        self.discoverer._busMessageErrorCb(None, message)
+        self.discoverer._busMessageErrorCb(None, message, analysis)
+        self.failUnlessEqual(dic['uri'], 'popme')
         self.failUnlessEqual(dic['debug'], 'debug2')
 
+        # errors shouldn't be overridden
+        analysis = Analysis("popme2")
+        self.discoverer.analyses.append(analysis)
+        analysis.error = "previous error"
+        self.discoverer._busMessageErrorCb(None, message, analysis)
+        self.failUnlessEqual(analysis.error, "previous error")
+        self.failUnlessEqual(dic['uri'], 'popme')
+
     def testNewDecodedPadFixed(self):
         video = gst.Pad('video_00', gst.PAD_SRC)
         video.set_caps(gst.Caps('video/x-raw-rgb'))
         audio = gst.Pad('audio_00', gst.PAD_SRC)
         audio.set_caps(gst.Caps('audio/x-raw-int'))
 
-        self.failUnlessEqual(self.discoverer.current_streams, [])
-        self.discoverer._newDecodedPadCb(None, video, False)
-        self.failUnlessEqual(len(self.discoverer.current_streams), 1)
+        self.failUnlessEqual(self.analysis.streams, [])
+        self.discoverer._newDecodedPadCb(None, video, False, self.analysis)
+        self.failUnlessEqual(len(self.analysis.streams), 1)
         self.failUnlessEqual(self.discoverer.new_video_pad_cb, 1)
 
-        self.discoverer._newDecodedPadCb(None, audio, False)
-        self.failUnlessEqual(len(self.discoverer.current_streams), 2)
+        self.discoverer._newDecodedPadCb(None, audio, False, self.analysis)
+        self.failUnlessEqual(len(self.analysis.streams), 2)
         self.failUnlessEqual(self.discoverer.new_video_pad_cb, 1)
 
     def testNewDecodedPadNotFixed(self):
@@ -322,34 +375,35 @@ class TestAnalysis(TestCase):
         video_ghost = gst.GhostPad("video", video)
         audio_ghost = gst.GhostPad("audio", audio)
 
-        self.failUnlessEqual(self.discoverer.current_streams, [])
-        self.discoverer._newDecodedPadCb(None, video_ghost, False)
-        self.failUnlessEqual(len(self.discoverer.current_streams), 0)
+        self.failUnlessEqual(self.analysis.streams, [])
+        self.discoverer._newDecodedPadCb(None, video_ghost, False,
+                self.analysis)
+        self.failUnlessEqual(len(self.analysis.streams), 0)
         self.failUnlessEqual(self.discoverer.new_video_pad_cb, 1)
 
-        self.discoverer._newDecodedPadCb(None, audio_ghost, False)
-        self.failUnlessEqual(len(self.discoverer.current_streams), 0)
+        self.discoverer._newDecodedPadCb(None, audio_ghost, False,
+                self.analysis)
+        self.failUnlessEqual(len(self.analysis.streams), 0)
         self.failUnlessEqual(self.discoverer.new_video_pad_cb, 1)
 
         # fix the caps
         video.set_caps(gst.Caps('video/x-raw-rgb, framerate=25/1'))
-        self.failUnlessEqual(len(self.discoverer.current_streams), 1)
+        self.failUnlessEqual(len(self.analysis.streams), 1)
         self.failUnlessEqual(self.discoverer.new_video_pad_cb, 1)
 
         audio.set_caps(gst.Caps('audio/x-raw-int, rate=44100'))
-        self.failUnlessEqual(len(self.discoverer.current_streams), 2)
+        self.failUnlessEqual(len(self.analysis.streams), 2)
         self.failUnlessEqual(self.discoverer.new_video_pad_cb, 1)
 
 class TestStateChange(TestCase):
     def setUp(self):
         TestCase.setUp(self)
         self.discoverer = Discoverer1()
-        self.discoverer.current_uri = "meh"
-        # don't plug the thumbnailing branch
-        self.discoverer.current_uri = 'file:///foo/bar'
+        self.analysis = Analysis('file:///foo/bar')
+        self.discoverer.analyses.append(self.analysis)
         self.src = gst.Bin()
-        self.discoverer.pipeline = self.src
-        self.discoverer.current_duration = 10 * gst.SECOND
+        self.analysis.pipeline = self.src
+        self.analysis.duration = 10 * gst.SECOND
         self.factories = []
         self.error = None
         self.error_detail = None
@@ -362,6 +416,7 @@ class TestStateChange(TestCase):
         self.discoverer.disconnect_by_function(self.discoveryErrorCb)
         self.discoverer.disconnect_by_function(self.discoveryDoneCb)
         self.discoverer = None
+        self.analysis = None
         self.factories = None
         self.error = None
         self.src = None
@@ -380,22 +435,24 @@ class TestStateChange(TestCase):
         # ignore element
         ignored = gst.message_new_state_changed(ignore_src,
                gst.STATE_READY, gst.STATE_PAUSED, gst.STATE_VOID_PENDING)
-        self.discoverer._busMessageStateChangedCb(None, ignored)
+        self.discoverer._busMessageStateChangedCb(None, ignored,
+                self.analysis)
         self.failUnlessEqual(self.factories, [])
 
         # ignore transition
         ignored = gst.message_new_state_changed(self.src,
                 gst.STATE_NULL, gst.STATE_READY, gst.STATE_PAUSED)
-        self.discoverer._busMessageStateChangedCb(None, ignored)
+        self.discoverer._busMessageStateChangedCb(None, ignored,
+                self.analysis)
         self.failUnlessEqual(self.factories, [])
 
     def testBusStateChangedNoStreams(self):
         # no streams found
         message = gst.message_new_state_changed(self.src,
                 gst.STATE_READY, gst.STATE_PAUSED, gst.STATE_VOID_PENDING)
-        self.discoverer.addUri('illbepopped')
         self.failUnlessEqual(self.error, None)
-        self.discoverer._busMessageStateChangedCb(None, message)
+        self.discoverer._busMessageStateChangedCb(None, message,
+                self.analysis)
         self.failUnlessEqual(self.factories, [])
         # FIXME: be more strict about the error here
         self.failUnless(self.error)
@@ -404,17 +461,16 @@ class TestStateChange(TestCase):
         # only video
         pad = gst.Pad('src', gst.PAD_SRC)
         pad.set_caps(gst.Caps('video/x-raw-rgb'))
-        self.discoverer._newDecodedPadCb(None, pad, False)
+        self.discoverer._newDecodedPadCb(None, pad, False, self.analysis)
 
         self.failUnlessEqual(self.error, None)
         message = gst.message_new_state_changed(self.src,
                 gst.STATE_READY, gst.STATE_PAUSED, gst.STATE_VOID_PENDING)
-        self.discoverer.addUri('illbepopped')
         self.failUnlessEqual(self.error, None)
-        self.discoverer._busMessageStateChangedCb(None, message)
-        # should go to PLAYING to do thumbnails
-        self.failUnlessEqual(self.src.get_state(0)[2], gst.STATE_PLAYING)
-        self.discoverer._finishAnalysis("foo")
+        self.discoverer._busMessageStateChangedCb(None, message,
+                self.analysis)
+        # thumbnails are done later, no need to go to PLAYING
+        self.failIfEqual(self.src.get_state(0)[2], gst.STATE_PLAYING)
         self.failUnlessEqual(len(self.factories), 1)
         factory = self.factories[0]
         self.failUnless(isinstance(factory, FileSourceFactory))
@@ -424,14 +480,14 @@ class TestStateChange(TestCase):
         # only audio
         pad = gst.Pad('src', gst.PAD_SRC)
         pad.set_caps(gst.Caps('audio/x-raw-int'))
-        self.discoverer._newDecodedPadCb(None, pad, False)
+        self.discoverer._newDecodedPadCb(None, pad, False, self.analysis)
 
         self.failUnlessEqual(self.error, None)
         message = gst.message_new_state_changed(self.src,
                 gst.STATE_READY, gst.STATE_PAUSED, gst.STATE_VOID_PENDING)
-        self.discoverer.addUri('illbepopped')
         self.failUnlessEqual(self.error, None)
-        self.discoverer._busMessageStateChangedCb(None, message)
+        self.discoverer._busMessageStateChangedCb(None, message,
+                self.analysis)
         self.failUnlessEqual(len(self.factories), 1)
         factory = self.factories[0]
         self.failUnless(isinstance(factory, FileSourceFactory))
@@ -440,58 +496,248 @@ class TestStateChange(TestCase):
     def testBusStateChangedImageOnly(self):
         # only image
         pngdec = gst.element_factory_make('pngdec')
-        self.discoverer.pipeline.add(pngdec)
+        self.analysis.pipeline.add(pngdec)
         # images don't have duration
-        self.discoverer.current_duration = gst.CLOCK_TIME_NONE
+        self.analysis.duration = gst.CLOCK_TIME_NONE
         pad = pngdec.get_pad('src')
         caps = gst.Caps(pad.get_caps()[0])
         caps[0]['width'] = 320
         caps[0]['height'] = 240
         caps[0]['framerate'] = gst.Fraction(0, 1)
         pad.set_caps(caps)
-        self.discoverer._newDecodedPadCb(None, pad, False)
+        self.discoverer._newDecodedPadCb(None, pad, False, self.analysis)
 
         self.failUnlessEqual(self.error, None)
         message = gst.message_new_state_changed(self.src,
                 gst.STATE_READY, gst.STATE_PAUSED, gst.STATE_VOID_PENDING)
-        self.discoverer.addUri('illbepopped')
         self.failUnlessEqual(self.error, None)
-        self.discoverer._busMessageStateChangedCb(None, message)
-        # should go to PLAYING to do thumbnails
-        self.failUnlessEqual(self.src.get_state(0)[2], gst.STATE_PLAYING)
-        self.discoverer._finishAnalysis("foo")
+        self.discoverer._busMessageStateChangedCb(None, message,
+                self.analysis)
+        # thumbnails are done later, no need to go to PLAYING
+        self.failIfEqual(self.src.get_state(0)[2], gst.STATE_PLAYING)
         self.failUnlessEqual(len(self.factories), 1)
         factory = self.factories[0]
         self.failUnless(isinstance(factory, PictureFileSourceFactory))
         self.failUnlessEqual(len(factory.output_streams), 1)
 
     def testDurationCheckImage(self):
-        self.discoverer.current_duration = gst.CLOCK_TIME_NONE
+        self.analysis.duration = gst.CLOCK_TIME_NONE
         pngdec = gst.element_factory_make('pngdec')
-        self.discoverer.pipeline.add(pngdec)
+        self.analysis.pipeline.add(pngdec)
         pad = pngdec.get_pad('src')
         caps = gst.Caps(pad.get_caps()[0])
         caps[0]['width'] = 320
         caps[0]['height'] = 240
         caps[0]['framerate'] = gst.Fraction(0, 1)
         pad.set_caps(caps)
-        self.discoverer._newDecodedPadCb(None, pad, False)
-        self.discoverer.addUri('illbepopped')
-        self.discoverer._finishAnalysis("foo")
+        self.discoverer._newDecodedPadCb(None, pad, False, self.analysis)
+        self.discoverer._finishAnalysis(self.analysis, "foo")
 
         self.failUnlessEqual(self.error, None)
-        self.failUnlessEqual(self.discoverer.current_duration,
+        self.failUnlessEqual(self.analysis.duration,
                 gst.CLOCK_TIME_NONE)
 
     def testDurationCheckNonImage(self):
-        self.discoverer.current_duration = gst.CLOCK_TIME_NONE
+        self.analysis.duration = gst.CLOCK_TIME_NONE
         pad = gst.Pad('src', gst.PAD_SRC)
         pad.set_caps(gst.Caps('audio/x-raw-int'))
-        self.discoverer._newDecodedPadCb(None, pad, False)
-        self.discoverer.addUri('illbepopped')
-        self.discoverer._finishAnalysis("foo")
+        self.discoverer._newDecodedPadCb(None, pad, False, self.analysis)
+        self.discoverer._finishAnalysis(self.analysis, "foo")
 
         self.failUnlessEqual(self.error,
                 "Could not establish the duration of the file.")
-        self.failUnlessEqual(self.discoverer.current_duration,
+        self.failUnlessEqual(self.analysis.duration,
                 gst.CLOCK_TIME_NONE)
+
+class TestImageFastPath(TestCase):
+    def setUp(self):
+        TestCase.setUp(self)
+        self.directory = tempfile.mkdtemp()
+        cache = DiscoveryCache(os.path.join(self.directory, "cache.json"))
+        self.discoverer = Discoverer1(cache)
+        self.factories = []
+        self.discoverer.connect("discovery-done", self._discoveryDoneCb)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        self.discoverer = None
+        TestCase.tearDown(self)
+
+    def _discoveryDoneCb(self, discoverer, uri, factory):
+        self.factories.append(factory)
+
+    def _writePicture(self, data):
+        filename = os.path.join(self.directory, "picture.png")
+        f = open(filename, "wb")
+        f.write(data)
+        f.close()
+        return "file://" + filename
+
+    def testPng(self):
+        timings = []
+        self.discoverer.connect("timing",
+                lambda disc, uri, mime, timing: timings.append((mime, timing)))
+        uri = self._writePicture(make_png(320, 240, color_type=6))
+        self.discoverer.addUri(uri)
+        self.discoverer._analyzeNextCb()
+        mime, timing = timings[0]
+        self.failUnlessEqual(mime, "image/png")
+        self.failUnless("total" in timing)
+
+        # no pipeline involved
+        self.failIf(self.discoverer.timeout_scheduled)
+        self.failIf(self.discoverer.working)
+        factory, = self.factories
+        self.failUnless(isinstance(factory, PictureFileSourceFactory))
+        self.failUnlessEqual(factory.duration, gst.CLOCK_TIME_NONE)
+        stream, = factory.getOutputStreams()
+        self.failUnless(stream.is_image)
+        self.failUnlessEqual((stream.width, stream.height), (320, 240))
+        self.failUnless(stream.has_alpha())
+        self.failUnlessEqual(stream.thumbnail, None)
+        # cached like the pictures discovered with a pipeline
+        cached = self.discoverer.cache.lookup(uri)
+        self.failUnless(isinstance(cached, PictureFileSourceFactory))
+
+        # the caps are the ones pngdec outputs
+        pngdec = gst.element_factory_make("pngdec")
+        self.failIf(stream.caps.intersect(
+                pngdec.get_pad("src").get_pad_template_caps()).is_empty())
+
+    def _encodePicture(self, filename, caps, encoder):
+        pipeline = gst.parse_launch("videotestsrc num-buffers=1 ! "
+                "ffmpegcolorspace ! %s ! %s ! filesink location=%s" %
+                (caps, encoder, filename))
+        pipeline.set_state(gst.STATE_PLAYING)
+        message = pipeline.get_bus().timed_pop_filtered(10 * gst.SECOND,
+                gst.MESSAGE_EOS | gst.MESSAGE_ERROR)
+        pipeline.set_state(gst.STATE_NULL)
+        self.failUnlessEqual(message.type, gst.MESSAGE_EOS)
+        return "file://" + filename
+
+    def _decodedCaps(self, uri, decoder):
+        pipeline = gst.parse_launch("filesrc location=%s ! %s name=decoder "
+                "! fakesink" % (gst.uri_get_location(uri), decoder))
+        pipeline.set_state(gst.STATE_PAUSED)
+        pipeline.get_state(10 * gst.SECOND)
+        caps = pipeline.get_by_name("decoder").get_pad("src").get_negotiated_caps()
+        pipeline.set_state(gst.STATE_NULL)
+        return caps
+
+    def _checkDecoderCaps(self, filename, caps, encoder, decoder):
+        uri = self._encodePicture(os.path.join(self.directory, filename),
+                caps, encoder)
+        decoded = self._decodedCaps(uri, decoder)
+        self.discoverer.addUri(uri)
+        self.discoverer._analyzeNextCb()
+        stream, = self.factories.pop().getOutputStreams()
+        self.failUnless(stream.caps.is_equal(decoded),
+                "%s != %s" % (stream.caps.to_string(), decoded.to_string()))
+
+    def testPngdecCaps(self):
+        self._checkDecoderCaps("rgb.png",
+                "video/x-raw-rgb,bpp=24,width=32,height=24", "pngenc", "pngdec")
+        self._checkDecoderCaps("rgba.png",
+                "video/x-raw-rgb,bpp=32,depth=32,width=32,height=24",
+                "pngenc", "pngdec")
+
+    def testJpegdecCaps(self):
+        self._checkDecoderCaps("picture.jpg",
+                "video/x-raw-yuv,format=(fourcc)I420,width=32,height=24",
+                "jpegenc", "jpegdec")
+
+    def testBrokenHeader(self):
+        # falls back to the pipeline
+        uri = self._writePicture(make_png(320, 240)[:20])
+        self.failUnlessEqual(self.discoverer._probeImage(Analysis(uri)), None)
+
+    def testHeaderOnlyAutoplug(self):
+        discoverer = Discoverer(header_only=True)
+        # containers are demuxed
+        self.failUnless(discoverer._autoplugContinueCb(None, None,
+                gst.Caps("application/ogg")))
+        # elementary streams are exposed without being decoded
+        self.failIf(discoverer._autoplugContinueCb(None, None,
+                gst.Caps("audio/x-vorbis")))
+
+class BytesReadDiscoverer(Discoverer1):
+    bytes_read_position = 0
+
+    def _queryBytesRead(self, analysis):
+        return self.bytes_read_position
+
+class TestAdaptiveTimeout(TestCase):
+    def setUp(self):
+        TestCase.setUp(self)
+        self.directory = tempfile.mkdtemp()
+        self.discoverer = BytesReadDiscoverer()
+        self.analysis = Analysis("meh")
+        self.discoverer.analyses.append(self.analysis)
+        self.discoverer.working = True
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        self.discoverer = None
+        self.analysis = None
+        TestCase.tearDown(self)
+
+    def _makeFile(self, size):
+        filename = os.path.join(self.directory, "file")
+        f = open(filename, "w")
+        f.truncate(size)
+        f.close()
+        return "file://" + filename
+
+    def testTimeoutFromSize(self):
+        self.failUnlessEqual(self.discoverer._getTimeout(self.analysis),
+                DEFAULT_TIMEOUT)
+
+        self.discoverer.throughput = 1024 * 1024
+        self.discoverer.bytes_read = 8 * 1024 * 1024
+        self.failUnlessEqual(self.discoverer._getTimeout(
+                Analysis(self._makeFile(1024))), MIN_TIMEOUT)
+        # only as much as the previous files needed is expected to be read
+        self.failUnlessEqual(self.discoverer._getTimeout(
+                Analysis(self._makeFile(100 * 1024 * 1024))),
+                MIN_TIMEOUT + 4 * 8)
+
+    def testTimeoutCapped(self):
+        # extensions stop MAX_TIMEOUT after the analysis started
+        self.analysis.started -= MAX_TIMEOUT - 3.5
+        self.failUnlessEqual(self.discoverer._getTimeout(self.analysis), 4)
+        self.analysis.started -= 10
+        self.failUnlessEqual(self.discoverer._getTimeout(self.analysis), 1)
+
+    def testTimeoutExtended(self):
+        errors = []
+        self.discoverer.connect("discovery-error",
+                lambda disc, uri, error, detail: errors.append(error))
+        self.discoverer.timeout_expired = False
+
+        # still reading, wait some more
+        self.discoverer.bytes_read_position = 1000
+        self.discoverer._timeoutCb(self.analysis)
+        self.failUnless(self.discoverer.timeout_scheduled)
+        self.failUnlessEqual(self.analysis.last_position, 1000)
+        self.failUnlessEqual(errors, [])
+
+        # stuck
+        self.discoverer._timeoutCb(self.analysis)
+        self.failUnlessEqual(errors, ["Timeout while analyzing file."])
+
+    def testUpdateEstimates(self):
+        self.discoverer.throughput = 1000
+        self.discoverer.bytes_read = 1000
+        self.discoverer.bytes_read_position = 2000
+        self.analysis.timings["preroll"] = 0.5
+        self.discoverer._updateEstimates(self.analysis)
+        self.failUnless(1000 < self.discoverer.bytes_read < 2000)
+        self.failUnless(1000 < self.discoverer.throughput < 4000)
+
+    def testTimingSignal(self):
+        timings = []
+        self.discoverer.connect("timing",
+                lambda disc, uri, mime, timing: timings.append(timing))
+        self.analysis.mime = "application/ogg"
+        self.discoverer._finishAnalysis(self.analysis, "foo")
+        self.failUnless("total" in timings[0])
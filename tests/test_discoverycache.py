@@ -0,0 +1,194 @@
+# PiTiVi , Non-linear video editor
+#
+#       tests/test_discoverycache.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import gst
+
+from pitivi.discoverer import Discoverer
+from pitivi.discoverycache import DiscoveryCache
+from pitivi.factories.file import FileSourceFactory, PictureFileSourceFactory
+from pitivi.stream import VideoStream, AudioStream
+
+
+class StubDiscoverer(Discoverer):
+    analyzed = 0
+
+    def _scheduleAnalysis(self):
+        pass
+
+    def _createSource(self, analysis):
+        self.analyzed += 1
+        return None
+
+
+class TestDiscoveryCache(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "cache",
+                "discovery.json")
+        self.cache = DiscoveryCache(self.filename)
+
+        self.media = os.path.join(self.directory, "media.ogg")
+        self._writeMedia("some data")
+        self.uri = "file://" + self.media
+
+        self.thumbnail = os.path.join(self.directory, "thumbnail.png")
+        open(self.thumbnail, "w").close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _writeMedia(self, data):
+        f = open(self.media, "w")
+        f.write(data)
+        f.close()
+
+    def _makeFactory(self):
+        factory = FileSourceFactory(self.uri)
+        factory.duration = 10 * gst.SECOND
+        video = VideoStream(gst.Caps("video/x-raw-yuv, width=320, "
+                "height=240, framerate=25/1"), "src0")
+        video.thumbnail = self.thumbnail
+        factory.addOutputStream(video)
+        factory.addOutputStream(AudioStream(gst.Caps("audio/x-raw-int, "
+                "rate=44100, channels=2"), "src1"))
+        return factory
+
+    def checkFactory(self, factory):
+        self.failUnless(isinstance(factory, FileSourceFactory))
+        self.failUnlessEqual(factory.uri, self.uri)
+        self.failUnlessEqual(factory.duration, 10 * gst.SECOND)
+        video, audio = factory.getOutputStreams()
+        self.failUnless(isinstance(video, VideoStream))
+        self.failUnlessEqual(video.pad_name, "src0")
+        self.failUnlessEqual(video.width, 320)
+        self.failUnlessEqual(video.thumbnail, self.thumbnail)
+        self.failIf(video.is_image)
+        self.failUnless(isinstance(audio, AudioStream))
+        self.failUnlessEqual(audio.pad_name, "src1")
+
+    def testLookupMissing(self):
+        self.failUnlessEqual(self.cache.lookup(self.uri), None)
+        self.failUnlessEqual(self.cache.lookup("http://example.com/a.ogg"),
+                None)
+        self.failUnlessEqual(self.cache.misses, 2)
+
+    def testStoreLookup(self):
+        self.cache.store(self._makeFactory())
+        self.checkFactory(self.cache.lookup(self.uri))
+        self.failUnlessEqual(self.cache.hits, 1)
+
+    def testSaveLoad(self):
+        self.cache.store(self._makeFactory())
+        self.cache.save()
+        self.failUnless(os.path.exists(self.filename))
+
+        cache = DiscoveryCache(self.filename)
+        self.checkFactory(cache.lookup(self.uri))
+
+    def testSaveUnwritable(self):
+        # the directory of the cache can't be created
+        open(os.path.dirname(self.filename), "w").close()
+        self.cache.store(self._makeFactory())
+        self.cache.save()
+        self.failIf(os.path.exists(self.filename))
+
+    def testImage(self):
+        factory = PictureFileSourceFactory(self.uri)
+        factory.duration = gst.CLOCK_TIME_NONE
+        factory.addOutputStream(VideoStream(gst.Caps("video/x-raw-rgb"),
+                "src", is_image=True))
+        self.cache.store(factory)
+        self.cache.save()
+
+        factory = DiscoveryCache(self.filename).lookup(self.uri)
+        self.failUnless(isinstance(factory, PictureFileSourceFactory))
+        self.failUnlessEqual(factory.duration, gst.CLOCK_TIME_NONE)
+        self.failUnless(factory.getOutputStreams()[0].is_image)
+
+    def testCopyEntry(self):
+        self.cache.store(self._makeFactory())
+        entry = self.cache.getEntry(self.uri)
+
+        cache = DiscoveryCache(os.path.join(self.directory, "other.json"))
+        self.failUnlessEqual(cache.getEntry(self.uri), None)
+        cache.setEntry(self.uri, entry)
+        self.checkFactory(cache.lookup(self.uri))
+
+    def testFileChanged(self):
+        self.cache.store(self._makeFactory())
+        self._writeMedia("some other data")
+
+        self.failUnlessEqual(self.cache.lookup(self.uri), None)
+        # the stale thumbnail must be regenerated
+        self.failIf(os.path.exists(self.thumbnail))
+
+    def testThumbnailGone(self):
+        self.cache.store(self._makeFactory())
+        os.unlink(self.thumbnail)
+        self.failUnlessEqual(self.cache.lookup(self.uri), None)
+
+    def testCorrupted(self):
+        os.makedirs(os.path.dirname(self.filename))
+        f = open(self.filename, "w")
+        f.write("{ not json")
+        f.close()
+
+        cache = DiscoveryCache(self.filename)
+        self.failUnlessEqual(cache.lookup(self.uri), None)
+        cache.store(self._makeFactory())
+        cache.save()
+        self.checkFactory(DiscoveryCache(self.filename).lookup(self.uri))
+
+    def testMaxEntries(self):
+        self.cache.max_entries = 1
+        self.cache.store(self._makeFactory())
+        # make sure it's the least recently used one
+        self.cache._entries[self.uri]["used"] = 0
+        other = os.path.join(self.directory, "other.ogg")
+        open(other, "w").close()
+        factory = FileSourceFactory("file://" + other)
+        factory.duration = gst.SECOND
+        self.cache.store(factory)
+        self.cache.save()
+
+        cache = DiscoveryCache(self.filename)
+        self.failUnlessEqual(cache.lookup(self.uri), None)
+        self.failIfEqual(cache.lookup("file://" + other), None)
+
+    def testDiscovererUsesCache(self):
+        discoverer = StubDiscoverer(self.cache)
+        factories = []
+        discoverer.connect("discovery-done",
+                lambda disc, uri, factory: factories.append(factory))
+
+        self.cache.store(self._makeFactory())
+        discoverer.addUri(self.uri)
+        discoverer._analyzeNextCb()
+
+        self.failUnlessEqual(discoverer.analyzed, 0)
+        self.failUnlessEqual(len(factories), 1)
+        self.checkFactory(factories[0])
+        self.failIf(discoverer.working)
+        # the cache was written when the discoverer became ready
+        self.failUnless(os.path.exists(self.filename))
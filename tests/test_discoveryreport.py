@@ -0,0 +1,100 @@
+# PiTiVi , Non-linear video editor
+#
+#       tests/test_discoveryreport.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+from unittest import TestCase
+
+from pitivi.log import log
+from pitivi.discoveryreport import DiscoveryReport, UNKNOWN
+
+
+class CountingReport(DiscoveryReport):
+    formatted = 0
+
+    def format(self):
+        self.formatted += 1
+        return DiscoveryReport.format(self)
+
+    __str__ = format
+
+
+class TestDiscoveryReport(TestCase):
+    def setUp(self):
+        self.report = DiscoveryReport()
+
+    def testAddTimings(self):
+        self.report.addTimings("file:///a.ogg",
+                {"typefind": 0.1, "total": 1.0}, "application/ogg")
+        self.report.addTimings("file:///b.ogg",
+                {"typefind": 0.3, "total": 2.0}, "application/ogg")
+
+        phases = self.report.formats["application/ogg"]
+        self.failUnlessEqual(phases["total"].count, 2)
+        self.failUnlessAlmostEqual(phases["total"].getMean(), 1.5)
+        self.failUnlessAlmostEqual(phases["typefind"].max, 0.3)
+        self.failIf("preroll" in phases)
+
+    def testThumbnailTimings(self):
+        self.report.addTimings("file:///a.avi", {"total": 1.0},
+                "video/x-msvideo")
+        # thumbnails come later, without a type
+        self.report.addTimings("file:///a.avi", {"thumbnail": 0.5})
+        self.report.addTimings("file:///b.avi", {"thumbnail": 0.5})
+
+        phases = self.report.formats["video/x-msvideo"]
+        self.failUnlessAlmostEqual(phases["thumbnail"].sum, 0.5)
+        self.failUnlessAlmostEqual(self.report.getTimeSpent("video/x-msvideo"),
+                1.5)
+        self.failUnless(UNKNOWN in self.report.formats)
+
+    def testSortedFormats(self):
+        self.report.addTimings("file:///a.png", {"total": 0.001}, "image/png")
+        self.report.addTimings("file:///a.mov", {"total": 3.0},
+                "video/quicktime")
+        self.report.addTimings("file:///a.ogg", {"total": 1.0},
+                "application/ogg")
+        self.failUnlessEqual(self.report.getSortedFormats(),
+                ["video/quicktime", "application/ogg", "image/png"])
+
+    def testFormat(self):
+        self.failUnlessEqual(len(self.report.format().splitlines()), 1)
+
+        self.report.addTimings("file:///a.ogg",
+                {"typefind": 0.01, "total": 0.25}, "application/ogg")
+        lines = self.report.format().splitlines()
+        self.failUnlessEqual(len(lines), 2)
+        self.failUnless(lines[1].startswith("application/ogg"))
+        self.failUnless("250.0/   250.0" in lines[1])
+
+        self.report.clear()
+        self.failUnlessEqual(self.report.formats, {})
+
+    def testLazyFormat(self):
+        report = CountingReport()
+        handlers = list(log._log_handlers)
+        debug = log.getDebug()
+        try:
+            del log._log_handlers[:]
+            log.setDebug("*:1")
+            log.doLog(log.INFO, None, "discoveryreport", "%s", (report, ))
+            self.failUnlessEqual(report.formatted, 0)
+        finally:
+            log._log_handlers[:] = handlers
+            log.setDebug(debug)
+
+        self.failUnlessEqual("%s" % report, report.format())
@@ -19,13 +19,18 @@
 # Free Software Foundation, Inc., 59 Temple Place - Suite 330,
 # Boston, MA 02111-1307, USA.
 
+import os
+import shutil
+import tempfile
 from unittest import TestCase
+from StringIO import StringIO
 import gst
 from xml.etree.ElementTree import Element, SubElement
 
 from pitivi.reflect import qual
 from pitivi.formatters.etree import ElementTreeFormatter, version,\
-                                    indent, tostring
+                                    indent, tostring, IndentedXMLWriter, \
+                                    iterparse_elements, ElementParser
 from pitivi.stream import VideoStream, AudioStream
 from pitivi.factories.file import FileSourceFactory
 from pitivi.factories.test import VideoTestSourceFactory, \
@@ -37,6 +42,7 @@ from pitivi.timeline.timeline import Timeline, TimelineObject
 from pitivi.project import Project
 from pitivi.utils import get_controllable_properties
 from pitivi.effects import EffectsHandler
+from pitivi.log import tracing
 
 class FakeElementTreeFormatter(ElementTreeFormatter):
     pass
@@ -74,10 +80,15 @@ class TestFormatterSave(TestCase):
         self.failUnlessEqual(element.tag, "source")
         self.failUnlessEqual(element.attrib["type"], qual(source1.__class__))
         self.failUnlessEqual(element.attrib["filename"], "file1.ogg")
+        self.failIf("proxy" in element.attrib)
 
         streams = element.find("output-streams")
         self.failUnlessEqual(len(streams), 2)
 
+        source1.proxy_uri = "file:///tmp/proxy1.mkv"
+        element = self.formatter._saveSource(source1)
+        self.failUnlessEqual(element.attrib["proxy"], "file:///tmp/proxy1.mkv")
+
     def testSaveFactories(self):
         video_stream = VideoStream(gst.Caps("video/x-raw-yuv"))
         audio_stream = AudioStream(gst.Caps("audio/x-raw-int"))
@@ -388,6 +399,63 @@ class TestFormatterSave(TestCase):
         self.failIfEqual(element.find("factories"), None)
         self.failIfEqual(element.find("timeline"), None)
 
+    def testWriteProject(self):
+        video_stream = VideoStream(gst.Caps("video/x-raw-yuv"))
+        audio_stream = AudioStream(gst.Caps("audio/x-raw-int"))
+        source1 = VideoTestSourceFactory()
+        source2 = AudioTestSourceFactory()
+
+        track_object = SourceTrackObject(source1, video_stream,
+                start=10 * gst.SECOND, duration=20 * gst.SECOND,
+                in_point=5 * gst.SECOND, media_duration=15 * gst.SECOND,
+                priority=10)
+        track = Track(video_stream)
+        track.addTrackObject(track_object)
+        timeline_object = TimelineObject(source1)
+        timeline_object.addTrackObject(track_object)
+
+        timeline = Timeline()
+        timeline.addTrack(track)
+        # a track without objects is written as an empty element
+        timeline.addTrack(Track(audio_stream))
+        timeline.addTimelineObject(timeline_object)
+
+        project = Project()
+        project.timeline = timeline
+        project.sources.addFactory(source1)
+        project.sources.addFactory(source2)
+
+        formatter = FakeElementTreeFormatter(EffectsHandler())
+        element = formatter._serializeProject(project)
+        indent(element)
+        expected = tostring(element)
+
+        output = StringIO()
+        self.formatter._writeProject(project, IndentedXMLWriter(output))
+        self.failUnlessEqual(output.getvalue(), expected)
+
+    def testIndentedXMLWriter(self):
+        root = Element("root", name=u"caf\xe9 & <friends>")
+        empty = SubElement(root, "empty")
+        container = SubElement(root, "container")
+        leaf = SubElement(container, "leaf", id="1")
+        SubElement(leaf, "child")
+        SubElement(container, "leaf", id="2")
+
+        output = StringIO()
+        writer = IndentedXMLWriter(output)
+        writer.start(Element(root.tag, root.attrib))
+        writer.start(Element(empty.tag))
+        writer.end()
+        writer.start(Element(container.tag))
+        for child in list(container):
+            writer.write(child)
+        writer.end()
+        writer.end()
+
+        indent(root)
+        self.failUnlessEqual(output.getvalue(), tostring(root))
+
 
 class TestFormatterLoad(TestCase):
     def setUp(self):
@@ -731,6 +799,85 @@ class TestFormatterLoad(TestCase):
         f.write(tostring(element))
         f.close()
 
+    def testLoadProjectFailed(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, "broken.xptv")
+            f = open(filename, "w")
+            f.write("<pitivi><factories><sources>")
+            f.close()
+            uri = "file://" + filename
+
+            failed = []
+            self.formatter.connect("new-project-failed",
+                    lambda formatter, uri, e: failed.append(uri))
+            tracing.clear()
+            tracing.enable()
+            try:
+                self.formatter.loadProject(uri)
+            finally:
+                tracing.disable()
+        finally:
+            shutil.rmtree(directory)
+
+        self.failUnlessEqual(failed, [uri])
+        # the span started by loadProject is closed
+        phases = [(event["ph"], event.get("args"))
+                for event in tracing.getEvents()
+                if event["name"] == "load-project"]
+        tracing.clear()
+        self.failUnlessEqual(phases, [("b", {"uri": uri}),
+                ("e", {"success": False})])
+
+    def testIterparseElements(self):
+        document = StringIO('<pitivi><factories><sources>'
+                '<source id="1"><output-streams><stream id="2" />'
+                '</output-streams></source><source id="3" />'
+                '</sources></factories><timeline /></pitivi>')
+        sources = []
+        streams = []
+
+        def sourceCb(element):
+            # the stream was handled and detached before its source closed
+            if element.attrib["id"] == "1":
+                self.failUnlessEqual(len(element.find("output-streams")), 0)
+            sources.append(element)
+
+        def factoriesCb(element):
+            # handled elements have been detached
+            self.failUnlessEqual(len(element.find("sources")), 0)
+            return True
+
+        iterparse_elements(document, {
+                ("sources", "source"): sourceCb,
+                ("output-streams", "stream"): streams.append,
+                ("pitivi", "factories"): factoriesCb,
+                ("pitivi", "timeline"): self.fail})
+
+        self.failUnlessEqual([source.attrib["id"] for source in sources],
+                ["1", "3"])
+        self.failUnlessEqual([stream.attrib["id"] for stream in streams],
+                ["2"])
+
+    def testElementParserResume(self):
+        document = StringIO('<pitivi><factories><sources><source id="1" />'
+                '</sources></factories><timeline><tracks><track id="2" />'
+                '</tracks></timeline></pitivi>')
+        sources = []
+        tracks = []
+
+        parser = ElementParser(document)
+        parser.parse({("sources", "source"): sources.append,
+                ("pitivi", "factories"): lambda element: True})
+        self.failUnlessEqual(len(sources), 1)
+        self.failIf(parser.done)
+        # the parsing goes on after the factories
+        parser.parse({("sources", "source"): sources.append,
+                ("tracks", "track"): tracks.append})
+        self.failUnlessEqual(len(sources), 1)
+        self.failUnlessEqual([track.attrib["id"] for track in tracks], ["2"])
+        self.failUnless(parser.done)
+
     ## following test is disabled until I figure out a better way of
     ## testing the mapping system.
 #     def testDirectoryMapping(self):
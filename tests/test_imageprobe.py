@@ -0,0 +1,121 @@
+# PiTiVi , Non-linear video editor
+#
+#       tests/test_imageprobe.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+import os
+import struct
+import tempfile
+import zlib
+from unittest import TestCase
+
+from pitivi.imageprobe import probe_image, PNG_SIGNATURE
+
+
+def png_chunk(chunk_type, data):
+    return struct.pack(">I4s", len(data), chunk_type) + data + \
+            struct.pack(">I", zlib.crc32(chunk_type + data) & 0xffffffff)
+
+
+def make_png(width, height, color_type=2, depth=8, chunks=()):
+    data = PNG_SIGNATURE + png_chunk("IHDR",
+            struct.pack(">IIBBBBB", width, height, depth, color_type, 0, 0, 0))
+    for chunk_type, chunk_data in chunks:
+        data += png_chunk(chunk_type, chunk_data)
+    return data + png_chunk("IDAT", zlib.compress("\0")) + \
+            png_chunk("IEND", "")
+
+
+def jpeg_segment(marker, data):
+    return struct.pack(">BBH", 0xff, marker, len(data) + 2) + data
+
+
+def make_jpeg(width, height, sof=0xc0, precision=8, components=3):
+    return "\xff\xd8" + \
+            jpeg_segment(0xe0, "JFIF\0\1\1\0\0\1\0\1\0\0") + \
+            jpeg_segment(0xdb, "\0" * 65) + \
+            jpeg_segment(sof, struct.pack(">BHHB", precision, height,
+                    width, components) + "\1\x22\0" * components) + \
+            jpeg_segment(0xda, "\0" * 10) + "\0" * 100 + "\xff\xd9"
+
+
+class TestImageProbe(TestCase):
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.unlink(self.filename)
+
+    def probe(self, data):
+        f = open(self.filename, "wb")
+        f.write(data)
+        f.close()
+        return probe_image(self.filename)
+
+    def testPng(self):
+        info = self.probe(make_png(640, 480))
+        self.failUnlessEqual(info.format, "png")
+        self.failUnlessEqual((info.width, info.height), (640, 480))
+        self.failIf(info.has_alpha)
+
+    def testPngAlpha(self):
+        self.failUnless(self.probe(make_png(16, 16, color_type=6)).has_alpha)
+        self.failUnless(self.probe(make_png(16, 16, color_type=4)).has_alpha)
+
+        # palette with transparency
+        info = self.probe(make_png(16, 16, color_type=3,
+                chunks=[("PLTE", "\0\0\0"), ("tRNS", "\0")]))
+        self.failUnless(info.has_alpha)
+        info = self.probe(make_png(16, 16, color_type=3,
+                chunks=[("PLTE", "\0\0\0")]))
+        self.failIf(info.has_alpha)
+
+    def testPngUnsupported(self):
+        self.failUnlessEqual(self.probe(make_png(16, 16, depth=16)), None)
+        self.failUnlessEqual(self.probe(make_png(0, 16)), None)
+
+    def testJpeg(self):
+        info = self.probe(make_jpeg(1920, 1080))
+        self.failUnlessEqual(info.format, "jpeg")
+        self.failUnlessEqual((info.width, info.height), (1920, 1080))
+
+        # progressive and grayscale
+        info = self.probe(make_jpeg(100, 50, sof=0xc2, components=1))
+        self.failUnlessEqual((info.width, info.height), (100, 50))
+
+    def testJpegUnsupported(self):
+        # CMYK
+        self.failUnlessEqual(self.probe(make_jpeg(16, 16, components=4)), None)
+        self.failUnlessEqual(self.probe(make_jpeg(16, 16, precision=12)), None)
+        # height defined by a DNL marker
+        self.failUnlessEqual(self.probe(make_jpeg(16, 0)), None)
+        # lossless, hierarchical and arithmetic coded
+        for sof in (0xc3, 0xc5, 0xc6, 0xc7, 0xc9, 0xca, 0xcb, 0xcd, 0xce,
+                0xcf):
+            self.failUnlessEqual(self.probe(make_jpeg(16, 16, sof=sof)), None)
+        self.failUnless(self.probe(make_jpeg(16, 16, sof=0xc1)))
+
+    def testTruncated(self):
+        self.failUnlessEqual(self.probe(make_png(16, 16)[:20]), None)
+        self.failUnlessEqual(self.probe(make_jpeg(16, 16)[:30]), None)
+        self.failUnlessEqual(self.probe("\xff\xd8\xff"), None)
+        self.failUnlessEqual(self.probe(""), None)
+
+    def testNotAnImage(self):
+        self.failUnlessEqual(self.probe("OggS" + "\0" * 100), None)
+        self.failUnlessEqual(probe_image("/nonexistent/file.png"), None)
@@ -0,0 +1,102 @@
+# PiTiVi , Non-linear video editor
+#
+#       tests/test_indexer.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import gst
+
+from pitivi.discoverycache import DiscoveryCache
+from pitivi.factories.file import FileSourceFactory
+from pitivi.indexer import walk_uris, is_indexed, IndexSummary
+from pitivi.peakcache import Peaks, PeakCache
+from pitivi.stream import VideoStream, AudioStream
+
+
+class TestIndexer(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _touch(self, *path):
+        filename = os.path.join(self.directory, *path)
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        open(filename, "w").close()
+        return filename
+
+    def testWalk(self):
+        self._touch("b.ogg")
+        self._touch("a", "c d.ogg")
+        self._touch(".hidden", "e.ogg")
+        self._touch("a", ".f.ogg")
+        self._touch("a", "notes.txt")
+        single = self._touch("g.ogg")
+
+        uris = list(walk_uris([self.directory, single]))
+        self.failUnlessEqual(uris, [
+                "file://%s/b.ogg" % self.directory,
+                "file://%s/g.ogg" % self.directory,
+                "file://%s/a/c%%20d.ogg" % self.directory,
+                "file://%s/g.ogg" % self.directory])
+
+    def testIsIndexed(self):
+        cache = DiscoveryCache(os.path.join(self.directory, "discovery.json"))
+        peak_cache = PeakCache(os.path.join(self.directory, "peaks"))
+        uri = "file://" + self._touch("media.ogg")
+        self.failIf(is_indexed(cache, peak_cache, uri))
+
+        factory = FileSourceFactory(uri)
+        factory.duration = gst.SECOND
+        video = VideoStream(gst.Caps("video/x-raw-yuv"), "src0")
+        factory.addOutputStream(video)
+        factory.addOutputStream(AudioStream(gst.Caps("audio/x-raw-int"),
+                "src1"))
+        cache.store(factory)
+        self.failIf(is_indexed(cache, peak_cache, uri))
+        self.failUnless(is_indexed(cache, peak_cache, uri, thumbnails=False,
+                peaks=False))
+
+        video.thumbnail = self._touch("thumbnail.png")
+        cache.store(factory)
+        self.failUnless(is_indexed(cache, peak_cache, uri, peaks=False))
+        self.failIf(is_indexed(cache, peak_cache, uri))
+
+        peak_cache.store(uri, "src1", Peaks(1, gst.SECOND))
+        self.failUnless(is_indexed(cache, peak_cache, uri))
+
+    def testSummary(self):
+        summary = IndexSummary()
+        summary.indexed = 3
+        summary.skipped = 2
+        summary.addFailure("file:///a.txt", "Can not decode file.")
+        summary.addFailure("file:///b.avi", "The worker crashed.")
+        summary.addFailure("file:///c.txt", "Can not decode file.")
+
+        lines = summary.format().split("\n")
+        self.failUnlessEqual(lines[0],
+                "3 files indexed, 2 already indexed, 3 failed")
+        # the most common reason comes first
+        self.failUnlessEqual(lines[2:5], ["Can not decode file. (2):",
+                "  file:///a.txt", "  file:///c.txt"])
+        self.failUnlessEqual(lines[6], "The worker crashed. (1):")
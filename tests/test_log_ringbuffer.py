@@ -0,0 +1,118 @@
+# PiTiVi , Non-linear video editor
+#
+#       tests/test_log_ringbuffer.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+import threading
+import time
+from StringIO import StringIO
+from unittest import TestCase
+
+from pitivi.log import log
+from pitivi.log.ringbuffer import RingBufferLogHandler, setThreadTag, \
+        getThreadTag
+
+
+class TestRingBufferLogHandler(TestCase):
+    def setUp(self):
+        self.output = StringIO()
+
+    def testWriterThread(self):
+        handler = RingBufferLogHandler(self.output, interval=0.001)
+        handler.start()
+        handler(log.INFO, "object", "category", "file.py", 42, "message 1")
+        handler(log.INFO, None, "category", "file.py", 43, "100% message 2")
+        handler.stop()
+
+        lines = self.output.getvalue().splitlines()
+        self.failUnlessEqual(len(lines), 2)
+        self.failUnless("message 1" in lines[0])
+        self.failUnless("(file.py:42)" in lines[0])
+        self.failUnless("100% message 2" in lines[1])
+
+    def testDropsWhenFull(self):
+        handler = RingBufferLogHandler(self.output, capacity=2)
+        for i in xrange(5):
+            handler(log.DEBUG, None, "category", "file.py", i, "message")
+        self.failUnlessEqual(handler.dropped, 3)
+
+        handler.flush()
+        lines = self.output.getvalue().splitlines()
+        self.failUnlessEqual(len(lines), 3)
+        self.failUnless("3 records dropped" in lines[-1])
+
+    def testDumpOnly(self):
+        handler = RingBufferLogHandler(self.output, history=3, dump_only=True)
+        handler.start()
+        for i in xrange(5):
+            handler(log.DEBUG, None, "category", "file.py", i,
+                    "message %d" % i)
+        handler.stop()
+        self.failUnlessEqual(self.output.getvalue(), "")
+
+        dump = StringIO()
+        handler.dumpHistory(10, dump)
+        lines = dump.getvalue().splitlines()
+        # a header, then only the last three records
+        self.failUnlessEqual(len(lines), 4)
+        self.failUnless("message 2" in lines[1])
+        self.failUnless("message 4" in lines[3])
+
+    def testInstall(self):
+        handlers = list(log._log_handlers_limited)
+        try:
+            handler = RingBufferLogHandler(self.output, dump_only=True)
+            handler.install()
+            # nothing would reach stderr until a dump otherwise
+            self.failUnless(log.stderrHandler in log._log_handlers_limited)
+            self.failUnless(handler in log._log_handlers_limited)
+            handler.uninstall()
+            self.failIf(handler in log._log_handlers_limited)
+
+            handler = RingBufferLogHandler(self.output)
+            handler.install()
+            self.failIf(log.stderrHandler in log._log_handlers_limited)
+            handler.uninstall()
+            self.failUnless(log.stderrHandler in log._log_handlers_limited)
+        finally:
+            log._log_handlers_limited[:] = handlers
+
+    def testHistorySeconds(self):
+        handler = RingBufferLogHandler(self.output, dump_only=True)
+        handler(log.DEBUG, None, "category", "file.py", 1, "old")
+        handler._history[0] = (time.time() - 60, ) + handler._history[0][1:]
+        handler(log.DEBUG, None, "category", "file.py", 2, "new")
+
+        records = handler.getHistory(10)
+        self.failUnlessEqual([record[-1] for record in records], ["new"])
+        self.failUnlessEqual(len(handler.getHistory()), 2)
+
+    def testThreadTags(self):
+        handler = RingBufferLogHandler(self.output)
+
+        def logFromThread():
+            setThreadTag("worker")
+            handler(log.DEBUG, None, "category", "file.py", 1, "message")
+            setThreadTag(None)
+
+        thread = threading.Thread(target=logFromThread)
+        thread.start()
+        thread.join()
+        handler.flush()
+
+        self.failUnless("[worker" in self.output.getvalue())
+        self.failUnlessEqual(getThreadTag(1), "0x1")
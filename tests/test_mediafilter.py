@@ -0,0 +1,112 @@
+# PiTiVi , Non-linear video editor
+#
+#       tests/test_mediafilter.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from pitivi.mediafilter import MediaFilter, sniff_mime_type
+
+
+class TestSniff(TestCase):
+    def testContainers(self):
+        self.failUnlessEqual(sniff_mime_type("OggS\0\2"), "application/ogg")
+        self.failUnlessEqual(sniff_mime_type("\0\0\0\x18ftypmp42"),
+                "video/quicktime")
+        self.failUnlessEqual(sniff_mime_type("RIFF\0\0\0\0AVI LIST"),
+                "video/x-msvideo")
+        self.failUnlessEqual(sniff_mime_type("RIFF\0\0\0\0WAVEfmt "),
+                "audio/x-wav")
+        self.failUnlessEqual(sniff_mime_type("FORM\0\0\0\0AIFFCOMM"),
+                "audio/x-aiff")
+        self.failUnlessEqual(sniff_mime_type("\x1a\x45\xdf\xa3\x01"),
+                "video/x-matroska")
+
+    def testMpeg(self):
+        self.failUnlessEqual(sniff_mime_type("ID3\3\0"), "audio/mpeg")
+        self.failUnlessEqual(sniff_mime_type("\xff\xfb\x90\x00"),
+                "audio/mpeg")
+        packet = "\x47" + "\0" * 187
+        self.failUnlessEqual(sniff_mime_type(packet * 3), "video/mpegts")
+        self.failUnlessEqual(sniff_mime_type(packet), None)
+
+    def testImages(self):
+        self.failUnlessEqual(sniff_mime_type("\x89PNG\r\n\x1a\n"),
+                "image/png")
+        self.failUnlessEqual(sniff_mime_type("\xff\xd8\xff\xe0"),
+                "image/jpeg")
+
+    def testUnknown(self):
+        self.failUnlessEqual(sniff_mime_type(""), None)
+        self.failUnlessEqual(sniff_mime_type("<?xml version"), None)
+        self.failUnlessEqual(sniff_mime_type("RIFF\0\0\0\0CDXA"), None)
+
+
+class TestMediaFilter(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, name, data=""):
+        filename = os.path.join(self.directory, name)
+        f = open(filename, "wb")
+        f.write(data)
+        f.close()
+        return filename
+
+    def testExtensions(self):
+        media_filter = MediaFilter()
+        # not even opened
+        self.failUnless(media_filter.accepts("/nonexistent/clip.MOV"))
+        self.failUnless(media_filter.accepts("/nonexistent/song.ogg"))
+        self.failIf(media_filter.accepts("/nonexistent/project.xptv"))
+        self.failIf(media_filter.accepts("/nonexistent/clip.THM"))
+        self.failIf(media_filter.accepts("/nonexistent/.clip.mov"))
+
+    def testNoExtension(self):
+        media_filter = MediaFilter()
+        self.failUnless(media_filter.accepts(self._write("video",
+                "OggS\0\2" + "\0" * 100)))
+        self.failIf(media_filter.accepts(self._write("README",
+                "some text")))
+        self.failIf(media_filter.accepts("/nonexistent/file"))
+
+    def testUnknownExtension(self):
+        media_filter = MediaFilter()
+        # the dots of a date aren't an extension
+        self.failUnless(media_filter.accepts(self._write(
+                "Interview 2010.03.05", "\x1a\x45\xdf\xa3" + "\0" * 100)))
+        self.failIf(media_filter.accepts(self._write("notes 2010.03.05",
+                "some text")))
+        # ignored extensions aren't opened, camera thumbnails are JPEG
+        self.failIf(media_filter.accepts(self._write("clip.thm",
+                "\xff\xd8\xff\xe0")))
+
+    def testConfigured(self):
+        media_filter = MediaFilter(extensions=[".THM", "mov"],
+                mime_types=["audio/"], ignored_extensions=["mp3"])
+        self.failUnless(media_filter.accepts("/nonexistent/clip.thm"))
+        self.failIf(media_filter.accepts("/nonexistent/song.ogg"))
+        self.failUnless(media_filter.accepts(self._write("song", "ID3\3")))
+        self.failIf(media_filter.accepts(self._write("picture",
+                "\x89PNG\r\n\x1a\n")))
+        self.failIf(media_filter.accepts(self._write("song.mp3", "ID3\3")))
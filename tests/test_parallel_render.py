@@ -0,0 +1,317 @@
+# PiTiVi , Non-linear video editor
+#
+#       tests/test_parallel_render.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+from unittest import TestCase
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+import gobject
+import gst
+
+from pitivi import parallelrender
+from pitivi.parallelrender import align_time, plan_ranges, \
+        shift_granulepos, granulepos_to_time, guess_granule_base, \
+        guess_timestamp_base, ParallelRenderer
+from pitivi.render import ProjectRenderer, path_to_uri
+from pitivi.effects import EffectsHandler
+from pitivi.projectmanager import ProjectManager
+from pitivi.settings import ExportSettings
+
+
+class TestPlanRanges(TestCase):
+    def testAlignTime(self):
+        ntsc = gst.Fraction(30000, 1001)
+        self.failUnlessEqual(align_time(gst.SECOND + 1, None),
+                gst.SECOND + 1)
+        self.failUnlessEqual(align_time(50 * gst.MSECOND,
+                gst.Fraction(25, 1)), 40 * gst.MSECOND)
+        self.failUnlessEqual(align_time(50 * gst.MSECOND,
+                gst.Fraction(25, 1), up=True), 80 * gst.MSECOND)
+        self.failUnlessEqual(align_time(40 * gst.MSECOND,
+                gst.Fraction(25, 1), up=True), 40 * gst.MSECOND)
+        frame = align_time(gst.SECOND, ntsc)
+        self.failUnlessEqual(align_time(frame, ntsc), frame)
+        self.failUnlessEqual(align_time(frame, ntsc, up=True), frame)
+
+    def testEvenSplit(self):
+        self.failUnlessEqual(plan_ranges(30 * gst.SECOND, 3),
+                [(0, 10 * gst.SECOND), (10 * gst.SECOND, 20 * gst.SECOND),
+                (20 * gst.SECOND, 30 * gst.SECOND)])
+        self.failUnlessEqual(plan_ranges(30 * gst.SECOND, 1),
+                [(0, 30 * gst.SECOND)])
+
+    def testFrameAligned(self):
+        framerate = gst.Fraction(30000, 1001)
+        ranges = plan_ranges(10 * gst.SECOND, 3, framerate=framerate)
+        self.failUnlessEqual(len(ranges), 3)
+        for start, end in ranges:
+            self.failUnlessEqual(align_time(start, framerate), start)
+
+    def testCutPoints(self):
+        cut_points = [0, 7 * gst.SECOND, 11 * gst.SECOND, 26 * gst.SECOND,
+                30 * gst.SECOND]
+        # 11s is closer to 10s than 7s, 26s is out of reach of 20s
+        self.failUnlessEqual(plan_ranges(30 * gst.SECOND, 3, cut_points),
+                [(0, 11 * gst.SECOND), (11 * gst.SECOND, 20 * gst.SECOND),
+                (20 * gst.SECOND, 30 * gst.SECOND)])
+
+    def testCutPointsNotOnFrames(self):
+        framerate = gst.Fraction(25, 1)
+        cut_points = [9 * gst.SECOND + 1]
+        self.failUnlessEqual(plan_ranges(20 * gst.SECOND, 2, cut_points,
+                framerate=framerate),
+                [(0, 10 * gst.SECOND), (10 * gst.SECOND, 20 * gst.SECOND)])
+
+    def testBusy(self):
+        busy = [(9 * gst.SECOND, 11 * gst.SECOND)]
+        self.failUnlessEqual(plan_ranges(20 * gst.SECOND, 2, busy=busy),
+                [(0, 11 * gst.SECOND), (11 * gst.SECOND, 20 * gst.SECOND)])
+
+        # cut points in transitions are ignored
+        cut_points = [10 * gst.SECOND, 12 * gst.SECOND]
+        self.failUnlessEqual(plan_ranges(20 * gst.SECOND, 2, cut_points,
+                busy), [(0, 12 * gst.SECOND), (12 * gst.SECOND,
+                20 * gst.SECOND)])
+
+        # back to back transitions
+        busy = [(9 * gst.SECOND, 11 * gst.SECOND),
+                (11 * gst.SECOND, 13 * gst.SECOND)]
+        self.failUnlessEqual(plan_ranges(20 * gst.SECOND, 2, busy=busy),
+                [(0, 11 * gst.SECOND), (11 * gst.SECOND, 20 * gst.SECOND)])
+
+    def testBusyUntilEnd(self):
+        busy = [(5 * gst.SECOND, 20 * gst.SECOND)]
+        self.failUnlessEqual(plan_ranges(20 * gst.SECOND, 2, busy=busy),
+                [(0, 20 * gst.SECOND)])
+
+    def testShiftVorbisGranulepos(self):
+        caps = gst.Caps("audio/x-vorbis, rate=44100, channels=2")
+        self.failUnlessEqual(shift_granulepos(caps, 1024, gst.SECOND),
+                44100 + 1024)
+        self.failUnlessEqual(shift_granulepos(caps, 1024, 0), 1024)
+        # copied from 1s of a file to 3s
+        self.failUnlessEqual(shift_granulepos(caps, 44100 + 1024,
+                3 * gst.SECOND, gst.SECOND), 3 * 44100 + 1024)
+        self.failUnlessEqual(shift_granulepos(caps, gst.BUFFER_OFFSET_NONE,
+                gst.SECOND), gst.BUFFER_OFFSET_NONE)
+        caps = gst.Caps("audio/mpeg, rate=44100, channels=2")
+        self.failUnlessEqual(shift_granulepos(caps, 1024, gst.SECOND), 1024)
+
+    def testGranuleposToTime(self):
+        caps = gst.Caps("audio/x-vorbis, rate=44100, channels=2")
+        self.failUnlessEqual(granulepos_to_time(caps, 44100), gst.SECOND)
+        # a keyframe granule shift of 6
+        header = "\x80theora" + "\x00" * 34 + "\xc0"
+        caps = gst.Caps("video/x-theora, framerate=25/1, "
+                "streamheader=(buffer)<%s>" % header.encode("hex"))
+        self.failUnlessEqual(granulepos_to_time(caps, (20 << 6) + 5),
+                gst.SECOND)
+        self.failUnlessEqual(granulepos_to_time(caps,
+                gst.BUFFER_OFFSET_NONE), None)
+        caps = gst.Caps("audio/mpeg, rate=44100, channels=2")
+        self.failUnlessEqual(granulepos_to_time(caps, 1024), None)
+
+    def testGuessTimestampBase(self):
+        start = 10 * gst.SECOND
+        # the audio of a piece written from its start comes first
+        self.failUnlessEqual(guess_timestamp_base(start, start), start)
+        # or a late video frame
+        self.failUnlessEqual(guess_timestamp_base(start + 40 * gst.MSECOND,
+                start), start)
+        # the piece is written from 0
+        self.failUnlessEqual(guess_timestamp_base(40 * gst.MSECOND, start), 0)
+        self.failUnlessEqual(guess_timestamp_base(0, 0), 0)
+
+    def testGuessGranuleBase(self):
+        caps = gst.Caps("audio/x-vorbis, rate=44100, channels=2")
+        # the piece starts at 10s and counts its granules from 0
+        self.failUnlessEqual(guess_granule_base(caps, 1024,
+                10 * gst.SECOND), 0)
+        # or from its first timestamp
+        self.failUnlessEqual(guess_granule_base(caps, 10 * 44100 + 1024,
+                10 * gst.SECOND), 10 * gst.SECOND)
+        self.failUnlessEqual(guess_granule_base(caps, 1024, 0), 0)
+
+
+def count_frames(uri):
+    """
+    Decode C{uri} and return the number of video frames and the end of the
+    last video and audio buffers.
+    """
+    result = {"frames": 0, "video": 0, "audio": 0}
+    pipeline = gst.Pipeline()
+    source = gst.element_make_from_uri(gst.URI_SRC, uri)
+    dbin = gst.element_factory_make("decodebin2")
+    pipeline.add(source, dbin)
+    source.link(dbin)
+
+    def handoff(sink, buf, pad, kind):
+        if kind == "video":
+            result["frames"] += 1
+        result[kind] = max(result[kind], buf.timestamp + buf.duration)
+
+    def new_decoded_pad(dbin, pad, is_last):
+        kind = pad.get_caps()[0].get_name().split("/")[0]
+        sink = gst.element_factory_make("fakesink")
+        sink.props.sync = False
+        sink.props.signal_handoffs = True
+        sink.connect("handoff", handoff, kind)
+        pipeline.add(sink)
+        sink.sync_state_with_parent()
+        pad.link(sink.get_pad("sink"))
+
+    dbin.connect("new-decoded-pad", new_decoded_pad)
+    pipeline.set_state(gst.STATE_PLAYING)
+    message = pipeline.get_bus().timed_pop_filtered(60 * gst.SECOND,
+            gst.MESSAGE_EOS | gst.MESSAGE_ERROR)
+    pipeline.set_state(gst.STATE_NULL)
+    if message is None or message.type != gst.MESSAGE_EOS:
+        raise Exception("couldn't decode %s" % uri)
+    return result
+
+
+def get_granule_positions(uri):
+    """
+    Demux the ogg file C{uri} and return the granule positions of its
+    streams, by caps name.
+    """
+    result = {}
+    pipeline = gst.Pipeline()
+    source = gst.element_make_from_uri(gst.URI_SRC, uri)
+    demuxer = gst.element_factory_make("oggdemux")
+    pipeline.add(source, demuxer)
+    source.link(demuxer)
+
+    def handoff(sink, buf, pad, name):
+        if buf.offset_end != gst.BUFFER_OFFSET_NONE:
+            result.setdefault(name, []).append(buf.offset_end)
+
+    def pad_added(demuxer, pad):
+        name = pad.get_caps()[0].get_name()
+        sink = gst.element_factory_make("fakesink")
+        sink.props.sync = False
+        sink.props.signal_handoffs = True
+        sink.connect("handoff", handoff, name)
+        pipeline.add(sink)
+        sink.sync_state_with_parent()
+        pad.link(sink.get_pad("sink"))
+
+    demuxer.connect("pad-added", pad_added)
+    pipeline.set_state(gst.STATE_PLAYING)
+    message = pipeline.get_bus().timed_pop_filtered(60 * gst.SECOND,
+            gst.MESSAGE_EOS | gst.MESSAGE_ERROR)
+    pipeline.set_state(gst.STATE_NULL)
+    if message is None or message.type != gst.MESSAGE_EOS:
+        raise Exception("couldn't demux %s" % uri)
+    return result
+
+
+class TestParallelRenderVerification(TestCase):
+    """
+    Renders the same project serially and in parallel and compares the
+    results. Needs theora, vorbis and ogg, run with TEST_INTEGRATION=1.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.min_range_duration = parallelrender.MIN_RANGE_DURATION
+        parallelrender.MIN_RANGE_DURATION = gst.SECOND
+        self.mainloop = gobject.MainLoop()
+
+    def tearDown(self):
+        parallelrender.MIN_RANGE_DURATION = self.min_range_duration
+        shutil.rmtree(self.directory)
+
+    def _makeMedia(self):
+        filename = os.path.join(self.directory, "media.ogg")
+        pipeline = gst.parse_launch("videotestsrc num-buffers=100 ! "
+                "video/x-raw-yuv, width=320, height=240, framerate=25/1 ! "
+                "theoraenc ! oggmux name=mux ! filesink location=%s "
+                "audiotestsrc num-buffers=173 samplesperbuffer=1024 ! "
+                "audio/x-raw-int, rate=44100 ! audioconvert ! vorbisenc ! "
+                "mux." % filename)
+        pipeline.set_state(gst.STATE_PLAYING)
+        pipeline.get_bus().timed_pop_filtered(60 * gst.SECOND,
+                gst.MESSAGE_EOS | gst.MESSAGE_ERROR)
+        pipeline.set_state(gst.STATE_NULL)
+        return path_to_uri(filename)
+
+    def _makeProject(self):
+        uri = self._makeMedia()
+        manager = ProjectManager(EffectsHandler())
+        manager.newBlankProject()
+        project = manager.current
+        project.sources.connect("ready", lambda sources: self.mainloop.quit())
+        project.sources.addUri(uri)
+        self.mainloop.run()
+
+        factory = project.sources.getUri(uri)
+        first = project.timeline.addSourceFactory(factory)
+        second = project.timeline.addSourceFactory(factory)
+        second.start = first.duration
+
+        settings = ExportSettings()
+        settings.videowidth = 320
+        settings.videoheight = 240
+        project.setSettings(settings)
+
+        project_uri = path_to_uri(os.path.join(self.directory,
+                "project.xptv"))
+        manager.saveProject(project, project_uri, overwrite=True)
+        manager.closeRunningProject()
+        return project_uri
+
+    def testSameAsSerial(self):
+        project_uri = self._makeProject()
+        serial = path_to_uri(os.path.join(self.directory, "serial.ogg"))
+        parallel = path_to_uri(os.path.join(self.directory, "parallel.ogg"))
+
+        renderer = ProjectRenderer(project_uri, serial, out=StringIO())
+        self.failUnless(renderer.run(), renderer.error)
+
+        out = StringIO()
+        renderer = ParallelRenderer(project_uri, parallel, out=out, jobs=3)
+        self.failUnless(renderer.run(), renderer.error)
+        events = [json.loads(line) for line in out.getvalue().splitlines()]
+        started = [event for event in events if event["event"] == "started"]
+        self.failUnless(len(started[0]["ranges"]) > 1)
+
+        expected = count_frames(serial)
+        result = count_frames(parallel)
+        self.failUnlessEqual(result["frames"], expected["frames"])
+        frame = gst.SECOND / 25
+        self.failUnless(abs(result["video"] - expected["video"]) < frame)
+        self.failUnless(abs(result["audio"] - expected["audio"]) < frame)
+
+        # the granule positions of the pieces follow each other
+        granules = get_granule_positions(parallel)
+        self.failUnless(granules)
+        for name, positions in granules.iteritems():
+            self.failUnlessEqual(positions, sorted(positions), name)
+
+
+if not os.getenv("TEST_INTEGRATION"):
+    del TestParallelRenderVerification
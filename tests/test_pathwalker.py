@@ -0,0 +1,94 @@
+# PiTiVi , Non-linear video editor
+#
+#       tests/test_pathwalker.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import gobject
+
+from pitivi.threads import CancellationToken
+from pitivi.ui.pathwalker import PathWalker
+
+
+class TestPathWalker(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.batches = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _touch(self, *path):
+        filename = os.path.join(self.directory, *path)
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        open(filename, "w").close()
+
+    def _walk(self, walker, token=None):
+        if token is None:
+            token = CancellationToken()
+        walker(token)
+        # deliver the batches
+        context = gobject.main_context_default()
+        while context.pending():
+            context.iteration(False)
+
+    def testFilterAndBatches(self):
+        for i in range(5):
+            self._touch("clip%d.ogv" % i)
+            self._touch("clip%d.thm" % i)
+        self._touch(".hidden", "clip.ogv")
+
+        walker = PathWalker([self.directory], self.batches.append,
+                batch_size=2)
+        self._walk(walker)
+
+        self.failUnlessEqual([len(batch) for batch in self.batches],
+                [2, 2, 1])
+        uris = sum(self.batches, [])
+        self.failUnlessEqual(sorted(uris), ["file://%s/clip%d.ogv" %
+                (self.directory, i) for i in range(5)])
+        self.failUnlessEqual(walker.skipped, 5)
+
+    def testDuplicateFolders(self):
+        self._touch("clip.ogv")
+        walker = PathWalker([self.directory, "file://" + self.directory],
+                self.batches.append)
+        self._walk(walker)
+        self.failUnlessEqual(len(sum(self.batches, [])), 1)
+
+    def testBackpressure(self):
+        self._touch("clip.ogv")
+        token = CancellationToken()
+        calls = []
+
+        def pending():
+            # the discoverer never catches up, until the walk is cancelled
+            calls.append(None)
+            if len(calls) == 3:
+                token.cancel()
+            return 1000
+
+        walker = PathWalker([self.directory], self.batches.append,
+                pending=pending)
+        self._walk(walker, token)
+        self.failUnlessEqual(len(calls), 3)
+        self.failUnlessEqual(self.batches, [])
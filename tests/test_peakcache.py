@@ -0,0 +1,99 @@
+# PiTiVi , Non-linear video editor
+#
+#       tests/test_peakcache.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+import os
+import array
+import shutil
+import tempfile
+from unittest import TestCase
+
+import gst
+
+from pitivi.peakcache import Peaks, PeakCache
+
+
+class TestPeaks(TestCase):
+    def testColumns(self):
+        # two channels, the second one twice as loud
+        values = array.array("f")
+        for i in range(10):
+            values.extend([i / 10.0, i / 5.0])
+        peaks = Peaks(2, gst.SECOND, values)
+        self.failUnlessEqual(len(peaks), 10)
+
+        left, right = peaks.getColumns(0, 10 * gst.SECOND, 5)
+        self.failUnlessEqual(len(left), 5)
+        # highest of each pair of peaks
+        self.failUnlessAlmostEqual(left[0], 0.1, 5)
+        self.failUnlessAlmostEqual(left[4], 0.9, 5)
+        self.failUnlessAlmostEqual(right[4], 1.8, 5)
+
+    def testMoreColumnsThanPeaks(self):
+        values = array.array("f", [0.5, 1.0])
+        peaks = Peaks(1, gst.SECOND, values)
+        columns = peaks.getColumns(0, 2 * gst.SECOND, 4)[0]
+        self.failUnlessEqual(columns, [0.5, 0.5, 1.0, 1.0])
+
+    def testPastTheEnd(self):
+        peaks = Peaks(1, gst.SECOND, array.array("f", [1.0]))
+        columns = peaks.getColumns(0, 30 * gst.SECOND, 3)[0]
+        self.failUnlessEqual(columns, [1.0, 0.0, 0.0])
+
+
+class TestPeakCache(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = PeakCache(os.path.join(self.directory, "peaks"))
+        self.media = os.path.join(self.directory, "media.ogg")
+        self._writeMedia("some data")
+        self.uri = "file://" + self.media
+        self.peaks = Peaks(2, gst.SECOND,
+                array.array("f", [0.25, 0.5, 0.75, 1.0]))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _writeMedia(self, data):
+        f = open(self.media, "w")
+        f.write(data)
+        f.close()
+
+    def testStoreLookup(self):
+        self.failUnlessEqual(self.cache.lookup(self.uri, "src0"), None)
+        self.failIf(self.cache.has(self.uri, "src0"))
+
+        self.cache.store(self.uri, "src0", self.peaks)
+        self.failUnless(self.cache.has(self.uri, "src0"))
+        self.failIf(self.cache.has(self.uri, "src1"))
+
+        peaks = self.cache.lookup(self.uri, "src0")
+        self.failUnlessEqual(peaks.channels, 2)
+        self.failUnlessEqual(peaks.interval, gst.SECOND)
+        self.failUnlessEqual(peaks.values, self.peaks.values)
+
+    def testFileChanged(self):
+        self.cache.store(self.uri, "src0", self.peaks)
+        self._writeMedia("some other data")
+        self.failIf(self.cache.has(self.uri, "src0"))
+        self.failUnlessEqual(self.cache.lookup(self.uri, "src0"), None)
+
+    def testNotAFile(self):
+        self.cache.store("http://example.com/a.ogg", "src0", self.peaks)
+        self.failUnlessEqual(self.cache.lookup("http://example.com/a.ogg",
+                "src0"), None)
@@ -314,6 +314,76 @@ class TestPipeline(TestCase):
         self.assertEquals(factory.current_bins, 0)
 
 
+class ClockPipeline(Pipeline):
+    running_time = None
+    queries = 0
+
+    def _getRunningTime(self):
+        return self.running_time
+
+    def getPosition(self, format=gst.FORMAT_TIME):
+        self.queries += 1
+        return self._last_position
+
+class TestClockPosition(TestCase):
+
+    def setUp(self):
+        TestCase.setUp(self)
+        self.pipeline = ClockPipeline()
+
+    def tearDown(self):
+        self.pipeline.release()
+        del self.pipeline
+        TestCase.tearDown(self)
+
+    def testUnknown(self):
+        self.failUnlessEqual(self.pipeline.getClockPosition(),
+                gst.CLOCK_TIME_NONE)
+
+    def testPlaying(self):
+        self.pipeline.running_time = 10 * gst.SECOND
+        self.pipeline._anchorPosition(3 * gst.SECOND)
+        self.failUnlessEqual(self.pipeline.getClockPosition(), 3 * gst.SECOND)
+
+        # follows the clock between position queries
+        self.pipeline.running_time = 10 * gst.SECOND + 40 * gst.MSECOND
+        self.failUnlessEqual(self.pipeline.getClockPosition(),
+                3 * gst.SECOND + 40 * gst.MSECOND)
+
+    def testNoClock(self):
+        self.pipeline._anchorPosition(3 * gst.SECOND)
+        self.pipeline.running_time = 20 * gst.SECOND
+        self.failUnlessEqual(self.pipeline.getClockPosition(), 3 * gst.SECOND)
+
+    def testClamp(self):
+        self.pipeline._duration = 5 * gst.SECOND
+        self.pipeline.running_time = 10 * gst.SECOND
+        self.pipeline._anchorPosition(3 * gst.SECOND)
+        self.pipeline.running_time = 13 * gst.SECOND
+        self.failUnlessEqual(self.pipeline.getClockPosition(), 5 * gst.SECOND)
+
+        # the stop of the segment comes first
+        self.pipeline._segment_stop = 4 * gst.SECOND
+        self.failUnlessEqual(self.pipeline.getClockPosition(), 4 * gst.SECOND)
+
+    def testClockListener(self):
+        positions = []
+        self.pipeline.connect("position",
+                lambda pipeline, position: positions.append(position))
+        self.pipeline.activatePositionListener(clock=True)
+
+        # queried until there is an anchor
+        self.pipeline.running_time = 10 * gst.SECOND
+        self.pipeline._last_position = 3 * gst.SECOND
+        self.pipeline._positionListenerCb()
+        self.failUnlessEqual(self.pipeline.queries, 1)
+
+        self.pipeline._anchorPosition(3 * gst.SECOND)
+        self.pipeline.running_time = 11 * gst.SECOND
+        self.pipeline._positionListenerCb()
+        self.failUnlessEqual(self.pipeline.queries, 1)
+        self.failUnlessEqual(positions, [4 * gst.SECOND])
+
 if __name__ == "__main__":
     main()
 
@@ -0,0 +1,171 @@
+# PiTiVi , Non-linear video editor
+#
+#       tests/test_proxy.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+import os
+from unittest import TestCase
+
+import gst
+
+from common import CacheDirTestCase, make_file_factory, stub_job_queue
+from pitivi.stream import VideoStream, AudioStream
+from pitivi.proxy import ProxyMaker, get_proxy_filename, get_proxy_caps, \
+        needs_proxy
+
+StubProxyMaker = stub_job_queue(ProxyMaker)
+
+
+def make_factory(uri, width=1920, height=1080, is_image=False):
+    return make_file_factory(uri, width, height, is_image=is_image)
+
+
+class TestProxyFunctions(TestCase):
+    def testCaps(self):
+        stream = make_factory("file:///a.mov").getProxyStream()
+        structure = get_proxy_caps(stream)[0]
+        self.failUnlessEqual((structure["width"], structure["height"]),
+                (960, 540))
+
+        # anamorphic sources keep their pixel aspect ratio
+        stream = VideoStream(gst.Caps("video/x-raw-yuv, width=1440, "
+                "height=1080, pixel-aspect-ratio=4/3"))
+        structure = get_proxy_caps(stream)[0]
+        self.failUnlessEqual((structure["width"], structure["height"]),
+                (720, 540))
+        self.failUnlessEqual(structure["pixel-aspect-ratio"],
+                gst.Fraction(4, 3))
+
+        # small sources aren't scaled up
+        stream = VideoStream(gst.Caps("video/x-raw-yuv, width=321, "
+                "height=240, pixel-aspect-ratio=1/1"))
+        structure = get_proxy_caps(stream)[0]
+        self.failUnlessEqual((structure["width"], structure["height"]),
+                (322, 240))
+
+    def testNeedsProxy(self):
+        self.failUnless(needs_proxy(make_factory("file:///a.mov")))
+        self.failIf(needs_proxy(make_factory("file:///a.ogg", 640, 480)))
+        self.failIf(needs_proxy(make_factory("file:///a.png",
+                is_image=True)))
+
+
+class TestDecodeArguments(TestCase):
+    def setUp(self):
+        self.factory = make_factory("file:///a.mov")
+        self.video = self.factory.getOutputStreams(VideoStream)[0]
+        self.audio = self.factory.getOutputStreams(AudioStream)[0]
+
+    def testWithoutProxy(self):
+        self.failUnlessEqual(self.factory.getDecodeArguments(self.video),
+                ("file:///a.mov", self.video.caps, self.video))
+
+    def testProxy(self):
+        self.factory.proxy_uri = "file:///proxy.mkv"
+        uri, caps, stream = self.factory.getDecodeArguments(self.video)
+        self.failUnlessEqual(uri, "file:///proxy.mkv")
+        self.failUnlessEqual(stream, None)
+
+        # the proxy has no audio
+        self.failUnlessEqual(self.factory.getDecodeArguments(self.audio),
+                ("file:///a.mov", self.audio.caps, self.audio))
+
+        # the originals are used while rendering
+        self.factory.use_proxy = False
+        self.failUnlessEqual(self.factory.getDecodeArguments(self.video),
+                ("file:///a.mov", self.video.caps, self.video))
+
+
+class TestProxyMaker(CacheDirTestCase):
+    def setUp(self):
+        CacheDirTestCase.setUp(self)
+        self.maker = StubProxyMaker()
+        self.done = []
+        self.ready = 0
+        self.maker.connect("proxy-done", self._proxyDoneCb)
+        self.maker.connect("ready", self._readyCb)
+
+    def _proxyDoneCb(self, maker, factory):
+        self.done.append(factory)
+
+    def _readyCb(self, maker):
+        self.ready += 1
+
+    def _finishCurrent(self):
+        factory = self.maker._current[0]
+        open(self.maker._getPartFilename(), "w").close()
+        self.maker._finish(True)
+        return factory
+
+    def testFilename(self):
+        filename = get_proxy_filename("file:///a.mov")
+        self.failUnless(filename.startswith(self.directory))
+        self.failIfEqual(filename, get_proxy_filename("file:///b.mov"))
+
+    def testFilenameChangesWithSource(self):
+        source = os.path.join(self.directory, "a.mov")
+        open(source, "w").write("a")
+        uri = "file://" + source
+        filename = get_proxy_filename(uri)
+        self.failUnlessEqual(filename, get_proxy_filename(uri))
+
+        # the file is replaced at the same location
+        open(source, "w").write("ab")
+        self.failIfEqual(filename, get_proxy_filename(uri))
+
+    def testSkipped(self):
+        self.failIf(self.maker.add(make_factory("file:///a.ogg", 640, 480)))
+        self.failUnlessEqual(self.maker.queue, [])
+
+    def testCached(self):
+        factory = make_factory("file:///a.mov")
+        open(get_proxy_filename(factory.uri), "w").close()
+        self.failUnless(self.maker.add(factory))
+        self.failUnlessEqual(self.done, [factory])
+        self.failUnlessEqual(factory.proxy_uri,
+                "file://" + get_proxy_filename(factory.uri))
+
+    def testQueue(self):
+        factories = [make_factory("file:///%d.mov" % i) for i in range(2)]
+        for factory in factories:
+            self.failUnless(self.maker.add(factory))
+        # nothing is made until enabled
+        self.failUnlessEqual(self.maker.started, [])
+
+        self.maker.setEnabled(True)
+        self.failUnlessEqual(self.maker.started, factories[:1])
+        self.failUnlessEqual(self._finishCurrent(), factories[0])
+        self.failUnless(os.path.exists(get_proxy_filename(factories[0].uri)))
+        self.failUnlessEqual(self.maker.started, factories)
+        self.failUnlessEqual(self.ready, 0)
+
+        self._finishCurrent()
+        self.failUnlessEqual(self.done, factories)
+        self.failUnlessEqual(self.ready, 1)
+
+    def testRemoveCurrent(self):
+        factory = make_factory("file:///a.mov")
+        self.maker.setEnabled(True)
+        self.maker.add(factory)
+        filename = self.maker._current[1]
+        open(filename + ".part", "w").close()
+
+        self.maker.remove(factory)
+        self.failUnlessEqual(self.maker._current, None)
+        self.failIf(os.path.exists(filename + ".part"))
+        self.failIf(os.path.exists(filename))
+        self.failUnlessEqual(self.done, [])
@@ -0,0 +1,141 @@
+# PiTiVi , Non-linear video editor
+#
+#       tests/test_render.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+from unittest import TestCase
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+import gst
+
+from pitivi.render import parse_fraction, parse_property, apply_overrides, \
+        settings_to_arguments, check_elements, get_stream_types, \
+        format_event, make_option_parser, path_to_uri
+from pitivi.settings import ExportSettings
+from pitivi.stream import AudioStream, VideoStream
+
+
+class StubTrack(object):
+    def __init__(self, stream, duration):
+        self.stream = stream
+        self.duration = duration
+
+
+class StubTimeline(object):
+    def __init__(self, *tracks):
+        self.tracks = list(tracks)
+
+
+class TestRender(TestCase):
+    def _parse(self, *args):
+        options, args = make_option_parser().parse_args(
+                list(args) + ["project.xptv", "out.ogg"])
+        return options
+
+    def testParseFraction(self):
+        self.failUnlessEqual(parse_fraction("25"), gst.Fraction(25, 1))
+        self.failUnlessEqual(parse_fraction("30000/1001"),
+                gst.Fraction(30000, 1001))
+        self.failUnlessRaises(ValueError, parse_fraction, "0")
+        self.failUnlessRaises(ValueError, parse_fraction, "25/a")
+
+    def testParseProperty(self):
+        self.failUnlessEqual(parse_property("bitrate=2000"),
+                ("bitrate", 2000))
+        self.failUnlessEqual(parse_property("quality=0.5"), ("quality", 0.5))
+        self.failUnlessEqual(parse_property("sharpness=True"),
+                ("sharpness", True))
+        self.failUnlessEqual(parse_property("name=a=b"), ("name", "a=b"))
+        self.failUnlessRaises(ValueError, parse_property, "bitrate")
+
+    def testNoOverrides(self):
+        settings = ExportSettings()
+        settings.vcodecsettings = {"quality": 48}
+        overridden = apply_overrides(settings, self._parse())
+        self.failIf(overridden is settings)
+        self.failUnlessEqual(str(overridden), str(settings))
+
+    def testOverrides(self):
+        settings = ExportSettings()
+        settings.vcodecsettings = {"quality": 48}
+        settings.acodecsettings = {"quality": 0.3}
+        options = self._parse("--width", "1280", "--height", "720",
+                "--framerate", "30000/1001", "--samplerate", "48000",
+                "--vencoder", "x264enc", "--vencoder-property",
+                "bitrate=4000", "--aencoder-property", "quality=0.5",
+                "--no-audio")
+        overridden = apply_overrides(settings, options)
+
+        self.failUnlessEqual((overridden.videowidth, overridden.videoheight),
+                (1280, 720))
+        self.failUnlessEqual(overridden.videorate, gst.Fraction(30000, 1001))
+        self.failUnlessEqual(overridden.videopar, settings.videopar)
+        self.failUnlessEqual(overridden.audiorate, 48000)
+        # the settings of another encoder don't apply
+        self.failUnlessEqual(overridden.vencoder, "x264enc")
+        self.failUnlessEqual(overridden.vcodecsettings, {"bitrate": 4000})
+        self.failUnlessEqual(overridden.aencoder, None)
+        self.failUnlessEqual(overridden.acodecsettings, {"quality": 0.5})
+        self.failUnlessEqual(overridden.muxer, settings.muxer)
+        # the project settings are left alone
+        self.failUnlessEqual(settings.videowidth, 720)
+        self.failUnlessEqual(settings.vcodecsettings, {"quality": 48})
+
+    def testSettingsToArguments(self):
+        settings = ExportSettings()
+        settings.videorate = gst.Fraction(30000, 1001)
+        settings.aencoder = None
+        settings.vcodecsettings = {"bitrate": 4000, "sharpness": True}
+        settings.containersettings = {"max-delay": 0.5}
+        options, args = make_option_parser().parse_args(
+                settings_to_arguments(settings) + ["project.xptv", "out.ogg"])
+        self.failUnlessEqual(str(apply_overrides(ExportSettings(), options)),
+                str(settings))
+
+    def testCheckElements(self):
+        settings = ExportSettings()
+        settings.muxer = "identity"
+        settings.vencoder = "nonexistingencoder"
+        settings.aencoder = None
+        self.failUnlessEqual(check_elements(settings), ["nonexistingencoder"])
+
+    def testStreamTypes(self):
+        video = VideoStream(gst.Caps("video/x-raw-yuv"))
+        audio = AudioStream(gst.Caps("audio/x-raw-int"))
+        self.failUnlessEqual(get_stream_types(StubTimeline()), (False, False))
+        self.failUnlessEqual(get_stream_types(StubTimeline(
+                StubTrack(video, gst.SECOND), StubTrack(audio, 0))),
+                (True, False))
+        self.failUnlessEqual(get_stream_types(StubTimeline(
+                StubTrack(video, gst.SECOND), StubTrack(audio, gst.SECOND))),
+                (True, True))
+
+    def testFormatEvent(self):
+        line = format_event("progress", position=gst.SECOND,
+                duration=2 * gst.SECOND, fraction=0.5)
+        self.failIf("\n" in line)
+        self.failUnlessEqual(json.loads(line), {"event": "progress",
+                "position": gst.SECOND, "duration": 2 * gst.SECOND,
+                "fraction": 0.5})
+
+    def testPathToUri(self):
+        self.failUnlessEqual(path_to_uri("file:///a/b.ogg"), "file:///a/b.ogg")
+        self.failUnlessEqual(path_to_uri("/a/b c.ogg"), "file:///a/b%20c.ogg")
@@ -0,0 +1,202 @@
+# PiTiVi , Non-linear video editor
+#
+#       tests/test_rendercache.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import gst
+
+from pitivi.stream import VideoStream
+from pitivi.settings import ExportSettings
+from pitivi.timeline.track import Track, SourceTrackObject, TrackEffect
+from pitivi.rendercache import get_heavy_regions, get_region_key, \
+        get_cache_settings, find_cache_file, get_cache_directory, \
+        trim_cache, touch_cache_file, CachedRegion
+from common import StubFactory, FakeEffectFactory
+
+
+class TestHeavyRegions(TestCase):
+    def setUp(self):
+        self.stream = VideoStream(gst.Caps("video/x-raw-rgb"))
+        self.factory = StubFactory()
+        self.factory.addOutputStream(self.stream)
+        self.track = Track(self.stream)
+
+    def tearDown(self):
+        for track_object in list(self.track.track_objects):
+            self.track.removeTrackObject(track_object)
+        del self.track
+
+    def _addSource(self, start, end):
+        track_object = SourceTrackObject(self.factory, self.stream)
+        self.track.addTrackObject(track_object)
+        track_object.start = start * gst.SECOND
+        track_object.duration = (end - start) * gst.SECOND
+        return track_object
+
+    def _addEffect(self, start, end):
+        factory = FakeEffectFactory()
+        factory.addInputStream(self.stream)
+        factory.addOutputStream(self.stream)
+        track_object = TrackEffect(factory, self.stream)
+        self.track.addTrackObject(track_object)
+        track_object.start = start * gst.SECOND
+        track_object.duration = (end - start) * gst.SECOND
+        return track_object
+
+    def _getRegions(self):
+        return [(start / gst.SECOND, end / gst.SECOND, set(objects))
+                for start, end, objects in get_heavy_regions(self.track)]
+
+    def testSequence(self):
+        self._addSource(0, 10)
+        self._addSource(10, 20)
+        self.failUnlessEqual(self._getRegions(), [])
+
+    def testOverlap(self):
+        first = self._addSource(0, 10)
+        second = self._addSource(5, 15)
+        self._addSource(20, 30)
+        # only the overlap is composited
+        self.failUnlessEqual(self._getRegions(),
+                [(5, 10, set([first, second]))])
+
+    def testChain(self):
+        # every clip has a transition with the next one
+        sources = [self._addSource(index * 10, index * 10 + 12)
+                for index in range(10)]
+        regions = self._getRegions()
+        self.failUnlessEqual(len(regions), 9)
+        for index, (start, end, objects) in enumerate(regions):
+            self.failUnlessEqual((start, end),
+                    ((index + 1) * 10, (index + 1) * 10 + 2))
+            self.failUnlessEqual(objects,
+                    set([sources[index], sources[index + 1]]))
+
+    def testTouching(self):
+        first = self._addSource(0, 10)
+        second = self._addSource(5, 15)
+        effect = self._addEffect(10, 12)
+        self.failUnlessEqual(self._getRegions(),
+                [(5, 12, set([first, second, effect]))])
+
+    def testEffect(self):
+        source = self._addSource(0, 10)
+        effect = self._addEffect(2, 4)
+        self._addSource(10, 20)
+        self.failUnlessEqual(self._getRegions(),
+                [(2, 4, set([source, effect]))])
+
+    def testApply(self):
+        source = self._addSource(0, 10)
+        effect = self._addEffect(2, 4)
+        (start, end, objects), = get_heavy_regions(self.track)
+        region = CachedRegion(self.track, start, end, objects, "key")
+        region.filename = "/nonexistent/key-0.mkv"
+
+        region.apply()
+        # the clip is still played around the region
+        self.failUnless(source.gnl_object.props.active)
+        self.failIf(effect.gnl_object.props.active)
+        self.failUnlessEqual(region.gnl_object.props.start, 2 * gst.SECOND)
+        self.failUnlessEqual(region.gnl_object.props.duration, 2 * gst.SECOND)
+
+        region.unapply()
+        self.failUnless(source.gnl_object.props.active)
+        self.failUnless(effect.gnl_object.props.active)
+
+    def testInactive(self):
+        self._addSource(0, 10)
+        second = self._addSource(5, 15)
+        second.active = False
+        self.failUnlessEqual(self._getRegions(), [])
+
+    def testKey(self):
+        settings = ExportSettings()
+        first = self._addSource(0, 10)
+        second = self._addSource(5, 15)
+        start, end, objects = get_heavy_regions(self.track)[0]
+        key = get_region_key(start, end, objects, settings)
+        self.failUnlessEqual(key,
+                get_region_key(start, end, list(reversed(objects)), settings))
+
+        second.in_point = gst.SECOND
+        self.failIfEqual(key, get_region_key(start, end, objects, settings))
+        second.in_point = 0
+
+        settings.videowidth = settings.videowidth * 2
+        self.failIfEqual(key, get_region_key(start, end, objects, settings))
+
+
+class TestCacheFiles(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.xdg_cache_home = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = self.directory
+
+    def tearDown(self):
+        if self.xdg_cache_home is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.xdg_cache_home
+        shutil.rmtree(self.directory)
+
+    def testFindCacheFile(self):
+        self.failUnlessEqual(find_cache_file("abc"), None)
+
+        # unfinished renders are ignored
+        open(os.path.join(get_cache_directory(), "abc.part"), "w").close()
+        self.failUnlessEqual(find_cache_file("abc"), None)
+
+        filename = os.path.join(get_cache_directory(), "abc-1000.mkv")
+        open(filename, "w").close()
+        self.failUnlessEqual(find_cache_file("abc"), (filename, 1000))
+        self.failUnlessEqual(find_cache_file("ab"), None)
+
+    def _makeFile(self, name, size, mtime):
+        filename = os.path.join(get_cache_directory(), name)
+        f = open(filename, "wb")
+        f.write("x" * size)
+        f.close()
+        os.utime(filename, (mtime, mtime))
+        return filename
+
+    def testTrimCache(self):
+        old = self._makeFile("old-0.mkv", 10, 1000)
+        kept = self._makeFile("kept-0.mkv", 10, 2000)
+        used = self._makeFile("used-0.mkv", 10, 3000)
+        new = self._makeFile("new-0.mkv", 10, 4000)
+        self.failUnlessEqual(trim_cache(40), [])
+
+        # the least recently used files go first
+        touch_cache_file(old)
+        self.failUnlessEqual(trim_cache(20, keep=[kept]), [used, new])
+        self.failUnless(os.path.exists(old))
+        self.failUnless(os.path.exists(kept))
+
+    def testCacheSettings(self):
+        settings = ExportSettings()
+        cache_settings = get_cache_settings(settings)
+        self.failUnlessEqual(cache_settings.vencoder, "jpegenc")
+        self.failUnlessEqual(cache_settings.aencoder, None)
+        self.failUnlessEqual(cache_settings.videowidth, settings.videowidth)
+        # the settings of the project are left alone
+        self.failIfEqual(settings.vencoder, "jpegenc")
@@ -0,0 +1,213 @@
+# PiTiVi , Non-linear video editor
+#
+#       tests/test_renderqueue.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import gst
+
+from pitivi.renderqueue import RenderQueue, RenderJob, job_for_settings, \
+        job_from_data, JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED
+from pitivi.settings import ExportSettings
+
+
+class StubProcess(object):
+    def __init__(self, job):
+        self.job = job
+        self.fraction = 0.0
+        self.error = None
+        self.killed = False
+
+    def kill(self):
+        self.killed = True
+
+
+class StubQueue(RenderQueue):
+    def __init__(self, *args, **kwargs):
+        self.processes = []
+        RenderQueue.__init__(self, *args, **kwargs)
+
+    def _makeProcess(self, job):
+        process = StubProcess(job)
+        self.processes.append(process)
+        return process
+
+    def finish(self, process, error=None):
+        process.error = error
+        self._processCb(process, None)
+
+
+class TestRenderJob(TestCase):
+    def testJobForSettings(self):
+        settings = ExportSettings()
+        job = job_for_settings("file:///p.xptv", "file:///out.ogg", settings,
+                start=gst.SECOND, end=2 * gst.SECOND)
+        self.failUnlessEqual((job.start, job.end), (gst.SECOND,
+                2 * gst.SECOND))
+        self.failUnlessEqual(job.getCost(), 1)
+        arguments = job.getArguments()
+        self.failUnlessEqual(arguments[:3], ["file:///p.xptv",
+                "file:///out.ogg", "--force"])
+        self.failUnless("--vencoder" in arguments)
+
+        job = job_for_settings("file:///p.xptv", "file:///out.ogg", jobs=4)
+        self.failUnlessEqual((job.start, job.end), (None, None))
+        self.failUnlessEqual(job.getCost(), 4)
+
+    def testData(self):
+        job = job_for_settings("file:///p.xptv", "file:///out.ogg",
+                start=gst.SECOND, retries=5)
+        job.id = 3
+        job.state = JOB_FAILED
+        job.attempts = 6
+        job.error = "oops"
+        other = job_from_data(job.toData())
+        self.failUnlessEqual(other.toData(), job.toData())
+        self.failUnlessEqual(other.start, gst.SECOND)
+
+
+class TestRenderQueue(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "queue.json")
+        self.project = os.path.join(self.directory, "p.xptv")
+        self._writeProject("<pitivi/>")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _writeProject(self, data):
+        f = open(self.project, "w")
+        f.write(data)
+        f.close()
+
+    def _job(self, jobs=1, retries=0):
+        return job_for_settings("file://" + self.project, "file:///out.ogg",
+                jobs=jobs, retries=retries)
+
+    def testSnapshot(self):
+        queue = RenderQueue(self.filename)
+        job = self._job()
+        queue.addJob(job)
+        snapshot = gst.uri_get_location(job.snapshot_uri)
+        self.failIfEqual(snapshot, self.project)
+        self.failUnlessEqual(job.getArguments()[0], job.snapshot_uri)
+
+        # editing the project doesn't change what the job renders
+        self._writeProject("<pitivi>edited</pitivi>")
+        self.failUnlessEqual(open(snapshot).read(), "<pitivi/>")
+
+        other = RenderQueue(self.filename)
+        self.failUnlessEqual(other.jobs[0].snapshot_uri, job.snapshot_uri)
+        other.removeJob(other.jobs[0])
+        self.failIf(os.path.exists(snapshot))
+
+    def testMissingProject(self):
+        queue = RenderQueue(self.filename)
+        job = job_for_settings("file://" + self.project + ".missing",
+                "file:///out.ogg")
+        self.failUnlessRaises(IOError, queue.addJob, job)
+        self.failUnlessEqual(queue.jobs, [])
+        self.failUnlessEqual(os.listdir(self.directory + "/queue-projects"),
+                [])
+
+    def testPersistence(self):
+        queue = RenderQueue(self.filename)
+        first = self._job()
+        second = self._job()
+        queue.addJob(first)
+        queue.addJob(second)
+        self.failUnlessEqual((first.id, second.id), (1, 2))
+
+        other = RenderQueue(self.filename)
+        self.failUnlessEqual([job.id for job in other.jobs], [1, 2])
+        other.removeJob(other.getJob(1))
+        other.addJob(self._job())
+
+        removed = []
+        queue.connect("job-removed", lambda queue, job: removed.append(job))
+        queue.sync()
+        self.failUnlessEqual(removed, [first])
+        self.failUnlessEqual([job.id for job in queue.jobs], [2, 3])
+
+    def testCorrupted(self):
+        f = open(self.filename, "w")
+        f.write("{")
+        f.close()
+        queue = RenderQueue(self.filename)
+        self.failUnlessEqual(queue.jobs, [])
+
+    def testBudget(self):
+        queue = StubQueue(self.filename, budget=2)
+        for jobs in (1, 2, 1):
+            queue.addJob(self._job(jobs))
+        queue.start()
+        # the second job doesn't fit next to the first one and the third
+        # one waits for its turn
+        self.failUnlessEqual([job.state for job in queue.jobs],
+                [JOB_RUNNING, JOB_QUEUED, JOB_QUEUED])
+
+        queue.finish(queue.processes[0])
+        self.failUnlessEqual([job.state for job in queue.jobs],
+                [JOB_DONE, JOB_RUNNING, JOB_QUEUED])
+
+        idle = []
+        queue.connect("idle", lambda queue: idle.append(True))
+        queue.finish(queue.processes[1])
+        queue.finish(queue.processes[2])
+        self.failUnlessEqual([job.state for job in queue.jobs],
+                [JOB_DONE, JOB_DONE, JOB_DONE])
+        self.failUnless(idle)
+        queue.stop()
+
+    def testRetries(self):
+        queue = StubQueue(self.filename, budget=1)
+        job = self._job(retries=1)
+        queue.addJob(job)
+        queue.start()
+        queue.finish(queue.processes[0], "no space left")
+        self.failUnlessEqual((job.state, job.attempts), (JOB_RUNNING, 2))
+        queue.finish(queue.processes[1], "no space left")
+        self.failUnlessEqual((job.state, job.error),
+                (JOB_FAILED, "no space left"))
+
+        queue.retryJob(job)
+        self.failUnlessEqual((job.state, job.attempts), (JOB_RUNNING, 1))
+        queue.stop()
+
+    def testRestart(self):
+        queue = StubQueue(self.filename)
+        queue.addJob(self._job())
+        queue.start()
+        # the process running the queue went away
+        job = queue.jobs[0]
+        job.pid = None
+        queue._processes.clear()
+        queue._write()
+
+        queue = StubQueue(self.filename)
+        self.failUnlessEqual(queue.jobs[0].state, JOB_RUNNING)
+        queue.start()
+        self.failUnlessEqual(len(queue.processes), 1)
+        self.failUnlessEqual(queue.jobs[0].attempts, 2)
+        queue.stop()
+        self.failUnless(queue.processes[0].killed)
+        self.failUnlessEqual(queue.jobs[0].state, JOB_QUEUED)
@@ -0,0 +1,102 @@
+# PiTiVi , Non-linear video editor
+#
+#       tests/test_renderstats.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+import os
+import csv
+import tempfile
+from unittest import TestCase
+
+import gst
+
+from pitivi.renderstats import RenderStats, ElementTimer, get_queue_fill, \
+        STATS_COLUMNS
+
+
+class StubPipeline(object):
+    def __init__(self):
+        self.factories = {}
+
+
+class ClockedRenderStats(RenderStats):
+    now = 0.0
+
+    def _getTime(self):
+        return self.now
+
+
+class TestRenderStats(TestCase):
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix=".csv")
+        os.close(fd)
+
+    def tearDown(self):
+        os.unlink(self.filename)
+
+    def testQueueFill(self):
+        queue = gst.element_factory_make("queue")
+        self.failUnlessEqual(get_queue_fill(queue), 0.0)
+
+    def testElementTimer(self):
+        pipeline = gst.parse_launch("videotestsrc num-buffers=10 ! "
+                "identity name=identity sleep-time=2000 ! fakesink")
+        timer = ElementTimer()
+        timer.attach(pipeline.get_by_name("identity"))
+        pipeline.set_state(gst.STATE_PLAYING)
+        pipeline.get_bus().timed_pop_filtered(10 * gst.SECOND,
+                gst.MESSAGE_EOS | gst.MESSAGE_ERROR)
+        pipeline.set_state(gst.STATE_NULL)
+        self.failUnlessEqual(timer.buffers, 10)
+        self.failUnless(timer.total >= 0.02)
+
+    def testSample(self):
+        stats = ClockedRenderStats(StubPipeline(), self.filename)
+        stats.sample(0)
+        stats.now = 2.0
+        stats.video_encoders.buffers = 50
+        stats.decoders.total = 0.5
+        stats.encoders.total = 1.5
+        row = stats.sample(4 * gst.SECOND)
+        self.failUnlessEqual(row["fps"], 25.0)
+        self.failUnlessEqual(row["realtime"], 2.0)
+        self.failUnlessEqual(row["encoder_share"], 0.75)
+
+        stats.now = 3.0
+        stats.video_encoders.buffers = 60
+        row = stats.sample(5 * gst.SECOND)
+        self.failUnlessEqual(row["fps"], 10.0)
+        self.failUnlessEqual(stats.getSummary(), {"fps": 20.0,
+                "realtime": 5.0 / 3, "encoder_share": 0.75})
+        stats.close()
+
+        rows = list(csv.reader(open(self.filename)))
+        self.failUnlessEqual(rows[0], STATS_COLUMNS)
+        self.failUnlessEqual(len(rows), 4)
+        self.failUnlessEqual(float(rows[2][STATS_COLUMNS.index("fps")]),
+                25.0)
+
+    def testSampleAfterAttach(self):
+        stats = ClockedRenderStats(StubPipeline())
+        # frames encoded before sampling started
+        stats.video_encoders.buffers = 30
+        stats.sample(0)
+        stats.now = 2.0
+        stats.video_encoders.buffers = 80
+        row = stats.sample(2 * gst.SECOND)
+        self.failUnlessEqual(row["fps"], 25.0)
+        self.failUnlessEqual(stats.getSummary()["fps"], 25.0)
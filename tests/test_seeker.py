@@ -25,6 +25,7 @@ import gst
 
 class StubSeeker(Seeker):
     seek_id = 0
+    now = 0.0
 
     def _scheduleSeek(self, position, format):
         # mock Seeker._scheduleSeek so that we don't need a mainloop
@@ -33,6 +34,12 @@ class StubSeeker(Seeker):
 
         return seek_id
 
+    def _unscheduleSeek(self, seek_id):
+        pass
+
+    def _getTime(self):
+        return self.now
+
 class TestSeeker(TestCase):
     def setUp(self):
         self.seek_count = 0
@@ -40,7 +47,7 @@ class TestSeeker(TestCase):
         self.seek_format = None
 
     def testSeek(self):
-        def seek_cb(seeker, position, format):
+        def seek_cb(seeker, position, format, flags):
             self.seek_count += 1
             self.seek_position = position
             self.seek_format = format
@@ -82,3 +89,99 @@ class TestSeeker(TestCase):
         # timeout with None position
         seeker._seekTimeoutCb()
 
+class TestScrub(TestCase):
+    def setUp(self):
+        self.seeks = []
+        self.seeker = StubSeeker(timeout=10)
+        self.seeker.connect('seek', self._seekCb)
+
+    def _seekCb(self, seeker, position, format, flags):
+        self.seeks.append((position, flags))
+
+    def _move(self, position, elapsed=0.1):
+        self.seeker.now += elapsed
+        self.seeker.seek(long(position * gst.SECOND))
+
+    def testSlow(self):
+        self.seeker.beginScrub()
+        self._move(1)
+        self.seeker.seekDone()
+        self._move(1.1)
+        self.failUnlessEqual(self.seeks,
+                [(gst.SECOND, gst.SEEK_FLAG_ACCURATE),
+                (long(1.1 * gst.SECOND), gst.SEEK_FLAG_ACCURATE)])
+        self.failUnlessEqual(self.seeker.dropped, 0)
+
+        # the exact frame was already shown
+        self.seeker.seekDone()
+        self.seeker.endScrub()
+        self.failUnlessEqual(len(self.seeks), 2)
+
+    def testFast(self):
+        self.seeker.beginScrub()
+        self._move(1)
+        self.seeker.seekDone()
+        self._move(5)
+        self.failUnlessEqual(self.seeks[-1],
+                (5 * gst.SECOND, gst.SEEK_FLAG_KEY_UNIT))
+        self.failIfEqual(self.seeker._settle_id, None)
+        self.seeker.seekDone()
+
+        # the pointer stops, the exact frame is shown
+        self.seeker._settleTimeoutCb()
+        self.failUnlessEqual(self.seeks[-1],
+                (5 * gst.SECOND, gst.SEEK_FLAG_ACCURATE))
+        self.seeker.seekDone()
+        self.seeker.endScrub()
+        self.failUnlessEqual(len(self.seeks), 3)
+
+    def testDropStale(self):
+        self.seeker.beginScrub()
+        self._move(1)
+        # the pipeline is still busy with the first seek
+        self._move(2)
+        self._move(3)
+        self.failUnlessEqual(self.seeks, [(gst.SECOND, gst.SEEK_FLAG_ACCURATE)])
+        self.failUnlessEqual(self.seeker.dropped, 1)
+
+        # only the last one is done
+        self.seeker.seekDone()
+        self.failUnlessEqual([position for position, flags in self.seeks],
+                [gst.SECOND, 3 * gst.SECOND])
+
+    def testEndScrubWhileBusy(self):
+        self.seeker.beginScrub()
+        self._move(1)
+        self.seeker.seekDone()
+        self._move(10)
+        self._move(20)
+        self.seeker.endScrub()
+        self.failUnlessEqual(len(self.seeks), 2)
+
+        # the last position is shown exactly once the pipeline is ready
+        self.seeker.seekDone()
+        self.failUnlessEqual(self.seeks[-1],
+                (20 * gst.SECOND, gst.SEEK_FLAG_ACCURATE))
+
+    def testLostSeek(self):
+        self.seeker.beginScrub()
+        self._move(1)
+        self._move(1.1, elapsed=2)
+        self.failUnlessEqual(len(self.seeks), 1)
+        # the pipeline never tells the seek is done, the pending position is
+        # seeked to when the timer fires, without waiting for the pointer
+        self.seeker._busyTimeoutCb()
+        self.failUnlessEqual(self.seeks[-1],
+                (long(1.1 * gst.SECOND), gst.SEEK_FLAG_ACCURATE))
+
+    def testOtherSeeks(self):
+        self.seeker.beginScrub()
+        self._move(1)
+        self._move(2, elapsed=2)
+        # another seeker's seek of the same pipeline is done
+        self.seeker.seekDone(None, 7 * gst.SECOND, 0.1)
+        self.failUnlessEqual(len(self.seeks), 1)
+
+        self.seeker.seekDone(None, gst.SECOND, 0.1)
+        self.failUnlessEqual(self.seeks[-1],
+                (2 * gst.SECOND, gst.SEEK_FLAG_ACCURATE))
@@ -1,5 +1,6 @@
+import gc
 import unittest
-from pitivi.signalinterface import Signallable
+from pitivi.signalinterface import Signallable, signal_handler_report
 
 class myobject(Signallable):
 
@@ -26,6 +27,13 @@ class mysubobject(myobject):
 def function_cb(testcase):
     testcase.fail("this should not be reached")
 
+class Receiver(object):
+    def __init__(self):
+        self.calls = []
+
+    def callback(self, signaller, *args):
+        self.calls.append(args)
+
 class TestSignalisation(unittest.TestCase):
     """
     Test the proper behaviour of pitivi.signalinterface.Signallable
@@ -259,3 +267,51 @@ class TestSignalisation(unittest.TestCase):
         self.assertEquals(self.s_noargs_triggered, 2)
 
     #FIXME : test return values on emission !
+
+    def test07_weak_connect(self):
+        receiver = Receiver()
+        sigid = self.object.connect_weak("signal-oneargs",
+                receiver.callback, "extra")
+        self.assert_(sigid)
+        self.object.emit_signal_one_args(42)
+        self.assertEquals(receiver.calls, [(42, "extra")])
+
+        # the connection doesn't keep the receiver alive and goes away
+        # with it
+        del receiver
+        gc.collect()
+        self.assertRaises(Exception, self.object.disconnect, sigid)
+        self.object.emit_signal_one_args(42)
+
+    def test08_weak_disconnect(self):
+        receiver = Receiver()
+        sigid = self.object.connect_weak("signal-oneargs", receiver.callback)
+        self.object.disconnect(sigid)
+        self.object.emit_signal_one_args(42)
+        self.assertEquals(receiver.calls, [])
+
+        self.object.connect_weak("signal-oneargs", receiver.callback)
+        self.object.connect_weak("signal-noargs", receiver.callback)
+        self.object.disconnect_by_function(receiver.callback)
+        self.object.emit_signal_one_args(42)
+        self.object.emit_signal_no_args()
+        self.assertEquals(receiver.calls, [])
+        self.assertRaises(Exception, self.object.disconnect_by_function,
+                receiver.callback)
+
+    def test09_handler_report(self):
+        def counts():
+            return dict([((cls, signame), count)
+                    for count, cls, signame in signal_handler_report()])
+
+        before = counts()
+        receiver = Receiver()
+        self.object.connect("signal-oneargs", receiver.callback)
+        self.object.connect_weak("signal-oneargs", receiver.callback)
+        self.subobject.connect("subobject-noargs", receiver.callback)
+        after = counts()
+
+        key = ("myobject", "signal-oneargs")
+        self.assertEquals(after[key] - before.get(key, 0), 2)
+        key = ("mysubobject", "subobject-noargs")
+        self.assertEquals(after[key] - before.get(key, 0), 1)
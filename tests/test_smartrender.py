@@ -0,0 +1,184 @@
+# PiTiVi , Non-linear video editor
+#
+#       tests/test_smartrender.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+from unittest import TestCase
+
+import gst
+
+from pitivi.smartrender import plan_segments, can_copy, headers_match, \
+        SourceInfo, SourceScanner
+from pitivi.settings import ExportSettings
+
+SECOND = gst.SECOND
+
+
+def make_info(uri, keyframes, duration):
+    info = SourceInfo(uri)
+    info.keyframes = [keyframe * SECOND for keyframe in keyframes]
+    info.duration = duration * SECOND
+    return info
+
+
+class TestPlanSegments(TestCase):
+    def setUp(self):
+        self.info = make_info("file:///a.ogg", range(0, 60, 4), 60)
+        self.infos = {"file:///a.ogg": self.info}
+
+    def testNothingToCopy(self):
+        self.failUnlessEqual(plan_segments(30 * SECOND, [], self.infos),
+                [(0, 30 * SECOND, None, None)])
+        spans = [(0, 30 * SECOND, "file:///b.ogg", 0)]
+        self.failUnlessEqual(plan_segments(30 * SECOND, spans, self.infos),
+                [(0, 30 * SECOND, None, None)])
+
+    def testKeyframeAligned(self):
+        # the clip shows 5s to 25s of the file from 10s
+        spans = [(10 * SECOND, 30 * SECOND, "file:///a.ogg", 5 * SECOND)]
+        self.failUnlessEqual(plan_segments(40 * SECOND, spans, self.infos),
+                [(0, 13 * SECOND, None, None),
+                (13 * SECOND, 29 * SECOND, "file:///a.ogg", 8 * SECOND),
+                (29 * SECOND, 40 * SECOND, None, None)])
+
+    def testUntilEndOfFile(self):
+        spans = [(0, 10 * SECOND, "file:///a.ogg", 50 * SECOND)]
+        self.failUnlessEqual(plan_segments(10 * SECOND, spans, self.infos),
+                [(0, 2 * SECOND, None, None),
+                (2 * SECOND, 10 * SECOND, "file:///a.ogg", 52 * SECOND)])
+
+    def testTooShort(self):
+        spans = [(0, 6 * SECOND, "file:///a.ogg", 3 * SECOND)]
+        self.failUnlessEqual(plan_segments(6 * SECOND, spans, self.infos),
+                [(0, SECOND, None, None),
+                (SECOND, 5 * SECOND, "file:///a.ogg", 4 * SECOND),
+                (5 * SECOND, 6 * SECOND, None, None)])
+        self.failUnlessEqual(plan_segments(6 * SECOND, spans, self.infos,
+                min_copy=5 * SECOND), [(0, 6 * SECOND, None, None)])
+
+    def testWithoutVideo(self):
+        spans = [(SECOND, 6 * SECOND, "file:///a.ogg", 3 * SECOND)]
+        self.failUnlessEqual(plan_segments(6 * SECOND, spans, self.infos,
+                video=False),
+                [(0, SECOND, None, None),
+                (SECOND, 6 * SECOND, "file:///a.ogg", 3 * SECOND)])
+
+    def testBackToBack(self):
+        spans = [(0, 8 * SECOND, "file:///a.ogg", 0),
+                (8 * SECOND, 16 * SECOND, "file:///a.ogg", 20 * SECOND)]
+        self.failUnlessEqual(plan_segments(16 * SECOND, spans, self.infos),
+                [(0, 8 * SECOND, "file:///a.ogg", 0),
+                (8 * SECOND, 16 * SECOND, "file:///a.ogg", 20 * SECOND)])
+
+
+class TestCanCopy(TestCase):
+    def setUp(self):
+        self.settings = ExportSettings()
+        self.info = SourceInfo("file:///a.ogg")
+        self.info.caps["video"] = gst.Caps("video/x-theora, width=720, "
+                "height=576, framerate=25/1, pixel-aspect-ratio=1/1")
+        self.info.caps["audio"] = gst.Caps("audio/x-vorbis, rate=44100, "
+                "channels=2")
+
+    def testSameFormat(self):
+        self.failUnless(can_copy(self.info, self.settings,
+                set(["video", "audio"])))
+
+    def testOtherSize(self):
+        self.settings.videowidth = 320
+        self.failIf(can_copy(self.info, self.settings, set(["video"])))
+        # the video isn't written
+        self.failUnless(can_copy(self.info, self.settings, set(["audio"])))
+
+    def testOtherCodec(self):
+        self.info.caps["audio"] = gst.Caps("audio/mpeg, rate=44100, "
+                "channels=2")
+        self.failIf(can_copy(self.info, self.settings,
+                set(["video", "audio"])))
+
+    def testMissingStream(self):
+        del self.info.caps["audio"]
+        self.failIf(can_copy(self.info, self.settings,
+                set(["video", "audio"])))
+
+    def testAmbiguous(self):
+        self.info.ambiguous = True
+        self.failIf(can_copy(self.info, self.settings, set(["video"])))
+
+    def testReordered(self):
+        self.info.reordered = True
+        self.failIf(can_copy(self.info, self.settings, set(["video"])))
+        # the audio can still be copied
+        self.failUnless(can_copy(self.info, self.settings, set(["audio"])))
+
+
+class FakePad(object):
+    def __init__(self, caps):
+        self.caps = caps
+
+    def get_negotiated_caps(self):
+        return self.caps
+
+
+class TestSourceScanner(TestCase):
+    def _scan(self, timestamps):
+        scanner = SourceScanner("file:///a.mp4", ExportSettings())
+        pad = FakePad(gst.Caps("video/x-h264"))
+        for timestamp in timestamps:
+            buf = gst.Buffer("frame")
+            buf.timestamp = timestamp * SECOND / 25
+            buf.duration = SECOND / 25
+            scanner._handoffCb(None, buf, pad, "video")
+        return scanner.info
+
+    def testInOrder(self):
+        self.failIf(self._scan([0, 1, 2, 3, 4]).reordered)
+
+    def testReordered(self):
+        # I0 P3 B1 B2 I4, in decoding order
+        info = self._scan([0, 3, 1, 2, 4])
+        self.failUnless(info.reordered)
+        self.failUnlessEqual(info.duration, 5 * SECOND / 25)
+
+
+class TestHeadersMatch(TestCase):
+    def setUp(self):
+        self.reference = SourceInfo("file:///headers.ogg")
+        self.reference.caps["video"] = gst.Caps("video/x-theora, "
+                "width=720, height=576, streamheader=(buffer)<8074686f7261>")
+        self.reference.caps["audio"] = gst.Caps("audio/x-vorbis, rate=44100, "
+                "streamheader=(buffer)<01766f72626973>")
+        self.info = SourceInfo("file:///a.ogg")
+        self.info.caps = dict(self.reference.caps)
+
+    def testSameHeaders(self):
+        self.failUnless(headers_match(self.info, self.reference,
+                set(["video", "audio"])))
+
+    def testOtherHeaders(self):
+        self.info.caps["video"] = gst.Caps("video/x-theora, "
+                "width=720, height=576, streamheader=(buffer)<8074686f7200>")
+        self.failIf(headers_match(self.info, self.reference,
+                set(["video", "audio"])))
+        # the video isn't written
+        self.failUnless(headers_match(self.info, self.reference,
+                set(["audio"])))
+
+    def testMissingStream(self):
+        del self.reference.caps["audio"]
+        self.failIf(headers_match(self.info, self.reference,
+                set(["video", "audio"])))
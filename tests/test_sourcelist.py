@@ -102,3 +102,13 @@ class TestSourceList(TestCase):
 
         # there was an error, the factory wasn't added so this shouldn't raise
         self.sourcelist.addUri(uri)
+
+    def testAddUrisSkipExisting(self):
+        self.sourcelist.addUri("file:///a")
+        self.failUnlessRaises(SourceListError, self.sourcelist.addUris,
+                ["file:///a", "file:///b"])
+
+        self.sourcelist.addUris(["file:///a", "file:///c"],
+                skip_existing=True)
+        self.failUnlessEqual(self.sourcelist.discoverer.queue[-1],
+                "file:///c")
@@ -279,3 +279,50 @@ class TestStreamGroupMatching(TestCase):
         best_map = match_stream_groups(group_a, group_b)
         self.failUnlessEqual(known_best_map, best_map)
 
+
+    def testMatchStreamGroupsManyStreams(self):
+        # broadcast files have a lot of audio streams with the same caps,
+        # only the pad names tell them apart
+        caps = gst.Caps("audio/x-raw-int, channels=1")
+        group_a = [AudioStream(caps, pad_name="src%d" % i) for i in range(16)]
+        group_b = [AudioStream(caps, pad_name="src%d" % i) for i in range(16)]
+        group_b.reverse()
+
+        best_map = match_stream_groups(group_a, group_b)
+        self.failUnlessEqual(len(best_map), 16)
+        for (stream_a, stream_b), rank in best_map.iteritems():
+            self.failUnlessEqual(stream_a.pad_name, stream_b.pad_name)
+            self.failUnlessEqual(rank,
+                    STREAM_MATCH_SAME_CAPS + STREAM_MATCH_SAME_PAD_NAME)
+
+    def testMatchStreamGroupsManyStreamsUneven(self):
+        video = VideoStream(gst.Caps("video/x-raw-yuv"), pad_name="src0")
+        audio_caps = gst.Caps("audio/x-raw-int")
+        group_a = [video] + [AudioStream(audio_caps, pad_name="src%d" % i)
+                for i in range(1, 13)]
+        # some streams are gone, the others were renumbered
+        group_b = [AudioStream(audio_caps, pad_name="src%d" % i)
+                for i in range(8)]
+        group_b.append(VideoStream(gst.Caps("video/x-raw-yuv"),
+                pad_name="src8"))
+
+        best_map = match_stream_groups(group_a, group_b)
+        self.failUnlessEqual(best_map[video, group_b[8]],
+                STREAM_MATCH_SAME_CAPS)
+        self.failUnlessEqual(len(best_map), 9)
+        # audio streams keep their pad names when they can, the remaining
+        # stream of group_b goes to the first audio stream left
+        same_pad_name = [stream_a.pad_name for stream_a, stream_b in best_map
+                if stream_a.pad_name == stream_b.pad_name]
+        self.failUnlessEqual(sorted(same_pad_name),
+                sorted(["src%d" % i for i in range(1, 8)]))
+        self.failUnlessEqual(best_map[group_a[8], group_b[0]],
+                STREAM_MATCH_SAME_CAPS)
+
+    def testMatchStreamGroupsTies(self):
+        streams = [AudioStream(gst.Caps("audio/x-vorbis")) for i in range(4)]
+        # equally good matches pair the streams in order
+        best_map = match_stream_groups(streams[:2], streams[2:])
+        self.failUnlessEqual(best_map,
+                {(streams[0], streams[2]): STREAM_MATCH_SAME_CAPS,
+                (streams[1], streams[3]): STREAM_MATCH_SAME_CAPS})
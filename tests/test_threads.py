@@ -0,0 +1,144 @@
+# PiTiVi , Non-linear video editor
+#
+#       tests/test_threads.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+import threading
+from unittest import TestCase
+
+import gobject
+gobject.threads_init()
+
+from pitivi.threads import WorkerPool, PRIORITY_HIGH, PRIORITY_LOW, \
+        FUTURE_DONE, FUTURE_FAILED, FUTURE_CANCELLED
+
+
+class TestWorkerPool(TestCase):
+    def setUp(self):
+        self.pool = WorkerPool(max_workers=2)
+        self.mainloop = gobject.MainLoop()
+        self.results = []
+
+    def tearDown(self):
+        self.failUnless(self.pool.stopAllThreads(timeout=5))
+
+    def _runUntilFinished(self, futures):
+        def check():
+            if [f for f in futures if not f.isFinished()]:
+                return True
+            # let the pending deliveries run first
+            gobject.idle_add(self.mainloop.quit)
+            return False
+        gobject.timeout_add(10, check)
+        self.mainloop.run()
+
+    def testResultDeliveredInMainLoop(self):
+        main_thread = threading.currentThread()
+
+        def job(token, value):
+            return value * 2
+
+        def doneCb(future, result):
+            self.results.append((result, threading.currentThread()))
+
+        future = self.pool.submit(job, (21,))
+        future.connect("done", doneCb)
+        self._runUntilFinished([future])
+
+        self.failUnlessEqual(future.state, FUTURE_DONE)
+        self.failUnlessEqual(self.results, [(42, main_thread)])
+
+    def testError(self):
+        def job(token):
+            raise ValueError("oops")
+
+        def errorCb(future, exception):
+            self.results.append(exception)
+
+        future = self.pool.submit(job)
+        future.connect("error", errorCb)
+        self._runUntilFinished([future])
+
+        self.failUnlessEqual(future.state, FUTURE_FAILED)
+        self.failUnless(isinstance(self.results[0], ValueError))
+        self.failUnlessEqual(self.pool.getStats()["failed"], 1)
+
+    def testBoundedAndPrioritized(self):
+        release = threading.Event()
+        running = []
+        lock = threading.Lock()
+        order = []
+
+        def blocker(token):
+            lock.acquire()
+            running.append(1)
+            lock.release()
+            release.wait()
+
+        def job(token, name):
+            order.append(name)
+
+        blockers = [self.pool.submit(blocker) for i in range(3)]
+        low = self.pool.submit(job, ("low",), priority=PRIORITY_LOW)
+        high = self.pool.submit(job, ("high",), priority=PRIORITY_HIGH)
+
+        stats = self.pool.getStats()
+        self.failUnless(stats["workers"] <= 2)
+        self.failUnless(stats["queued"] >= 3)
+
+        release.set()
+        self._runUntilFinished(blockers + [low, high])
+        self.failUnlessEqual(order, ["high", "low"])
+        self.failUnless(self.pool.peak_queued >= 3)
+
+    def testCancel(self):
+        release = threading.Event()
+        cancelled = []
+
+        def blocker(token):
+            release.wait()
+
+        def loop(token):
+            while not token.wait(0.01):
+                pass
+
+        def cancelledCb(future):
+            cancelled.append(future)
+
+        blockers = [self.pool.submit(blocker) for i in range(2)]
+        pending = self.pool.submit(blocker)
+        pending.connect("cancelled", cancelledCb)
+        pending.cancel()
+        self.failUnlessEqual(pending.state, FUTURE_CANCELLED)
+
+        release.set()
+        running = self.pool.submit(loop)
+        running.connect("cancelled", cancelledCb)
+        gobject.timeout_add(50, lambda: running.cancel())
+        self._runUntilFinished(blockers + [pending, running])
+
+        self.failUnlessEqual(cancelled, [pending, running])
+
+    def testStopAllThreads(self):
+        def loop(token):
+            while not token.wait(0.01):
+                pass
+
+        futures = [self.pool.submit(loop) for i in range(4)]
+        self.failUnless(self.pool.stopAllThreads(timeout=5))
+        self.failUnless(not [f for f in futures if not f.isFinished()])
+        self.failUnlessRaises(RuntimeError, self.pool.submit, loop)
@@ -0,0 +1,182 @@
+# PiTiVi , Non-linear video editor
+#
+#       tests/test_thumbnailer.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+import os
+from unittest import TestCase
+
+from common import CacheDirTestCase, make_file_factory, stub_job_queue
+from pitivi.imageprobe import probe_image
+from pitivi.sourcelist import SourceList
+from pitivi.stream import VideoStream
+from pitivi.thumbnailer import Thumbnailer, get_thumbnail_filename, \
+        write_png
+
+StubThumbnailer = stub_job_queue(Thumbnailer)
+
+
+class TestThumbnailer(CacheDirTestCase):
+    def setUp(self):
+        CacheDirTestCase.setUp(self)
+        self.thumbnailer = StubThumbnailer(batch_size=2)
+        self.done = []
+        self.ready = 0
+        self.thumbnailer.connect("thumbnail-done", self._thumbnailDoneCb)
+        self.thumbnailer.connect("ready", self._readyCb)
+
+    def _thumbnailDoneCb(self, thumbnailer, factory):
+        self.done.append(factory)
+
+    def _readyCb(self, thumbnailer):
+        self.ready += 1
+
+    def _finishCurrent(self):
+        factory = self.thumbnailer._current[0]
+        write_png(self.thumbnailer._getPartFilename(), 2, 2, "\0" * 16)
+        self.thumbnailer._finish(True)
+        return factory
+
+    def testFilename(self):
+        filename = get_thumbnail_filename("file:///a.ogg")
+        self.failUnless(filename.startswith(self.directory))
+        self.failUnlessEqual(filename, get_thumbnail_filename("file:///a.ogg"))
+        self.failIfEqual(filename, get_thumbnail_filename("file:///b.ogg"))
+
+    def testWritePng(self):
+        filename = os.path.join(self.directory, "thumbnail.png")
+        # rows of 5 pixels are padded from 15 to 16 bytes
+        write_png(filename, 5, 3, "\xff" * 16 * 3)
+        info = probe_image(filename)
+        self.failUnlessEqual((info.width, info.height), (5, 3))
+
+    def testSkipped(self):
+        self.failIf(self.thumbnailer.add(make_file_factory("file:///a.ogg",
+                video=False)))
+        self.failIf(self.thumbnailer.add(make_file_factory("file:///a.png",
+                is_image=True)))
+
+        factory = make_file_factory("file:///b.ogg")
+        factory.getOutputStreams(VideoStream)[0].thumbnail = "/tmp/b.png"
+        self.failIf(self.thumbnailer.add(factory))
+        self.failUnlessEqual(self.thumbnailer.queue, [])
+
+    def testBatches(self):
+        self.thumbnailer.pause()
+        factories = [make_file_factory("file:///%d.ogg" % i) for i in range(3)]
+        for factory in factories:
+            self.failUnless(self.thumbnailer.add(factory))
+        # nothing happens while paused
+        self.failUnlessEqual(self.thumbnailer.started, [])
+
+        self.thumbnailer.resume()
+        self.failUnlessEqual(self.thumbnailer.started, factories[:1])
+        self.failUnlessEqual(self.thumbnailer.queue, factories[2:])
+
+        self.failUnlessEqual(self._finishCurrent(), factories[0])
+        self.failUnlessEqual(self.thumbnailer.started, factories[:2])
+        self.failUnlessEqual(self._finishCurrent(), factories[1])
+        # second batch
+        self.failUnlessEqual(self.thumbnailer.started, factories)
+        self.failUnlessEqual(self.ready, 0)
+        self._finishCurrent()
+
+        self.failUnlessEqual(self.done, factories)
+        self.failUnlessEqual(self.ready, 1)
+        for factory in factories:
+            self.failUnlessEqual(factory.getOutputStreams(VideoStream)[0].thumbnail,
+                    get_thumbnail_filename(factory.uri))
+
+    def testPauseDuringBatch(self):
+        factories = [make_file_factory("file:///%d.ogg" % i) for i in range(2)]
+        self.thumbnailer.pause()
+        for factory in factories:
+            self.thumbnailer.add(factory)
+        self.thumbnailer.resume()
+
+        # the current thumbnail is finished, the rest of the batch waits
+        self.thumbnailer.pause()
+        self._finishCurrent()
+        self.failUnlessEqual(self.thumbnailer.queue, factories[1:])
+        self.failUnlessEqual(self.ready, 0)
+
+        self.thumbnailer.resume()
+        self.failUnlessEqual(self.thumbnailer.started, factories)
+
+    def testFailure(self):
+        timings = []
+        self.thumbnailer.connect("timing",
+                lambda thumbnailer, uri, timing: timings.append(uri))
+        factory = make_file_factory("file:///a.ogg")
+        self.thumbnailer.add(factory)
+        self.thumbnailer._finish(False)
+        self.failUnlessEqual(timings, [factory.uri])
+        self.failUnlessEqual(self.done, [])
+        self.failUnlessEqual(self.ready, 1)
+        self.failUnlessEqual(factory.getOutputStreams(VideoStream)[0].thumbnail,
+                None)
+
+    def testExistingThumbnail(self):
+        factory = make_file_factory("file:///a.ogg")
+        write_png(get_thumbnail_filename(factory.uri), 1, 1, "\0" * 4)
+        self.thumbnailer.add(factory)
+
+        self.failUnlessEqual(self.thumbnailer.started, [])
+        self.failUnlessEqual(self.done, [factory])
+
+    def testRemove(self):
+        factories = [make_file_factory("file:///%d.ogg" % i) for i in range(3)]
+        self.thumbnailer.pause()
+        for factory in factories:
+            self.thumbnailer.add(factory)
+        self.thumbnailer.remove(factories[1])
+        self.thumbnailer.resume()
+        self._finishCurrent()
+        self._finishCurrent()
+        self.failUnlessEqual(self.done, [factories[0], factories[2]])
+
+
+class TestSourceListThumbnails(TestCase):
+    def setUp(self):
+        self.sourcelist = SourceList()
+        self.sourcelist.thumbnailer = StubThumbnailer()
+        self.sourcelist.thumbnailer.connect("thumbnail-done",
+                self.sourcelist._thumbnailDoneCb)
+        self.updated = []
+        self.sourcelist.connect("source-updated", self._sourceUpdatedCb)
+
+    def _sourceUpdatedCb(self, sourcelist, factory):
+        self.updated.append(factory)
+
+    def testDeferredWhileDiscovering(self):
+        factory = make_file_factory("file:///a.ogg")
+        self.sourcelist.discoverer.emit("starting")
+        self.sourcelist.addFactory(factory)
+        self.failUnlessEqual(self.sourcelist.thumbnailer.started, [])
+
+        self.sourcelist.discoverer.emit("ready")
+        self.failUnlessEqual(self.sourcelist.thumbnailer.started, [factory])
+
+        self.sourcelist.thumbnailer._setFile(factory, "/tmp/a.png")
+        self.failUnlessEqual(self.updated, [factory])
+
+    def testRemovedSource(self):
+        factory = make_file_factory("file:///a.ogg")
+        self.sourcelist.addFactory(factory)
+        self.sourcelist.removeUri(factory.uri)
+        self.sourcelist.thumbnailer._setFile(factory, "/tmp/a.png")
+        self.failUnlessEqual(self.updated, [])
@@ -0,0 +1,107 @@
+# PiTiVi , Non-linear video editor
+#
+#       tests/test_tracing.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+
+from __future__ import with_statement
+
+from StringIO import StringIO
+from unittest import TestCase
+
+from pitivi.log import tracing
+from pitivi.log.loggable import Loggable
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+
+class Traced(Loggable):
+    logCategory = "traced"
+
+
+class TestTracing(TestCase):
+    def setUp(self):
+        tracing.clear()
+        tracing.enable()
+        self.traced = Traced()
+
+    def tearDown(self):
+        tracing.disable()
+        tracing.clear()
+
+    def testDisabled(self):
+        tracing.disable()
+        with self.traced.span("nothing"):
+            pass
+        self.traced.beginSpan("nothing")
+        self.traced.endSpan("nothing")
+        self.failUnlessEqual(tracing.getEvents(), [])
+
+    def testSpan(self):
+        with self.traced.span("work", size=3):
+            pass
+
+        events = tracing.getEvents()
+        self.failUnlessEqual(len(events), 1)
+        event = events[0]
+        self.failUnlessEqual(event["name"], "work")
+        self.failUnlessEqual(event["cat"], "traced")
+        self.failUnlessEqual(event["ph"], "X")
+        self.failUnlessEqual(event["args"], {"size": 3})
+        self.failUnless(event["dur"] >= 0)
+
+    def testSpanException(self):
+        def raiser():
+            with self.traced.span("work"):
+                raise ValueError()
+
+        self.failUnlessRaises(ValueError, raiser)
+        event = tracing.getEvents()[0]
+        self.failUnlessEqual(event["args"], {"exception": "ValueError"})
+
+    def testAsync(self):
+        self.traced.beginSpan("job", "a")
+        self.traced.beginSpan("job", "b")
+        self.traced.endSpan("job", "a")
+        self.traced.endSpan("job", "b")
+
+        events = tracing.getEvents()
+        self.failUnlessEqual([(e["ph"], e["id"]) for e in events],
+                [("b", "a"), ("b", "b"), ("e", "a"), ("e", "b")])
+
+    def testMaxEvents(self):
+        tracing.enable(max_events=2)
+        try:
+            for name in ("a", "b", "c"):
+                tracing.instant(name)
+        finally:
+            tracing.enable(max_events=200000)
+
+        self.failUnlessEqual([e["name"] for e in tracing.getEvents()],
+                ["b", "c"])
+
+    def testExport(self):
+        with self.traced.span("work", obj=object()):
+            pass
+        output = StringIO()
+        tracing.exportChromeTrace(output)
+
+        trace = json.loads(output.getvalue())
+        self.failUnlessEqual(len(trace["traceEvents"]), 1)
+        self.failUnlessEqual(trace["traceEvents"][0]["name"], "work")
@@ -401,6 +401,41 @@ class TestTrack(TestCase):
         for obj in objs:
             self.failUnlessEqual(obj.track, None)
 
+    def testDefaultSourcesReused(self):
+        track = self.track1
+        objs = []
+        # clips of 1 second with a gap of 1 second before each
+        for i in xrange(3):
+            obj = SourceTrackObject(self.factory, self.stream)
+            obj.start = (2 * i + 1) * gst.SECOND
+            obj.duration = gst.SECOND
+            objs.append(obj)
+            track.addTrackObject(obj)
+
+        sources = list(track.default_sources)
+        self.failUnlessEqual([(source.props.start, source.props.duration)
+                for source in sources],
+                [(2 * i * gst.SECOND, gst.SECOND) for i in xrange(3)])
+
+        # moving the last clip only changes the last gap, the same source is
+        # used to fill it
+        track.disableUpdates()
+        objs[2].start = 6 * gst.SECOND
+        track.enableUpdates()
+        self.failUnlessEqual(track.default_sources[:2], sources[:2])
+        self.failUnless(track.default_sources[2] is sources[2])
+        self.failUnlessEqual(sources[2].props.start, 4 * gst.SECOND)
+        self.failUnlessEqual(sources[2].props.duration, 2 * gst.SECOND)
+
+        # merging two gaps moves one source and removes the other one
+        track.removeTrackObject(objs[0])
+        self.failUnlessEqual(len(track.default_sources), 2)
+        self.failUnlessEqual((sources[0].props.start, sources[0].props.duration),
+                (0, 3 * gst.SECOND))
+        self.failIf(sources[1] in list(track.composition))
+
+        track.removeAllTrackObjects()
+
     def testMaxPriority(self):
         track = self.track1
         factory = self.factory